@@ -4,8 +4,9 @@ Organization audit log — diff MongoDB user_data and format entries for admins/
 from __future__ import annotations
 
 import datetime
+import hashlib
 import json
-from typing import Any
+from typing import Any, Iterable, Iterator
 
 DATA_CATEGORIES = (
     'water',
@@ -42,6 +43,8 @@ def _summarize_pref_value(key: str, value: Any) -> str:
         if s.startswith('data:'):
             return '[company logo image updated]'
         return _truncate(s, 80)
+    if key == 'companyLogoRef':
+        return f'[company logo image {str(value)[:12]}]'
     if key in ('hiddenWidgets', 'dashboardChartPreferences', 'qaChecklistState'):
         s = str(value)
         return _truncate(s, 120) if len(s) > 120 else s
@@ -52,6 +55,90 @@ def _stable_json(obj: Any) -> str:
     return json.dumps(obj, sort_keys=True, default=str)
 
 
+# Site sections hashed (and diffed) independently; data categories are hashed one by one.
+SITE_HASH_SECTIONS = (
+    'name',
+    'companyName',
+    'notes',
+    'financials',
+    'tabQuestions',
+    'invoices',
+    'bills',
+    'cashTransactions',
+    'monthlyCashFlow',
+)
+
+
+def content_digest(obj: Any) -> str:
+    return hashlib.blake2b(_stable_json(obj).encode('utf-8'), digest_size=16).hexdigest()
+
+
+def site_hash_section(field: str, category: str | None = None) -> str:
+    """Section name covering site field `field` (and data `category`): '<field>', 'data.<category>' or 'other'."""
+    if field in SITE_HASH_SECTIONS:
+        return field
+    if field == 'data' and category in DATA_CATEGORIES:
+        return f'data.{category}'
+    return 'other'
+
+
+def valid_site_hashes(hashes: Any) -> bool:
+    return (
+        isinstance(hashes, dict)
+        and isinstance(hashes.get('site'), str)
+        and isinstance(hashes.get('sections'), dict)
+        and isinstance(hashes.get('data'), dict)
+    )
+
+
+def site_content_hashes(site: Any, previous: dict | None = None, touched: Iterable[str] | None = None) -> dict:
+    """
+    Merkle-style hashes for one site: {'site': h, 'sections': {section: h}, 'data': {category: h}}.
+
+    The site hash is taken over the section and category hashes, so equal site hashes mean the
+    audit diff has nothing to report for that site. Given the site's `previous` hashes and the
+    `touched` section names (see site_hash_section), only those sections are read and re-hashed.
+    """
+    site = site if isinstance(site, dict) else {}
+    data = site.get('data') if isinstance(site.get('data'), dict) else {}
+    if valid_site_hashes(previous) and touched is not None:
+        sections, categories, touched = dict(previous['sections']), dict(previous['data']), set(touched)
+    else:
+        sections, categories, touched = {}, {}, None
+
+    for key in SITE_HASH_SECTIONS:
+        if touched is None or key in touched:
+            sections[key] = content_digest(site.get(key))
+    for category in DATA_CATEGORIES:
+        if touched is None or f'data.{category}' in touched:
+            categories[category] = content_digest(data.get(category))
+    if touched is None or 'other' in touched:
+        other = {k: v for k, v in site.items() if k not in SITE_HASH_SECTIONS and k != 'data'}
+        data_other = {k: v for k, v in data.items() if k not in DATA_CATEGORIES}
+        if data_other:
+            other['data'] = data_other
+        elif site.get('data') is not None and not isinstance(site.get('data'), dict):
+            other['data'] = site.get('data')
+        sections['other'] = content_digest(other)
+
+    return {'site': content_digest([sections, categories]), 'sections': sections, 'data': categories}
+
+
+def content_hashes_for_sites(sites: Any, reuse: dict | None = None) -> dict:
+    """
+    {site_id: site_content_hashes(site)} for a user_data `sites` map.
+
+    `reuse` holds stored hashes that are known to match these exact sites (the sites were not
+    resent); only sites missing from it are hashed.
+    """
+    sites = sites if isinstance(sites, dict) else {}
+    reuse = reuse if isinstance(reuse, dict) else {}
+    return {
+        site_id: reuse[site_id] if valid_site_hashes(reuse.get(site_id)) else site_content_hashes(site)
+        for site_id, site in sites.items()
+    }
+
+
 def _months_summary(months: Any) -> str:
     if not isinstance(months, list):
         return 'no months'
@@ -234,12 +321,28 @@ def _diff_record_list(site_id: str, field: str, old_items: Any, new_items: Any)
     return changes
 
 
-def _diff_site(site_id: str, old_site: Any, new_site: Any) -> list[dict]:
+def _diff_site(
+    site_id: str, old_site: Any, new_site: Any, old_hashes: dict | None = None, new_hashes: dict | None = None
+) -> list[dict]:
     old_site = old_site if isinstance(old_site, dict) else {}
     new_site = new_site if isinstance(new_site, dict) else {}
     changes: list[dict] = []
 
+    hashed = valid_site_hashes(old_hashes) and valid_site_hashes(new_hashes)
+
+    def unchanged(section: str) -> bool:
+        # Equal section hashes: skip the section without looking at its rows.
+        if not hashed:
+            return False
+        if section.startswith('data.'):
+            old_h, new_h = old_hashes['data'].get(section[5:]), new_hashes['data'].get(section[5:])
+        else:
+            old_h, new_h = old_hashes['sections'].get(section), new_hashes['sections'].get(section)
+        return old_h is not None and old_h == new_h
+
     for text_key in ('name', 'companyName', 'notes'):
+        if unchanged(text_key):
+            continue
         ov, nv = old_site.get(text_key), new_site.get(text_key)
         if ov != nv:
             changes.append({
@@ -250,21 +353,26 @@ def _diff_site(site_id: str, old_site: Any, new_site: Any) -> list[dict]:
                 'new': _truncate(nv),
             })
 
-    changes.extend(_diff_financials(site_id, old_site.get('financials'), new_site.get('financials')))
-    changes.extend(_diff_tab_questions(site_id, old_site.get('tabQuestions'), new_site.get('tabQuestions')))
-    changes.extend(_diff_record_list(site_id, 'invoices', old_site.get('invoices'), new_site.get('invoices')))
-    changes.extend(_diff_record_list(site_id, 'bills', old_site.get('bills'), new_site.get('bills')))
+    if not unchanged('financials'):
+        changes.extend(_diff_financials(site_id, old_site.get('financials'), new_site.get('financials')))
+    if not unchanged('tabQuestions'):
+        changes.extend(_diff_tab_questions(site_id, old_site.get('tabQuestions'), new_site.get('tabQuestions')))
+    for field in ('invoices', 'bills'):
+        if not unchanged(field):
+            changes.extend(_diff_record_list(site_id, field, old_site.get(field), new_site.get(field)))
 
     old_data = old_site.get('data') if isinstance(old_site.get('data'), dict) else {}
     new_data = new_site.get('data') if isinstance(new_site.get('data'), dict) else {}
     for category in DATA_CATEGORIES:
+        if unchanged(f'data.{category}'):
+            continue
         changes.extend(
             _diff_data_rows(site_id, category, old_data.get(category), new_data.get(category))
         )
 
     old_cash = old_site.get('cashTransactions')
     new_cash = new_site.get('cashTransactions')
-    if _stable_json(old_cash) != _stable_json(new_cash):
+    if not unchanged('cashTransactions') and _stable_json(old_cash) != _stable_json(new_cash):
         changes.append({
             'area': 'cash_transactions',
             'path': f'sites.{site_id}.cashTransactions',
@@ -275,7 +383,7 @@ def _diff_site(site_id: str, old_site: Any, new_site: Any) -> list[dict]:
 
     old_flow = old_site.get('monthlyCashFlow')
     new_flow = new_site.get('monthlyCashFlow')
-    if _stable_json(old_flow) != _stable_json(new_flow):
+    if not unchanged('monthlyCashFlow') and _stable_json(old_flow) != _stable_json(new_flow):
         changes.append({
             'area': 'monthly_cash_flow',
             'path': f'sites.{site_id}.monthlyCashFlow',
@@ -288,7 +396,12 @@ def _diff_site(site_id: str, old_site: Any, new_site: Any) -> list[dict]:
 
 
 def diff_user_data_payload(old_doc: dict | None, new_doc: dict | None) -> list[dict]:
-    """Compare previous and incoming Mongo user_data documents."""
+    """
+    Compare previous and incoming Mongo user_data documents.
+
+    When both carry `content_hashes` (see content_hashes_for_sites) for a site, a site with equal
+    hashes is skipped outright and only the sections whose hashes differ are compared.
+    """
     old_doc = old_doc if isinstance(old_doc, dict) else {}
     new_doc = new_doc if isinstance(new_doc, dict) else {}
     changes: list[dict] = []
@@ -299,6 +412,8 @@ def diff_user_data_payload(old_doc: dict | None, new_doc: dict | None) -> list[d
 
     old_sites = old_doc.get('sites') if isinstance(old_doc.get('sites'), dict) else {}
     new_sites = new_doc.get('sites') if isinstance(new_doc.get('sites'), dict) else {}
+    old_hashes = old_doc.get('content_hashes') if isinstance(old_doc.get('content_hashes'), dict) else {}
+    new_hashes = new_doc.get('content_hashes') if isinstance(new_doc.get('content_hashes'), dict) else {}
 
     for site_id in sorted(set(old_sites) | set(new_sites)):
         if site_id not in old_sites:
@@ -321,7 +436,10 @@ def diff_user_data_payload(old_doc: dict | None, new_doc: dict | None) -> list[d
                 'new': '(removed)',
             })
         else:
-            changes.extend(_diff_site(site_id, old_sites[site_id], new_sites[site_id]))
+            old_h, new_h = old_hashes.get(site_id), new_hashes.get(site_id)
+            if valid_site_hashes(old_h) and valid_site_hashes(new_h) and old_h['site'] == new_h['site']:
+                continue
+            changes.extend(_diff_site(site_id, old_sites[site_id], new_sites[site_id], old_h, new_h))
 
     if len(changes) > _MAX_CHANGES_PER_SAVE:
         extra = len(changes) - _MAX_CHANGES_PER_SAVE
@@ -347,14 +465,66 @@ def build_audit_summary(changes: list[dict], action: str) -> str:
     return f'{action}: ' + ', '.join(parts)
 
 
-def format_audit_log_txt(
+def build_audit_entry(
+    organization_id: str,
+    actor: dict,
+    action: str,
+    changes: list[dict],
+    timestamp: datetime.datetime,
+) -> dict:
+    """Stored audit log document; `actor` holds the actor_* fields."""
+    return {
+        'organization_id': organization_id,
+        'timestamp': timestamp,
+        **actor,
+        'action': action,
+        'summary': build_audit_summary(changes, action),
+        'change_count': len(changes),
+        'changes': changes,
+    }
+
+
+def _format_audit_entry_txt(entry: dict) -> str:
+    when = entry.get('timestamp')
+    if isinstance(when, datetime.datetime):
+        when_str = when.astimezone(datetime.timezone.utc).strftime('%Y-%m-%d %H:%M:%S UTC')
+    else:
+        when_str = str(when or '')
+    actor = entry.get('actor_email') or entry.get('actor_username') or 'unknown'
+    name = entry.get('actor_name') or ''
+    role = entry.get('actor_role') or 'user'
+    action = entry.get('action') or 'change'
+    summary = entry.get('summary') or ''
+    lines = [f'[{when_str}] {actor}' + (f' ({name})' if name else '') + f' — {role} — {action}']
+    if summary:
+        lines.append(f'  Summary: {summary}')
+    for ch in entry.get('changes') or []:
+        detail = ch.get('detail') or ch.get('path') or 'change'
+        lines.append(f'  - {detail}')
+        old_v = ch.get('old')
+        new_v = ch.get('new')
+        if old_v not in (None, '') or new_v not in (None, ''):
+            if old_v not in (None, ''):
+                lines.append(f'      Before: {old_v}')
+            if new_v not in (None, ''):
+                lines.append(f'      After:  {new_v}')
+    return '\n'.join(lines)
+
+
+def iter_audit_log_txt(
     organization_id: str,
     organization_name: str | None,
-    entries: list[dict],
+    entries: Iterable[dict],
     *,
+    entry_count: int,
     generated_at: datetime.datetime | None = None,
-) -> str:
-    """Plain-text audit log for download."""
+) -> Iterator[str]:
+    """
+    Plain-text audit log as a stream of chunks (header, then one chunk per entry).
+
+    `entries` may be a live database cursor; only one entry is held at a time. The header's
+    entry count has to be known up front, so callers pass it in.
+    """
     ts = generated_at or datetime.datetime.now(datetime.timezone.utc)
     lines = [
         'Carbon Calculator — Organization Audit Log',
@@ -364,38 +534,56 @@ def format_audit_log_txt(
     if organization_name:
         lines.append(f'Organization name: {organization_name}')
     lines.append(f'Generated (UTC): {ts.strftime("%Y-%m-%d %H:%M:%S")}')
-    lines.append(f'Entries: {len(entries)}')
+    lines.append(f'Entries: {entry_count}')
     lines.append('=' * 60)
-    lines.append('')
-
-    if not entries:
-        lines.append('No audit entries recorded yet.')
-        return '\n'.join(lines) + '\n'
+    yield '\n'.join(lines) + '\n\n'
 
+    # Entries are separated by a blank line; the last one is held back so trailing whitespace
+    # can be trimmed exactly as the buffered formatter always did.
+    pending = None
     for entry in entries:
-        when = entry.get('timestamp')
-        if isinstance(when, datetime.datetime):
-            when_str = when.astimezone(datetime.timezone.utc).strftime('%Y-%m-%d %H:%M:%S UTC')
+        if pending is not None:
+            yield pending + '\n\n'
+        pending = _format_audit_entry_txt(entry)
+    if pending is None:
+        yield 'No audit entries recorded yet.\n'
+    else:
+        yield pending.rstrip() + '\n'
+
+
+def format_audit_log_txt(
+    organization_id: str,
+    organization_name: str | None,
+    entries: list[dict],
+    *,
+    generated_at: datetime.datetime | None = None,
+) -> str:
+    """Plain-text audit log for download."""
+    return ''.join(iter_audit_log_txt(
+        organization_id,
+        organization_name,
+        entries,
+        entry_count=len(entries),
+        generated_at=generated_at,
+    ))
+
+
+def audit_entry_to_json(entry: dict) -> dict:
+    """JSON-safe copy of a stored audit entry (ObjectId and datetimes become strings)."""
+    out = {}
+    for key, value in entry.items():
+        if isinstance(value, datetime.datetime):
+            if value.tzinfo is None:
+                value = value.replace(tzinfo=datetime.timezone.utc)
+            out[key] = value.isoformat()
+        elif key == '_id':
+            out[key] = str(value)
         else:
-            when_str = str(when or '')
-        actor = entry.get('actor_email') or entry.get('actor_username') or 'unknown'
-        name = entry.get('actor_name') or ''
-        role = entry.get('actor_role') or 'user'
-        action = entry.get('action') or 'change'
-        summary = entry.get('summary') or ''
-        lines.append(f'[{when_str}] {actor}' + (f' ({name})' if name else '') + f' — {role} — {action}')
-        if summary:
-            lines.append(f'  Summary: {summary}')
-        for ch in entry.get('changes') or []:
-            detail = ch.get('detail') or ch.get('path') or 'change'
-            lines.append(f'  - {detail}')
-            old_v = ch.get('old')
-            new_v = ch.get('new')
-            if old_v not in (None, '') or new_v not in (None, ''):
-                if old_v not in (None, ''):
-                    lines.append(f'      Before: {old_v}')
-                if new_v not in (None, ''):
-                    lines.append(f'      After:  {new_v}')
-        lines.append('')
-
-    return '\n'.join(lines).rstrip() + '\n'
+            out[key] = value
+    return out
+
+
+def iter_audit_log_ndjson(entries: Iterable[dict]) -> Iterator[str]:
+    """One JSON object per line, for streaming exports of the full history."""
+    for entry in entries:
+        yield json.dumps(audit_entry_to_json(entry), ensure_ascii=False, default=str) + '\n'
@@ -0,0 +1,319 @@
+"""
+Background writer for organization audit entries.
+
+Request handlers hand over either a finished change list or the pre/post data snapshots of a save;
+one worker thread computes the diffs and writes whatever has queued up with a single insert_many,
+so a save's latency does not include diffing every site or an audit round trip.
+
+Entries that cannot be written — the database is down, the queue is full, or the process is
+shutting down before the queue drained — are appended to a JSON-lines spool file. The worker
+replays the spool when it starts, after each successful write while anything is spooled, and
+every `replay_interval` seconds while it is idle with a spool pending. Every event gets its entry
+_id when it is queued, so an entry that ends up both written and spooled replays as a duplicate
+key and is skipped. Spool lines that cannot be parsed (a torn append) are moved to a `.bad` file.
+
+Several processes may share the spool file. Appends take an exclusive flock on it, and a replay
+first claims the file by renaming it to a private `.replay` name under that lock, so entries
+appended while a replay runs land in a fresh spool file. A claimed file whose replay failed stays
+on disk and is retried by the next replay.
+"""
+from __future__ import annotations
+
+import glob
+import os
+import queue
+import sys
+import threading
+import time
+import uuid
+from typing import Callable
+
+from bson import ObjectId, json_util
+from pymongo.errors import BulkWriteError
+
+from audit_log import build_audit_entry, diff_user_data_payload
+
+try:
+    import fcntl
+except ImportError:  # not POSIX: spool access is only serialized within this process
+    fcntl = None
+
+
+def _lock(fh, *, blocking: bool = True) -> bool:
+    """Exclusive advisory lock on an open file (released on close); False when it is held elsewhere."""
+    if fcntl is None:
+        return True
+    try:
+        fcntl.flock(fh.fileno(), fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+    except BlockingIOError:
+        return False
+    return True
+
+
+def _is_current(fh, path: str) -> bool:
+    """Whether `path` still names the open file `fh` (it may have been renamed or removed)."""
+    try:
+        return os.path.samestat(os.fstat(fh.fileno()), os.stat(path))
+    except FileNotFoundError:
+        return False
+
+
+class AuditWriter:
+    def __init__(
+        self,
+        get_collection: Callable[[], object],
+        *,
+        spool_path: str,
+        max_batch: int = 200,
+        max_queue: int = 5000,
+        enqueue_timeout: float = 0.05,
+        replay_interval: float = 30.0,
+    ):
+        self._get_collection = get_collection
+        self.spool_path = spool_path
+        self.max_batch = max(1, int(max_batch))
+        self.enqueue_timeout = enqueue_timeout
+        self.replay_interval = replay_interval
+        self._spool_pending = False
+        self._queue: queue.Queue = queue.Queue(maxsize=max(1, int(max_queue)))
+        self._pending = 0
+        self._idle = threading.Condition()
+        self._spool_lock = threading.Lock()
+        self._in_flight: list[tuple] = []
+        self._in_flight_lock = threading.Lock()
+        self._thread: threading.Thread | None = None
+        self._start_lock = threading.Lock()
+
+    # --- producer side -----------------------------------------------------------------------
+
+    def record(self, org_id: str, actor: dict, action: str, changes: list[dict], timestamp) -> None:
+        """Queue an entry whose change list is already known."""
+        if changes:
+            self._submit(('entry', org_id, actor, action, changes, timestamp, ObjectId()))
+
+    def record_diff(self, org_id: str, actor: dict, action: str, old_snapshot: dict, new_snapshot: dict, timestamp) -> None:
+        """
+        Queue a save; the worker diffs the snapshots and drops the event if nothing changed.
+
+        The snapshots are read later on another thread, so the caller must not mutate them after
+        handing them over.
+        """
+        self._submit(('diff', org_id, actor, action, (old_snapshot, new_snapshot), timestamp, ObjectId()))
+
+    def _submit(self, item: tuple) -> None:
+        self.start()
+        with self._idle:
+            self._pending += 1
+        try:
+            self._queue.put(item, timeout=self.enqueue_timeout)
+        except queue.Full:
+            # Never stall a request on audit volume: persist this one to the spool instead.
+            self._spool(self._entries([item]))
+            self._done(1)
+
+    # --- worker side -------------------------------------------------------------------------
+
+    def start(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._start_lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name='audit-writer', daemon=True)
+            self._thread.start()
+
+    def _done(self, count: int) -> None:
+        with self._idle:
+            self._pending -= count
+            if self._pending <= 0:
+                self._idle.notify_all()
+
+    def _entries(self, items: list[tuple]) -> list[dict]:
+        entries = []
+        for kind, org_id, actor, action, payload, timestamp, entry_id in items:
+            changes = diff_user_data_payload(*payload) if kind == 'diff' else payload
+            if changes:
+                entry = build_audit_entry(org_id, actor, action, changes, timestamp)
+                # Client-side _id so a spooled batch that was partly written replays idempotently.
+                entry['_id'] = entry_id
+                entries.append(entry)
+        return entries
+
+    def _write(self, entries: list[dict]) -> bool:
+        """Insert `entries`, spooling them on failure; True when the database took them."""
+        if not entries:
+            return False
+        try:
+            col = self._get_collection()
+            if col is None:
+                raise RuntimeError('audit log collection unavailable')
+            col.insert_many(entries, ordered=False)
+        except Exception as e:
+            print(f'WARN: audit writer spooling {len(entries)} entries: {e}', file=sys.stderr)
+            self._spool(entries)
+            return False
+        return True
+
+    def _replay_pending(self) -> None:
+        try:
+            self.replay_spool()
+        except Exception as e:
+            # Never let the spool stop the worker: the queue must keep draining.
+            print(f'ERROR: audit spool replay failed: {e}', file=sys.stderr)
+
+    def _run(self) -> None:
+        self._replay_pending()
+        while True:
+            # Block for one event, then take whatever else queued up meanwhile as the same batch.
+            try:
+                batch = [self._queue.get(timeout=self.replay_interval if self._spool_pending else None)]
+            except queue.Empty:
+                self._replay_pending()
+                continue
+            while len(batch) < self.max_batch:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            with self._in_flight_lock:
+                self._in_flight = batch
+            written = False
+            try:
+                written = self._write(self._entries(batch))
+            except Exception as e:
+                print(f'ERROR: audit writer dropped {len(batch)} events: {e}', file=sys.stderr)
+            finally:
+                with self._in_flight_lock:
+                    self._in_flight = []
+                self._done(len(batch))
+            if written and self._spool_pending:
+                # The database is answering again: catch up on what was spooled meanwhile.
+                self._replay_pending()
+
+    def flush(self, timeout: float) -> bool:
+        """Wait up to `timeout` seconds for queued events to be written; True when fully drained."""
+        deadline = time.monotonic() + timeout
+        with self._idle:
+            while self._pending > 0:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._idle.wait(remaining)
+        return True
+
+    def close(self, timeout: float = 5.0) -> None:
+        """
+        Bounded shutdown: drain for up to `timeout`, then spool whatever is still queued, along
+        with the batch the worker is still writing (a duplicate if that write finishes after all).
+        """
+        if self.flush(timeout):
+            return
+        with self._in_flight_lock:
+            in_flight = list(self._in_flight)
+        leftovers = []
+        while True:
+            try:
+                leftovers.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        if in_flight or leftovers:
+            self._spool(self._entries(in_flight + leftovers))
+        if leftovers:
+            self._done(len(leftovers))
+
+    # --- spool -------------------------------------------------------------------------------
+
+    def _spool(self, entries: list[dict]) -> None:
+        if not entries:
+            return
+        lines = ''.join(json_util.dumps(entry) + '\n' for entry in entries)
+        with self._spool_lock:
+            os.makedirs(os.path.dirname(os.path.abspath(self.spool_path)), exist_ok=True)
+            while True:
+                fh = open(self.spool_path, 'a', encoding='utf-8')
+                _lock(fh)
+                # A replay may have claimed the file while this process waited for the lock.
+                if _is_current(fh, self.spool_path):
+                    break
+                fh.close()
+            with fh:
+                fh.write(lines)
+                fh.flush()
+                os.fsync(fh.fileno())
+            self._spool_pending = True
+
+    def replay_spool(self) -> int:
+        """Insert spooled entries; returns how many were written (they stay spooled on failure)."""
+        with self._spool_lock:
+            self._claim_spool()
+            written = 0
+            for path in self._claimed_files():
+                count = self._replay_file(path)
+                if count is None:
+                    break
+                written += count
+            self._spool_pending = os.path.exists(self.spool_path) or bool(self._claimed_files())
+            return written
+
+    def _claimed_files(self) -> list[str]:
+        return sorted(glob.glob(f'{glob.escape(self.spool_path)}.*.replay'))
+
+    def _claim_spool(self) -> None:
+        """Rename the spool file to a private `.replay` name, under the lock appenders take."""
+        while True:
+            try:
+                fh = open(self.spool_path, encoding='utf-8')
+            except FileNotFoundError:
+                return
+            with fh:
+                _lock(fh)
+                if _is_current(fh, self.spool_path):
+                    os.replace(self.spool_path, f'{self.spool_path}.{os.getpid()}-{uuid.uuid4().hex}.replay')
+                    return
+
+    def _replay_file(self, path: str) -> int | None:
+        """Insert one claimed file's entries and remove it; None when the insert failed."""
+        try:
+            # A torn append may end mid-character; that line is quarantined like any unparseable one.
+            fh = open(path, encoding='utf-8', errors='replace')
+        except FileNotFoundError:
+            return 0
+        with fh:
+            # Skip files another process is replaying right now (or has just finished).
+            if not _lock(fh, blocking=False) or not _is_current(fh, path):
+                return 0
+            entries, bad = [], []
+            for line in fh:
+                if not line.strip():
+                    continue
+                try:
+                    entries.append(json_util.loads(line))
+                except Exception:
+                    bad.append(line if line.endswith('\n') else line + '\n')
+            if entries:
+                try:
+                    col = self._get_collection()
+                    if col is None:
+                        return None
+                    col.insert_many(entries, ordered=False)
+                except BulkWriteError as e:
+                    # Duplicate keys are entries an earlier, interrupted attempt already wrote.
+                    if any(err.get('code') != 11000 for err in e.details.get('writeErrors', [])):
+                        print(f'WARN: audit spool replay failed, will retry: {e}', file=sys.stderr)
+                        return None
+                except Exception as e:
+                    print(f'WARN: audit spool replay failed, will retry: {e}', file=sys.stderr)
+                    return None
+            if bad:
+                self._quarantine(bad)
+            os.remove(path)
+            return len(entries)
+
+    def _quarantine(self, lines: list[str]) -> None:
+        """Keep unparseable spool lines aside for inspection instead of failing every replay."""
+        bad_path = f'{self.spool_path}.bad'
+        print(f'WARN: audit spool: moved {len(lines)} unreadable line(s) to {bad_path}', file=sys.stderr)
+        with open(bad_path, 'a', encoding='utf-8') as fh:
+            fh.write(''.join(lines))
+            fh.flush()
+            os.fsync(fh.fileno())
@@ -0,0 +1,117 @@
+"""
+Content-addressed blob storage for large binary org preferences (company logo).
+
+Blobs are keyed by the SHA-256 hex digest of their bytes, so storing the same image twice is a
+no-op and a reference can be cached forever. GridFS is used in production; LocalBlobStore is a
+disk-backed stand-in for development and tests (BLOB_STORE_BACKEND=local).
+"""
+from __future__ import annotations
+
+import base64
+import binascii
+import hashlib
+import json
+import os
+import re
+import tempfile
+from pathlib import Path
+
+try:
+    import gridfs
+except ImportError:
+    gridfs = None
+
+BLOB_BUCKET = 'org_blobs'
+
+_REF_RE = re.compile(r'^[0-9a-f]{64}$')
+
+
+def blob_ref_for(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def is_blob_ref(value) -> bool:
+    return isinstance(value, str) and bool(_REF_RE.match(value))
+
+
+def decode_image_data_url(data_url) -> tuple[bytes, str] | None:
+    """Split a data:image/...;base64 URL into (raw bytes, content type)."""
+    if not isinstance(data_url, str) or not data_url.startswith('data:image'):
+        return None
+    try:
+        head, b64 = data_url.split(',', 1)
+        raw = base64.b64decode(b64)
+    except (ValueError, binascii.Error, TypeError):
+        return None
+    if not raw:
+        return None
+    content_type = head[len('data:'):].split(';', 1)[0].strip() or 'application/octet-stream'
+    return raw, content_type
+
+
+class LocalBlobStore:
+    """Blobs as files under root/<ab>/<sha256>, with a small JSON sidecar for the content type."""
+
+    def __init__(self, root):
+        self.root = Path(root)
+
+    def _path(self, ref: str) -> Path:
+        return self.root / ref[:2] / ref
+
+    def put(self, data: bytes, content_type: str) -> str:
+        ref = blob_ref_for(data)
+        path = self._path(ref)
+        if path.is_file():
+            return ref
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=path.parent)
+        try:
+            with os.fdopen(fd, 'wb') as fh:
+                fh.write(data)
+            path.with_suffix('.json').write_text(json.dumps({'content_type': content_type}), encoding='utf-8')
+            os.replace(tmp, path)
+        except OSError:
+            if os.path.exists(tmp):
+                os.unlink(tmp)
+            raise
+        return ref
+
+    def get(self, ref: str) -> tuple[bytes, str] | None:
+        if not is_blob_ref(ref):
+            return None
+        path = self._path(ref)
+        try:
+            data = path.read_bytes()
+        except OSError:
+            return None
+        try:
+            meta = json.loads(path.with_suffix('.json').read_text(encoding='utf-8'))
+        except (OSError, json.JSONDecodeError):
+            meta = {}
+        return data, meta.get('content_type') or 'application/octet-stream'
+
+
+class GridFSBlobStore:
+    """Blobs in a GridFS bucket; the file name is the SHA-256 reference."""
+
+    def __init__(self, db, bucket_name: str = BLOB_BUCKET):
+        if gridfs is None:
+            raise RuntimeError('gridfs is not available (install pymongo)')
+        self._files = db[f'{bucket_name}.files']
+        self._bucket = gridfs.GridFSBucket(db, bucket_name=bucket_name)
+
+    def put(self, data: bytes, content_type: str) -> str:
+        ref = blob_ref_for(data)
+        if self._files.find_one({'filename': ref}, {'_id': 1}) is None:
+            self._bucket.upload_from_stream(ref, data, metadata={'content_type': content_type})
+        return ref
+
+    def get(self, ref: str) -> tuple[bytes, str] | None:
+        if not is_blob_ref(ref):
+            return None
+        try:
+            stream = self._bucket.open_download_stream_by_name(ref)
+        except gridfs.errors.NoFile:
+            return None
+        meta = stream.metadata or {}
+        return stream.read(), meta.get('content_type') or 'application/octet-stream'
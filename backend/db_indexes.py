@@ -0,0 +1,161 @@
+"""
+MongoDB index management — the indexes every hot query path relies on, declared in one place.
+
+The app calls ensure_indexes() at boot (MONGO_ENSURE_INDEXES=0 turns that off); the same checks
+are available from scripts/mongo_indexes.py.
+
+Indexes are created by name, so re-running is a no-op once they exist. None are unique: legacy
+documents (mixed-case emails, duplicate usernames across organizations) must not make boot fail.
+"""
+from __future__ import annotations
+
+from typing import Any
+
+from data.catalog_factor_registry import CATALOG_COLLECTION
+from emission_rollups import ROLLUPS_COLLECTION
+from site_documents import SITE_DOCUMENTS_COLLECTION
+
+# collection -> [(index name, key spec)]
+REQUIRED_INDEXES: dict[str, list[tuple[str, list[tuple[str, int]]]]] = {
+    'users': [
+        # _find_user_by_email runs on every authenticated request.
+        ('email_1', [('email', 1)]),
+        # _find_user_by_username, with and without organization_id (prefix serves both).
+        ('username_1_organization_id_1', [('username', 1), ('organization_id', 1)]),
+        # Org user listings and organization removal.
+        ('organization_id_1', [('organization_id', 1)]),
+    ],
+    'organizations': [
+        ('name_1', [('name', 1)]),
+    ],
+    'user_data': [
+        # get_user_data / save_user_data / PATCH all address one org document.
+        ('organization_id_1', [('organization_id', 1)]),
+    ],
+    SITE_DOCUMENTS_COLLECTION: [
+        # Per-site layout: every read and write addresses an organization's sites, or one of them.
+        ('organization_id_1_site_id_1', [('organization_id', 1), ('site_id', 1)]),
+    ],
+    ROLLUPS_COLLECTION: [
+        # Cell key; its prefixes serve chart series per organization and per site, and the
+        # per-site / per-category cell swaps on save.
+        (
+            'organization_id_1_site_id_1_year_1_month_1_category_1_scope_1',
+            [('organization_id', 1), ('site_id', 1), ('year', 1), ('month', 1), ('category', 1), ('scope', 1)],
+        ),
+    ],
+    'organization_audit_log': [
+        # Matches the audit log listing sort so pages are read in index order.
+        ('organization_id_1_timestamp_-1__id_-1', [('organization_id', 1), ('timestamp', -1), ('_id', -1)]),
+    ],
+    'email_outbox': [
+        # Workers claim the oldest due message (pending, or sending with an expired lease).
+        ('status_1_next_attempt_at_1', [('status', 1), ('next_attempt_at', 1)]),
+    ],
+    CATALOG_COLLECTION: [
+        ('country_key_1', [('country_key', 1)]),
+        # /api/factors ETag: newest catalog update.
+        ('updated_at_-1', [('updated_at', -1)]),
+    ],
+}
+
+# Representative shapes of the hot queries: (collection, filter, sort or None).
+HOT_QUERIES: list[tuple[str, dict, list[tuple[str, int]] | None]] = [
+    ('users', {'email': 'probe@example.com'}, None),
+    ('users', {'username': 'probe'}, None),
+    ('users', {'username': 'probe', 'organization_id': 'probe'}, None),
+    ('users', {'organization_id': 'probe'}, None),
+    ('organizations', {'name': 'probe'}, None),
+    ('user_data', {'organization_id': 'probe'}, None),
+    (SITE_DOCUMENTS_COLLECTION, {'organization_id': 'probe', 'site_id': 'probe'}, None),
+    (ROLLUPS_COLLECTION, {'organization_id': 'probe'}, None),
+    (ROLLUPS_COLLECTION, {'organization_id': 'probe', 'site_id': 'probe'}, None),
+    ('organization_audit_log', {'organization_id': 'probe'}, [('timestamp', -1), ('_id', -1)]),
+]
+
+
+def _index_key(spec) -> list[tuple[str, int]]:
+    return [(field, int(direction)) for field, direction in spec]
+
+
+def ensure_indexes(db, *, create: bool = True, required: dict | None = None) -> list[dict]:
+    """
+    Create (or, with create=False, only look for) every required index.
+
+    Returns one report row per index: status is 'present', 'created', 'missing', 'conflict'
+    (an index with that name exists with a different key) or 'error'.
+    """
+    report = []
+    for collection, indexes in (required or REQUIRED_INDEXES).items():
+        col = db[collection]
+        try:
+            existing = {name: _index_key(info.get('key') or []) for name, info in col.index_information().items()}
+        except Exception as e:
+            for name, _keys in indexes:
+                report.append({'collection': collection, 'index': name, 'status': 'error', 'detail': str(e)})
+            continue
+        for name, keys in indexes:
+            row = {'collection': collection, 'index': name, 'status': 'present'}
+            if name in existing:
+                if existing[name] != _index_key(keys):
+                    row.update(status='conflict', detail=f'existing key {existing[name]}')
+            elif _index_key(keys) in existing.values():
+                # Same key under another name (e.g. created by hand) serves the query just as well.
+                row['detail'] = 'present under another name'
+            elif not create:
+                row['status'] = 'missing'
+            else:
+                try:
+                    col.create_index(keys, name=name)
+                    row['status'] = 'created'
+                except Exception as e:
+                    row.update(status='error', detail=str(e))
+            report.append(row)
+    return report
+
+
+def _plan_stages(node: Any) -> set[str]:
+    stages = set()
+    if isinstance(node, dict):
+        stage = node.get('stage')
+        if isinstance(stage, str):
+            stages.add(stage)
+        for value in node.values():
+            stages |= _plan_stages(value)
+    elif isinstance(node, list):
+        for value in node:
+            stages |= _plan_stages(value)
+    return stages
+
+
+def index_problems(index_rows: list[dict], scan_rows: list[dict] = ()) -> list[dict]:
+    """Rows that need attention: missing/conflicting/failed indexes and scanning queries."""
+    problems = [r for r in index_rows if r['status'] in ('missing', 'conflict', 'error')]
+    problems += [r for r in scan_rows if r.get('error') or r.get('collscan')]
+    return problems
+
+
+def find_collection_scans(db, queries: list | None = None) -> list[dict]:
+    """
+    Explain each hot query and report its winning plan.
+
+    Rows carry 'collscan' (the plan reads the whole collection) and 'in_memory_sort' (a blocking
+    SORT stage, i.e. no index delivers the requested order).
+    """
+    report = []
+    for collection, query, sort in (queries or HOT_QUERIES):
+        row = {'collection': collection, 'filter': sorted(query), 'sort': sort}
+        try:
+            cursor = db[collection].find(query)
+            if sort:
+                cursor = cursor.sort(sort)
+            plan = (cursor.explain().get('queryPlanner') or {}).get('winningPlan') or {}
+        except Exception as e:
+            row['error'] = str(e)
+            report.append(row)
+            continue
+        stages = _plan_stages(plan)
+        row['collscan'] = 'COLLSCAN' in stages
+        row['in_memory_sort'] = 'SORT' in stages
+        report.append(row)
+    return report
@@ -0,0 +1,165 @@
+"""
+Outbound email outbox — messages are persisted to a MongoDB collection and delivered by a small
+pool of worker threads, so request handlers never wait on Gmail / Resend / SMTP.
+
+Each document moves pending -> sending -> sent, or back to pending with an exponential backoff
+after a failed attempt, until `max_attempts` is reached (status 'failed'). A worker claims a
+message with a lease and counts the attempt as it claims; if the process dies mid-send the lease
+expires and another worker retries, so a message that keeps crashing its sender still fails after
+`max_attempts`.
+
+Only a process that calls start() delivers mail; enqueue() just persists the message (and wakes
+this process's workers when it runs them).
+"""
+from __future__ import annotations
+
+import datetime
+import queue
+import random
+import sys
+import threading
+from typing import Callable
+
+from pymongo import ReturnDocument
+
+
+def _utc_now() -> datetime.datetime:
+    return datetime.datetime.now(datetime.timezone.utc)
+
+
+class EmailOutbox:
+    def __init__(
+        self,
+        get_collection: Callable[[], object],
+        deliver: Callable[[dict], None],
+        *,
+        workers: int = 2,
+        max_attempts: int = 6,
+        base_delay_seconds: float = 30.0,
+        max_delay_seconds: float = 3600.0,
+        lease_seconds: float = 300.0,
+        poll_seconds: float = 30.0,
+    ):
+        self._get_collection = get_collection
+        self._deliver = deliver
+        self.workers = max(1, int(workers))
+        self.max_attempts = max(1, int(max_attempts))
+        self.base_delay_seconds = base_delay_seconds
+        self.max_delay_seconds = max_delay_seconds
+        self.lease_seconds = lease_seconds
+        self.poll_seconds = poll_seconds
+        self._wake: queue.Queue = queue.Queue()
+        self._stop = threading.Event()
+        self._threads: list[threading.Thread] = []
+        self._lock = threading.Lock()
+
+    def start(self) -> None:
+        with self._lock:
+            if self._threads:
+                return
+            self._stop.clear()
+            for n in range(self.workers):
+                thread = threading.Thread(target=self._run, name=f'email-outbox-{n}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def stop(self, timeout: float | None = None) -> None:
+        with self._lock:
+            threads, self._threads = self._threads, []
+        self._stop.set()
+        for _ in threads:
+            self._wake.put(None)
+        for thread in threads:
+            thread.join(timeout)
+
+    def enqueue(self, subject: str, text: str, to_addr: str, html: str | None = None, *, kind: str = 'email'):
+        """Persist one message and wake a worker; raises RuntimeError when the outbox is unavailable."""
+        col = self._get_collection()
+        if col is None:
+            raise RuntimeError('email outbox collection unavailable')
+        now = _utc_now()
+        res = col.insert_one({
+            'kind': kind,
+            'to': to_addr,
+            'subject': subject,
+            'text': text,
+            'html': html,
+            'status': 'pending',
+            'attempts': 0,
+            'created_at': now,
+            'next_attempt_at': now,
+        })
+        if self._threads:
+            self._wake.put(res.inserted_id)
+        return res.inserted_id
+
+    def _claim(self, col) -> dict | None:
+        now = _utc_now()
+        return col.find_one_and_update(
+            {'$or': [
+                {'status': 'pending', 'next_attempt_at': {'$lte': now}},
+                {'status': 'sending', 'lease_until': {'$lt': now}},
+            ]},
+            {
+                '$set': {'status': 'sending', 'lease_until': now + datetime.timedelta(seconds=self.lease_seconds)},
+                '$inc': {'attempts': 1},
+            },
+            sort=[('next_attempt_at', 1)],
+            return_document=ReturnDocument.AFTER,
+        )
+
+    def retry_delay(self, attempts: int) -> float:
+        """Backoff before attempt `attempts + 1`: doubling from base_delay, capped, with +-20% jitter."""
+        delay = min(self.max_delay_seconds, self.base_delay_seconds * (2 ** max(0, attempts - 1)))
+        return delay * random.uniform(0.8, 1.2)
+
+    def process_once(self) -> bool:
+        """Deliver one due message; returns False when there was nothing to do."""
+        col = self._get_collection()
+        if col is None:
+            return False
+        doc = self._claim(col)
+        if doc is None:
+            return False
+        attempts = int(doc.get('attempts') or 0)
+        if attempts > self.max_attempts:
+            # Reclaimed after its last attempt's lease expired: that sender died mid-send.
+            col.update_one(
+                {'_id': doc['_id']},
+                {'$set': {'status': 'failed', 'last_error': 'delivery interrupted'}, '$unset': {'lease_until': ''}},
+            )
+            print(f'ERROR: email to {doc.get("to")} failed after {self.max_attempts} attempts', file=sys.stderr)
+            return True
+        try:
+            self._deliver(doc)
+        except Exception as e:
+            now = _utc_now()
+            update = {'last_error': str(e)[:500], 'last_attempt_at': now}
+            if attempts >= self.max_attempts:
+                update['status'] = 'failed'
+                print(f'ERROR: email to {doc.get("to")} failed after {attempts} attempts: {e}', file=sys.stderr)
+            else:
+                update['status'] = 'pending'
+                update['next_attempt_at'] = now + datetime.timedelta(seconds=self.retry_delay(attempts))
+            col.update_one({'_id': doc['_id']}, {'$set': update, '$unset': {'lease_until': ''}})
+            return True
+        col.update_one(
+            {'_id': doc['_id']},
+            {'$set': {'status': 'sent', 'sent_at': _utc_now()}, '$unset': {'lease_until': ''}},
+        )
+        return True
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                worked = self.process_once()
+            except Exception as e:
+                print(f'WARN: email outbox worker: {e}', file=sys.stderr)
+                worked = False
+            if worked:
+                continue
+            # Idle: sleep until a new message arrives or the next poll (which picks up retries).
+            try:
+                self._wake.get(timeout=self.poll_seconds)
+            except queue.Empty:
+                pass
@@ -0,0 +1,233 @@
+"""
+Materialized monthly emission rollups — kg CO2e per (organization, site, year, month, category,
+scope), kept in the `emission_rollups` collection so charts read a few hundred small documents
+instead of re-evaluating every data row.
+
+Saves hand the touched (site, categories) pairs to a RollupMaintainer; its worker thread
+re-evaluates just those rows with the emissions engine and swaps the affected cells. A change of
+reporting country rebuilds the organization; after conversion factor updates, rebuild with
+scripts/backfill_emission_rollups.py.
+
+Cells hold raw kg for every scope; disabled scopes are filtered out when a series is read, the
+same way the dashboard zeroes them.
+"""
+from __future__ import annotations
+
+import queue
+import sys
+import threading
+import time
+from typing import Callable
+
+from pymongo import DeleteMany, InsertOne
+
+from audit_log import DATA_CATEGORIES
+from emissions_engine import MONTHS, RowResolver, compute_emissions
+
+ROLLUPS_COLLECTION = 'emission_rollups'
+SERIES_GROUPS = {'category': '$category', 'scope': '$scope', 'site': '$site_id'}
+
+# {site_id: categories to recompute, or None for every category of that site}
+TouchedSites = dict[str, set[str] | None]
+
+
+def _selected_sites(sites: dict, touched: TouchedSites | None) -> dict:
+    if touched is None:
+        return sites
+    selected = {}
+    for site_id, categories in touched.items():
+        site = sites.get(site_id)
+        if not isinstance(site, dict):
+            continue
+        if categories is None:
+            selected[site_id] = site
+            continue
+        data = site.get('data') if isinstance(site.get('data'), dict) else {}
+        selected[site_id] = {'data': {c: data[c] for c in categories if c in data}}
+    return selected
+
+
+def rollup_cells(sites: dict, resolve_row: RowResolver, touched: TouchedSites | None = None) -> list[dict]:
+    """Non-zero monthly cells for the touched sites/categories (every site when touched is None)."""
+    result = compute_emissions(_selected_sites(sites or {}, touched), resolve_row, include_rows=True)
+    cells: dict[tuple, float] = {}
+    for site_id, summary in result['sites'].items():
+        for row in summary.get('row_details', []):
+            if row['year'] is None:
+                continue
+            for month, kg in enumerate(row['months_kg'][:MONTHS], start=1):
+                if kg:
+                    key = (site_id, row['year'], month, row['category'], row['scope'])
+                    cells[key] = cells.get(key, 0.0) + float(kg)
+    return [
+        {'site_id': site_id, 'year': year, 'month': month, 'category': category, 'scope': scope, 'kg': kg}
+        for (site_id, year, month, category, scope), kg in cells.items()
+    ]
+
+
+def replace_rollups(
+    col,
+    org_id: str,
+    sites: dict,
+    touched: TouchedSites | None,
+    resolve_row: RowResolver,
+    *,
+    now=None,
+) -> int:
+    """
+    Swap the cells of the touched sites/categories (the whole organization when touched is None)
+    for freshly computed ones. Touched sites missing from `sites` lose their cells. Returns the
+    number of cells written.
+    """
+    ops: list = []
+    if touched is None:
+        ops.append(DeleteMany({'organization_id': org_id}))
+    else:
+        for site_id, categories in touched.items():
+            query: dict = {'organization_id': org_id, 'site_id': site_id}
+            if categories is not None:
+                query['category'] = {'$in': sorted(categories)}
+            ops.append(DeleteMany(query))
+    cells = rollup_cells(sites, resolve_row, touched)
+    ops.extend(InsertOne({'organization_id': org_id, **cell, 'updated_at': now}) for cell in cells)
+    if ops:
+        col.bulk_write(ops, ordered=True)
+    return len(cells)
+
+
+def chart_series(
+    col,
+    org_id: str,
+    *,
+    site_id: str | None = None,
+    year: int | None = None,
+    group_by: str = 'category',
+    disabled_scopes=(),
+) -> dict:
+    """
+    Monthly kg CO2e series grouped by category, scope or site, summed by the database.
+
+    Returns {'group_by', 'periods': ['2025-01', ...], 'series': {key: [kg per period]},
+    'totals_kg': {key: kg}, 'total_kg'}; periods cover whole years.
+    """
+    if group_by not in SERIES_GROUPS:
+        raise ValueError(f'group_by must be one of {", ".join(SERIES_GROUPS)}')
+    match: dict = {'organization_id': org_id}
+    if site_id is not None:
+        match['site_id'] = site_id
+    if year is not None:
+        match['year'] = year
+    if disabled_scopes:
+        match['scope'] = {'$nin': sorted(disabled_scopes)}
+    pipeline = [
+        {'$match': match},
+        {'$group': {
+            '_id': {'year': '$year', 'month': '$month', 'key': SERIES_GROUPS[group_by]},
+            'kg': {'$sum': '$kg'},
+        }},
+    ]
+    sums = [(doc['_id']['year'], doc['_id']['month'], doc['_id']['key'], doc['kg']) for doc in col.aggregate(pipeline)]
+
+    years = sorted({y for y, *_ in sums} | ({year} if year is not None else set()))
+    periods = [f'{y}-{m:02d}' for y in years for m in range(1, MONTHS + 1)]
+    slot = {(y, m): n for n, (y, m) in enumerate((y, m) for y in years for m in range(1, MONTHS + 1))}
+    series: dict[str, list[float]] = {}
+    for y, m, key, kg in sums:
+        if (y, m) in slot:
+            series.setdefault(str(key), [0.0] * len(periods))[slot[(y, m)]] += kg
+    if group_by == 'category':
+        order = {c: n for n, c in enumerate(DATA_CATEGORIES)}
+        series = dict(sorted(series.items(), key=lambda kv: (order.get(kv[0], len(order)), kv[0])))
+    else:
+        series = dict(sorted(series.items()))
+    totals = {key: sum(values) for key, values in series.items()}
+    return {
+        'group_by': group_by,
+        'periods': periods,
+        'series': series,
+        'totals_kg': totals,
+        'total_kg': sum(totals.values()),
+    }
+
+
+class RollupMaintainer:
+    """
+    Single worker thread applying rollup updates in submission order, off the request path.
+
+    `resolver_for(org_id)` returns the organization's row resolver (None when factors are
+    unavailable); `load_sites(org_id)` returns its full `sites` map for rebuilds.
+    """
+
+    def __init__(
+        self,
+        get_collection: Callable[[], object],
+        resolver_for: Callable[[str], RowResolver | None],
+        load_sites: Callable[[str], dict],
+        *,
+        now: Callable[[], object] = lambda: None,
+    ):
+        self._get_collection = get_collection
+        self._resolver_for = resolver_for
+        self._load_sites = load_sites
+        self._now = now
+        self._queue: queue.Queue = queue.Queue()
+        self._pending = 0
+        self._idle = threading.Condition()
+        self._thread: threading.Thread | None = None
+        self._start_lock = threading.Lock()
+
+    def submit(self, org_id: str, sites: dict, touched: TouchedSites) -> None:
+        """Queue a recompute of `touched`; `sites` must not be mutated afterwards."""
+        if touched:
+            self._put((org_id, sites, touched))
+
+    def rebuild(self, org_id: str) -> None:
+        """Queue a recompute of every cell of the organization from its stored data."""
+        self._put((org_id, None, None))
+
+    def _put(self, job: tuple) -> None:
+        with self._idle:
+            self._pending += 1
+        self._start()
+        self._queue.put(job)
+
+    def _start(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._start_lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name='emission-rollups', daemon=True)
+            self._thread.start()
+
+    def apply(self, org_id: str, sites: dict | None, touched: TouchedSites | None) -> int:
+        col = self._get_collection()
+        resolve_row = self._resolver_for(org_id)
+        if col is None or resolve_row is None:
+            raise RuntimeError('rollup collection or conversion factors unavailable')
+        if sites is None:
+            sites = self._load_sites(org_id)
+        return replace_rollups(col, org_id, sites, touched, resolve_row, now=self._now())
+
+    def _run(self) -> None:
+        while True:
+            org_id, sites, touched = self._queue.get()
+            try:
+                self.apply(org_id, sites, touched)
+            except Exception as e:
+                print(f'WARN: emission rollups for {org_id} not updated (run the backfill): {e}', file=sys.stderr)
+            finally:
+                with self._idle:
+                    self._pending -= 1
+                    self._idle.notify_all()
+
+    def flush(self, timeout: float) -> bool:
+        """Wait up to `timeout` seconds for queued updates; True when all were applied."""
+        deadline = time.monotonic() + timeout
+        with self._idle:
+            while self._pending > 0:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._idle.wait(remaining)
+        return True
@@ -0,0 +1,263 @@
+"""
+Server-side emissions engine — per-row, per-month, per-category and per-scope kg CO2e for whole
+user_data.sites payloads (same month/row shape that _sanitize_site_data_payload produces).
+
+Factor resolution stays in mongo_api; this module only needs a callable returning the kg CO2e
+coefficient for one row. Month vectors are evaluated as one (rows x 12) batch — with NumPy when
+it is installed, plain Python otherwise.
+"""
+from __future__ import annotations
+
+from typing import Callable
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from audit_log import DATA_CATEGORIES
+
+MONTHS = 12
+SCOPES = ('scope1', 'scope2', 'scope3')
+
+# Mirrors js/calculations.js getScopeBreakdown().
+SCOPE1_SOURCES = frozenset({
+    'naturalGas', 'diesel', 'lpg', 'coal', 'transport_petrol', 'transport_diesel',
+})
+SCOPE2_SOURCES = frozenset({'electricity'})
+SCOPE3_ENERGY_SOURCES = frozenset({
+    'electricity_transmission_distribution', 'td_district_heat_steam',
+})
+# Org preference that switches a source off (js/calculations.js sourceToggleEnabled()).
+SOURCE_TOGGLE_PREFS = {
+    'electricity_transmission_distribution': 'elecDistLossIncluded',
+    'td_district_heat_steam': 'elecDistLossIncluded',
+    'business_travel_hotel_night': 'hotelStayEnabled',
+    'wfh_day': 'wfhEnabled',
+    'materials_paper_kg': 'materialsEnabled',
+}
+
+# (coefficient kg CO2e per entered unit, error, factor_key)
+RowResolver = Callable[[str, dict], tuple[float | None, str | None, str]]
+
+
+def scope_for_source(source_key: str | None) -> str:
+    src = (source_key or '').strip()
+    if src in SCOPE3_ENERGY_SOURCES:
+        return 'scope3'
+    if src in SCOPE1_SOURCES or src.startswith('refrigerant_'):
+        return 'scope1'
+    if src in SCOPE2_SOURCES:
+        return 'scope2'
+    return 'scope3'
+
+
+def _pref_enabled(prefs: dict | None, key: str) -> bool:
+    return str((prefs or {}).get(key, 'true')).strip().lower() != 'false'
+
+
+def scopes_enabled_from_prefs(prefs: dict | None) -> dict[str, bool]:
+    """{scope: enabled} from the scope1Enabled / scope2Enabled / scope3Enabled org preferences."""
+    return {scope: _pref_enabled(prefs, f'{scope}Enabled') for scope in SCOPES}
+
+
+def disabled_sources_from_prefs(prefs: dict | None) -> frozenset[str]:
+    """Sources the organization has switched off; the dashboard counts their rows as zero."""
+    return frozenset(src for src, key in SOURCE_TOGGLE_PREFS.items() if not _pref_enabled(prefs, key))
+
+
+def _zero_months() -> list[float]:
+    return [0.0] * MONTHS
+
+
+def _row_months(row: dict) -> list[float]:
+    months = row.get('months') if isinstance(row.get('months'), list) else []
+    out = [(float(v) if isinstance(v, (int, float)) else 0.0) for v in months[:MONTHS]]
+    out.extend([0.0] * (MONTHS - len(out)))
+    return out
+
+
+def _batched_row_kg(month_rows: list[list[float]], coefficients: list[float]):
+    """(rows x 12) month values scaled by one coefficient per row."""
+    if np is not None:
+        if not month_rows:
+            return np.zeros((0, MONTHS))
+        return np.asarray(month_rows, dtype=float) * np.asarray(coefficients, dtype=float)[:, None]
+    return [[v * c for v in months] for months, c in zip(month_rows, coefficients)]
+
+
+def _group_sum(row_kg, group_index: list[int], n_groups: int) -> list[list[float]]:
+    """Sum row vectors into n_groups month vectors."""
+    if np is not None:
+        out = np.zeros((n_groups, MONTHS))
+        if group_index:
+            np.add.at(out, np.asarray(group_index, dtype=np.intp), row_kg)
+        return out.tolist()
+    out = [_zero_months() for _ in range(n_groups)]
+    for gi, vec in zip(group_index, row_kg):
+        acc = out[gi]
+        for m in range(MONTHS):
+            acc[m] += vec[m]
+    return out
+
+
+def _row_year(row: dict) -> int | None:
+    try:
+        return int(row.get('year'))
+    except (TypeError, ValueError):
+        return None
+
+
+class _GroupIndex:
+    """Assign dense integer ids to group keys in first-seen order."""
+
+    def __init__(self):
+        self.keys: list[tuple] = []
+        self._ids: dict[tuple, int] = {}
+
+    def id_for(self, key: tuple) -> int:
+        gid = self._ids.get(key)
+        if gid is None:
+            gid = len(self.keys)
+            self._ids[key] = gid
+            self.keys.append(key)
+        return gid
+
+
+def _empty_summary() -> dict:
+    return {
+        'total_kg': 0.0,
+        'totals_kg': {},
+        'scope_kg': {s: 0.0 for s in SCOPES},
+        'months_kg': {},
+        'rows': 0,
+        'errors': [],
+    }
+
+
+def compute_emissions(
+    sites: dict,
+    resolve_row: RowResolver,
+    *,
+    year: int | None = None,
+    scopes_enabled: dict[str, bool] | None = None,
+    include_rows: bool = False,
+) -> dict:
+    """
+    Evaluate every data row of every site in one batch.
+
+    Returns {'sites': {site_id: summary}, 'organization': summary} where a summary holds
+    total_kg, totals_kg (per data category), scope_kg, months_kg ({year: [12]}), the row count
+    and rows with a non-zero quantity that could not be resolved ('errors').
+    Rows outside `year` (when given) and rows in a scope disabled by `scopes_enabled` are left
+    out of every aggregate, as the dashboard's scope breakdown leaves them out.
+    """
+    sites = sites if isinstance(sites, dict) else {}
+    scopes_enabled = scopes_enabled or {}
+
+    month_rows: list[list[float]] = []
+    coefficients: list[float] = []
+    row_meta: list[tuple] = []  # (site_id, category, index, row, factor_key, scope, year)
+    summaries: dict[str, dict] = {}
+
+    for site_id, site in sites.items():
+        summary = summaries.setdefault(str(site_id), _empty_summary())
+        data = site.get('data') if isinstance(site, dict) else None
+        if not isinstance(data, dict):
+            continue
+        for category in DATA_CATEGORIES:
+            rows = data.get(category)
+            if not isinstance(rows, list):
+                continue
+            for idx, row in enumerate(rows):
+                if not isinstance(row, dict):
+                    continue
+                row_year = _row_year(row)
+                if year is not None and row_year != year:
+                    continue
+                months = _row_months(row)
+                coefficient, err, factor_key = resolve_row(category, row)
+                scope = scope_for_source(row.get('emissionType') or factor_key)
+                if not scopes_enabled.get(scope, True):
+                    continue
+                if err or coefficient is None:
+                    if any(months):
+                        summary['errors'].append({
+                            'site_id': str(site_id),
+                            'category': category,
+                            'index': idx,
+                            'emissionType': row.get('emissionType'),
+                            'error': err or 'Missing conversion factor',
+                        })
+                    continue
+                month_rows.append(months)
+                coefficients.append(float(coefficient))
+                row_meta.append((str(site_id), category, idx, row, factor_key, scope, row_year))
+
+    row_kg = _batched_row_kg(month_rows, coefficients)
+
+    category_groups, scope_groups, year_groups = _GroupIndex(), _GroupIndex(), _GroupIndex()
+    category_index, scope_index, year_index = [], [], []
+    for site_id, category, _idx, _row, _fk, scope, row_year in row_meta:
+        category_index.append(category_groups.id_for((site_id, category)))
+        scope_index.append(scope_groups.id_for((site_id, scope)))
+        year_index.append(year_groups.id_for((site_id, row_year)))
+
+    by_category = _group_sum(row_kg, category_index, len(category_groups.keys))
+    by_scope = _group_sum(row_kg, scope_index, len(scope_groups.keys))
+    by_year = _group_sum(row_kg, year_index, len(year_groups.keys))
+
+    for (site_id, category), vec in zip(category_groups.keys, by_category):
+        summaries[site_id]['totals_kg'][category] = sum(vec)
+    for (site_id, scope), vec in zip(scope_groups.keys, by_scope):
+        summaries[site_id]['scope_kg'][scope] = sum(vec)
+    for (site_id, row_year), vec in zip(year_groups.keys, by_year):
+        summaries[site_id]['months_kg'][str(row_year)] = vec
+
+    for site_id, _category, *_rest in row_meta:
+        summaries[site_id]['rows'] += 1
+    for summary in summaries.values():
+        summary['total_kg'] = sum(summary['totals_kg'].values())
+
+    if include_rows:
+        kg_rows = row_kg.tolist() if np is not None else row_kg
+        for summary in summaries.values():
+            summary['row_details'] = []
+        for (site_id, category, idx, row, factor_key, scope, row_year), coefficient, vec in zip(
+            row_meta, coefficients, kg_rows
+        ):
+            summaries[site_id]['row_details'].append({
+                'category': category,
+                'index': idx,
+                'description': row.get('description') or '',
+                'emissionType': row.get('emissionType'),
+                'factor_key': factor_key,
+                'year': row_year,
+                'unit': row.get('unit'),
+                'scope': scope,
+                'kg_per_unit': coefficient,
+                'months_kg': vec,
+                'total_kg': sum(vec),
+            })
+
+    return {
+        'sites': summaries,
+        'organization': _merge_summaries(summaries.values()),
+    }
+
+
+def _merge_summaries(summaries) -> dict:
+    out = _empty_summary()
+    for summary in summaries:
+        out['rows'] += summary['rows']
+        out['errors'].extend(summary['errors'])
+        for category, kg in summary['totals_kg'].items():
+            out['totals_kg'][category] = out['totals_kg'].get(category, 0.0) + kg
+        for scope, kg in summary['scope_kg'].items():
+            out['scope_kg'][scope] = out['scope_kg'].get(scope, 0.0) + kg
+        for row_year, vec in summary['months_kg'].items():
+            acc = out['months_kg'].setdefault(row_year, _zero_months())
+            for m in range(MONTHS):
+                acc[m] += vec[m]
+    out['total_kg'] = sum(out['totals_kg'].values())
+    return out
@@ -0,0 +1,166 @@
+"""
+Minimal in-process SMTP sink for tests and local development.
+
+Speaks just enough SMTP for smtplib (EHLO/HELO, AUTH PLAIN/LOGIN, MAIL, RCPT, DATA, RSET, NOOP,
+QUIT; no STARTTLS, so point the app at it with MAIL_USE_TLS=false) and keeps every accepted
+message. Run standalone to print mail instead of sending it:
+
+    python fake_smtp.py --port 1025
+"""
+from __future__ import annotations
+
+import argparse
+import email
+import email.policy
+import socket
+import socketserver
+import threading
+
+
+class _SmtpHandler(socketserver.StreamRequestHandler):
+    def _reply(self, line: str) -> None:
+        self.wfile.write(line.encode('ascii') + b'\r\n')
+
+    def handle(self) -> None:
+        server: FakeSmtpServer = self.server.owner
+        with server.lock:
+            server.connections += 1
+            server._sockets.add(self.connection)
+        try:
+            self._session(server)
+        finally:
+            with server.lock:
+                server._sockets.discard(self.connection)
+
+    def _session(self, server: 'FakeSmtpServer') -> None:
+        self._reply('220 fake-smtp ready')
+        mail_from, rcpt_to = None, []
+        while True:
+            raw = self.rfile.readline()
+            if not raw:
+                return
+            line = raw.decode('utf-8', errors='replace').rstrip('\r\n')
+            verb, _, arg = line.partition(' ')
+            verb = verb.upper()
+            if verb == 'EHLO':
+                self._reply('250-fake-smtp')
+                self._reply('250-AUTH PLAIN LOGIN')
+                self._reply('250 8BITMIME')
+            elif verb == 'HELO':
+                self._reply('250 fake-smtp')
+            elif verb == 'AUTH':
+                if arg.upper().startswith('LOGIN'):
+                    self._reply('334 VXNlcm5hbWU6')
+                    self.rfile.readline()
+                    self._reply('334 UGFzc3dvcmQ6')
+                    self.rfile.readline()
+                elif arg.upper() == 'PLAIN':
+                    self._reply('334 ')
+                    self.rfile.readline()
+                self._reply('235 authenticated')
+            elif verb == 'MAIL':
+                mail_from, rcpt_to = arg.partition(':')[2].strip().strip('<>'), []
+                self._reply('250 OK')
+            elif verb == 'RCPT':
+                rcpt_to.append(arg.partition(':')[2].strip().strip('<>'))
+                self._reply('250 OK')
+            elif verb == 'DATA':
+                self._reply('354 end with <CRLF>.<CRLF>')
+                lines = []
+                while True:
+                    data_line = self.rfile.readline()
+                    if not data_line or data_line in (b'.\r\n', b'.\n'):
+                        break
+                    lines.append(data_line[1:] if data_line.startswith(b'..') else data_line)
+                msg = email.message_from_bytes(b''.join(lines), policy=email.policy.default)
+                server._accept(mail_from, list(rcpt_to), msg)
+                self._reply('250 queued')
+            elif verb in ('RSET', 'NOOP'):
+                self._reply('250 OK')
+            elif verb == 'QUIT':
+                self._reply('221 bye')
+                return
+            else:
+                self._reply('502 command not implemented')
+
+
+class _ThreadingServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class FakeSmtpServer:
+    """
+    Threaded SMTP sink on 127.0.0.1.
+
+        with FakeSmtpServer() as smtp:
+            ...  # MAIL_SERVER=127.0.0.1, MAIL_PORT=smtp.port, MAIL_USE_TLS=false
+            smtp.messages[0]['Subject']
+    """
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0, *, on_message=None):
+        self._server = _ThreadingServer((host, port), _SmtpHandler)
+        self._server.owner = self
+        self.host, self.port = self._server.server_address[:2]
+        self.messages: list = []
+        self.envelopes: list[tuple[str | None, list[str]]] = []
+        self.connections = 0
+        self.lock = threading.Lock()
+        self._sockets: set = set()
+        self._on_message = on_message
+        self._thread: threading.Thread | None = None
+
+    def _accept(self, mail_from, rcpt_to, msg) -> None:
+        with self.lock:
+            self.envelopes.append((mail_from, rcpt_to))
+            self.messages.append(msg)
+        if self._on_message is not None:
+            self._on_message(mail_from, rcpt_to, msg)
+
+    def disconnect_all(self) -> None:
+        """Hang up on every open client session (like a server dropping idle connections)."""
+        with self.lock:
+            sockets = list(self._sockets)
+        for sock in sockets:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    def start(self) -> 'FakeSmtpServer':
+        self._thread = threading.Thread(target=self._server.serve_forever, name='fake-smtp', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> 'FakeSmtpServer':
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Print mail sent to a local fake SMTP server.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=1025)
+    args = parser.parse_args()
+
+    def show(mail_from, rcpt_to, msg):
+        body = msg.get_body(preferencelist=('plain', 'html'))
+        print(f'--- {mail_from} -> {", ".join(rcpt_to)}: {msg["Subject"]}')
+        print(body.get_content() if body is not None else '')
+
+    server = FakeSmtpServer(args.host, args.port, on_message=show)
+    print(f'fake SMTP listening on {server.host}:{server.port} (MAIL_USE_TLS=false)')
+    try:
+        server._server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,667 @@
+"""
+Final-report rendering: the .docx templates, their parsed-and-indexed cache and the builders that
+fill them from a report payload.
+
+This module has no side effects on import and does not touch MongoDB, so the bulk-report process
+pool imports it instead of the app. The caller resolves the client logo to PNG bytes (or the
+payload carries it as a data URL).
+"""
+from __future__ import annotations
+
+import copy
+import datetime
+import hashlib
+import io
+import json
+import re
+import threading
+import xml.etree.ElementTree as ET
+import zipfile
+from collections import OrderedDict
+from pathlib import Path
+from typing import Iterator
+from xml.sax.saxutils import escape
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+from blob_store import decode_image_data_url
+from zip_rewrite import RawZipSource, iter_rewritten_zip
+
+_W_NS = 'http://schemas.openxmlformats.org/wordprocessingml/2006/main'
+ET.register_namespace('w', _W_NS)
+
+_REPO_ROOT = Path(__file__).resolve().parent.parent
+_CARBON_STATEMENT_TEMPLATE = (
+    _REPO_ROOT / 'requirements' / 'Carbon emmission statement report template_v1.1.docx'
+)
+_CARBON_STATEMENT_TEMPLATE_LEGACY = (
+    _REPO_ROOT / 'requirements' / 'Carbon emissions statement report template.docx'
+)
+_SELBY_TEMPLATE = _REPO_ROOT / 'requirements' / 'Carbon Emissions Statement Selby Trust v2 ECO AUDIT.docx'
+
+# First embedded image in report templates (client branding area).
+_DOCX_CLIENT_LOGO_PART = 'word/media/image1.png'
+_YELLOW_MAP_JSON = Path(__file__).resolve().parent / 'final_report_yellow_map.json'
+
+# Optional narrative fragments in the legacy Selby template.
+_DOCX_NARRATIVE_SNIPPETS = (
+    ('is a community centre located in the London Borough of Haringey.', 'organization_profile'),
+    (
+        'energy use (electricity and gas), water consumption, waste generation, and business travel',
+        'scope_streams_summary',
+    ),
+    ('March 2022 to April 2023', 'assessment_period_detail'),
+)
+
+_CARBON_STATEMENT_BASELINE_NEEDLE = (
+    'This report is based on the data collected across the 2024/25 financial year.'
+)
+
+
+def _load_yellow_numeric_field_map() -> list:
+    try:
+        data = json.loads(_YELLOW_MAP_JSON.read_text(encoding='utf-8'))
+        fields = data.get('fields')
+        return list(fields) if isinstance(fields, list) else []
+    except (OSError, json.JSONDecodeError, TypeError):
+        return []
+
+
+def _docx_narrative_replacements(payload: dict) -> list[tuple[str, str]]:
+    """(template clause, client text) pairs for the non-empty narrative fields in the payload."""
+    out = []
+    for needle, key in _DOCX_NARRATIVE_SNIPPETS:
+        val = (payload.get(key) or '').strip()
+        if val:
+            out.append((needle, val))
+    return out
+
+
+def _apply_docx_narrative_overrides(xml_str: str, payload: dict) -> str:
+    """Replace known template clauses when the client supplies non-empty text (XML-escaped)."""
+    for needle, val in _docx_narrative_replacements(payload):
+        if needle in xml_str:
+            xml_str = xml_str.replace(needle, escape(val))
+    return xml_str
+
+
+_LOGO_PNG_CACHE_MAX = 32
+_logo_png_cache = OrderedDict()
+_logo_png_cache_lock = threading.Lock()
+
+
+def _logo_png_from_raw(raw: bytes) -> bytes | None:
+    """PNG passes through; JPEG/WebP/etc. are rasterized via Pillow if installed."""
+    if raw.startswith(b'\x89PNG\r\n\x1a\n'):
+        return raw
+    if Image is None:
+        return None
+    try:
+        img = Image.open(io.BytesIO(raw))
+        if img.mode not in ('RGB', 'RGBA'):
+            img = img.convert('RGBA')
+        out = io.BytesIO()
+        img.save(out, format='PNG', compress_level=6)
+        return out.getvalue()
+    except Exception:
+        return None
+
+
+def cached_logo_png(key: tuple, load_raw) -> bytes | None:
+    """Convert once per logo: LRU of PNG bytes keyed by content hash."""
+    with _logo_png_cache_lock:
+        if key in _logo_png_cache:
+            _logo_png_cache.move_to_end(key)
+            return _logo_png_cache[key]
+    raw = load_raw()
+    if raw is None:
+        return None
+    png = _logo_png_from_raw(raw)
+    with _logo_png_cache_lock:
+        _logo_png_cache[key] = png
+        while len(_logo_png_cache) > _LOGO_PNG_CACHE_MAX:
+            _logo_png_cache.popitem(last=False)
+    return png
+
+
+def png_bytes_from_logo_data_url(data_url: str | None) -> bytes | None:
+    """Decode a data: URL to PNG bytes for word/media (accept PNG; rasterize JPEG/WebP via Pillow if installed)."""
+    if not data_url or not isinstance(data_url, str) or not data_url.startswith('data:image'):
+        return None
+
+    def load_raw():
+        decoded = decode_image_data_url(data_url)
+        return decoded[0] if decoded else None
+
+    key = ('data_url', hashlib.sha256(data_url.encode('utf-8', 'replace')).hexdigest())
+    return cached_logo_png(key, load_raw)
+
+
+def png_bytes_from_payload_logo(payload: dict) -> bytes | None:
+    """PNG bytes for the logo data URL a report payload carries, if any."""
+    return png_bytes_from_logo_data_url(payload.get('company_logo_data_url') or payload.get('logo_data_url'))
+
+
+def _wtag(name: str) -> str:
+    return f'{{{_W_NS}}}{name}'
+
+
+def resolve_final_report_template() -> Path:
+    if _CARBON_STATEMENT_TEMPLATE.is_file():
+        return _CARBON_STATEMENT_TEMPLATE
+    if _CARBON_STATEMENT_TEMPLATE_LEGACY.is_file():
+        return _CARBON_STATEMENT_TEMPLATE_LEGACY
+    if _SELBY_TEMPLATE.is_file():
+        return _SELBY_TEMPLATE
+    raise FileNotFoundError(
+        'No final report template found. Add requirements/Carbon emmission statement report template_v1.1.docx'
+    )
+
+
+def _format_kg(value: float) -> str:
+    return f'{float(value):,.2f}'
+
+
+def _format_scope_pct(part_kg: float, total_kg: float) -> str:
+    if total_kg <= 0:
+        return '0.0%'
+    return f'{(100.0 * float(part_kg) / float(total_kg)):.1f}%'
+
+
+def _element_has_yellow_highlight(el: ET.Element) -> bool:
+    for child in el.iter():
+        tag = child.tag.split('}')[-1] if '}' in child.tag else child.tag
+        if tag != 'highlight':
+            continue
+        val = child.attrib.get(_wtag('val')) or child.attrib.get('val')
+        if val == 'yellow':
+            return True
+    return False
+
+
+def _set_cell_text(tc: ET.Element, text: str) -> None:
+    """Replace all text in a table cell with a single paragraph."""
+    text = str(text or '')
+    for child in list(tc):
+        tc.remove(child)
+    p = ET.SubElement(tc, _wtag('p'))
+    r = ET.SubElement(p, _wtag('r'))
+    t = ET.SubElement(r, _wtag('t'))
+    if text.startswith(' ') or text.endswith(' '):
+        t.set('{http://www.w3.org/XML/1998/namespace}space', 'preserve')
+    t.text = text
+
+
+def _cell_text(tc: ET.Element) -> str:
+    return ''.join((node.text or '') for node in tc.iter() if node.tag == _wtag('t')).strip()
+
+
+_SELBY_NUMERIC_TEXT = re.compile(r'^[\d,]+(\.\d+)?$')
+
+_CARBON_STATEMENT_PERF_ROW_LABELS = {
+    'Natural gas used for company facilities': 'natural_gas',
+    'Electricity used for company facilities': 'electricity',
+    'Electricity (transmission and distribution)': 'electricity_td',
+    'Water use': 'water',
+    'Wastewater': 'wastewater',
+    'Waste (to energy)': 'waste_to_energy',
+    'Waste (to recycling)': 'waste_to_recycling',
+}
+
+
+class _ReportTemplate:
+    """
+    One final-report template parsed and indexed once per (path, mtime).
+
+    Element references are stored as positions in `root.iter()` order, which a deep copy
+    preserves, so a report clones the pristine tree and resolves them with one pass.
+    """
+
+    def __init__(self, path: Path, mtime_ns: int, field_map_mtime_ns: int | None):
+        self.path = path
+        self.mtime_ns = mtime_ns
+        self.field_map_mtime_ns = field_map_mtime_ns
+        self.raw = path.read_bytes()
+        self.zip_source = RawZipSource(self.raw)
+        name = path.name.lower()
+        self.kind = 'carbon_statement' if 'carbon em' in name and 'statement' in name else 'selby'
+        with zipfile.ZipFile(io.BytesIO(self.raw), 'r') as zin:
+            xml_str = zin.read('word/document.xml').decode('utf-8', errors='ignore')
+        self.root = ET.fromstring(xml_str)
+        self.field_map = tuple(_load_yellow_numeric_field_map())
+
+        elements = list(self.root.iter())
+        pos = {id(el): i for i, el in enumerate(elements)}
+        self.text_nodes = tuple(i for i, el in enumerate(elements) if el.tag.split('}')[-1] == 't')
+        if self.kind == 'selby':
+            self.numeric_nodes = self._index_selby_numeric_nodes(elements, pos)
+        else:
+            self._index_carbon_statement(elements, pos)
+
+    def clone(self) -> tuple[ET.Element, list[ET.Element]]:
+        root = copy.deepcopy(self.root)
+        return root, list(root.iter())
+
+    @staticmethod
+    def _index_selby_numeric_nodes(elements, pos) -> tuple[int, ...]:
+        """Numeric w:t children of yellow-highlighted runs (targets of the yellow field map)."""
+        out = []
+        for run in elements:
+            if run.tag.split('}')[-1] != 'r' or not _element_has_yellow_highlight(run):
+                continue
+            for t in run:
+                if t.tag.split('}')[-1] != 't':
+                    continue
+                txt = (t.text or '').strip()
+                if txt and _SELBY_NUMERIC_TEXT.match(txt):
+                    out.append(pos[id(t)])
+        return tuple(out)
+
+    def _index_carbon_statement(self, elements, pos) -> None:
+        tables = [el for el in elements if el.tag == _wtag('tbl')]
+
+        def second_cell(row):
+            cells = row.findall(_wtag('tc'))
+            return pos[id(cells[1])] if len(cells) > 1 else None
+
+        # project number / reporting period / registered address
+        self.detail_cells = ()
+        if tables:
+            rows = tables[0].findall(f'.//{_wtag("tr")}')[:3]
+            self.detail_cells = tuple(second_cell(row) for row in rows)
+        # version / issue date
+        self.control_cells = ()
+        if len(tables) > 1:
+            rows = tables[1].findall(f'.//{_wtag("tr")}')
+            if rows:
+                self.control_cells = tuple(pos[id(tc)] for tc in rows[0].findall(_wtag('tc'))[:2])
+
+        perf_table = None
+        for tbl in tables:
+            text = ''.join((t.text or '') for t in tbl.iter() if t.tag == _wtag('t'))
+            if 'Carbon Emission Source' in text and 'Usage Data' in text:
+                perf_table = tbl
+                break
+        if perf_table is None and len(tables) > 3:
+            perf_table = tables[3]
+        # (row key or 'total', cell positions)
+        perf_rows = []
+        if perf_table is not None:
+            for tr in perf_table.findall(f'.//{_wtag("tr")}'):
+                cells = tr.findall(_wtag('tc'))
+                if len(cells) < 5:
+                    continue
+                label = _cell_text(cells[1] if len(cells) > 1 else cells[0])
+                key = 'total' if 'Total gross CO2' in label else _CARBON_STATEMENT_PERF_ROW_LABELS.get(label)
+                if key:
+                    perf_rows.append((key, tuple(pos[id(tc)] for tc in cells)))
+        self.perf_rows = tuple(perf_rows)
+
+        # Yellow w:t nodes with their enclosing cells: a cell rewritten by the table fill drops
+        # its highlighted text, so those nodes no longer take a slot in the yellow field map.
+        parents = {id(child): parent for parent in elements for child in parent}
+        yellow = []
+        for el in elements:
+            if el.tag != _wtag('p') or not _element_has_yellow_highlight(el):
+                continue
+            cells = []
+            cur = parents.get(id(el))
+            while cur is not None:
+                if cur.tag == _wtag('tc'):
+                    cells.append(pos[id(cur)])
+                cur = parents.get(id(cur))
+            for t in el.iter(_wtag('t')):
+                yellow.append((pos[id(t)], frozenset(cells)))
+        self.yellow_nodes = tuple(yellow)
+
+
+_report_template_cache: dict[str, _ReportTemplate] = {}
+_report_template_lock = threading.Lock()
+
+
+def _file_mtime_ns(path: Path) -> int | None:
+    try:
+        return path.stat().st_mtime_ns
+    except OSError:
+        return None
+
+
+def _get_report_template(path: Path) -> _ReportTemplate:
+    """Parsed template for `path`, rebuilt when the .docx or the yellow field map changes on disk."""
+    mtime_ns = path.stat().st_mtime_ns
+    field_map_mtime_ns = _file_mtime_ns(_YELLOW_MAP_JSON)
+    key = str(path)
+    with _report_template_lock:
+        cached = _report_template_cache.get(key)
+        if (
+            cached is not None
+            and cached.mtime_ns == mtime_ns
+            and cached.field_map_mtime_ns == field_map_mtime_ns
+        ):
+            return cached
+        tpl = _ReportTemplate(path, mtime_ns, field_map_mtime_ns)
+        _report_template_cache[key] = tpl
+        return tpl
+
+
+def _replace_in_text_nodes(nodes: list[ET.Element], positions, replacements) -> None:
+    """
+    Apply (needle, value, count) replacements to w:t text in document order.
+
+    count=None replaces every occurrence; count=1 only the first one in the document.
+    """
+    text_nodes = [nodes[i] for i in positions]
+    for needle, value, count in replacements:
+        remaining = count
+        for t in text_nodes:
+            text = t.text
+            if not text or needle not in text:
+                continue
+            if remaining is None:
+                t.text = text.replace(needle, value)
+                continue
+            t.text = text.replace(needle, value, remaining)
+            remaining -= min(remaining, text.count(needle))
+            if remaining == 0:
+                break
+
+
+def _performance_values_from_payload(payload: dict) -> dict[str, str]:
+    """Map yellow-field keys to display strings for the performance table."""
+    perf = payload.get('performance_rows') if isinstance(payload.get('performance_rows'), dict) else {}
+    totals_kg = payload.get('totals_kg') or {}
+    scope_kg = payload.get('scope_kg') or {}
+
+    def row(key: str) -> dict:
+        raw = perf.get(key) if isinstance(perf.get(key), dict) else {}
+        return raw if isinstance(raw, dict) else {}
+
+    def pick_num(key: str, field: str, fallback: float = 0.0) -> float:
+        raw = row(key).get(field, fallback)
+        try:
+            return float(raw)
+        except (TypeError, ValueError):
+            return float(fallback)
+
+    def pick_str(key: str, field: str, fallback: str = '') -> str:
+        val = row(key).get(field)
+        if val is None or val == '':
+            return fallback
+        return str(val)
+
+    natural_kg = pick_num('natural_gas', 'emissions_kg', scope_kg.get('scope1', 0) * 0.5)
+    electricity_kg = pick_num('electricity', 'emissions_kg', totals_kg.get('energy', 0) * 1000 * 0.5)
+    td_kg = pick_num('electricity_td', 'emissions_kg', 0)
+    water_kg = pick_num('water', 'emissions_kg', totals_kg.get('water', 0) * 1000 * 0.5)
+    wastewater_kg = pick_num('wastewater', 'emissions_kg', totals_kg.get('water', 0) * 1000 * 0.5)
+    waste_energy_kg = pick_num('waste_to_energy', 'emissions_kg', 0)
+    waste_recycling_kg = pick_num('waste_to_recycling', 'emissions_kg', totals_kg.get('waste', 0) * 1000 * 0.5)
+
+    return {
+        'natural_gas_scope_kg': _format_kg(pick_num('natural_gas', 'scope_kg', natural_kg)),
+        'natural_gas_emissions_kg': _format_kg(natural_kg),
+        'electricity_usage': pick_str('electricity', 'usage', '0 kWh'),
+        'electricity_factor': pick_str('electricity', 'factor', ''),
+        'electricity_emissions_kg': _format_kg(electricity_kg),
+        'electricity_scope_kg': _format_kg(pick_num('electricity', 'scope_kg', electricity_kg)),
+        'td_usage': pick_str('electricity_td', 'usage', pick_str('electricity', 'usage', '0 kWh')),
+        'td_factor': pick_str('electricity_td', 'factor', ''),
+        'td_emissions_kg': _format_kg(td_kg),
+        'water_usage': pick_str('water', 'usage', '0 m3'),
+        'water_factor': pick_str('water', 'factor', ''),
+        'water_emissions_kg': _format_kg(water_kg),
+        'wastewater_usage': pick_str('wastewater', 'usage', pick_str('water', 'usage', '0 m3')),
+        'wastewater_factor': pick_str('wastewater', 'factor', ''),
+        'wastewater_emissions_kg': _format_kg(wastewater_kg),
+        'waste_to_energy_usage': pick_str('waste_to_energy', 'usage', '0 tonnes'),
+        'waste_to_energy_factor': pick_str('waste_to_energy', 'factor', ''),
+        'waste_to_energy_kg': _format_kg(waste_energy_kg),
+        'waste_to_recycling_usage': pick_str('waste_to_recycling', 'usage', '0 tonnes'),
+        'waste_to_recycling_factor': pick_str('waste_to_recycling', 'factor', ''),
+        'waste_to_recycling_kg': _format_kg(waste_recycling_kg),
+    }
+
+
+def _fill_carbon_statement_tables(
+    tpl: _ReportTemplate, nodes: list[ET.Element], payload: dict, grand_total_kg: float
+) -> set[int]:
+    """Fill report-detail and performance tables in the carbon statement template; returns rewritten cells."""
+    written: set[int] = set()
+
+    def set_cell(position: int | None, text: str) -> None:
+        if position is None:
+            return
+        _set_cell_text(nodes[position], text)
+        written.add(position)
+
+    project_number = (payload.get('project_number') or '').strip()
+    reporting_period = (payload.get('reporting_period') or '').strip()
+    org_address = (payload.get('org_registered_address') or '').strip()
+    version = (payload.get('version') or '1.0').strip()
+    issue_date = (payload.get('issue_date') or '').strip()
+
+    for position, text in zip(tpl.detail_cells, (project_number, reporting_period, org_address)):
+        set_cell(position, text)
+    for position, text in zip(tpl.control_cells, (f'Version {version}' if version else '', issue_date)):
+        set_cell(position, text)
+
+    perf_values = _performance_values_from_payload(payload)
+    perf_rows = payload.get('performance_rows') if isinstance(payload.get('performance_rows'), dict) else {}
+    for key, cells in tpl.perf_rows:
+        if key == 'total':
+            set_cell(cells[-1], _format_kg(grand_total_kg))
+            continue
+        row_data = perf_rows.get(key) if isinstance(perf_rows.get(key), dict) else {}
+        usage = row_data.get('usage') or perf_values.get(
+            {'electricity_td': 'td_usage', 'waste_to_energy': 'waste_to_energy_usage',
+             'waste_to_recycling': 'waste_to_recycling_usage'}.get(key, f'{key}_usage'),
+            '',
+        )
+        factor = row_data.get('factor') or perf_values.get(
+            {'electricity_td': 'td_factor', 'waste_to_energy': 'waste_to_energy_factor',
+             'waste_to_recycling': 'waste_to_recycling_factor'}.get(key, f'{key}_factor'),
+            '',
+        )
+        emissions_key = {
+            'natural_gas': 'natural_gas_emissions_kg',
+            'electricity': 'electricity_emissions_kg',
+            'electricity_td': 'td_emissions_kg',
+            'water': 'water_emissions_kg',
+            'wastewater': 'wastewater_emissions_kg',
+            'waste_to_energy': 'waste_to_energy_kg',
+            'waste_to_recycling': 'waste_to_recycling_kg',
+        }.get(key, '')
+        emissions_raw = row_data.get('emissions_kg')
+        if emissions_raw is None:
+            emissions_disp = perf_values.get(emissions_key, '0')
+        else:
+            try:
+                emissions_disp = _format_kg(float(emissions_raw))
+            except (TypeError, ValueError):
+                emissions_disp = str(emissions_raw)
+        scope_raw = row_data.get('scope_kg')
+        if scope_raw is None:
+            scope_field = 'natural_gas_scope_kg' if key == 'natural_gas' else (
+                'electricity_scope_kg' if key == 'electricity' else emissions_key
+            )
+            scope_disp = perf_values.get(scope_field, emissions_disp)
+        else:
+            try:
+                scope_disp = _format_kg(float(scope_raw))
+            except (TypeError, ValueError):
+                scope_disp = str(scope_raw)
+        if len(cells) > 2 and usage:
+            set_cell(cells[2], str(usage))
+        if len(cells) > 3 and factor:
+            set_cell(cells[3], str(factor))
+        if len(cells) > 4:
+            set_cell(cells[4], emissions_disp)
+        if len(cells) > 5:
+            set_cell(cells[5], scope_disp)
+    return written
+
+
+def _carbon_statement_text_replacements(payload: dict, grand_total_kg: float) -> list[tuple[str, str, int | None]]:
+    scope_kg = payload.get('scope_kg') or {}
+    scope1 = float(scope_kg.get('scope1', 0))
+    scope2 = float(scope_kg.get('scope2', 0))
+    scope3 = float(scope_kg.get('scope3', 0))
+    total_scope = scope1 + scope2 + scope3
+    reporting_period = (payload.get('reporting_period') or '').strip()
+    reporting_year = str(payload.get('reporting_year') or '').strip()
+    baseline = (payload.get('assessment_base_year') or reporting_year or '').strip()
+    org_profile = (payload.get('organization_profile') or '').strip()
+
+    out: list[tuple[str, str, int | None]] = []
+    if reporting_period:
+        out.append((
+            _CARBON_STATEMENT_BASELINE_NEEDLE,
+            f'This report is based on the data collected across the {reporting_period} reporting period.',
+            None,
+        ))
+    if baseline:
+        out.append(('Baseline Year ', f'Baseline Year {baseline} ', None))
+    if reporting_year:
+        out.append(('Conversion Factor 2024', f'Conversion Factor {reporting_year}', None))
+
+    out.append(('22,436.71', _format_kg(grand_total_kg), None))
+    out.append(('Scope 1: 76.9%', f'Scope 1: {_format_scope_pct(scope1, total_scope)}', None))
+    out.append(('Scope 2: 20.6%', f'Scope 2: {_format_scope_pct(scope2, total_scope)}', None))
+    out.append(('Scope 3: 2.4%', f'Scope 3: {_format_scope_pct(scope3, total_scope)}', None))
+
+    if org_profile:
+        out.append(('Performance', org_profile + 'Performance', 1))
+    return out
+
+
+def _apply_yellow_field_map(
+    tpl: _ReportTemplate, nodes: list[ET.Element], values_by_key: dict[str, str], rewritten_cells: set[int]
+) -> None:
+    field_map = tpl.field_map
+    idx = 0
+    for position, cells in tpl.yellow_nodes:
+        if rewritten_cells and not cells.isdisjoint(rewritten_cells):
+            continue
+        if idx >= len(field_map):
+            break
+        field_name = field_map[idx]
+        idx += 1
+        if not field_name:
+            continue
+        val = values_by_key.get(field_name)
+        if val is None or val == '':
+            continue
+        nodes[position].text = str(val)
+
+
+def _report_document_xml(root: ET.Element) -> bytes:
+    # Serializing to str and encoding once is much cheaper than ET's per-write utf-8 codec.
+    body = ET.tostring(root, encoding='unicode', method='xml').encode('utf-8')
+    return b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>' + body
+
+
+def _build_selby_final_report(tpl: _ReportTemplate, payload: dict) -> bytes:
+    """word/document.xml for the legacy Selby template."""
+    organization_name = payload.get('organization_name') or payload.get('company_name') or 'Organization'
+    site_name = payload.get('site_name') or 'Site'
+    totals_kg = payload.get('totals_kg') or {}
+    scope_kg = payload.get('scope_kg') or {}
+    grand_total_kg = float(
+        payload.get(
+            'grand_total_kg',
+            sum(float(totals_kg.get(k, 0) or 0) for k in ('water', 'energy', 'waste', 'transport', 'refrigerants')),
+        )
+    )
+    issue_date = payload.get('issue_date') or datetime.datetime.now(datetime.timezone.utc).strftime('%d/%m/%Y')
+    reporting_period = (payload.get('reporting_period') or '').strip()
+
+    root, nodes = tpl.clone()
+    replacements = [('Selby Trust', organization_name, None), ('Selby', site_name, None)]
+    if reporting_period:
+        replacements.append(('2022/2023', reporting_period, None))
+    replacements.extend((needle, val, None) for needle, val in _docx_narrative_replacements(payload))
+    _replace_in_text_nodes(nodes, tpl.text_nodes, replacements)
+
+    values_by_key = {
+        'grand_total_kg': _format_kg(grand_total_kg),
+        'scope1_kg': _format_kg(scope_kg.get('scope1', 0)),
+        'scope2_kg': _format_kg(scope_kg.get('scope2', 0)),
+        'scope3_kg': _format_kg(scope_kg.get('scope3', 0)),
+        'water_kg': _format_kg(totals_kg.get('water', 0)),
+        'energy_kg': _format_kg(totals_kg.get('energy', 0)),
+        'waste_kg': _format_kg(totals_kg.get('waste', 0)),
+        'transport_kg': _format_kg(totals_kg.get('transport', 0)),
+        'refrigerants_kg': _format_kg(totals_kg.get('refrigerants', 0)),
+    }
+    for position, field_name in zip(tpl.numeric_nodes, tpl.field_map):
+        node = nodes[position]
+        if not field_name:
+            continue
+        if field_name == 'project_number':
+            pn = (payload.get('project_number') or '').strip()
+            if pn:
+                node.text = pn
+            continue
+        if field_name not in values_by_key:
+            continue
+        node.text = values_by_key[field_name]
+
+    for position in tpl.text_nodes:
+        t = nodes[position]
+        if (t.text or '').strip() == '07/05/2023':
+            t.text = issue_date
+        if (t.text or '').strip() == 'Draft':
+            t.text = payload.get('status', 'Final')
+        if (t.text or '').strip() == 'Version 1.0':
+            t.text = f"Version {payload.get('version', '1.0')}"
+
+    return _report_document_xml(root)
+
+
+def _build_carbon_statement_final_report(tpl: _ReportTemplate, payload: dict) -> bytes:
+    """word/document.xml for the carbon statement template."""
+    totals_kg = payload.get('totals_kg') or {}
+    grand_total_kg = float(
+        payload.get(
+            'grand_total_kg',
+            sum(float(totals_kg.get(k, 0) or 0) for k in (
+                'water', 'energy', 'waste', 'transport', 'refrigerants', 'transmissionDistribution'
+            )),
+        )
+    )
+    root, nodes = tpl.clone()
+    _replace_in_text_nodes(nodes, tpl.text_nodes, _carbon_statement_text_replacements(payload, grand_total_kg))
+    rewritten_cells = _fill_carbon_statement_tables(tpl, nodes, payload, grand_total_kg)
+    _apply_yellow_field_map(tpl, nodes, _performance_values_from_payload(payload), rewritten_cells)
+    return _report_document_xml(root)
+
+
+def iter_final_report_docx(payload: dict, *, logo_png: bytes | None = None) -> tuple[Iterator[bytes], str]:
+    """
+    Render the final report and return (chunk iterator over the .docx, suggested_filename).
+
+    Only word/document.xml and the client logo are compressed; every other template member is
+    copied as stored compressed bytes. Without `logo_png` (already converted) the payload's logo
+    data URL is used. Raises FileNotFoundError if no template is present.
+    """
+    organization_name = payload.get('organization_name') or payload.get('company_name') or 'Organization'
+    tpl = _get_report_template(resolve_final_report_template())
+    if logo_png is None:
+        logo_png = png_bytes_from_payload_logo(payload)
+
+    if tpl.kind == 'carbon_statement':
+        document_xml = _build_carbon_statement_final_report(tpl, payload)
+    else:
+        document_xml = _build_selby_final_report(tpl, payload)
+    replacements = {'word/document.xml': document_xml}
+    if logo_png:
+        replacements[_DOCX_CLIENT_LOGO_PART] = logo_png
+
+    safe_name = re.sub(r'[^\w\-]+', '_', organization_name).strip('_') or 'Organization'
+    file_name = (
+        f'Final_Report_{safe_name}_{datetime.datetime.now(datetime.timezone.utc).strftime("%Y-%m-%d")}.docx'
+    )
+    return iter_rewritten_zip(tpl.zip_source, replacements), file_name
@@ -0,0 +1,107 @@
+"""
+HTTP revalidation and compression helpers — strong ETags with If-None-Match -> 304, and
+gzip / brotli encoding of large JSON responses.
+
+A compressed response carries its ETag with an encoding suffix ("<tag>-gzip", "<tag>-br"), so
+each representation has its own strong validator; if_none_match() accepts any of them.
+"""
+from __future__ import annotations
+
+import gzip
+import hashlib
+import json
+import zlib
+from typing import Iterable, Iterator
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+_ENCODING_SUFFIXES = ('gzip', 'br')
+
+
+def strong_etag(*parts) -> str:
+    """Opaque (unquoted) strong ETag over `parts`."""
+    raw = json.dumps(parts, sort_keys=True, default=str, separators=(',', ':'))
+    return hashlib.blake2b(raw.encode('utf-8'), digest_size=16).hexdigest()
+
+
+def if_none_match(request, etag: str) -> bool:
+    """True when the request's If-None-Match already names `etag` (in any encoding)."""
+    conditions = request.if_none_match
+    if not conditions:
+        return False
+    return any(conditions.contains_weak(tag) for tag in (etag, *(f'{etag}-{s}' for s in _ENCODING_SUFFIXES)))
+
+
+def revalidated(response, etag: str, *, cache_control: str = 'private, no-cache'):
+    """Attach the validator: clients keep the body and must revalidate before reusing it."""
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = cache_control
+    return response
+
+
+def _accepted(accept_encoding, coding: str) -> bool:
+    return accept_encoding[coding] > 0 if accept_encoding else False
+
+
+def _iter_gzip(chunks: Iterable[bytes]) -> Iterator[bytes]:
+    encoder = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        out = encoder.compress(chunk)
+        if out:
+            yield out
+    yield encoder.flush()
+
+
+def _iter_brotli(chunks: Iterable[bytes]) -> Iterator[bytes]:
+    encoder = brotli.Compressor(quality=5)
+    for chunk in chunks:
+        out = encoder.process(chunk)
+        if out:
+            yield out
+    yield encoder.finish()
+
+
+def compress_response(response, accept_encoding, *, min_size: int, mimetypes=('application/json',)):
+    """
+    Encode a JSON response with brotli (when installed and accepted) or gzip in place.
+
+    Buffered bodies under `min_size` are left as they are; streamed bodies (only large ones are
+    streamed) are encoded chunk by chunk. Passthrough files, already-encoded, non-2xx and non-JSON
+    responses are left untouched.
+    """
+    if (
+        response.direct_passthrough
+        or response.status_code < 200
+        or response.status_code >= 300
+        or response.status_code == 204
+        or 'Content-Encoding' in response.headers
+        or response.mimetype not in mimetypes
+    ):
+        return response
+    response.vary.add('Accept-Encoding')
+    if brotli is not None and _accepted(accept_encoding, 'br'):
+        coding = 'br'
+    elif _accepted(accept_encoding, 'gzip'):
+        coding = 'gzip'
+    else:
+        return response
+    if response.is_streamed:
+        response.response = (_iter_brotli if coding == 'br' else _iter_gzip)(response.iter_encoded())
+        response.headers.pop('Content-Length', None)
+    else:
+        body = response.get_data()
+        if len(body) < min_size:
+            return response
+        if coding == 'br':
+            encoded = brotli.compress(body, quality=5)
+        else:
+            encoded = gzip.compress(body, compresslevel=6)
+        response.set_data(encoded)
+    response.headers['Content-Encoding'] = coding
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(f'{etag}-{coding}')
+    return response
@@ -0,0 +1,121 @@
+"""
+Fast JSON for the Flask app: an orjson-backed provider and chunked streaming of large responses.
+
+FastJSONProvider is a drop-in for Flask's DefaultJSONProvider (install it with
+`app.json = FastJSONProvider(app)`). It serializes datetime (ISO 8601, naive values taken as
+UTC), date, UUID, dataclasses and bson ObjectId (as its hex string) natively, keeps Flask's
+key sorting, and falls back to the stdlib encoder (same output) for anything orjson refuses,
+e.g. integers beyond 64 bits, or for everything when orjson is not installed.
+
+stream_response() sends a large object without building the whole body: containers down to
+`depth` levels are written piece by piece, their leaves serialized one at a time and buffered
+into chunks of about `chunk_size` bytes.
+"""
+from __future__ import annotations
+
+import datetime
+import decimal
+from typing import Any, Iterator
+
+from bson import ObjectId
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+STREAM_CHUNK_BYTES = 64 * 1024
+
+
+def _default(obj: Any) -> Any:
+    if isinstance(obj, ObjectId):
+        return str(obj)
+    if isinstance(obj, decimal.Decimal):
+        return str(obj)
+    if hasattr(obj, '__html__'):
+        return str(obj.__html__())
+    raise TypeError(f'Object of type {type(obj).__name__} is not JSON serializable')
+
+
+def _stdlib_default(obj: Any) -> Any:
+    # Same output as orjson, so falling back never changes how a value is written.
+    if isinstance(obj, datetime.datetime):
+        return (obj if obj.tzinfo is not None else obj.replace(tzinfo=datetime.timezone.utc)).isoformat()
+    if isinstance(obj, datetime.date):
+        return obj.isoformat()
+    if isinstance(obj, ObjectId):
+        return str(obj)
+    return DefaultJSONProvider.default(obj)
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    default = staticmethod(_stdlib_default)
+
+    def _options(self, *, indent: bool = False) -> int:
+        options = orjson.OPT_NAIVE_UTC | orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+        if self.sort_keys:
+            options |= orjson.OPT_SORT_KEYS
+        if indent:
+            options |= orjson.OPT_INDENT_2
+        return options
+
+    def dumps_bytes(self, obj: Any, *, indent: bool = False) -> bytes:
+        if orjson is not None:
+            try:
+                return orjson.dumps(obj, default=_default, option=self._options(indent=indent))
+            except orjson.JSONEncodeError:
+                pass
+        return super().dumps(obj, indent=2 if indent else None, separators=None if indent else (',', ':')).encode()
+
+    def dumps(self, obj: Any, **kwargs: Any) -> str:
+        if kwargs or orjson is None:
+            return super().dumps(obj, **kwargs)
+        return self.dumps_bytes(obj).decode('utf-8')
+
+    def loads(self, s: str | bytes, **kwargs: Any) -> Any:
+        if kwargs or orjson is None:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+    def _indented(self) -> bool:
+        return (self.compact is None and self._app.debug) or self.compact is False
+
+    def response(self, *args: Any, **kwargs: Any):
+        obj = self._prepare_response_obj(args, kwargs)
+        body = self.dumps_bytes(obj, indent=self._indented()) + b'\n'
+        return self._app.response_class(body, mimetype=self.mimetype)
+
+    def iter_chunks(self, obj: Any, *, depth: int = 2, chunk_size: int = STREAM_CHUNK_BYTES) -> Iterator[bytes]:
+        """The compact serialization of `obj`, in chunks of about `chunk_size` bytes."""
+        pending: list[bytes] = []
+        size = 0
+        for piece in self._pieces(obj, depth):
+            pending.append(piece)
+            size += len(piece)
+            if size >= chunk_size:
+                yield b''.join(pending)
+                pending, size = [], 0
+        pending.append(b'\n')
+        yield b''.join(pending)
+
+    def _pieces(self, obj: Any, depth: int) -> Iterator[bytes]:
+        if depth <= 0 or not isinstance(obj, (dict, list, tuple)) or not obj:
+            yield self.dumps_bytes(obj)
+        elif isinstance(obj, dict):
+            keys = sorted(obj, key=str) if self.sort_keys else list(obj)
+            for n, key in enumerate(keys):
+                yield (b'{' if n == 0 else b',') + self.dumps_bytes(str(key)) + b':'
+                yield from self._pieces(obj[key], depth - 1)
+            yield b'}'
+        else:
+            for n, item in enumerate(obj):
+                yield b'[' if n == 0 else b','
+                yield from self._pieces(item, depth - 1)
+            yield b']'
+
+    def stream_response(self, obj: Any, *, depth: int = 2, chunk_size: int = STREAM_CHUNK_BYTES):
+        """A streamed JSON response for `obj` (see iter_chunks)."""
+        return self._app.response_class(
+            self.iter_chunks(obj, depth=depth, chunk_size=chunk_size), mimetype=self.mimetype,
+        )
@@ -0,0 +1,145 @@
+"""
+Incremental parsing of a JSON object body read from a stream, with size budgets.
+
+iter_object_stream() reads the body in chunks and yields top-level members as soon as each one is
+complete. Members named in `stream_keys` must hold objects and are not built whole: the member is
+announced as ((key,), {}) and each of its entries is yielded as ((key, entry_key), value). Only
+one pending value is buffered at a time, so a caller can validate (and drop or keep) entries while
+the rest of the body is still arriving.
+
+Budgets are enforced while reading: `max_total` bounds the whole body (in bytes) and `max_value`
+bounds any single yielded value (in characters of JSON text); exceeding either raises
+PayloadTooLarge as soon as it is known, without reading the rest. Malformed JSON raises
+PayloadError.
+"""
+from __future__ import annotations
+
+import codecs
+import json
+import re
+from typing import Any, Iterable, Iterator
+
+_DECODER = json.JSONDecoder()
+_WHITESPACE = re.compile(r'[ \t\n\r]*')
+_KEY_MAX = 1024
+
+
+class PayloadError(ValueError):
+    """The body is not a well-formed JSON object."""
+
+
+class PayloadTooLarge(ValueError):
+    """The body, or one of its values, exceeds its size budget."""
+
+
+class _Reader:
+    def __init__(self, stream, *, max_total: int, chunk_size: int):
+        self._stream = stream
+        self._max_total = max_total
+        self._chunk_size = chunk_size
+        self._utf8 = codecs.getincrementaldecoder('utf-8')()
+        self._total = 0
+        self.buf = ''
+        self.pos = 0
+        self.eof = False
+
+    def fill(self) -> bool:
+        """Append the next chunk (dropping consumed text); False once the stream is exhausted."""
+        if self.eof:
+            return False
+        chunk = self._stream.read(self._chunk_size)
+        self._total += len(chunk)
+        if self._total > self._max_total:
+            raise PayloadTooLarge(f'request body exceeds {self._max_total} bytes')
+        try:
+            text = self._utf8.decode(chunk, final=not chunk)
+        except UnicodeDecodeError as e:
+            raise PayloadError('request body is not valid UTF-8') from e
+        self.eof = not chunk
+        self.buf = self.buf[self.pos:] + text
+        self.pos = 0
+        return True
+
+    def peek(self) -> str:
+        """Next non-whitespace character ('' at the end of the body)."""
+        while True:
+            self.pos = _WHITESPACE.match(self.buf, self.pos).end()
+            if self.pos < len(self.buf) or not self.fill():
+                return self.buf[self.pos:self.pos + 1]
+
+    def expect(self, chars: str) -> str:
+        char = self.peek()
+        if not char or char not in chars:
+            raise PayloadError(f'expected one of {chars!r} at body offset {self._offset()}')
+        self.pos += 1
+        return char
+
+    def value(self, limit: int) -> Any:
+        """Decode the next complete JSON value, reading more of the stream as needed."""
+        self.peek()
+        start = self.pos
+        while True:
+            pending = len(self.buf) - start
+            try:
+                value, end = _DECODER.raw_decode(self.buf, start)
+            except json.JSONDecodeError:
+                end = None
+            # A number ending the buffer may continue in the next chunk.
+            if end is not None and (end < len(self.buf) or self.eof):
+                if end - start > limit:
+                    raise PayloadTooLarge(f'value at body offset {self._offset()} exceeds {limit} characters')
+                self.pos = end
+                return value
+            if pending > limit:
+                raise PayloadTooLarge(f'value at body offset {self._offset()} exceeds {limit} characters')
+            if self.eof:
+                raise PayloadError(f'malformed JSON value at body offset {self._offset()}')
+            # Retry only once the pending text has doubled, so decoding stays linear overall.
+            target = max(2 * pending, pending + self._chunk_size)
+            self.pos = start
+            while len(self.buf) - self.pos < target and self.fill():
+                pass
+            start = self.pos
+
+    def _offset(self) -> int:
+        return self._total - len(self.buf.encode('utf-8')) + len(self.buf[:self.pos].encode('utf-8'))
+
+
+def _object_keys(reader: _Reader) -> Iterator[str]:
+    """Yield each key of the object at the reader, leaving it positioned at the member's value."""
+    reader.expect('{')
+    if reader.peek() == '}':
+        reader.pos += 1
+        return
+    while True:
+        key = reader.value(_KEY_MAX)
+        if not isinstance(key, str):
+            raise PayloadError('object keys must be strings')
+        reader.expect(':')
+        yield key
+        if reader.expect(',}') == '}':
+            return
+
+
+def iter_object_stream(
+    stream,
+    *,
+    stream_keys: Iterable[str] = (),
+    max_total: int,
+    max_value: int,
+    chunk_size: int = 64 * 1024,
+) -> Iterator[tuple[tuple[str, ...], Any]]:
+    """Yield (path, value) for the members of the JSON object in `stream` (see module docstring)."""
+    stream_keys = frozenset(stream_keys)
+    reader = _Reader(stream, max_total=max_total, chunk_size=chunk_size)
+    if reader.peek() != '{':
+        raise PayloadError('request body must be a JSON object')
+    for key in _object_keys(reader):
+        if key in stream_keys and reader.peek() == '{':
+            yield (key,), {}
+            for entry_key in _object_keys(reader):
+                yield (key, entry_key), reader.value(max_value)
+        else:
+            yield (key,), reader.value(max_value)
+    if reader.peek():
+        raise PayloadError('unexpected data after the JSON object')
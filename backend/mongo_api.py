@@ -1,13 +1,18 @@
-from flask import Flask, request, jsonify, Response
+from flask import Flask, request, jsonify, Response, send_file
 from flask_bcrypt import Bcrypt
-from flask_jwt_extended import JWTManager, create_access_token, jwt_required, get_jwt_identity
+from flask_jwt_extended import JWTManager, create_access_token, jwt_required, get_jwt, get_jwt_identity
 from flask_cors import CORS
+import pymongo
 from pymongo import MongoClient
+from pymongo.errors import ConnectionFailure
 from bson import ObjectId
+import atexit
 import datetime
 import os
 import sys
 import secrets
+import threading
+import time
 import hmac
 import hashlib
 import smtplib
@@ -15,50 +20,16 @@ from email.message import EmailMessage
 import urllib.request
 import urllib.error
 import urllib.parse
-import io
 import json
 import re
 import base64
 import binascii
-import zipfile
+import copy
+from collections import OrderedDict
 from pathlib import Path
-import xml.etree.ElementTree as ET
+from typing import Iterator
 from xml.sax.saxutils import escape
 
-try:
-    from PIL import Image
-except ImportError:
-    Image = None
-
-_W_NS = 'http://schemas.openxmlformats.org/wordprocessingml/2006/main'
-ET.register_namespace('w', _W_NS)
-
-_REPO_ROOT = Path(__file__).resolve().parent.parent
-_CARBON_STATEMENT_TEMPLATE = (
-    _REPO_ROOT / 'requirements' / 'Carbon emmission statement report template_v1.1.docx'
-)
-_CARBON_STATEMENT_TEMPLATE_LEGACY = (
-    _REPO_ROOT / 'requirements' / 'Carbon emissions statement report template.docx'
-)
-_SELBY_TEMPLATE = _REPO_ROOT / 'requirements' / 'Carbon Emissions Statement Selby Trust v2 ECO AUDIT.docx'
-
-# First embedded image in report templates (client branding area).
-_DOCX_CLIENT_LOGO_PART = 'word/media/image1.png'
-_YELLOW_MAP_JSON = Path(__file__).resolve().parent / 'final_report_yellow_map.json'
-
-# Optional narrative fragments in the legacy Selby template.
-_DOCX_NARRATIVE_SNIPPETS = (
-    ('is a community centre located in the London Borough of Haringey.', 'organization_profile'),
-    (
-        'energy use (electricity and gas), water consumption, waste generation, and business travel',
-        'scope_streams_summary',
-    ),
-    ('March 2022 to April 2023', 'assessment_period_detail'),
-)
-
-_CARBON_STATEMENT_BASELINE_NEEDLE = (
-    'This report is based on the data collected across the 2024/25 financial year.'
-)
 
 # Master switch for writing to MongoDB collection `organization_audit_log`.
 # Diff/summary logic still runs when False; only insert_one is skipped (saves Atlas storage).
@@ -73,30 +44,14 @@ def _mongodb_audit_logging_enabled() -> bool:
     return ENABLE_MONGODB_AUDIT_LOGGING
 
 
-def _load_yellow_numeric_field_map() -> list:
-    try:
-        data = json.loads(_YELLOW_MAP_JSON.read_text(encoding='utf-8'))
-        fields = data.get('fields')
-        return list(fields) if isinstance(fields, list) else []
-    except (OSError, json.JSONDecodeError, TypeError):
-        return []
-
-
-def _apply_docx_narrative_overrides(xml_str: str, payload: dict) -> str:
-    """Replace known template clauses when the client supplies non-empty text (XML-escaped)."""
-    for needle, key in _DOCX_NARRATIVE_SNIPPETS:
-        val = (payload.get(key) or '').strip()
-        if not val or needle not in xml_str:
-            continue
-        xml_str = xml_str.replace(needle, escape(val))
-    return xml_str
 
 app = Flask(__name__)
 # JWT auth uses Authorization header — no cookies. Do not use supports_credentials with origins "*"
 # (browsers block preflight and fetch fails with "Connection error").
 CORS(app, resources={r"/*": {
     "origins": "*",
-    "allow_headers": ["Content-Type", "Authorization", "X-Organization-Id"],
+    "allow_headers": ["Content-Type", "Authorization", "X-Organization-Id", "If-None-Match"],
+    "expose_headers": ["ETag"],
 }})
 
 
@@ -125,40 +80,48 @@ def resolve_jwt_secret(raw_secret: str | None, app_env: str | None) -> str:
 # MongoDB Configuration
 CONNECTION_STRING = os.environ.get('MONGODB_URI', 'mongodb://localhost:27017/carbon_calculator')
 
+from mongo_supervisor import MongoSupervisor  # noqa: E402
+
+# Seconds a ping (including the first connect) may take before MongoDB counts as unreachable.
+MONGO_PING_TIMEOUT_SECONDS = float(os.environ.get('MONGO_PING_TIMEOUT_SECONDS', '10'))
+MONGO_PING_INTERVAL_SECONDS = float(os.environ.get('MONGO_PING_INTERVAL_SECONDS', '10'))
+
+
+def _connect_db():
+    # Added tlsAllowInvalidCertificates=True to bypass common SSL issues on cloud providers
+    client = MongoClient(
+        CONNECTION_STRING,
+        serverSelectionTimeoutMS=20000,
+        tlsAllowInvalidCertificates=True,
+        maxPoolSize=50,
+    )
+    db = (
+        client.get_default_database()
+        if '?' not in CONNECTION_STRING
+        else client[CONNECTION_STRING.split('/')[-1].split('?')[0] or 'carbon_calculator']
+    )
+    if not db.name or db.name == 'admin':
+        db = client['carbon_calculator']
+    return db
+
+
+def _ping_db(db) -> None:
+    with pymongo.timeout(MONGO_PING_TIMEOUT_SECONDS):
+        db.client.admin.command('ping')
+
+
 # Reuse one client per process so each HTTP request does not pay for a new TLS handshake (critical for Atlas latency).
-_mongo_client = None
-_mongo_db = None
+_mongo = MongoSupervisor(
+    _connect_db,
+    _ping_db,
+    ping_interval=MONGO_PING_INTERVAL_SECONDS,
+    now=utc_now,
+)
 
 
 def get_db():
-    global _mongo_client, _mongo_db
-    try:
-        if _mongo_client is not None and _mongo_db is not None:
-            return _mongo_db
-
-        # Added tlsAllowInvalidCertificates=True to bypass common SSL issues on cloud providers
-        _mongo_client = MongoClient(
-            CONNECTION_STRING,
-            serverSelectionTimeoutMS=20000,
-            tlsAllowInvalidCertificates=True,
-            maxPoolSize=50,
-        )
-        _mongo_client.admin.command('ping')
-
-        db = (
-            _mongo_client.get_default_database()
-            if '?' not in CONNECTION_STRING
-            else _mongo_client[CONNECTION_STRING.split('/')[-1].split('?')[0] or 'carbon_calculator']
-        )
-        if not db.name or db.name == 'admin':
-            db = _mongo_client['carbon_calculator']
-        _mongo_db = db
-        return _mongo_db
-    except Exception as e:
-        print(f"ERROR: Could not connect to MongoDB: {e}", file=sys.stderr)
-        _mongo_client = None
-        _mongo_db = None
-        return None
+    """The shared database, or None while MongoDB is unreachable (see mongo_supervisor.py)."""
+    return _mongo.get_db()
 
 # Lazy collection access helpers
 def get_users_col():
@@ -179,17 +142,121 @@ def get_audit_log_col():
     return db['organization_audit_log'] if db is not None else None
 
 
+def get_sites_col():
+    db = get_db()
+    return db[SITE_DOCUMENTS_COLLECTION] if db is not None else None
+
+
+def get_rollups_col():
+    db = get_db()
+    return db[ROLLUPS_COLLECTION] if db is not None else None
+
+
+# JSON bodies at least this large are gzip/brotli encoded when the client accepts it.
+COMPRESS_MIN_BYTES = int(os.environ.get('COMPRESS_MIN_BYTES', '1024'))
+
+
+@app.after_request
+def _compress_json_response(response):
+    return compress_response(response, request.accept_encodings, min_size=COMPRESS_MIN_BYTES)
+
+
+from json_provider import FastJSONProvider  # noqa: E402
+
+# JSON_PROVIDER=default keeps Flask's stdlib encoder (RFC 822 dates); the fast provider uses orjson.
+if (os.environ.get('JSON_PROVIDER') or 'fast').strip().lower() != 'default':
+    app.json = FastJSONProvider(app)
+# Responses listing at least this many sites / documents / entries are streamed in chunks.
+JSON_STREAM_MIN_ITEMS = int(os.environ.get('JSON_STREAM_MIN_ITEMS', '200'))
+
+
+def _json_response(obj, item_count: int):
+    """jsonify(obj), streamed in chunks when it lists JSON_STREAM_MIN_ITEMS items or more."""
+    stream = getattr(app.json, 'stream_response', None)
+    if stream is None or item_count < JSON_STREAM_MIN_ITEMS:
+        return jsonify(obj)
+    return stream(obj)
+
+
 from audit_log import (  # noqa: E402
-    build_audit_summary,
-    diff_user_data_payload,
-    format_audit_log_txt,
+    content_hashes_for_sites,
+    iter_audit_log_ndjson,
+    iter_audit_log_txt,
+    site_content_hashes,
+    site_hash_section,
+    valid_site_hashes,
+)
+from audit_writer import AuditWriter  # noqa: E402
+from emissions_engine import (  # noqa: E402
+    SCOPES,
+    SOURCE_TOGGLE_PREFS,
+    compute_emissions,
+    disabled_sources_from_prefs,
+    scopes_enabled_from_prefs,
+)
+from emission_rollups import ROLLUPS_COLLECTION, RollupMaintainer, chart_series  # noqa: E402
+from final_report import (  # noqa: E402
+    cached_logo_png,
+    iter_final_report_docx as _render_final_report_docx,
+    png_bytes_from_logo_data_url,
+    png_bytes_from_payload_logo,
+    resolve_final_report_template,
+)
+from report_jobs import ReportJobManager  # noqa: E402
+from json_stream import PayloadError, PayloadTooLarge, iter_object_stream  # noqa: E402
+from http_cache import compress_response, if_none_match, revalidated, strong_etag  # noqa: E402
+from site_sanitizer import SiteSanitizer  # noqa: E402
+from months_codec import FORMAT_LIST, FORMATS, pack_sites, pack_update, round_site_months, unpack_user_data  # noqa: E402
+from site_documents import (  # noqa: E402
+    LAYOUT_FIELD,
+    LAYOUT_SITES,
+    SITE_DOCUMENTS_COLLECTION,
+    SITE_WILDCARD,
+    apply_site_updates,
+    load_user_data,
+    split_site_update,
+    uses_site_documents,
+    write_site_changes,
+)
+from db_indexes import ensure_indexes, index_problems  # noqa: E402
+from email_outbox import EmailOutbox  # noqa: E402
+from blob_store import (  # noqa: E402
+    GridFSBlobStore,
+    LocalBlobStore,
+    decode_image_data_url,
+    is_blob_ref,
 )
 
+BLOB_STORE_DIR = os.environ.get('BLOB_STORE_DIR') or str(Path(__file__).resolve().parent / 'blobs')
+_blob_store = None
+_blob_store_db = None
+
+
+def get_blob_store():
+    """Logo blob store: GridFS on the app database, or local disk when BLOB_STORE_BACKEND=local."""
+    global _blob_store, _blob_store_db
+    if os.environ.get('BLOB_STORE_BACKEND', '').strip().lower() == 'local':
+        if not isinstance(_blob_store, LocalBlobStore) or str(_blob_store.root) != BLOB_STORE_DIR:
+            _blob_store = LocalBlobStore(BLOB_STORE_DIR)
+        return _blob_store
+    db = get_db()
+    if db is None:
+        return None
+    if _blob_store is None or _blob_store_db is not db:
+        try:
+            _blob_store = GridFSBlobStore(db)
+        except RuntimeError as e:
+            print(f'WARN: blob store unavailable: {e}', file=sys.stderr)
+            return None
+        _blob_store_db = db
+    return _blob_store
+
 # Conversion Factors (country/year/source) — values live in MongoDB only.
 # Run scripts/update_conversion_factors.py to load from the customer datasheet.
 from data.catalog_factor_registry import (
     CATALOG_COLLECTION,
     SUPPORTED_YEARS as SUPPORTED_FACTOR_YEARS,
+    UI_KEY_TO_CATALOG_KEY,
     catalog_document_for_api,
     category_for_factor_key,
     resolve_catalog_factor_key,
@@ -250,14 +317,68 @@ def load_conversion_factors_from_catalog():
     return {}
 
 
+# Per-process registry cache. Once the TTL expires, a cheap probe of the catalog (document count
+# + newest updated_at) decides whether the full catalog needs re-reading, so factor uploads via
+# scripts/update_conversion_factors.py are picked up without restarting the web service.
+# Override the TTL with CONVERSION_FACTORS_CACHE_TTL_SECONDS (0 = probe on every lookup).
+_FACTOR_REGISTRY_TTL_DEFAULT_SEC = 300.0
+_factor_registry_lock = threading.Lock()
+_factor_registry_cache: dict = {'registry': None, 'table': None, 'version': None, 'checked_at': 0.0}
+
+
+def _factor_registry_ttl_seconds() -> float:
+    raw = (os.environ.get('CONVERSION_FACTORS_CACHE_TTL_SECONDS') or '').strip()
+    if not raw:
+        return _FACTOR_REGISTRY_TTL_DEFAULT_SEC
+    try:
+        return max(0.0, float(raw))
+    except ValueError:
+        return _FACTOR_REGISTRY_TTL_DEFAULT_SEC
+
+
+def _conversion_factors_version():
+    """Fingerprint of the factor source: JSON mirror mtime, or catalog count + newest updated_at."""
+    if _datasheet_json_fallback_enabled() and DATASHEET_FACTORS_JSON.is_file():
+        try:
+            return ('json', DATASHEET_FACTORS_JSON.stat().st_mtime_ns)
+        except OSError:
+            return None
+    col = get_catalog_col()
+    if col is None:
+        return None
+    try:
+        newest = col.find_one({}, {'_id': 0, 'updated_at': 1}, sort=[('updated_at', -1)])
+        return ('catalog', col.estimated_document_count(), (newest or {}).get('updated_at'))
+    except Exception as e:
+        print(f'WARN: conversion factor version probe failed: {e}', file=sys.stderr)
+        return None
+
+
 def get_conversion_factors_registry(force_reload: bool = False) -> dict:
-    """Registry used by lookup_conversion_factor (always read from catalog)."""
-    return load_conversion_factors_from_catalog()
+    """Registry used by lookup_conversion_factor (cached per process; TTL + version check)."""
+    cache = _factor_registry_cache
+    with _factor_registry_lock:
+        now = time.monotonic()
+        registry = cache['registry']
+        if not force_reload and registry and now - cache['checked_at'] < _factor_registry_ttl_seconds():
+            return registry
+        version = _conversion_factors_version()
+        if not force_reload and registry and version is not None and version == cache['version']:
+            cache['checked_at'] = now
+            return registry
+        fresh = load_conversion_factors_from_catalog()
+        if fresh:
+            cache.update(registry=fresh, table=_FactorLookupTable(fresh), version=version, checked_at=now)
+            return fresh
+        # Catalog unreachable or empty: keep serving the last good registry, if any.
+        return registry or {}
 
 
 def invalidate_conversion_factors_cache() -> None:
-    """Kept for compatibility; registry is not cached in-process."""
-    pass
+    """Force the next registry access to reload from the catalog (last good copy kept as fallback)."""
+    with _factor_registry_lock:
+        _factor_registry_cache['version'] = None
+        _factor_registry_cache['checked_at'] = 0.0
 
 
 def list_catalog_factor_documents() -> list[dict]:
@@ -361,6 +482,11 @@ def _mail_use_ssl() -> bool:
     return (os.environ.get('MAIL_USE_SSL') or '').strip().lower() in ('1', 'true', 'yes')
 
 
+def _mail_use_starttls() -> bool:
+    """STARTTLS on plain SMTP connections; MAIL_USE_TLS=false only for local sinks (fake_smtp.py)."""
+    return (os.environ.get('MAIL_USE_TLS') or 'true').strip().lower() not in ('0', 'false', 'no')
+
+
 def _is_render_hosted() -> bool:
     return (os.environ.get('RENDER') or '').strip().lower() in ('true', '1', 'yes')
 
@@ -411,10 +537,37 @@ def _gmail_encode_message(msg: EmailMessage) -> str:
     return base64.urlsafe_b64encode(msg.as_bytes()).decode('ascii').rstrip('=')
 
 
-def _get_gmail_access_token() -> str:
+# Access tokens live about an hour; reuse one until shortly before expiry instead of exchanging the
+# refresh token for every message.
+_GMAIL_TOKEN_EXPIRY_MARGIN_SECONDS = 60
+_gmail_token_lock = threading.Lock()
+_gmail_token_cache: dict = {}
+
+
+def _get_gmail_access_token(*, force_refresh: bool = False) -> str:
     client_id = (os.environ.get('GMAIL_CLIENT_ID') or '').strip()
     client_secret = (os.environ.get('GMAIL_CLIENT_SECRET') or '').strip()
     refresh_token = (os.environ.get('GMAIL_REFRESH_TOKEN') or '').strip()
+    cache_key = (client_id, refresh_token)
+    with _gmail_token_lock:
+        cached = _gmail_token_cache
+        if (
+            not force_refresh
+            and cached.get('key') == cache_key
+            and cached.get('expires_at', 0) > time.time()
+        ):
+            return cached['access_token']
+        token, expires_in = _fetch_gmail_access_token(client_id, client_secret, refresh_token)
+        _gmail_token_cache.clear()
+        _gmail_token_cache.update({
+            'key': cache_key,
+            'access_token': token,
+            'expires_at': time.time() + max(0, expires_in - _GMAIL_TOKEN_EXPIRY_MARGIN_SECONDS),
+        })
+        return token
+
+
+def _fetch_gmail_access_token(client_id: str, client_secret: str, refresh_token: str) -> tuple[str, int]:
     timeout_sec = float(os.environ.get('MAIL_TIMEOUT_SECONDS', '8'))
 
     body = urllib.parse.urlencode({
@@ -439,12 +592,15 @@ def _get_gmail_access_token() -> str:
     token = (payload.get('access_token') or '').strip()
     if not token:
         raise RuntimeError(f'Gmail token error: missing access_token ({payload})')
-    return token
+    try:
+        expires_in = int(payload.get('expires_in') or 0)
+    except (TypeError, ValueError):
+        expires_in = 0
+    return token, expires_in
 
 
 def _send_email_via_gmail_api(subject: str, text: str, to_addr: str, html: str | None = None) -> None:
     """Send email via Gmail API over HTTPS (works on Render; SMTP ports are blocked)."""
-    access_token = _get_gmail_access_token()
     msg = _build_email_message(subject, text, to_addr, html)
     raw = _gmail_encode_message(msg)
     timeout_sec = float(os.environ.get('MAIL_TIMEOUT_SECONDS', '8'))
@@ -454,22 +610,27 @@ def _send_email_via_gmail_api(subject: str, text: str, to_addr: str, html: str |
     )
 
     payload = json.dumps({'raw': raw}).encode('utf-8')
-    req = urllib.request.Request(
-        api_url,
-        data=payload,
-        method='POST',
-        headers={
-            'Authorization': f'Bearer {access_token}',
-            'Content-Type': 'application/json',
-        },
-    )
-    try:
-        with urllib.request.urlopen(req, timeout=timeout_sec) as resp:
-            if getattr(resp, 'status', 200) >= 400:
-                raise RuntimeError(f'Gmail API error: HTTP {resp.status}')
-    except urllib.error.HTTPError as http_err:
-        detail = (http_err.read() or b'').decode('utf-8', errors='ignore').strip()
-        raise RuntimeError(f'Gmail API error: HTTP {http_err.code} ({detail})') from http_err
+    # A cached token can be revoked early; on 401 refresh once and resend.
+    for force_refresh in (False, True):
+        req = urllib.request.Request(
+            api_url,
+            data=payload,
+            method='POST',
+            headers={
+                'Authorization': f'Bearer {_get_gmail_access_token(force_refresh=force_refresh)}',
+                'Content-Type': 'application/json',
+            },
+        )
+        try:
+            with urllib.request.urlopen(req, timeout=timeout_sec) as resp:
+                if getattr(resp, 'status', 200) >= 400:
+                    raise RuntimeError(f'Gmail API error: HTTP {resp.status}')
+            return
+        except urllib.error.HTTPError as http_err:
+            if http_err.code == 401 and not force_refresh:
+                continue
+            detail = (http_err.read() or b'').decode('utf-8', errors='ignore').strip()
+            raise RuntimeError(f'Gmail API error: HTTP {http_err.code} ({detail})') from http_err
 
 
 def _send_smtp_email(subject: str, text: str, to_addr: str, html: str | None = None) -> None:
@@ -484,16 +645,57 @@ def _send_smtp_email(subject: str, text: str, to_addr: str, html: str | None = N
         raise RuntimeError('SMTP email settings unavailable (MAIL_* env vars)')
 
     msg = _build_email_message(subject, text, to_addr, html)
-
+    settings = (server, port, user, password, use_ssl, _mail_use_starttls(), timeout_sec)
+
+    global _smtp_conn, _smtp_conn_settings
+    with _smtp_lock:
+        for _attempt in range(2):
+            reused = _smtp_conn is not None and _smtp_conn_settings == settings
+            if not reused:
+                _close_smtp_connection()
+                _smtp_conn = _open_smtp_connection(*settings)
+                _smtp_conn_settings = settings
+            try:
+                _smtp_conn.send_message(msg)
+                return
+            except (smtplib.SMTPServerDisconnected, ConnectionError, TimeoutError):
+                # The server may have dropped an idle connection; retry once on a fresh one.
+                _close_smtp_connection()
+                if not reused:
+                    raise
+
+
+# One authenticated SMTP session shared by all senders (guarded by _smtp_lock), reopened when the
+# MAIL_* settings change or the server hangs up.
+_smtp_lock = threading.Lock()
+_smtp_conn = None
+_smtp_conn_settings = None
+
+
+def _open_smtp_connection(server, port, user, password, use_ssl, use_starttls, timeout_sec):
     if use_ssl:
-        with smtplib.SMTP_SSL(server, port, timeout=timeout_sec) as smtp:
-            smtp.login(user, password)
-            smtp.send_message(msg)
+        smtp = smtplib.SMTP_SSL(server, port, timeout=timeout_sec)
     else:
-        with smtplib.SMTP(server, port, timeout=timeout_sec) as smtp:
+        smtp = smtplib.SMTP(server, port, timeout=timeout_sec)
+    try:
+        if not use_ssl and use_starttls:
             smtp.starttls()
-            smtp.login(user, password)
-            smtp.send_message(msg)
+        smtp.login(user, password)
+    except Exception:
+        smtp.close()
+        raise
+    return smtp
+
+
+def _close_smtp_connection() -> None:
+    global _smtp_conn, _smtp_conn_settings
+    conn, _smtp_conn, _smtp_conn_settings = _smtp_conn, None, None
+    if conn is None:
+        return
+    try:
+        conn.quit()
+    except Exception:
+        conn.close()
 
 
 def _send_email(subject: str, text: str, to_addr: str, html: str | None = None) -> None:
@@ -660,12 +862,40 @@ DEFAULT_REGISTRATION_NOTIFY_EMAIL = 'info@sustainquality.co.uk'
 
 
 def _send_notification_email(subject: str, text: str, to_addr: str, html: str | None = None) -> None:
-    """Send admin/ops notification via Gmail API (Render) or SMTP (local)."""
+    """Queue an admin/ops notification on the outbox (sent directly when the outbox is off or unavailable)."""
     if not _email_delivery_ready():
         raise RuntimeError('Notification email is not configured (GMAIL_* or MAIL_* env vars).')
+    if _email_outbox_enabled():
+        try:
+            _email_outbox.enqueue(subject, text, to_addr, html, kind='notification')
+            return
+        except Exception as e:
+            print(f'WARN: email outbox unavailable, sending inline: {e}', file=sys.stderr)
     _send_email(subject, text, to_addr, html)
 
 
+def get_email_outbox_col():
+    db = get_db()
+    return db['email_outbox'] if db is not None else None
+
+
+def _email_outbox_enabled() -> bool:
+    return (os.environ.get('EMAIL_OUTBOX') or 'true').strip().lower() not in ('0', 'false', 'no')
+
+
+def _deliver_outbox_email(doc: dict) -> None:
+    _send_email(doc['subject'], doc['text'], doc['to'], doc.get('html'))
+
+
+# Late-bound lambdas so the collection getter and delivery path can be swapped in tests.
+_email_outbox = EmailOutbox(
+    lambda: get_email_outbox_col(),
+    lambda doc: _deliver_outbox_email(doc),
+    workers=int(os.environ.get('EMAIL_OUTBOX_WORKERS', '2')),
+    max_attempts=int(os.environ.get('EMAIL_OUTBOX_MAX_ATTEMPTS', '6')),
+)
+
+
 def _registration_notification_label(registration_type: str) -> str:
     labels = {
         'organization_signup': 'New organization signup',
@@ -757,15 +987,64 @@ def _issue_and_send_verification(email: str) -> tuple[str | None, str | None]:
     return code, None
 
 
+# A page load fires several API calls that each resolve the same caller. Found users are cached
+# briefly per process (misses are not, so uniqueness checks always see the database); every
+# endpoint that changes a user document calls _invalidate_user_cache.
+USER_CACHE_TTL_SECONDS = float(os.environ.get('USER_CACHE_TTL_SECONDS', '30'))
+_USER_CACHE_MAX = 1024
+_user_cache = OrderedDict()  # key -> (expires_at, user doc)
+_user_cache_lock = threading.Lock()
+_user_cache_generation = 0
+
+
+def _cached_user_lookup(users_col, key: tuple, load):
+    if USER_CACHE_TTL_SECONDS <= 0:
+        return load()
+    key = (getattr(users_col, 'full_name', id(users_col)),) + key
+    now = time.monotonic()
+    with _user_cache_lock:
+        hit = _user_cache.get(key)
+        if hit is not None and hit[0] > now:
+            _user_cache.move_to_end(key)
+            return copy.deepcopy(hit[1])
+        generation = _user_cache_generation
+    user = load()
+    if user is not None:
+        with _user_cache_lock:
+            # Skip the store if a mutation invalidated the cache while the query was in flight.
+            if generation == _user_cache_generation:
+                _user_cache[key] = (now + USER_CACHE_TTL_SECONDS, copy.deepcopy(user))
+                _user_cache.move_to_end(key)
+                while len(_user_cache) > _USER_CACHE_MAX:
+                    _user_cache.popitem(last=False)
+    return user
+
+
+def _invalidate_user_cache(user: dict | None = None) -> None:
+    """Drop cached copies of `user` (matched by _id), or everything when no user is given."""
+    global _user_cache_generation
+    user_id = (user or {}).get('_id')
+    with _user_cache_lock:
+        _user_cache_generation += 1
+        if user_id is None:
+            _user_cache.clear()
+            return
+        for key in [k for k, (_exp, doc) in _user_cache.items() if doc.get('_id') == user_id]:
+            del _user_cache[key]
+
+
 def _find_user_by_email(users_col, email: str):
     """Resolve user by normalized email, with fallback to legacy exact-match storage."""
     if not email or users_col is None:
         return None
-    em = _normalize_email(email)
-    user = users_col.find_one({'email': em})
-    if user:
-        return user
-    return users_col.find_one({'email': email.strip()})
+
+    def load():
+        user = users_col.find_one({'email': _normalize_email(email)})
+        if user:
+            return user
+        return users_col.find_one({'email': email.strip()})
+
+    return _cached_user_lookup(users_col, ('email', email.strip()), load)
 
 
 def _find_user_by_username(users_col, username: str, organization_id: str | None = None):
@@ -774,16 +1053,20 @@ def _find_user_by_username(users_col, username: str, organization_id: str | None
     uname = _normalize_username(username)
     if not uname:
         return None
-    query = {'username': uname}
-    if organization_id:
-        query['organization_id'] = organization_id
-    user = users_col.find_one(query)
-    if user:
-        return user
-    query_legacy = {'username': username.strip()}
-    if organization_id:
-        query_legacy['organization_id'] = organization_id
-    return users_col.find_one(query_legacy)
+
+    def load():
+        query = {'username': uname}
+        if organization_id:
+            query['organization_id'] = organization_id
+        user = users_col.find_one(query)
+        if user:
+            return user
+        query_legacy = {'username': username.strip()}
+        if organization_id:
+            query_legacy['organization_id'] = organization_id
+        return users_col.find_one(query_legacy)
+
+    return _cached_user_lookup(users_col, ('username', username.strip(), organization_id), load)
 
 
 def _user_memberships(user: dict | None) -> list:
@@ -873,17 +1156,26 @@ def _record_audit_event(
         return
     if not org_id or not changes:
         return
-    col = get_audit_log_col()
-    if col is None:
+    _audit_writer.record(org_id, _audit_actor_fields(user), action, changes, utc_now())
+
+
+def _record_audit_diff(
+    org_id: str,
+    user: dict | None,
+    action: str,
+    old_snapshot: dict,
+    new_snapshot: dict,
+) -> None:
+    """Queue a data save for auditing; the diff runs on the audit writer thread."""
+    if not _mongodb_audit_logging_enabled() or not org_id:
         return
-    col.insert_one({
-        'organization_id': org_id,
-        'timestamp': utc_now(),
-        **_audit_actor_fields(user),
-        'action': action,
-        'summary': build_audit_summary(changes, action),
-        'changes': changes,
-    })
+    _audit_writer.record_diff(org_id, _audit_actor_fields(user), action, old_snapshot, new_snapshot, utc_now())
+
+
+AUDIT_SPOOL_PATH = os.environ.get('AUDIT_SPOOL_PATH') or str(Path(__file__).resolve().parent / 'audit_spool.jsonl')
+AUDIT_SHUTDOWN_FLUSH_SECONDS = float(os.environ.get('AUDIT_SHUTDOWN_FLUSH_SECONDS', '5'))
+_audit_writer = AuditWriter(lambda: get_audit_log_col(), spool_path=AUDIT_SPOOL_PATH)
+atexit.register(lambda: _audit_writer.close(AUDIT_SHUTDOWN_FLUSH_SECONDS))
 
 
 def _find_org_by_id(orgs_col, org_id: str | None):
@@ -954,6 +1246,130 @@ def _find_user_by_login(users_col, identifier: str):
     return _find_user_by_email(users_col, ident)
 
 
+# Tokens carry the caller's memberships and role flags so read endpoints can authorize without a
+# users query. Each user document has a membership_version that every membership/role change
+# increments; this process remembers the newest version per login identity and sends tokens with
+# an older `mv` claim back to the database. Claims are only trusted against a version this process
+# read from the database within USER_CACHE_TTL_SECONDS: after a restart, in another worker, or once
+# that check is older (a change made by another worker), the next request re-reads the user.
+_CLAIMS_MEMBERSHIPS_MAX = 50
+_MEMBERSHIP_VERSIONS_MAX = 4096
+_membership_versions = OrderedDict()  # login key -> (checked_until, version)
+_membership_versions_lock = threading.Lock()
+
+
+def _login_identity_keys(user: dict) -> set[str]:
+    return {str(v).strip().lower() for v in (user.get('email'), user.get('username')) if v}
+
+
+def _note_membership_version(user: dict | None, *, changed: bool = False, checked: bool = False) -> None:
+    """
+    Record the newest membership_version seen for `user`; changed=True makes earlier tokens stale.
+    checked=True means `user` was just read from the database, so claims at that version are
+    trusted for USER_CACHE_TTL_SECONDS.
+    """
+    if not user:
+        return
+    version = int(user.get('membership_version') or 0) + (1 if changed else 0)
+    now = time.monotonic()
+    with _membership_versions_lock:
+        for key in _login_identity_keys(user):
+            checked_until, known = _membership_versions.get(key, (0.0, -1))
+            if checked:
+                checked_until = now + USER_CACHE_TTL_SECONDS
+            _membership_versions[key] = (checked_until, max(known, version))
+            _membership_versions.move_to_end(key)
+        while len(_membership_versions) > _MEMBERSHIP_VERSIONS_MAX:
+            _membership_versions.popitem(last=False)
+
+
+def _checked_membership_version(identity: str) -> int | None:
+    """Version to check claims against; None when it is unknown or was not read recently enough."""
+    with _membership_versions_lock:
+        checked_until, version = _membership_versions.get(str(identity).strip().lower(), (0.0, None))
+    return version if checked_until > time.monotonic() else None
+
+
+def _forget_cached_login(identity: str) -> None:
+    """Drop cached user documents looked up by `identity`, so the next lookup reads the database."""
+    global _user_cache_generation
+    ident = str(identity).strip().lower()
+    with _user_cache_lock:
+        _user_cache_generation += 1
+        for key in [k for k in _user_cache if str(k[2]).strip().lower() == ident]:
+            del _user_cache[key]
+
+
+def _membership_claims(user: dict) -> dict:
+    """Signed additional claims for the access token (no memberships claim when there are too many)."""
+    claims = {
+        'mv': int(user.get('membership_version') or 0),
+        'full_name': user.get('full_name'),
+        'organization_id': str(user['organization_id']) if user.get('organization_id') else None,
+        'is_org_admin': bool(user.get('is_org_admin')),
+        'is_platform_admin': bool(user.get('is_platform_admin')),
+        'is_consultant': _is_consultant(user),
+    }
+    if user.get('active_organization_id'):
+        claims['active_organization_id'] = str(user['active_organization_id'])
+    memberships = _user_memberships(user)
+    if len(memberships) <= _CLAIMS_MEMBERSHIPS_MAX:
+        claims['memberships'] = [
+            {'organization_id': m['organization_id'], 'role': m['role']} for m in memberships
+        ]
+    return claims
+
+
+def _user_from_claims() -> dict | None:
+    """
+    Caller built from current token claims, or None when they are absent, older than a membership
+    change, or for an identity whose membership_version was not read from the database recently.
+    """
+    claims = get_jwt()
+    identity = get_jwt_identity()
+    if not identity or not isinstance(claims.get('mv'), int) or not isinstance(claims.get('memberships'), list):
+        return None
+    known = _checked_membership_version(identity)
+    if known is None or claims['mv'] < known:
+        return None
+    user = {
+        'email' if '@' in identity else 'username': identity,
+        'full_name': claims.get('full_name'),
+        'organization_id': claims.get('organization_id'),
+        'is_org_admin': bool(claims.get('is_org_admin')),
+        'is_platform_admin': bool(claims.get('is_platform_admin')),
+        'is_consultant': bool(claims.get('is_consultant')),
+        'memberships': claims['memberships'],
+    }
+    if claims.get('active_organization_id'):
+        user['active_organization_id'] = claims['active_organization_id']
+    return user
+
+
+def _request_user(users_col=None) -> dict | None:
+    """
+    Caller for read-only endpoints: token claims when current, otherwise the users collection.
+
+    The claims user has no _id, password or profile fields beyond email/username/full_name; endpoints
+    that write to the user document must keep using _find_user_by_login.
+    """
+    user = _user_from_claims()
+    if user is not None:
+        return user
+    if users_col is None:
+        users_col = get_users_col()
+    identity = get_jwt_identity()
+    if users_col is None or not identity:
+        return None
+    recheck = _checked_membership_version(identity) is None
+    if recheck:
+        # The periodic check against the database: a cached copy could predate the change it looks for.
+        _forget_cached_login(identity)
+    user = _find_user_by_login(users_col, identity)
+    _note_membership_version(user, checked=recheck)
+    return user
+
+
 _ALLOWED_ROW_UNITS = {
     'water': {'m3', 'million_litres', 'litres', 'gallons'},
     'energy': {'kwh', 'mwh', 'gj', 'mj', 'therms'},
@@ -1052,9 +1468,53 @@ def _sanitize_org_preferences(raw) -> dict:
             continue
         limit = _ORG_PREF_LOGO_MAX if k == 'companyLogo' else _ORG_PREF_VALUE_MAX
         out[k] = str(value)[:limit]
+    if 'companyLogoRef' in out and not is_blob_ref(out['companyLogoRef']):
+        del out['companyLogoRef']
     return out
 
 
+def _logo_preference_writes(value) -> dict:
+    """
+    Preference writes for an incoming companyLogo value: a data URL is moved into the blob store
+    and replaced by companyLogoRef (None marks a key to remove). Without a blob store the value
+    stays inline, as before.
+    """
+    if not value:
+        return {'companyLogo': None, 'companyLogoRef': None}
+    decoded = decode_image_data_url(value)
+    store = get_blob_store() if decoded is not None else None
+    if store is None:
+        return {'companyLogo': value}
+    raw, content_type = decoded
+    try:
+        ref = store.put(raw, content_type)
+    except Exception as e:
+        print(f'WARN: could not store company logo blob: {e}', file=sys.stderr)
+        return {'companyLogo': value}
+    return {'companyLogo': None, 'companyLogoRef': ref}
+
+
+def _externalize_org_logo(prefs: dict, stored_ref: str | None = None) -> dict:
+    """
+    Keep org_preferences free of inline logo bytes (only a content hash in companyLogoRef).
+
+    A client-sent companyLogoRef never overrides the org's stored reference, so one organization
+    cannot point its preferences at another organization's blob.
+    """
+    if prefs.get('companyLogoRef') != stored_ref:
+        if stored_ref:
+            prefs['companyLogoRef'] = stored_ref
+        else:
+            prefs.pop('companyLogoRef', None)
+    if 'companyLogo' in prefs:
+        for key, value in _logo_preference_writes(prefs.pop('companyLogo')).items():
+            if value is None:
+                prefs.pop(key, None)
+            else:
+                prefs[key] = value
+    return prefs
+
+
 _SITE_LIST_MAX = 500
 _SITE_RECORD_STR_MAX = 2000
 
@@ -1120,68 +1580,67 @@ def _sanitize_monthly_cash_flow(raw) -> dict:
     return out
 
 
-def _sanitize_site_data_payload(payload: dict) -> dict:
-    """Validate/sanitize site rows and keep backward-compatible shape."""
+def _sanitize_cash_transactions(cash) -> dict:
+    if not isinstance(cash, dict):
+        cash = {}
+    return {
+        'cashIn': _sanitize_site_record_list(cash.get('cashIn'), id_prefix='cash-in'),
+        'cashOut': _sanitize_site_record_list(cash.get('cashOut'), id_prefix='cash-out'),
+    }
+
+
+def _sanitize_site_text(value):
+    return None if value is None else str(value)[:500]
+
+
+_site_sanitizer = SiteSanitizer(
+    fields={
+        'financials': _sanitize_site_financials,
+        'invoices': lambda v: _sanitize_site_record_list(v, id_prefix='inv'),
+        'bills': lambda v: _sanitize_site_record_list(v, id_prefix='bill'),
+        'cashTransactions': _sanitize_cash_transactions,
+        'monthlyCashFlow': _sanitize_monthly_cash_flow,
+    },
+    optional_fields={key: _sanitize_site_text for key in ('name', 'companyName', 'notes')},
+    row_units={category: (units, _DEFAULT_ROW_UNIT[category]) for category, units in _ALLOWED_ROW_UNITS.items()},
+    normalize_site=_normalize_site_tab_questions,
+    normalize_sections=('tabQuestions', 'other'),
+)
+
+
+def _sanitize_data_rows(category: str, rows) -> list:
+    """Clamp year, default unit and pad months to 12 for one data-input category."""
+    return _site_sanitizer.rows(category, rows)
+
+
+def _sanitize_site(site: dict) -> None:
+    """Sanitize one site in place (financials, record lists, text fields, tab notes, data rows)."""
+    _site_sanitizer.sanitize_site(site)
+
+
+def _sanitize_site_data_payload(payload: dict, stored_hashes: dict | None = None) -> dict:
+    """
+    Validate/sanitize site rows and keep backward-compatible shape.
+
+    With `stored_hashes` (the organization's stored content hashes, may be empty) sites and
+    sections identical to the stored ones skip sanitizing, and the payload's `content_hashes`
+    are set for the sanitized sites.
+    """
     if not isinstance(payload, dict):
         return {'sites': {}}
+    payload.pop('content_hashes', None)
     if 'org_preferences' in payload:
         payload['org_preferences'] = _sanitize_org_preferences(payload.get('org_preferences'))
     sites = payload.get('sites')
     if not isinstance(sites, dict):
         payload['sites'] = {}
         return payload
-    for _site_id, site in sites.items():
-        if not isinstance(site, dict):
-            continue
-        site['financials'] = _sanitize_site_financials(site.get('financials'))
-        site['invoices'] = _sanitize_site_record_list(site.get('invoices'), id_prefix='inv')
-        site['bills'] = _sanitize_site_record_list(site.get('bills'), id_prefix='bill')
-        cash = site.get('cashTransactions')
-        if not isinstance(cash, dict):
-            cash = {}
-        site['cashTransactions'] = {
-            'cashIn': _sanitize_site_record_list(cash.get('cashIn'), id_prefix='cash-in'),
-            'cashOut': _sanitize_site_record_list(cash.get('cashOut'), id_prefix='cash-out'),
-        }
-        site['monthlyCashFlow'] = _sanitize_monthly_cash_flow(site.get('monthlyCashFlow'))
-        for text_key in ('name', 'companyName', 'notes'):
-            if text_key in site and site[text_key] is not None:
-                site[text_key] = str(site[text_key])[:500]
-        _normalize_site_tab_questions(site)
-        data = site.get('data')
-        if not isinstance(data, dict):
-            continue
-        for category, rows in data.items():
-            if category not in _ALLOWED_ROW_UNITS or not isinstance(rows, list):
-                continue
-            clean_rows = []
-            for row in rows:
-                if not isinstance(row, dict):
-                    continue
-                year = row.get('year')
-                try:
-                    year_int = int(year)
-                except (TypeError, ValueError):
-                    year_int = 2025
-                if year_int < 2020:
-                    year_int = 2020
-                if year_int > 2030:
-                    year_int = 2030
-                unit = str(row.get('unit') or '').strip().lower()
-                if unit not in _ALLOWED_ROW_UNITS[category]:
-                    unit = _DEFAULT_ROW_UNIT[category]
-                months = row.get('months') if isinstance(row.get('months'), list) else []
-                months = [(float(v) if isinstance(v, (int, float)) else 0.0) for v in months[:12]]
-                while len(months) < 12:
-                    months.append(0.0)
-                clean_rows.append({
-                    'description': str(row.get('description') or '')[:500],
-                    'year': year_int,
-                    'months': months,
-                    'emissionType': row.get('emissionType'),
-                    'unit': unit,
-                })
-            data[category] = clean_rows
+    if stored_hashes is None:
+        for site in sites.values():
+            if isinstance(site, dict):
+                _site_sanitizer.sanitize_site(site)
+    else:
+        payload['content_hashes'] = _site_sanitizer.sanitize_sites(sites, stored_hashes)
     return payload
 
 
@@ -1308,7 +1767,7 @@ _SOURCE_CATEGORY = {
     'refrigerant_R407C': 'refrigerants', 'refrigerant_R408A': 'refrigerants',
 }
 _UNIT_TO_BASE = {
-    'water': {'m3': 1.0, 'litres': 0.001, 'gallons': 0.00454609, 'ft3': 0.0283168},
+    'water': {'m3': 1.0, 'million_litres': 1000.0, 'litres': 0.001, 'gallons': 0.00454609, 'ft3': 0.0283168},
     'energy': {'kwh': 1.0, 'mwh': 1000.0, 'gj': 277.777778, 'mj': 0.277777778, 'therms': 29.3071},
     'waste': {'tonnes': 1.0, 'kg': 0.001, 'lbs': 0.000453592},
     'transport': {'km': 1.0, 'miles': 1.609344, 'passenger_km': 1.0, 'tonne_km': 1.0, 'night': 1.0, 'day': 1.0},
@@ -1328,41 +1787,148 @@ def _normalize_year(year: int | str | None) -> int:
     return y
 
 
-def lookup_conversion_factor(country: str, year: int | str, source_key: str, unit: str = '') -> tuple[float | None, str | None]:
+class _FactorLookupTable:
+    """
+    Registry compiled into flat (country_key, source_key) -> entry dicts when the catalog loads.
+
+    An entry holds the resolved factor, factor key, category and allowed unit multipliers; source
+    aliases (UI keys) are expanded up front and the UK_<year> fallback is applied at lookup time
+    only for country/year documents that do not exist. Repeated raw lookups hit a result memo.
+    """
+
+    _MEMO_MAX = 50_000
+
+    def __init__(self, registry: dict):
+        self.registry = registry
+        self.country_keys = frozenset(sys.intern(str(k)) for k in registry)
+        self.entries: dict[tuple[str, str], tuple] = {}
+        aliases = tuple(UI_KEY_TO_CATALOG_KEY)
+        for country_key, doc in registry.items():
+            ck = sys.intern(str(country_key))
+            bucket = (doc or {}).get('factors') or {}
+            for src in (*bucket.keys(), *aliases):
+                factor_key = resolve_catalog_factor_key(src)
+                if factor_key not in bucket and src in bucket:
+                    factor_key = src
+                if factor_key not in bucket:
+                    continue
+                category = category_for_factor_key(factor_key)
+                raw = bucket.get(factor_key)
+                self.entries[(ck, sys.intern(src))] = (
+                    None if raw is None else float(raw),
+                    factor_key,
+                    category,
+                    _UNIT_TO_BASE.get(category, {}),
+                )
+        self._memo: dict[tuple, tuple[float | None, str | None, float]] = {}
+
+    def lookup(self, country, year, source_key, unit='') -> tuple[float | None, str | None, float]:
+        """Return (factor, error, unit multiplier) with lookup_conversion_factor semantics."""
+        memo_key = (country, year, source_key, unit)
+        try:
+            hit = self._memo.get(memo_key)
+        except TypeError:
+            memo_key, hit = None, None
+        if hit is not None:
+            return hit
+        result = self._resolve(country, year, source_key, unit)
+        if memo_key is not None:
+            if len(self._memo) >= self._MEMO_MAX:
+                self._memo.clear()
+            self._memo[memo_key] = result
+        return result
+
+    def _resolve(self, country, year, source_key, unit) -> tuple[float | None, str | None, float]:
+        c = (country or 'UK').strip().upper()
+        y = _normalize_year(year)
+        src = (source_key or '').strip()
+        country_key = f'{c}_{y}'
+        if country_key not in self.country_keys:
+            country_key = f'UK_{y}'
+        entry = self.entries.get((country_key, src))
+        if entry is None:
+            return None, f'Unsupported source: {src}', 1.0
+        factor, factor_key, category, multipliers = entry
+        unit_clean = (unit or '').strip().lower()
+        mul = 1.0
+        if unit_clean:
+            mul = multipliers.get(unit_clean)
+            if mul is None:
+                return None, f'Unsupported unit "{unit_clean}" for category "{category}"', 1.0
+        if factor is None:
+            return None, f'Missing factor for source "{src}" ({factor_key})', mul
+        return factor, None, mul
+
+
+def get_factor_lookup_table(registry: dict | None = None) -> _FactorLookupTable:
+    """Compiled lookup table for the cached registry (or for an explicit registry snapshot)."""
+    if registry is None:
+        registry = get_conversion_factors_registry()
+    table = _factor_registry_cache.get('table')
+    if table is not None and table.registry is registry:
+        return table
+    return _FactorLookupTable(registry)
+
+
+def lookup_conversion_factor(
+    country: str,
+    year: int | str,
+    source_key: str,
+    unit: str = '',
+    *,
+    registry: dict | None = None,
+) -> tuple[float | None, str | None]:
     """Return factor and optional error for (country, year, source, unit), in base units."""
-    c = (country or 'UK').strip().upper()
-    y = _normalize_year(year)
-    src = (source_key or '').strip()
-    registry = get_conversion_factors_registry()
-    doc = registry.get(f'{c}_{y}') or registry.get(f'UK_{y}')
-    factors_bucket = (doc or {}).get('factors') or {}
-    factor_key = resolve_catalog_factor_key(src)
-    if factor_key not in factors_bucket and src in factors_bucket:
-        factor_key = src
-    if factor_key not in factors_bucket:
-        return None, f'Unsupported source: {src}'
-    category = category_for_factor_key(factor_key)
-    unit_clean = (unit or '').strip().lower()
-    if unit_clean:
-        allowed = _UNIT_TO_BASE.get(category, {})
-        if unit_clean not in allowed:
-            return None, f'Unsupported unit "{unit_clean}" for category "{category}"'
-    if not doc:
-        return None, f'Missing factors for country/year: {c}/{y}'
-    factor = factors_bucket.get(factor_key)
-    if factor is None:
-        return None, f'Missing factor for source "{src}" ({factor_key})'
-    return float(factor), None
+    factor, err, _mul = get_factor_lookup_table(registry).lookup(country, year, source_key, unit)
+    return factor, err
+
+
+FACTOR_LOOKUP_BATCH_MAX = 5000
+
+
+def lookup_conversion_factors_batch(lookups: list, registry: dict | None = None) -> list[dict]:
+    """Resolve many (country, year, source_key, unit) lookups against one registry snapshot.
+
+    Results keep the input order; repeated tuples are resolved once.
+    """
+    if registry is None:
+        registry = get_conversion_factors_registry()
+    resolved: dict[tuple, tuple[float | None, str | None]] = {}
+    results = []
+    for item in lookups:
+        if not isinstance(item, dict):
+            results.append({
+                'country': None,
+                'year': None,
+                'source_key': None,
+                'unit': None,
+                'factor': None,
+                'error': 'Lookup must be an object',
+            })
+            continue
+        country = str(item.get('country') or 'UK').strip().upper()
+        year = _normalize_year(item.get('year'))
+        source_key = str(item.get('source_key') or '').strip()
+        unit = str(item.get('unit') or '').strip()
+        key = (country, year, source_key, unit.lower())
+        if key not in resolved:
+            resolved[key] = lookup_conversion_factor(country, year, source_key, unit, registry=registry)
+        factor, err = resolved[key]
+        results.append({
+            'country': country,
+            'year': year,
+            'source_key': source_key,
+            'unit': unit,
+            'factor': factor,
+            'error': err,
+        })
+    return results
 
 
 def calculate_emission_kg(country: str, year: int | str, source_key: str, value: float, unit: str = '') -> tuple[float | None, str | None]:
-    factor, err = lookup_conversion_factor(country, year, source_key, unit)
+    factor, err, mul = get_factor_lookup_table().lookup(country, year, source_key, unit)
     if err:
         return None, err
-    category = category_for_factor_key(resolve_catalog_factor_key(source_key) or source_key)
-    mul = 1.0
-    if unit:
-        mul = (_UNIT_TO_BASE.get(category, {}) or {}).get(unit.lower(), 1.0)
     try:
         numeric = float(value)
     except (TypeError, ValueError):
@@ -1370,6 +1936,107 @@ def calculate_emission_kg(country: str, year: int | str, source_key: str, value:
     return numeric * mul * float(factor), None
 
 
+# Data-input tab -> _UNIT_TO_BASE table used to convert row quantities (js resolveUnitCategory).
+# Tabs without a table (materials) use the entered quantity as-is, like the browser.
+_DATA_CATEGORY_UNIT_BASE = {
+    'water': 'water',
+    'energy': 'energy',
+    'transmissionDistribution': 'energy',
+    'waste': 'waste',
+    'transport': 'transport',
+    'businessTravel': 'transport',
+    'freight': 'transport',
+    'staffCommute': 'transport',
+    'wfh': 'transport',
+    'refrigerants': 'refrigerants',
+}
+# Factor applied when a row has no emission type selected (js lookupReportingYearFactor).
+_DATA_CATEGORY_DEFAULT_SOURCE = {
+    'water': 'water',
+    'energy': 'electricity',
+    'transmissionDistribution': 'electricity_transmission_distribution',
+    'waste': 'waste',
+    'transport': 'transport_petrol',
+    'refrigerants': 'refrigerant_R410A',
+}
+
+
+def _make_row_emission_resolver(
+    country: str,
+    registry: dict,
+    factor_year: int | None = None,
+    *,
+    disabled_sources: frozenset[str] = frozenset(),
+):
+    """
+    Row -> (kg CO2e per entered unit, error, factor_key), memoised per (category, source, unit, year).
+
+    Rows whose selected source is in `disabled_sources` resolve to 0.0, as the dashboard zeroes
+    them; a unit the category has no conversion for is a row error.
+    """
+    c = (country or 'UK').strip().upper()
+    memo: dict[tuple, tuple[float | None, str | None, str]] = {}
+
+    def resolve(category: str, row: dict) -> tuple[float | None, str | None, str]:
+        src = str(row.get('emissionType') or _DATA_CATEGORY_DEFAULT_SOURCE.get(category) or '').strip()
+        unit = str(row.get('unit') or '').strip().lower() or _DEFAULT_ROW_UNIT.get(category, '')
+        y = _normalize_year(factor_year if factor_year is not None else row.get('year'))
+        key = (category, src, unit, y)
+        hit = memo.get(key)
+        if hit is not None:
+            return hit
+        factor_key = _SOURCE_TO_BACKEND_FACTOR_KEY.get(src) or resolve_catalog_factor_key(src)
+        doc = registry.get(f'{c}_{y}') or registry.get(f'UK_{y}') or {}
+        bucket = doc.get('factors') or {}
+        factor = bucket.get(factor_key)
+        if factor is None and src in bucket:
+            factor_key, factor = src, bucket[src]
+        table = _UNIT_TO_BASE.get(_DATA_CATEGORY_UNIT_BASE.get(category, ''))
+        if not src:
+            result = (None, 'Missing emission type', '')
+        elif str(row.get('emissionType') or '').strip() in disabled_sources:
+            result = (0.0, None, factor_key)
+        elif factor is None:
+            result = (None, f'Missing factor for source "{src}" ({factor_key})', factor_key)
+        elif table is not None and unit not in table:
+            result = (None, f'Unknown unit "{unit}" for {category}', factor_key)
+        else:
+            result = (float(factor) * (table[unit] if table is not None else 1.0), None, factor_key)
+        memo[key] = result
+        return result
+
+    return resolve
+
+
+def _emissions_country(prefs: dict | None) -> str:
+    return (str((prefs or {}).get('carbonCalcCountry') or 'UK')).strip().upper() or 'UK'
+
+
+def calculate_site_emissions(
+    user_data: dict,
+    *,
+    year: int | None = None,
+    include_rows: bool = False,
+    registry: dict | None = None,
+) -> dict:
+    """Compute kg CO2e for every site in a (sanitized) user_data document in one pass."""
+    user_data = user_data if isinstance(user_data, dict) else {}
+    prefs = user_data.get('org_preferences') if isinstance(user_data.get('org_preferences'), dict) else {}
+    country = _emissions_country(prefs)
+    if registry is None:
+        registry = get_conversion_factors_registry()
+    result = compute_emissions(
+        user_data.get('sites') if isinstance(user_data.get('sites'), dict) else {},
+        _make_row_emission_resolver(country, registry, disabled_sources=disabled_sources_from_prefs(prefs)),
+        year=year,
+        scopes_enabled=scopes_enabled_from_prefs(prefs),
+        include_rows=include_rows,
+    )
+    result['country'] = country
+    result['year'] = year
+    return result
+
+
 def chatbot_assist(message: str, context: dict | None = None) -> str:
     msg = (message or '').strip().lower()
     if not msg:
@@ -1400,9 +2067,37 @@ def chatbot_assist(message: str, context: dict | None = None) -> str:
     )
 
 
+@app.errorhandler(ConnectionFailure)
+def _mongo_connection_failure(e):
+    # Open the circuit so the next requests fail fast instead of waiting out server selection.
+    _mongo.report_failure(e)
+    return jsonify({"msg": "DB Error"}), 503
+
+
+def _mongo_status() -> dict:
+    """Cached MongoDB health; starts the first connect in the background instead of waiting on it."""
+    _mongo.start()
+    return _mongo.status()
+
+
+@app.route('/health/live', methods=['GET'])
+def health_live():
+    """Liveness: the process serves requests (no database access)."""
+    return jsonify({"status": "alive"}), 200
+
+
+@app.route('/health/ready', methods=['GET'])
+def health_ready():
+    """Readiness: the last MongoDB ping succeeded (cached, no database access)."""
+    status = _mongo_status()
+    return jsonify({"status": "ready" if status['connected'] else "unavailable", "db": status}), (
+        200 if status['connected'] else 503
+    )
+
+
 @app.route('/', methods=['GET'])
 def home():
-    db_status = "connected" if get_db() is not None else "disconnected"
+    db_status = "connected" if _mongo_status()['connected'] else "disconnected"
     email_status = _email_config_status()
     return jsonify({
         "status": "healthy",
@@ -1514,7 +2209,8 @@ def login():
     user = _find_user_by_login(users_col, identifier)
     if user and bcrypt.check_password_hash(user['password'], password):
         identity = user.get('email') or user.get('username')
-        access_token = create_access_token(identity=identity)
+        _note_membership_version(user)
+        access_token = create_access_token(identity=identity, additional_claims=_membership_claims(user))
 
         is_platform_admin = bool(user.get('is_platform_admin'))
         is_consultant = _is_consultant(user)
@@ -1643,6 +2339,7 @@ def org_users():
         # Child users are managed by org admin; no verification step required.
         "email_verified": True,
     })
+    _invalidate_user_cache()
 
     notify_sustain_quality_new_registration(
         email or '',
@@ -1718,6 +2415,8 @@ def org_user_update_delete(username: str):
             }],
         )
         users_col.delete_one({"_id": target_user["_id"]})
+        _invalidate_user_cache(target_user)
+        _note_membership_version(target_user, changed=True)
         return jsonify({"msg": "User removed successfully"}), 200
 
     payload = request.get_json() or {}
@@ -1790,7 +2489,13 @@ def org_user_update_delete(username: str):
             user_changes,
         )
 
-    users_col.update_one({"_id": target_user["_id"]}, {"$set": updates})
+    users_col.update_one(
+        {"_id": target_user["_id"]},
+        {"$set": updates, "$inc": {"membership_version": 1}},
+    )
+    _invalidate_user_cache(target_user)
+    # Covers renames too: tokens issued under the old email/username stop passing the claims check.
+    _note_membership_version(target_user, changed=True)
     updated = users_col.find_one({"_id": target_user["_id"]}, {
         "_id": 0,
         "email": 1,
@@ -1805,45 +2510,194 @@ def org_user_update_delete(username: str):
     return jsonify({"msg": "User updated successfully", "user": updated}), 200
 
 
+# Storage layout for organizations saving data for the first time: 'legacy' (one user_data
+# document holding every site) or 'sites' (one document per site, see site_documents.py).
+USER_DATA_LAYOUT = (os.environ.get('USER_DATA_LAYOUT') or 'legacy').strip().lower()
+# How rows store `months` on write: 'list' (BSON array), 'f64' or 'f32' (packed, see months_codec.py).
+MONTHS_STORAGE = (os.environ.get('MONTHS_STORAGE') or FORMAT_LIST).strip().lower()
+if MONTHS_STORAGE not in FORMATS:
+    print(f'WARN: unknown MONTHS_STORAGE {MONTHS_STORAGE!r}; storing months as lists', file=sys.stderr)
+    MONTHS_STORAGE = FORMAT_LIST
+
+
+def _load_user_data(data_col, org_id: str, projection: dict | None = None) -> dict | None:
+    """The organization's user_data in the single-document shape, whichever layout stores it."""
+    return unpack_user_data(load_user_data(data_col, get_sites_col, org_id, projection))
+
+
+_SITE_SUMMARY_FIELDS = ('name', 'companyName')
+_USER_DATA_HEADER_FIELDS = ('organization_id', 'email', 'org_preferences', 'updated_at', 'data_version')
+
+
+def _user_data_etag(org_id: str, doc: dict | None, user_profile: dict) -> str:
+    """Strong validator for GET /api/data: every save and patch bumps updated_at and data_version."""
+    doc = doc or {}
+    return strong_etag(
+        'data', org_id, doc.get('updated_at'), doc.get('data_version'),
+        sorted(request.args.items(multi=True)), user_profile,
+    )
+
+
+def _user_data_view_projection(args) -> tuple[dict | None, str | None]:
+    """
+    Mongo projection for the GET /api/data query options; (None, None) means the whole document.
+
+    view=summary: each site's name and companyName only. site_id=<id>: that one site.
+    categories=energy,water: only those data categories (plus site names), of every site or of
+    site_id. The projection is applied by the database, so unselected rows are never read.
+    """
+    view = (args.get('view') or 'full').strip().lower()
+    site_id = args.get('site_id')
+    raw_categories = args.get('categories')
+    if view not in ('full', 'summary'):
+        return None, 'view must be "full" or "summary"'
+    if view == 'full' and site_id is None and raw_categories is None:
+        return None, None
+    if site_id is not None and not _is_safe_mongo_key(site_id):
+        return None, 'Invalid site_id'
+    categories = [c.strip() for c in (raw_categories or '').split(',') if c.strip()]
+    unknown = [c for c in categories if c not in _ALLOWED_ROW_UNITS]
+    if unknown:
+        return None, f'Unknown categories: {", ".join(unknown)}'
+    if view == 'summary' and (site_id is not None or categories):
+        return None, 'view=summary cannot be combined with site_id or categories'
+    if raw_categories is not None and not categories:
+        return None, 'categories must list at least one category'
+
+    projection = {field: 1 for field in _USER_DATA_HEADER_FIELDS}
+    sites_path = f'sites.{site_id}' if site_id is not None else f'sites.{SITE_WILDCARD}'
+    if site_id is not None and not categories:
+        projection[sites_path] = 1
+    else:
+        fields = list(_SITE_SUMMARY_FIELDS) + [f'data.{category}' for category in categories]
+        projection.update({f'{sites_path}.{field}': 1 for field in fields})
+    return projection, None
+
+
 @app.route('/api/data', methods=['GET'])
 @jwt_required()
 def get_user_data():
+    """
+    The organization's data. Large organizations can fetch less: ?view=summary (site list without
+    data), ?site_id=<id> (one site) and/or ?categories=energy,water (selected data categories).
+    """
     data_col = get_data_col()
     if data_col is None: return jsonify({"msg": "DB Error"}), 503
-    
-    current_identity = get_jwt_identity()
-    users_col = get_users_col()
-    user = _find_user_by_login(users_col, current_identity) if users_col is not None else None
+
+    user = _request_user()
     org_id = _resolve_request_organization_id(user) if user else None
     if not org_id:
         return jsonify({"msg": "Organization is not linked to this account."}), 400
+    projection, err = _user_data_view_projection(request.args)
+    if err:
+        return jsonify({"msg": err}), 400
 
     user_profile = {
         "full_name": user.get("full_name") if user else None,
         "email": user.get("email") if user else None,
     }
 
-    user_data = data_col.find_one({"organization_id": org_id})
-    
+    version = data_col.find_one({'organization_id': org_id}, {'_id': 0, 'updated_at': 1, 'data_version': 1})
+    etag = _user_data_etag(org_id, version, user_profile)
+    if if_none_match(request, etag):
+        return revalidated(app.response_class(status=304), etag)
+
+    user_data = _load_user_data(data_col, org_id, projection)
+
     if user_data:
+        etag = _user_data_etag(org_id, user_data, user_profile)
         user_data['_id'] = str(user_data['_id'])
+        user_data.pop('content_hashes', None)
+        user_data.pop(LAYOUT_FIELD, None)
+        user_data.pop('data_version', None)
         user_data['organization_id'] = user_data.get('organization_id', org_id)
         if 'org_preferences' not in user_data:
             user_data['org_preferences'] = {}
-        sites = user_data.get('sites')
+        sites = user_data.setdefault('sites', {}) if projection is not None else user_data.get('sites')
+        if request.args.get('site_id') is not None and request.args['site_id'] not in sites:
+            return jsonify({"msg": "Site not found"}), 404
         if isinstance(sites, dict):
             for site in sites.values():
-                if isinstance(site, dict):
+                # Partial views leave out tabQuestions; only normalize sites that carry them.
+                if isinstance(site, dict) and (projection is None or 'tabQuestions' in site or 'tab_questions' in site):
                     _normalize_site_tab_questions(site)
         user_data['user_profile'] = user_profile
-        return jsonify(user_data), 200
-    return jsonify({
+        return revalidated(_json_response(user_data, len(user_data.get('sites') or ())), etag), 200
+    return revalidated(jsonify({
         "email": user.get("email") if user else None,
         "organization_id": org_id,
         "sites": {},
         "org_preferences": {},
         "user_profile": user_profile,
-    }), 200
+    }), etag), 200
+
+USER_DATA_MAX_BYTES = int(os.environ.get('USER_DATA_MAX_BYTES', str(32 * 1024 * 1024)))
+USER_DATA_SITE_MAX_BYTES = int(os.environ.get('USER_DATA_SITE_MAX_BYTES', str(4 * 1024 * 1024)))
+
+
+def _read_user_data_payload(stored_hashes: dict):
+    """
+    Parse a POST /api/data body straight from the request stream; returns (payload, error response).
+
+    Each site is sanitized (see _sanitize_site_data_payload) as soon as it has arrived, and the
+    body and site budgets are enforced while reading, so an oversized save is refused before it
+    is buffered. The payload carries the sites' content_hashes when it has a `sites` object.
+    """
+    if not request.is_json:
+        return None, (jsonify({"msg": "Request body must be JSON"}), 415)
+    if request.content_length is not None and request.content_length > USER_DATA_MAX_BYTES:
+        return None, (jsonify({"msg": f"Request body exceeds {USER_DATA_MAX_BYTES} bytes"}), 413)
+    payload: dict = {}
+    hashes: dict = {}
+    try:
+        for path, value in iter_object_stream(
+            request.stream,
+            stream_keys=('sites',),
+            max_total=USER_DATA_MAX_BYTES,
+            max_value=USER_DATA_SITE_MAX_BYTES,
+        ):
+            if len(path) == 1:
+                payload[path[0]] = value
+            else:
+                site_id = path[1]
+                payload['sites'][site_id] = value
+                site_hashes = _site_sanitizer.sanitize_sites({site_id: value}, stored_hashes)
+                stored = stored_hashes.get(site_id)
+                if not (isinstance(stored, dict) and stored.get('site') == site_hashes[site_id]['site']):
+                    # Hash the months as a lossy MONTHS_STORAGE format will read them back.
+                    if round_site_months(value, MONTHS_STORAGE):
+                        site_hashes[site_id] = site_content_hashes(value)
+                hashes.update(site_hashes)
+    except PayloadTooLarge as e:
+        return None, (jsonify({"msg": str(e)}), 413)
+    except PayloadError as e:
+        return None, (jsonify({"msg": f"Invalid JSON body: {e}"}), 400)
+
+    payload.pop('content_hashes', None)
+    if 'org_preferences' in payload:
+        payload['org_preferences'] = _sanitize_org_preferences(payload.get('org_preferences'))
+    if isinstance(payload.get('sites'), dict):
+        payload['content_hashes'] = hashes
+    else:
+        payload['sites'] = {}
+    return payload, None
+
+
+def _write_user_data_header(data_col, org_id: str, existing: dict, update: dict) -> bool:
+    """
+    Apply a save's or patch's update to the user_data header; False (nothing written) when the
+    storage layout is no longer the one in `existing`, i.e. migrate_org() flipped it meanwhile.
+    """
+    if not existing:
+        data_col.update_one({'organization_id': org_id}, update, upsert=True)
+        return True
+    result = data_col.update_one({'organization_id': org_id, LAYOUT_FIELD: existing.get(LAYOUT_FIELD)}, update)
+    return bool(result.matched_count)
+
+
+def _user_data_layout_conflict():
+    return jsonify({"msg": "Data storage was migrated while saving; please retry."}), 409
+
 
 @app.route('/api/data', methods=['POST'])
 @jwt_required()
@@ -1852,7 +2706,6 @@ def save_user_data():
     if data_col is None: return jsonify({"msg": "DB Error"}), 503
     
     current_identity = get_jwt_identity()
-    data = request.get_json() or {}
 
     users_col = get_users_col()
     user = _find_user_by_login(users_col, current_identity) if users_col is not None else None
@@ -1861,10 +2714,17 @@ def save_user_data():
     if not org_id:
         return jsonify({"msg": "Organization is not linked to this account."}), 400
 
-    data = _sanitize_site_data_payload(data)
-    existing = data_col.find_one({'organization_id': org_id}) or {}
-
-    if 'sites' not in data and isinstance(existing.get('sites'), dict):
+    existing = _load_user_data(data_col, org_id) or {}
+    site_layout = uses_site_documents(existing) or (not existing and USER_DATA_LAYOUT == LAYOUT_SITES)
+    stored_hashes = existing.get('content_hashes') if isinstance(existing.get('content_hashes'), dict) else {}
+
+    data, error = _read_user_data_payload(stored_hashes)
+    if error:
+        return error
+    data.pop(LAYOUT_FIELD, None)
+    data.pop('data_version', None)
+    sites_resent = 'sites' in data
+    if not sites_resent and isinstance(existing.get('sites'), dict):
         data['sites'] = existing['sites']
 
     incoming_prefs = data.get('org_preferences')
@@ -1872,33 +2732,487 @@ def save_user_data():
         if isinstance(existing.get('org_preferences'), dict):
             data['org_preferences'] = existing['org_preferences']
     else:
-        merged_prefs = {**(existing.get('org_preferences') or {}), **incoming_prefs}
-        data['org_preferences'] = _sanitize_org_preferences(merged_prefs)
+        existing_prefs = existing.get('org_preferences') or {}
+        merged_prefs = {**existing_prefs, **incoming_prefs}
+        data['org_preferences'] = _externalize_org_logo(
+            _sanitize_org_preferences(merged_prefs), existing_prefs.get('companyLogoRef')
+        )
 
     data['email'] = user_email or current_identity  # keep for backwards compatibility
     data['organization_id'] = org_id
     data['updated_at'] = utc_now()
+    if 'content_hashes' not in data:
+        data['content_hashes'] = content_hashes_for_sites(data.get('sites'), reuse=stored_hashes)
 
     old_snapshot = {
         'sites': existing.get('sites') if isinstance(existing.get('sites'), dict) else {},
         'org_preferences': existing.get('org_preferences')
         if isinstance(existing.get('org_preferences'), dict)
         else {},
+        'content_hashes': stored_hashes,
     }
     new_snapshot = {
         'sites': data.get('sites') if isinstance(data.get('sites'), dict) else {},
         'org_preferences': data.get('org_preferences')
         if isinstance(data.get('org_preferences'), dict)
         else {},
+        'content_hashes': data['content_hashes'],
     }
-    data_changes = diff_user_data_payload(old_snapshot, new_snapshot)
-    if data_changes:
-        _record_audit_event(org_id, user, 'data_save', data_changes)
+    rollup_rebuild = _rollup_preferences_changed(old_snapshot['org_preferences'], new_snapshot['org_preferences'])
+    rollup_touched = _changed_rollup_categories(
+        stored_hashes, new_snapshot['content_hashes'], old_snapshot['sites'], new_snapshot['sites'],
+    )
 
-    data_col.update_one({'organization_id': org_id}, {'$set': data}, upsert=True)
+    if site_layout:
+        sites_col = get_sites_col()
+        if sites_col is None:
+            return jsonify({"msg": "DB Error"}), 503
+        sites = data.pop('sites', None) or {}
+        hashes = data.pop('content_hashes')
+        changed = [
+            site_id for site_id in sites
+            if (stored_hashes.get(site_id) or {}).get('site') != hashes[site_id]['site']
+        ]
+        write_site_changes(
+            sites_col, org_id, pack_sites(sites, MONTHS_STORAGE),
+            hashes=hashes, previous_order=old_snapshot['sites'], changed=changed, now=data['updated_at'],
+        )
+        data[LAYOUT_FIELD] = LAYOUT_SITES
+    else:
+        data['sites'] = pack_sites(data['sites'], MONTHS_STORAGE)
+    if not _write_user_data_header(data_col, org_id, existing, {'$set': data, '$inc': {'data_version': 1}}):
+        return _user_data_layout_conflict()
+    _record_audit_diff(org_id, user, 'data_save', old_snapshot, new_snapshot)
+    _queue_rollup_update(org_id, new_snapshot['sites'], rollup_touched, rebuild=rollup_rebuild)
     return jsonify({'msg': 'Data saved'}), 200
 
 
+_DATA_PATCH_MAX_OPS = 500
+_DATA_PATCH_OPS = (
+    'set_site',
+    'remove_site',
+    'set_site_fields',
+    'set_category',
+    'set_row',
+    'push_row',
+    'remove_row',
+    'set_preferences',
+)
+
+
+def _sanitize_tab_questions_value(value) -> dict:
+    holder = {'tabQuestions': value}
+    _normalize_site_tab_questions(holder)
+    return holder['tabQuestions']
+
+
+_SITE_PATCH_FIELDS = {
+    'name': _sanitize_site_text,
+    'companyName': _sanitize_site_text,
+    'notes': _sanitize_site_text,
+    'financials': _sanitize_site_financials,
+    'invoices': lambda v: _sanitize_site_record_list(v, id_prefix='inv'),
+    'bills': lambda v: _sanitize_site_record_list(v, id_prefix='bill'),
+    'cashTransactions': _sanitize_cash_transactions,
+    'monthlyCashFlow': _sanitize_monthly_cash_flow,
+    'tabQuestions': _sanitize_tab_questions_value,
+}
+
+
+def _is_safe_mongo_key(key) -> bool:
+    return isinstance(key, str) and 0 < len(key) <= 128 and '.' not in key and not key.startswith('$')
+
+
+def _paths_overlap(a: str, b: str) -> bool:
+    return a == b or a.startswith(b + '.') or b.startswith(a + '.')
+
+
+def _collapse_paths(paths) -> list[str]:
+    """Drop paths whose ancestor is also listed (Mongo rejects conflicting update/projection paths)."""
+    unique = list(dict.fromkeys(paths))
+    return [p for p in unique if not any(p != q and p.startswith(q + '.') for q in unique)]
+
+
+def _doc_path_get(doc, path: str):
+    """Resolve a dotted Mongo path in a plain dict/list document; returns (found, value)."""
+    cur = doc
+    for part in path.split('.'):
+        if isinstance(cur, dict) and part in cur:
+            cur = cur[part]
+        elif isinstance(cur, list) and part.isdigit() and int(part) < len(cur):
+            cur = cur[int(part)]
+        else:
+            return False, None
+    return True, cur
+
+
+def _plan_data_patch(ops) -> tuple[list[dict] | None, str | None]:
+    """Validate and sanitize patch operations; returns (normalized ops, error)."""
+    if not isinstance(ops, list) or not ops:
+        return None, 'Expected non-empty "ops" array'
+    if len(ops) > _DATA_PATCH_MAX_OPS:
+        return None, f'Too many operations (max {_DATA_PATCH_MAX_OPS})'
+    planned = []
+    for pos, op in enumerate(ops):
+        if not isinstance(op, dict) or op.get('op') not in _DATA_PATCH_OPS:
+            return None, f'ops[{pos}]: unknown operation'
+        kind = op['op']
+        if kind == 'set_preferences':
+            prefs = op.get('preferences')
+            if not isinstance(prefs, dict):
+                return None, f'ops[{pos}]: "preferences" must be an object'
+            clean = {k: v for k, v in _sanitize_org_preferences(prefs).items() if _is_safe_mongo_key(k)}
+            clean.pop('companyLogoRef', None)
+            if 'companyLogo' in clean and not clean['companyLogo']:
+                # A new logo goes to the blob store only once the whole patch is accepted.
+                clean.update(_logo_preference_writes(None))
+            planned.append({'op': kind, 'preferences': clean})
+            continue
+
+        site_id = op.get('site_id')
+        if not _is_safe_mongo_key(site_id):
+            return None, f'ops[{pos}]: invalid site_id'
+        entry = {'op': kind, 'site_id': site_id}
+        if kind == 'set_site':
+            site = op.get('site')
+            if not isinstance(site, dict):
+                return None, f'ops[{pos}]: "site" must be an object'
+            site = copy.deepcopy(site)
+            _sanitize_site(site)
+            entry['site'] = site
+        elif kind == 'set_site_fields':
+            fields = op.get('fields')
+            if not isinstance(fields, dict) or not fields:
+                return None, f'ops[{pos}]: "fields" must be a non-empty object'
+            unknown = [k for k in fields if k not in _SITE_PATCH_FIELDS]
+            if unknown:
+                return None, f'ops[{pos}]: unsupported site field(s): {", ".join(map(str, unknown))}'
+            entry['fields'] = {k: _SITE_PATCH_FIELDS[k](v) for k, v in fields.items()}
+        elif kind != 'remove_site':
+            category = op.get('category')
+            if category not in _ALLOWED_ROW_UNITS:
+                return None, f'ops[{pos}]: unknown category'
+            entry['category'] = category
+            if kind == 'set_category':
+                entry['rows'] = _sanitize_data_rows(category, op.get('rows'))
+            elif kind == 'push_row':
+                rows = _sanitize_data_rows(category, [op.get('row')])
+                if not rows:
+                    return None, f'ops[{pos}]: "row" must be an object'
+                entry['row'] = rows[0]
+            else:
+                index = op.get('index')
+                if not isinstance(index, int) or isinstance(index, bool) or index < 0:
+                    return None, f'ops[{pos}]: "index" must be a non-negative integer'
+                entry['index'] = index
+                if kind == 'set_row':
+                    rows = _sanitize_data_rows(category, [op.get('row')])
+                    if not rows:
+                        return None, f'ops[{pos}]: "row" must be an object'
+                    entry['row'] = rows[0]
+        planned.append(entry)
+    return planned, None
+
+
+def _data_patch_read_paths(planned: list[dict]) -> list[str]:
+    """Smallest subtrees of user_data that the operations read or replace."""
+    paths = []
+    for op in planned:
+        kind = op['op']
+        if kind == 'set_preferences':
+            # Whole map: the merged preferences are re-checked against _ORG_PREF_MAX_KEYS.
+            paths.append('org_preferences')
+        elif kind in ('set_site', 'remove_site'):
+            paths.append(f'sites.{op["site_id"]}')
+        elif kind == 'set_site_fields':
+            paths.extend(f'sites.{op["site_id"]}.{k}' for k in op['fields'])
+        else:
+            paths.append(f'sites.{op["site_id"]}.data.{op["category"]}')
+    return _collapse_paths(paths)
+
+
+def _data_patch_site_ids(planned: list[dict]) -> list[str]:
+    return sorted({op['site_id'] for op in planned if 'site_id' in op})
+
+
+def _data_patch_content_hashes(stored: dict, doc: dict, writes: dict) -> dict:
+    """
+    New content hashes for every site a patch wrote: {site_id: hashes, or None to drop them}.
+
+    Only the touched sections are re-hashed, on top of the site's stored hashes; a partially
+    patched site without stored hashes loses them (the audit diff then compares it in full).
+    """
+    touched: dict[str, set | None] = {}
+    for path in writes:
+        parts = path.split('.')
+        if parts[0] != 'sites':
+            continue
+        site_id = parts[1]
+        if len(parts) == 2:
+            touched[site_id] = None
+        elif site_id not in touched or touched[site_id] is not None:
+            category = parts[3] if len(parts) > 3 else None
+            touched.setdefault(site_id, set()).add(site_hash_section(parts[2], category))
+
+    sites = doc.get('sites') or {}
+    result: dict[str, dict | None] = {}
+    for site_id, sections in touched.items():
+        if site_id not in sites:
+            result[site_id] = None
+        elif sections is None:
+            result[site_id] = site_content_hashes(sites[site_id])
+        elif valid_site_hashes(stored.get(site_id)) and 'other' not in sections:
+            result[site_id] = site_content_hashes(sites[site_id], stored[site_id], sections)
+        else:
+            result[site_id] = None
+    return result
+
+
+def _data_patch_rollup_touched(writes: dict) -> dict:
+    """{site_id: data categories a patch wrote, or None for replaced/removed sites}."""
+    touched: dict[str, set | None] = {}
+    for path in writes:
+        parts = path.split('.')
+        if parts[0] != 'sites':
+            continue
+        if len(parts) == 2:
+            touched[parts[1]] = None
+        elif parts[2] == 'data' and len(parts) > 3 and touched.get(parts[1], set()) is not None:
+            touched.setdefault(parts[1], set()).add(parts[3])
+    return touched
+
+
+def _apply_data_patch(doc: dict, planned: list[dict]) -> tuple[dict | None, str | None]:
+    """
+    Apply operations in order to a partial user_data document (mutated in place).
+
+    Returns ({path: None | [pushed rows]}, error): None marks a subtree to $set/$unset from the
+    final document, a list marks rows that can be sent as a plain $push.
+    """
+    writes: dict[str, list | None] = {}
+    sites = doc.setdefault('sites', {})
+    prefs = doc.setdefault('org_preferences', {})
+
+    def mark(path: str, pushed: dict | None = None) -> None:
+        if pushed is None:
+            writes[path] = None
+        elif path not in writes or writes[path] is not None:
+            writes.setdefault(path, []).append(pushed)
+
+    for pos, op in enumerate(planned):
+        kind = op['op']
+        if kind == 'set_preferences':
+            for key, value in op['preferences'].items():
+                if value is None:
+                    prefs.pop(key, None)
+                else:
+                    prefs[key] = value
+                mark(f'org_preferences.{key}')
+            if len(prefs) > _ORG_PREF_MAX_KEYS:
+                return None, f'ops[{pos}]: org_preferences would exceed {_ORG_PREF_MAX_KEYS} keys'
+            clean = _sanitize_org_preferences(prefs)
+            for key in {*prefs, *clean}:
+                if prefs.get(key) != clean.get(key):
+                    mark(f'org_preferences.{key}')
+            prefs.clear()
+            prefs.update(clean)
+            continue
+        site_id = op['site_id']
+        site_path = f'sites.{site_id}'
+        if kind == 'set_site':
+            sites[site_id] = copy.deepcopy(op['site'])
+            mark(site_path)
+            continue
+        if kind == 'remove_site':
+            sites.pop(site_id, None)
+            mark(site_path)
+            continue
+        # Only set_site creates sites: a stale or mistyped site_id must not leave a partial one.
+        site = sites.get(site_id)
+        if site is None:
+            return None, f'ops[{pos}]: unknown site_id {site_id}'
+        if not isinstance(site, dict):
+            return None, f'ops[{pos}]: site is not an object'
+        if kind == 'set_site_fields':
+            for key, value in op['fields'].items():
+                site[key] = value
+                mark(f'{site_path}.{key}')
+            continue
+        data = site.setdefault('data', {})
+        category = op['category']
+        cat_path = f'{site_path}.data.{category}'
+        rows = data.get(category)
+        if kind == 'set_category':
+            data[category] = list(op['rows'])
+            mark(cat_path)
+        elif kind == 'push_row':
+            if not isinstance(rows, list):
+                rows = data[category] = []
+            rows.append(op['row'])
+            mark(cat_path, op['row'])
+        else:
+            index = op['index']
+            if not isinstance(rows, list) or index >= len(rows):
+                return None, f'ops[{pos}]: row index {index} out of range for {category}'
+            if kind == 'set_row':
+                rows[index] = op['row']
+                mark(f'{cat_path}.{index}')
+            else:
+                del rows[index]
+                mark(cat_path)
+    return writes, None
+
+
+def _externalize_patched_logo(prefs: dict, writes: dict) -> None:
+    """Move an accepted patch's inline companyLogo into the blob store (see _logo_preference_writes)."""
+    if 'org_preferences.companyLogo' not in writes or not prefs.get('companyLogo'):
+        return
+    for key, value in _logo_preference_writes(prefs['companyLogo']).items():
+        if value is None:
+            prefs.pop(key, None)
+        else:
+            prefs[key] = value
+        writes[f'org_preferences.{key}'] = None
+
+
+def _data_patch_update(doc: dict, writes: dict) -> dict:
+    """Translate touched paths into one non-conflicting Mongo update document."""
+    set_paths = [p for p, pushed in writes.items() if pushed is None]
+    pushes = {p: pushed for p, pushed in writes.items() if pushed is not None}
+    for path in list(pushes):
+        if any(_paths_overlap(path, other) for other in set_paths):
+            del pushes[path]
+            set_paths.append(path)
+    update: dict = {}
+    for path in _collapse_paths(set_paths):
+        found, value = _doc_path_get(doc, path)
+        if found:
+            update.setdefault('$set', {})[path] = value
+        else:
+            update.setdefault('$unset', {})[path] = ''
+    for path, rows in pushes.items():
+        update.setdefault('$push', {})[path] = {'$each': rows}
+    return update
+
+
+@app.route('/api/data', methods=['PATCH'])
+@jwt_required()
+def patch_user_data():
+    """
+    Apply site / category / row level operations without resending the whole document.
+
+    Body: {"ops": [{"op": "set_row", "site_id": "site-1", "category": "energy", "index": 0,
+    "row": {...}}, ...]}. Only the touched subtrees are read, diffed for the audit log and
+    written back with targeted $set / $unset / $push updates.
+    """
+    data_col = get_data_col()
+    if data_col is None:
+        return jsonify({"msg": "DB Error"}), 503
+
+    current_identity = get_jwt_identity()
+    users_col = get_users_col()
+    user = _find_user_by_login(users_col, current_identity) if users_col is not None else None
+    org_id = _resolve_request_organization_id(user) if user else None
+    if not org_id:
+        return jsonify({"msg": "Organization is not linked to this account."}), 400
+
+    payload = request.get_json(silent=True) or {}
+    planned, err = _plan_data_patch(payload.get('ops') if isinstance(payload, dict) else None)
+    if err:
+        return jsonify({"msg": err}), 400
+
+    projection = {path: 1 for path in _data_patch_read_paths(planned)}
+    projection.update({f'content_hashes.{site_id}': 1 for site_id in _data_patch_site_ids(planned)})
+    projection.update({'_id': 0, 'organization_id': 1})
+    existing = _load_user_data(data_col, org_id, projection) or {}
+    old_snapshot = {
+        'sites': existing.get('sites') if isinstance(existing.get('sites'), dict) else {},
+        'org_preferences': existing.get('org_preferences')
+        if isinstance(existing.get('org_preferences'), dict)
+        else {},
+    }
+    new_snapshot = copy.deepcopy(old_snapshot)
+    writes, err = _apply_data_patch(new_snapshot, planned)
+    if err:
+        return jsonify({"msg": err}), 400
+    _externalize_patched_logo(new_snapshot['org_preferences'], writes)
+    # Diff and hash the months as a lossy MONTHS_STORAGE format will read them back.
+    for site in new_snapshot['sites'].values():
+        round_site_months(site, MONTHS_STORAGE)
+
+    stored_hashes = existing.get('content_hashes') if isinstance(existing.get('content_hashes'), dict) else {}
+    new_hashes = _data_patch_content_hashes(stored_hashes, new_snapshot, writes)
+    old_snapshot['content_hashes'] = stored_hashes
+    new_snapshot['content_hashes'] = {**stored_hashes, **{k: v for k, v in new_hashes.items() if v is not None}}
+
+    update = _data_patch_update(new_snapshot, writes)
+    for site_id, hashes in new_hashes.items():
+        if hashes is None:
+            update.setdefault('$unset', {})[f'content_hashes.{site_id}'] = ''
+        else:
+            update.setdefault('$set', {})[f'content_hashes.{site_id}'] = hashes
+    update = pack_update(update, MONTHS_STORAGE)
+    now = utc_now()
+    if uses_site_documents(existing) or (not existing and USER_DATA_LAYOUT == LAYOUT_SITES):
+        sites_col = get_sites_col()
+        if sites_col is None:
+            return jsonify({"msg": "DB Error"}), 503
+        update, site_updates = split_site_update(update)
+        apply_site_updates(sites_col, org_id, site_updates, now=now)
+        update.setdefault('$set', {})[LAYOUT_FIELD] = LAYOUT_SITES
+    update.setdefault('$set', {}).update({
+        'email': (user.get('email') if user else None) or current_identity,
+        'organization_id': org_id,
+        'updated_at': now,
+    })
+    update['$inc'] = {'data_version': 1}
+    if not _write_user_data_header(data_col, org_id, existing, update):
+        return _user_data_layout_conflict()
+    _record_audit_diff(org_id, user, 'data_patch', old_snapshot, new_snapshot)
+    _queue_rollup_update(
+        org_id,
+        new_snapshot['sites'],
+        _data_patch_rollup_touched(writes),
+        rebuild=any(f'org_preferences.{key}' in writes for key in _ROLLUP_PREFERENCE_KEYS),
+    )
+    return jsonify({'msg': 'Data patched', 'operations': len(planned)}), 200
+
+
+_AUDIT_LOG_SORT = [('timestamp', -1), ('_id', -1)]
+_AUDIT_LOG_PAGE_MAX = 2000
+_AUDIT_LOG_EXPORT_BATCH = 500
+
+
+def _encode_audit_log_cursor(entry: dict) -> str:
+    """Opaque keyset cursor pointing just past `entry` in (timestamp, _id) descending order."""
+    ts = entry.get('timestamp')
+    entry_id = entry.get('_id')
+    position = [
+        ts.isoformat() if isinstance(ts, datetime.datetime) else None,
+        str(entry_id),
+        isinstance(entry_id, ObjectId),
+    ]
+    raw = json.dumps(position, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def _decode_audit_log_cursor(value: str):
+    """Inverse of _encode_audit_log_cursor -> (timestamp, _id), or None when malformed."""
+    try:
+        raw = base64.urlsafe_b64decode(value + '=' * (-len(value) % 4))
+        ts_iso, entry_id, is_oid = json.loads(raw.decode('utf-8'))
+        ts = datetime.datetime.fromisoformat(ts_iso) if ts_iso else None
+        if not isinstance(entry_id, str):
+            return None
+        if is_oid:
+            if not ObjectId.is_valid(entry_id):
+                return None
+            entry_id = ObjectId(entry_id)
+    except (ValueError, TypeError, binascii.Error, UnicodeDecodeError):
+        return None
+    return ts, entry_id
+
+
 @app.route('/api/organization/audit-log', methods=['GET'])
 @jwt_required()
 def organization_audit_log():
@@ -1914,28 +3228,56 @@ def organization_audit_log():
     if users_col is None or audit_col is None:
         return jsonify({'msg': 'DB Error'}), 503
 
-    current_identity = get_jwt_identity()
-    user = _find_user_by_login(users_col, current_identity) if current_identity else None
+    user = _request_user(users_col)
     org_id = _resolve_request_organization_id(user) if user else None
     if not org_id:
         return jsonify({'msg': 'Organization is not linked to this account.'}), 400
     if not _can_view_organization_audit_log(user, org_id):
         return jsonify({'msg': 'Only organization admin, platform admin, or consultant can view the audit log.'}), 403
 
+    fmt = (request.args.get('format') or 'json').strip().lower()
+    if fmt not in ('json', 'txt', 'ndjson'):
+        return jsonify({'msg': 'format must be json, txt or ndjson'}), 400
+    fields = (request.args.get('fields') or 'full').strip().lower()
+    if fields not in ('full', 'summary'):
+        return jsonify({'msg': 'fields must be full or summary'}), 400
+    # Summary mode leaves out the per-field change lists, which are most of each entry's size.
+    projection = {'changes': 0} if fields == 'summary' else None
+
+    query = {'organization_id': org_id}
+    raw_cursor = request.args.get('cursor')
+    if raw_cursor:
+        position = _decode_audit_log_cursor(raw_cursor)
+        if position is None:
+            return jsonify({'msg': 'Invalid cursor'}), 400
+        ts, entry_id = position
+        query['$or'] = [
+            {'timestamp': {'$lt': ts}},
+            {'timestamp': ts, '_id': {'$lt': entry_id}},
+        ]
+
+    raw_limit = request.args.get('limit')
     try:
-        limit = int(request.args.get('limit', 500))
+        limit = int(raw_limit) if raw_limit not in (None, '') else None
     except (TypeError, ValueError):
-        limit = 500
-    limit = max(1, min(limit, 2000))
+        limit = None
 
-    fmt = (request.args.get('format') or 'json').strip().lower()
-    cursor = audit_col.find({'organization_id': org_id}).sort('timestamp', -1).limit(limit)
-    entries = []
-    for doc in cursor:
-        doc['_id'] = str(doc['_id'])
-        entries.append(doc)
+    # (timestamp, _id) is unique and totally ordered, so pages never skip or repeat entries that
+    # share a timestamp.
+    find = lambda: audit_col.find(query, projection).sort(_AUDIT_LOG_SORT)  # noqa: E731
 
-    if fmt == 'txt':
+    if fmt in ('txt', 'ndjson'):
+        # Exports stream the whole (remaining) history unless a limit is given.
+        docs = find().batch_size(_AUDIT_LOG_EXPORT_BATCH)
+        if limit is not None:
+            docs = docs.limit(max(1, limit))
+        safe_id = re.sub(r'[^\w\-]+', '_', str(org_id))[:48]
+        if fmt == 'ndjson':
+            return Response(
+                iter_audit_log_ndjson(docs),
+                mimetype='application/x-ndjson; charset=utf-8',
+                headers={'Content-Disposition': f'attachment; filename="organization-audit-log-{safe_id}.ndjson"'},
+            )
         org_name = None
         orgs_col = get_orgs_col()
         if orgs_col is not None:
@@ -1944,20 +3286,45 @@ def organization_audit_log():
                 org_name = org_doc.get('name')
         if not org_name and user:
             org_name = user.get('organization_name')
-        body = format_audit_log_txt(org_id, org_name, entries)
-        safe_id = re.sub(r'[^\w\-]+', '_', str(org_id))[:48]
-        filename = f'organization-audit-log-{safe_id}.txt'
+        entry_count = audit_col.count_documents(query)
+        if limit is not None:
+            entry_count = min(entry_count, max(1, limit))
         return Response(
-            body,
+            iter_audit_log_txt(org_id, org_name, docs, entry_count=entry_count),
             mimetype='text/plain; charset=utf-8',
-            headers={'Content-Disposition': f'attachment; filename="{filename}"'},
+            headers={'Content-Disposition': f'attachment; filename="organization-audit-log-{safe_id}.txt"'},
         )
 
-    return jsonify({
+    page_size = max(1, min(limit if limit is not None else 500, _AUDIT_LOG_PAGE_MAX))
+    entries = list(find().limit(page_size + 1))
+    next_cursor = None
+    if len(entries) > page_size:
+        entries = entries[:page_size]
+        next_cursor = _encode_audit_log_cursor(entries[-1])
+    for doc in entries:
+        doc['_id'] = str(doc['_id'])
+
+    return _json_response({
         'organization_id': org_id,
         'count': len(entries),
         'entries': entries,
-    }), 200
+        'next_cursor': next_cursor,
+    }, len(entries)), 200
+
+
+def _factor_catalog_etag() -> str | None:
+    """Strong validator for GET /api/factors: catalog size and newest updated_at (None: unknown)."""
+    col = get_catalog_col()
+    if col is None:
+        version = _conversion_factors_version()
+    else:
+        try:
+            newest = col.find_one({}, {'_id': 0, 'updated_at': 1}, sort=[('updated_at', -1)])
+            version = ('catalog', col.estimated_document_count(), (newest or {}).get('updated_at'))
+        except Exception as e:
+            print(f'WARN: factor catalog ETag probe failed: {e}', file=sys.stderr)
+            return None
+    return strong_etag('factors', version) if version is not None else None
 
 
 @app.route('/api/factors', methods=['GET'])
@@ -1967,19 +3334,21 @@ def handle_factors():
     if get_catalog_col() is None and not _datasheet_json_fallback_enabled():
         return jsonify({"msg": "DB Error"}), 503
 
-    current_identity = get_jwt_identity()
-    users_col = get_users_col()
-    user = _find_user_by_login(users_col, current_identity) if users_col is not None else None
+    user = _request_user()
     org_id = _resolve_request_organization_id(user)
     if not org_id:
         return jsonify({"msg": "Organization is not linked to this account."}), 400
 
+    etag = _factor_catalog_etag()
+    if etag and if_none_match(request, etag):
+        return revalidated(app.response_class(status=304), etag)
     factors = list_catalog_factor_documents()
     if not factors:
         return jsonify({
             "msg": "No conversion factors in catalog. Run scripts/update_conversion_factors.py.",
         }), 503
-    return jsonify(factors), 200
+    response = _json_response(factors, len(factors))
+    return (revalidated(response, etag) if etag else response), 200
 
 
 @app.route('/api/factor-lookup', methods=['POST'])
@@ -2002,468 +3371,412 @@ def factor_lookup():
     }), 200
 
 
-@app.route('/api/chatbot/assist', methods=['POST'])
+@app.route('/api/factor-lookup/batch', methods=['POST'])
 @jwt_required()
-def chatbot_assist_endpoint():
+def factor_lookup_batch():
+    """Resolve an array of factor lookups in one request; factors and errors keep input order."""
     payload = request.get_json() or {}
-    message = payload.get('message') or ''
-    context = payload.get('context') or {}
-    reply = chatbot_assist(message, context)
-    return jsonify({'reply': reply, 'fallback': True}), 200
+    lookups = payload.get('lookups') if isinstance(payload, dict) else payload
+    if not isinstance(lookups, list):
+        return jsonify({'msg': 'Expected "lookups" array'}), 400
+    if len(lookups) > FACTOR_LOOKUP_BATCH_MAX:
+        return jsonify({'msg': f'Too many lookups (max {FACTOR_LOOKUP_BATCH_MAX})'}), 400
+    registry = get_conversion_factors_registry()
+    if not registry:
+        return jsonify({'msg': 'No conversion factors in catalog.'}), 503
+    results = lookup_conversion_factors_batch(lookups, registry)
+    return jsonify({
+        'count': len(results),
+        'errors': sum(1 for r in results if r.get('error')),
+        'results': results,
+    }), 200
 
-def _png_bytes_from_logo_data_url(data_url: str | None) -> bytes | None:
-    """Decode a data: URL to PNG bytes for word/media (accept PNG; rasterize JPEG/WebP via Pillow if installed)."""
-    if not data_url or not isinstance(data_url, str) or not data_url.startswith('data:image'):
-        return None
-    try:
-        _head, b64 = data_url.split(',', 1)
-        raw = base64.b64decode(b64)
-    except (ValueError, binascii.Error, TypeError):
-        return None
-    if raw.startswith(b'\x89PNG\r\n\x1a\n'):
-        return raw
-    if Image is None:
-        return None
-    try:
-        img = Image.open(io.BytesIO(raw))
-        if img.mode not in ('RGB', 'RGBA'):
-            img = img.convert('RGBA')
-        out = io.BytesIO()
-        img.save(out, format='PNG', compress_level=6)
-        return out.getvalue()
-    except Exception:
-        return None
 
+# Org preferences the rollup cells depend on; changing one rebuilds the organization.
+_ROLLUP_PREFERENCE_KEYS = ('carbonCalcCountry', *sorted(set(SOURCE_TOGGLE_PREFS.values())))
 
-def _docx_with_document_xml(template_bytes: bytes, document_xml_bytes: bytes, logo_png: bytes | None) -> bytes:
-    """Rebuild the .docx package with a new word/document.xml and optional first-page PNG swap."""
-    out_buf = io.BytesIO()
-    with zipfile.ZipFile(io.BytesIO(template_bytes), 'r') as zin:
-        with zipfile.ZipFile(out_buf, 'w', compression=zipfile.ZIP_DEFLATED) as zout:
-            for item in zin.infolist():
-                name = item.filename
-                if name == 'word/document.xml':
-                    zout.writestr(name, document_xml_bytes)
-                elif logo_png and name == _DOCX_CLIENT_LOGO_PART:
-                    zout.writestr(name, logo_png)
-                else:
-                    zout.writestr(name, zin.read(name))
-    return out_buf.getvalue()
+
+def _rollup_preferences_changed(old_prefs: dict, new_prefs: dict) -> bool:
+    return _emissions_country(old_prefs) != _emissions_country(new_prefs) or (
+        disabled_sources_from_prefs(old_prefs) != disabled_sources_from_prefs(new_prefs)
+    )
 
 
-def _wtag(name: str) -> str:
-    return f'{{{_W_NS}}}{name}'
+def _emission_rollups_enabled() -> bool:
+    return os.environ.get('EMISSION_ROLLUPS', 'true').strip().lower() not in ('0', 'false', 'no', 'off')
 
 
-def _resolve_final_report_template() -> Path:
-    if _CARBON_STATEMENT_TEMPLATE.is_file():
-        return _CARBON_STATEMENT_TEMPLATE
-    if _CARBON_STATEMENT_TEMPLATE_LEGACY.is_file():
-        return _CARBON_STATEMENT_TEMPLATE_LEGACY
-    if _SELBY_TEMPLATE.is_file():
-        return _SELBY_TEMPLATE
-    raise FileNotFoundError(
-        'No final report template found. Add requirements/Carbon emmission statement report template_v1.1.docx'
+def _rollup_resolver(org_id: str):
+    data_col = get_data_col()
+    registry = get_conversion_factors_registry()
+    if data_col is None or not registry:
+        return None
+    projection = {f'org_preferences.{key}': 1 for key in _ROLLUP_PREFERENCE_KEYS}
+    projection['_id'] = 0
+    header = data_col.find_one({'organization_id': org_id}, projection) or {}
+    prefs = header.get('org_preferences') if isinstance(header.get('org_preferences'), dict) else {}
+    return _make_row_emission_resolver(
+        _emissions_country(prefs), registry, disabled_sources=disabled_sources_from_prefs(prefs),
     )
 
 
-def _format_kg(value: float) -> str:
-    return f'{float(value):,.2f}'
+def _rollup_sites(org_id: str) -> dict:
+    data_col = get_data_col()
+    if data_col is None:
+        raise RuntimeError('user_data collection unavailable')
+    doc = _load_user_data(data_col, org_id, {'_id': 0, 'sites': 1}) or {}
+    return doc.get('sites') if isinstance(doc.get('sites'), dict) else {}
 
 
-def _format_scope_pct(part_kg: float, total_kg: float) -> str:
-    if total_kg <= 0:
-        return '0.0%'
-    return f'{(100.0 * float(part_kg) / float(total_kg)):.1f}%'
+_emission_rollups = RollupMaintainer(lambda: get_rollups_col(), _rollup_resolver, _rollup_sites, now=utc_now)
 
 
-def _element_has_yellow_highlight(el: ET.Element) -> bool:
-    for child in el.iter():
-        tag = child.tag.split('}')[-1] if '}' in child.tag else child.tag
-        if tag != 'highlight':
-            continue
-        val = child.attrib.get(_wtag('val')) or child.attrib.get('val')
-        if val == 'yellow':
-            return True
-    return False
+def _queue_rollup_update(org_id: str, sites: dict, touched: dict, *, rebuild: bool = False) -> None:
+    """Refresh the emission_rollups cells of `touched` ({site_id: categories | None}) after a write."""
+    if not _emission_rollups_enabled():
+        return
+    if rebuild:
+        _emission_rollups.rebuild(org_id)
+    else:
+        _emission_rollups.submit(org_id, sites, touched)
 
 
-def _set_cell_text(tc: ET.Element, text: str) -> None:
-    """Replace all text in a table cell with a single paragraph."""
-    text = str(text or '')
-    for child in list(tc):
-        tc.remove(child)
-    p = ET.SubElement(tc, _wtag('p'))
-    r = ET.SubElement(p, _wtag('r'))
-    t = ET.SubElement(r, _wtag('t'))
-    if text.startswith(' ') or text.endswith(' '):
-        t.set('{http://www.w3.org/XML/1998/namespace}space', 'preserve')
-    t.text = text
+def _changed_rollup_categories(old_hashes: dict, new_hashes: dict, old_sites, new_sites) -> dict:
+    """{site_id: data categories whose content hash changed, or None for added/removed sites}."""
+    touched: dict[str, set | None] = {}
+    for site_id in set(old_sites or {}) | set(new_sites or {}):
+        if site_id not in (old_sites or {}) or site_id not in (new_sites or {}):
+            touched[site_id] = None
+            continue
+        old_h, new_h = old_hashes.get(site_id), new_hashes.get(site_id)
+        if not valid_site_hashes(old_h) or not valid_site_hashes(new_h):
+            touched[site_id] = None
+        elif old_h['site'] != new_h['site']:
+            changed = {c for c in _ALLOWED_ROW_UNITS if old_h['data'].get(c) != new_h['data'].get(c)}
+            if changed:
+                touched[site_id] = changed
+    return touched
 
 
-def _cell_text(tc: ET.Element) -> str:
-    return ''.join((node.text or '') for node in tc.iter() if node.tag == _wtag('t')).strip()
+@app.route('/api/emissions/series', methods=['GET'])
+@jwt_required()
+def emissions_series():
+    """
+    Monthly kg CO2e chart series from the emission_rollups collection.
 
+    Query: group_by=category|scope|site (default category), optional site_id and year. Scopes the
+    organization has switched off are left out, as on the dashboard.
+    """
+    user = _request_user()
+    org_id = _resolve_request_organization_id(user) if user else None
+    if not org_id:
+        return jsonify({"msg": "Organization is not linked to this account."}), 400
+    data_col, rollups_col = get_data_col(), get_rollups_col()
+    if data_col is None or rollups_col is None:
+        return jsonify({"msg": "DB Error"}), 503
 
-def _yellow_highlight_text_nodes(root: ET.Element) -> list[ET.Element]:
-    """All w:t nodes inside yellow-highlighted paragraphs (document order)."""
-    nodes: list[ET.Element] = []
-    for el in root.iter():
-        if el.tag != _wtag('p'):
-            continue
-        if not _element_has_yellow_highlight(el):
-            continue
-        for t in el.iter():
-            if t.tag == _wtag('t'):
-                nodes.append(t)
-    return nodes
+    group_by = (request.args.get('group_by') or 'category').strip().lower()
+    site_id = request.args.get('site_id') or None
+    year = request.args.get('year')
+    if year not in (None, ''):
+        try:
+            year = int(year)
+        except (TypeError, ValueError):
+            return jsonify({"msg": "Invalid year"}), 400
+    else:
+        year = None
+    if site_id is not None and not _is_safe_mongo_key(site_id):
+        return jsonify({"msg": "Invalid site_id"}), 400
+
+    header = data_col.find_one(
+        {'organization_id': org_id},
+        {'_id': 0, **{f'org_preferences.{scope}Enabled': 1 for scope in SCOPES}},
+    ) or {}
+    prefs = header.get('org_preferences') or {}
+    disabled = [scope for scope, enabled in scopes_enabled_from_prefs(prefs).items() if not enabled]
+    try:
+        result = chart_series(
+            rollups_col, org_id, site_id=site_id, year=year, group_by=group_by, disabled_scopes=disabled,
+        )
+    except ValueError as e:
+        return jsonify({"msg": str(e)}), 400
+    result.update(organization_id=org_id, site_id=site_id, year=year)
+    return jsonify(result), 200
 
 
-def _performance_values_from_payload(payload: dict) -> dict[str, str]:
-    """Map yellow-field keys to display strings for the performance table."""
-    perf = payload.get('performance_rows') if isinstance(payload.get('performance_rows'), dict) else {}
-    totals_kg = payload.get('totals_kg') or {}
-    scope_kg = payload.get('scope_kg') or {}
+@app.route('/api/emissions/calculate', methods=['POST'])
+@jwt_required()
+def emissions_calculate():
+    """
+    Server-side kg CO2e for the organization's sites (per row, month, category and scope).
 
-    def row(key: str) -> dict:
-        raw = perf.get(key) if isinstance(perf.get(key), dict) else {}
-        return raw if isinstance(raw, dict) else {}
+    Body (all optional): sites / org_preferences to evaluate an unsaved payload instead of the
+    stored document, year to restrict rows to one reporting year, include_rows for row detail.
+    """
+    user = _request_user()
+    org_id = _resolve_request_organization_id(user) if user else None
+    if not org_id:
+        return jsonify({"msg": "Organization is not linked to this account."}), 400
 
-    def pick_num(key: str, field: str, fallback: float = 0.0) -> float:
-        raw = row(key).get(field, fallback)
+    payload = request.get_json(silent=True) or {}
+    if isinstance(payload.get('sites'), dict):
+        user_data = _sanitize_site_data_payload({
+            'sites': copy.deepcopy(payload['sites']),
+            'org_preferences': payload.get('org_preferences') or {},
+        })
+    else:
+        data_col = get_data_col()
+        if data_col is None:
+            return jsonify({"msg": "DB Error"}), 503
+        user_data = _load_user_data(data_col, org_id, {'_id': 0, 'sites': 1, 'org_preferences': 1}) or {}
+
+    year = payload.get('year')
+    if year not in (None, ''):
         try:
-            return float(raw)
+            year = int(year)
         except (TypeError, ValueError):
-            return float(fallback)
-
-    def pick_str(key: str, field: str, fallback: str = '') -> str:
-        val = row(key).get(field)
-        if val is None or val == '':
-            return fallback
-        return str(val)
-
-    natural_kg = pick_num('natural_gas', 'emissions_kg', scope_kg.get('scope1', 0) * 0.5)
-    electricity_kg = pick_num('electricity', 'emissions_kg', totals_kg.get('energy', 0) * 1000 * 0.5)
-    td_kg = pick_num('electricity_td', 'emissions_kg', 0)
-    water_kg = pick_num('water', 'emissions_kg', totals_kg.get('water', 0) * 1000 * 0.5)
-    wastewater_kg = pick_num('wastewater', 'emissions_kg', totals_kg.get('water', 0) * 1000 * 0.5)
-    waste_energy_kg = pick_num('waste_to_energy', 'emissions_kg', 0)
-    waste_recycling_kg = pick_num('waste_to_recycling', 'emissions_kg', totals_kg.get('waste', 0) * 1000 * 0.5)
+            return jsonify({"msg": "Invalid year"}), 400
+    else:
+        year = None
 
-    return {
-        'natural_gas_scope_kg': _format_kg(pick_num('natural_gas', 'scope_kg', natural_kg)),
-        'natural_gas_emissions_kg': _format_kg(natural_kg),
-        'electricity_usage': pick_str('electricity', 'usage', '0 kWh'),
-        'electricity_factor': pick_str('electricity', 'factor', ''),
-        'electricity_emissions_kg': _format_kg(electricity_kg),
-        'electricity_scope_kg': _format_kg(pick_num('electricity', 'scope_kg', electricity_kg)),
-        'td_usage': pick_str('electricity_td', 'usage', pick_str('electricity', 'usage', '0 kWh')),
-        'td_factor': pick_str('electricity_td', 'factor', ''),
-        'td_emissions_kg': _format_kg(td_kg),
-        'water_usage': pick_str('water', 'usage', '0 m3'),
-        'water_factor': pick_str('water', 'factor', ''),
-        'water_emissions_kg': _format_kg(water_kg),
-        'wastewater_usage': pick_str('wastewater', 'usage', pick_str('water', 'usage', '0 m3')),
-        'wastewater_factor': pick_str('wastewater', 'factor', ''),
-        'wastewater_emissions_kg': _format_kg(wastewater_kg),
-        'waste_to_energy_usage': pick_str('waste_to_energy', 'usage', '0 tonnes'),
-        'waste_to_energy_factor': pick_str('waste_to_energy', 'factor', ''),
-        'waste_to_energy_kg': _format_kg(waste_energy_kg),
-        'waste_to_recycling_usage': pick_str('waste_to_recycling', 'usage', '0 tonnes'),
-        'waste_to_recycling_factor': pick_str('waste_to_recycling', 'factor', ''),
-        'waste_to_recycling_kg': _format_kg(waste_recycling_kg),
-    }
+    registry = get_conversion_factors_registry()
+    if not registry:
+        return jsonify({"msg": "No conversion factors in catalog."}), 503
+    result = calculate_site_emissions(
+        user_data,
+        year=year,
+        include_rows=bool(payload.get('include_rows')),
+        registry=registry,
+    )
+    result['organization_id'] = org_id
+    return jsonify(result), 200
 
 
-def _fill_carbon_statement_tables(root: ET.Element, payload: dict, grand_total_kg: float) -> None:
-    """Fill report-detail and performance tables in the carbon statement template."""
-    tables = list(root.iter(_wtag('tbl')))
-    if not tables:
-        return
+def _request_org_logo_ref() -> str | None:
+    """companyLogoRef stored for the caller's organization (None when unset or unresolvable)."""
+    data_col = get_data_col()
+    if data_col is None:
+        return None
+    user = _request_user()
+    org_id = _resolve_request_organization_id(user) if user else None
+    if not org_id:
+        return None
+    doc = data_col.find_one({'organization_id': org_id}, {'org_preferences.companyLogoRef': 1, '_id': 0}) or {}
+    ref = (doc.get('org_preferences') or {}).get('companyLogoRef')
+    return ref if is_blob_ref(ref) else None
 
-    project_number = (payload.get('project_number') or '').strip()
-    reporting_period = (payload.get('reporting_period') or '').strip()
-    org_address = (payload.get('org_registered_address') or '').strip()
-    version = (payload.get('version') or '1.0').strip()
-    issue_date = (payload.get('issue_date') or '').strip()
-
-    if len(tables) > 0:
-        detail = tables[0]
-        rows = detail.findall(f'.//{_wtag("tr")}')
-        if len(rows) > 0 and len(rows[0].findall(_wtag('tc'))) > 1:
-            _set_cell_text(rows[0].findall(_wtag('tc'))[1], project_number)
-        if len(rows) > 1 and len(rows[1].findall(_wtag('tc'))) > 1:
-            _set_cell_text(rows[1].findall(_wtag('tc'))[1], reporting_period)
-        if len(rows) > 2 and len(rows[2].findall(_wtag('tc'))) > 1:
-            _set_cell_text(rows[2].findall(_wtag('tc'))[1], org_address)
-
-    if len(tables) > 1:
-        control = tables[1]
-        rows = control.findall(f'.//{_wtag("tr")}')
-        if rows:
-            cells = rows[0].findall(_wtag('tc'))
-            if len(cells) > 0:
-                _set_cell_text(cells[0], f'Version {version}' if version else '')
-            if len(cells) > 1:
-                _set_cell_text(cells[1], issue_date)
-
-    perf_values = _performance_values_from_payload(payload)
-    row_labels = {
-        'Natural gas used for company facilities': 'natural_gas',
-        'Electricity used for company facilities': 'electricity',
-        'Electricity (transmission and distribution)': 'electricity_td',
-        'Water use': 'water',
-        'Wastewater': 'wastewater',
-        'Waste (to energy)': 'waste_to_energy',
-        'Waste (to recycling)': 'waste_to_recycling',
-    }
 
-    perf_table = None
-    for tbl in tables:
-        text = ''.join((t.text or '') for t in tbl.iter() if t.tag == _wtag('t'))
-        if 'Carbon Emission Source' in text and 'Usage Data' in text:
-            perf_table = tbl
-            break
-    if perf_table is None and len(tables) > 3:
-        perf_table = tables[3]
-
-    if perf_table is not None:
-        perf_rows = payload.get('performance_rows') if isinstance(payload.get('performance_rows'), dict) else {}
-        for tr in perf_table.findall(f'.//{_wtag("tr")}'):
-            cells = tr.findall(_wtag('tc'))
-            if len(cells) < 5:
-                continue
-            label = _cell_text(cells[1] if len(cells) > 1 else cells[0])
-            if 'Total gross CO2' in label:
-                _set_cell_text(cells[-1], _format_kg(grand_total_kg))
-                continue
-            key = row_labels.get(label)
-            if not key:
-                continue
-            row_data = perf_rows.get(key) if isinstance(perf_rows.get(key), dict) else {}
-            usage = row_data.get('usage') or perf_values.get(
-                {'electricity_td': 'td_usage', 'waste_to_energy': 'waste_to_energy_usage',
-                 'waste_to_recycling': 'waste_to_recycling_usage'}.get(key, f'{key}_usage'),
-                '',
-            )
-            factor = row_data.get('factor') or perf_values.get(
-                {'electricity_td': 'td_factor', 'waste_to_energy': 'waste_to_energy_factor',
-                 'waste_to_recycling': 'waste_to_recycling_factor'}.get(key, f'{key}_factor'),
-                '',
-            )
-            emissions_key = {
-                'natural_gas': 'natural_gas_emissions_kg',
-                'electricity': 'electricity_emissions_kg',
-                'electricity_td': 'td_emissions_kg',
-                'water': 'water_emissions_kg',
-                'wastewater': 'wastewater_emissions_kg',
-                'waste_to_energy': 'waste_to_energy_kg',
-                'waste_to_recycling': 'waste_to_recycling_kg',
-            }.get(key, '')
-            emissions_raw = row_data.get('emissions_kg')
-            if emissions_raw is None:
-                emissions_disp = perf_values.get(emissions_key, '0')
-            else:
-                try:
-                    emissions_disp = _format_kg(float(emissions_raw))
-                except (TypeError, ValueError):
-                    emissions_disp = str(emissions_raw)
-            scope_raw = row_data.get('scope_kg')
-            if scope_raw is None:
-                scope_field = 'natural_gas_scope_kg' if key == 'natural_gas' else (
-                    'electricity_scope_kg' if key == 'electricity' else emissions_key
-                )
-                scope_disp = perf_values.get(scope_field, emissions_disp)
-            else:
-                try:
-                    scope_disp = _format_kg(float(scope_raw))
-                except (TypeError, ValueError):
-                    scope_disp = str(scope_raw)
-            if len(cells) > 2 and usage:
-                _set_cell_text(cells[2], str(usage))
-            if len(cells) > 3 and factor:
-                _set_cell_text(cells[3], str(factor))
-            if len(cells) > 4:
-                _set_cell_text(cells[4], emissions_disp)
-            if len(cells) > 5:
-                _set_cell_text(cells[5], scope_disp)
-
-
-def _apply_carbon_statement_text_replacements(xml_str: str, payload: dict, grand_total_kg: float) -> str:
-    scope_kg = payload.get('scope_kg') or {}
-    scope1 = float(scope_kg.get('scope1', 0))
-    scope2 = float(scope_kg.get('scope2', 0))
-    scope3 = float(scope_kg.get('scope3', 0))
-    total_scope = scope1 + scope2 + scope3
-    reporting_period = (payload.get('reporting_period') or '').strip()
-    reporting_year = str(payload.get('reporting_year') or '').strip()
-    baseline = (payload.get('assessment_base_year') or reporting_year or '').strip()
-    org_profile = (payload.get('organization_profile') or '').strip()
-
-    if reporting_period:
-        xml_str = xml_str.replace(_CARBON_STATEMENT_BASELINE_NEEDLE, escape(
-            f'This report is based on the data collected across the {reporting_period} reporting period.'
-        ))
-    if baseline:
-        xml_str = xml_str.replace('Baseline Year ', f'Baseline Year {escape(baseline)} ')
-    if reporting_year:
-        xml_str = xml_str.replace('Conversion Factor 2024', f'Conversion Factor {escape(reporting_year)}')
-
-    formatted_total = _format_kg(grand_total_kg)
-    xml_str = xml_str.replace('22,436.71', formatted_total)
-
-    xml_str = xml_str.replace('Scope 1: 76.9%', f'Scope 1: {_format_scope_pct(scope1, total_scope)}')
-    xml_str = xml_str.replace('Scope 2: 20.6%', f'Scope 2: {_format_scope_pct(scope2, total_scope)}')
-    xml_str = xml_str.replace('Scope 3: 2.4%', f'Scope 3: {_format_scope_pct(scope3, total_scope)}')
-
-    if org_profile and 'Performance' in xml_str:
-        needle = 'Performance'
-        xml_str = xml_str.replace(needle, escape(org_profile) + needle, 1)
-
-    return xml_str
-
-
-def _apply_yellow_field_map(root: ET.Element, values_by_key: dict[str, str]) -> None:
-    field_map = _load_yellow_numeric_field_map()
-    nodes = _yellow_highlight_text_nodes(root)
-    for idx, node in enumerate(nodes):
-        if idx >= len(field_map):
-            break
-        field_name = field_map[idx]
-        if not field_name:
-            continue
-        val = values_by_key.get(field_name)
-        if val is None or val == '':
-            continue
-        node.text = str(val)
-
-
-def _build_selby_final_report(template_bytes: bytes, payload: dict, logo_png: bytes | None) -> bytes:
-    organization_name = payload.get('organization_name') or payload.get('company_name') or 'Organization'
-    site_name = payload.get('site_name') or 'Site'
-    totals_kg = payload.get('totals_kg') or {}
-    scope_kg = payload.get('scope_kg') or {}
-    grand_total_kg = float(
-        payload.get(
-            'grand_total_kg',
-            sum(float(totals_kg.get(k, 0) or 0) for k in ('water', 'energy', 'waste', 'transport', 'refrigerants')),
-        )
-    )
-    issue_date = payload.get('issue_date') or datetime.datetime.now(datetime.timezone.utc).strftime('%d/%m/%Y')
-    reporting_period = (payload.get('reporting_period') or '').strip()
-
-    with zipfile.ZipFile(io.BytesIO(template_bytes), 'r') as zin:
-        xml_str = zin.read('word/document.xml').decode('utf-8', errors='ignore')
-
-    xml_str = xml_str.replace('Selby Trust', organization_name)
-    xml_str = xml_str.replace('Selby', site_name)
-    if reporting_period:
-        xml_str = xml_str.replace('2022/2023', reporting_period)
-    xml_str = _apply_docx_narrative_overrides(xml_str, payload)
-
-    numeric_pattern = re.compile(r'^[\d,]+(\.\d+)?$')
-    root = ET.fromstring(xml_str)
-    numeric_nodes: list[ET.Element] = []
-    for run in root.iter():
-        if run.tag.split('}')[-1] != 'r':
-            continue
-        if not _element_has_yellow_highlight(run):
-            continue
-        for t in list(run):
-            if t.tag.split('}')[-1] != 't':
-                continue
-            txt = (t.text or '').strip()
-            if txt and numeric_pattern.match(txt):
-                numeric_nodes.append(t)
-
-    values_by_key = {
-        'grand_total_kg': _format_kg(grand_total_kg),
-        'scope1_kg': _format_kg(scope_kg.get('scope1', 0)),
-        'scope2_kg': _format_kg(scope_kg.get('scope2', 0)),
-        'scope3_kg': _format_kg(scope_kg.get('scope3', 0)),
-        'water_kg': _format_kg(totals_kg.get('water', 0)),
-        'energy_kg': _format_kg(totals_kg.get('energy', 0)),
-        'waste_kg': _format_kg(totals_kg.get('waste', 0)),
-        'transport_kg': _format_kg(totals_kg.get('transport', 0)),
-        'refrigerants_kg': _format_kg(totals_kg.get('refrigerants', 0)),
-    }
-    numeric_field_map = _load_yellow_numeric_field_map()
-    for idx, node in enumerate(numeric_nodes):
-        if idx >= len(numeric_field_map):
-            break
-        field_name = numeric_field_map[idx]
-        if not field_name:
-            continue
-        if field_name == 'project_number':
-            pn = (payload.get('project_number') or '').strip()
-            if pn:
-                node.text = pn
-            continue
-        if field_name not in values_by_key:
-            continue
-        node.text = values_by_key[field_name]
+@app.route('/api/organization/logo', methods=['GET'])
+@jwt_required()
+def organization_logo():
+    """Company logo bytes for the caller's organization (content-addressed, so the ETag never changes)."""
+    ref = _request_org_logo_ref()
+    if not ref:
+        return jsonify({"msg": "No company logo"}), 404
+    etag = f'"{ref}"'
+    cache_headers = {'ETag': etag, 'Cache-Control': 'private, max-age=31536000, immutable'}
+    if etag in [t.strip() for t in (request.headers.get('If-None-Match') or '').split(',')]:
+        return Response(status=304, headers=cache_headers)
+    store = get_blob_store()
+    blob = store.get(ref) if store is not None else None
+    if blob is None:
+        return jsonify({"msg": "Company logo not found"}), 404
+    raw, content_type = blob
+    return Response(raw, mimetype=content_type, headers=cache_headers)
 
-    for t in root.iter():
-        if t.tag.split('}')[-1] != 't':
-            continue
-        if (t.text or '').strip() == '07/05/2023':
-            t.text = issue_date
-        if (t.text or '').strip() == 'Draft':
-            t.text = payload.get('status', 'Final')
-        if (t.text or '').strip() == 'Version 1.0':
-            t.text = f"Version {payload.get('version', '1.0')}"
-
-    body = ET.tostring(root, encoding='utf-8', method='xml')
-    doc_bytes = b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>' + body
-    return _docx_with_document_xml(template_bytes, doc_bytes, logo_png)
-
-
-def _build_carbon_statement_final_report(template_bytes: bytes, payload: dict, logo_png: bytes | None) -> bytes:
-    totals_kg = payload.get('totals_kg') or {}
-    grand_total_kg = float(
-        payload.get(
-            'grand_total_kg',
-            sum(float(totals_kg.get(k, 0) or 0) for k in (
-                'water', 'energy', 'waste', 'transport', 'refrigerants', 'transmissionDistribution'
-            )),
-        )
-    )
-    with zipfile.ZipFile(io.BytesIO(template_bytes), 'r') as zin:
-        xml_str = zin.read('word/document.xml').decode('utf-8', errors='ignore')
 
-    xml_str = _apply_carbon_statement_text_replacements(xml_str, payload, grand_total_kg)
-    root = ET.fromstring(xml_str)
-    _fill_carbon_statement_tables(root, payload, grand_total_kg)
-    _apply_yellow_field_map(root, _performance_values_from_payload(payload))
+@app.route('/api/chatbot/assist', methods=['POST'])
+@jwt_required()
+def chatbot_assist_endpoint():
+    payload = request.get_json() or {}
+    message = payload.get('message') or ''
+    context = payload.get('context') or {}
+    reply = chatbot_assist(message, context)
+    return jsonify({'reply': reply, 'fallback': True}), 200
+
+
+def _png_bytes_from_logo_ref(ref: str | None) -> bytes | None:
+    """PNG bytes for a companyLogoRef blob (same conversion cache as data URLs)."""
+    if not is_blob_ref(ref):
+        return None
+
+    def load_raw():
+        store = get_blob_store()
+        blob = store.get(ref) if store is not None else None
+        return blob[0] if blob else None
 
-    body = ET.tostring(root, encoding='utf-8', method='xml')
-    doc_bytes = b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>' + body
-    return _docx_with_document_xml(template_bytes, doc_bytes, logo_png)
+    return cached_logo_png(('blob', ref), load_raw)
+
+
+def iter_final_report_docx(
+    payload: dict,
+    logo_ref: str | None = None,
+    *,
+    logo_png: bytes | None = None,
+) -> tuple[Iterator[bytes], str]:
+    """
+    final_report.iter_final_report_docx() with the logo taken from `logo_png`, else the payload's
+    data URL, else the `logo_ref` blob.
+    """
+    if logo_png is None:
+        logo_png = png_bytes_from_payload_logo(payload) or _png_bytes_from_logo_ref(logo_ref)
+    return _render_final_report_docx(payload, logo_png=logo_png)
 
 
-def build_final_report_docx_bytes(payload: dict) -> tuple[bytes, str]:
+def build_final_report_docx_bytes(payload: dict, logo_ref: str | None = None) -> tuple[bytes, str]:
     """
     Build the final report .docx from the carbon statement template (preferred) or legacy Selby template.
 
+    `logo_ref` is an already-authorized companyLogoRef, used when the payload carries no logo data URL.
     Returns (file_bytes, suggested_filename). Raises FileNotFoundError if no template is present.
     """
-    organization_name = payload.get('organization_name') or payload.get('company_name') or 'Organization'
-    template_path = _resolve_final_report_template()
-    template_bytes = template_path.read_bytes()
-    logo_png = _png_bytes_from_logo_data_url(
-        payload.get('company_logo_data_url') or payload.get('logo_data_url')
-    )
+    chunks, file_name = iter_final_report_docx(payload, logo_ref=logo_ref)
+    return b''.join(chunks), file_name
 
-    if 'carbon em' in template_path.name.lower() and 'statement' in template_path.name.lower():
-        out_bytes = _build_carbon_statement_final_report(template_bytes, payload, logo_png)
-    else:
-        out_bytes = _build_selby_final_report(template_bytes, payload, logo_png)
 
-    safe_name = re.sub(r'[^\w\-]+', '_', organization_name).strip('_') or 'Organization'
-    file_name = (
-        f'Final_Report_{safe_name}_{datetime.datetime.now(datetime.timezone.utc).strftime("%Y-%m-%d")}.docx'
-    )
-    return out_bytes, file_name
+# Mirrors js/export.js collectFinalReportPerformanceRows() slot selection.
+_PERFORMANCE_ROW_KEYS = (
+    'natural_gas', 'electricity', 'electricity_td', 'water', 'wastewater', 'waste_to_energy', 'waste_to_recycling',
+)
+_USAGE_UNIT_LABELS = {
+    'kwh': 'kWh', 'mwh': 'MWh', 'm3': 'm3', 'million_litres': 'million litres', 'tonnes': 'tonnes', 'kg': 'kg',
+    'km': 'km',
+}
+_FACTOR_UNIT_LABELS = {'kwh': 'kWh', 'mwh': 'MWh', 'm3': 'm3', 'million_litres': 'm3', 'tonnes': 'tonne', 'kg': 'kg'}
+
+
+def _performance_row_key(category: str, emission_key: str) -> str:
+    if emission_key == 'naturalGas':
+        return 'natural_gas'
+    if emission_key == 'electricity':
+        return 'electricity'
+    if emission_key in ('electricity_transmission_distribution', 'td_district_heat_steam') or (
+        category == 'transmissionDistribution'
+    ):
+        return 'electricity_td'
+    if emission_key == 'water' or (category == 'water' and emission_key != 'wastewater'):
+        return 'water'
+    if emission_key == 'wastewater':
+        return 'wastewater'
+    if emission_key == 'waste_to_energy':
+        return 'waste_to_energy'
+    if category == 'waste' or emission_key in (
+        'waste_to_recycling', 'waste_landfill', 'waste_to_composting', 'wasteRecycled'
+    ):
+        return 'waste_to_recycling'
+    return 'electricity'
+
+
+def _format_report_number(value: float) -> str:
+    text = repr(float(value))
+    return text[:-2] if text.endswith('.0') else text
+
+
+def _format_usage_quantity(total: float, unit: str) -> str:
+    if not total or total <= 0:
+        return ''
+    label = _USAGE_UNIT_LABELS.get(unit) or unit or ''
+    display = f'{total:,.2f}'.rstrip('0').rstrip('.') if total >= 1000 else f'{total:.2f}'
+    return f'{display} {label}' if label else display
+
+
+def _format_factor_display(factor: float, unit: str) -> str:
+    if not factor or factor <= 0:
+        return ''
+    label = _FACTOR_UNIT_LABELS.get(unit) or unit or ''
+    text = _format_report_number(factor)
+    return f'{text} kg CO2e / {label}' if label else f'{text} kg CO2e'
+
+
+def _report_issue_date(raw) -> str:
+    parts = str(raw or '').split('-')
+    if len(parts) == 3 and all(p.isdigit() for p in parts):
+        return f'{int(parts[2]):02d}/{int(parts[1]):02d}/{parts[0]}'
+    return datetime.datetime.now(datetime.timezone.utc).strftime('%d/%m/%Y')
+
+
+def build_final_report_payload(
+    user_data: dict,
+    *,
+    organization_name: str,
+    site_id: str | None = None,
+    year: int | None = None,
+    registry: dict | None = None,
+) -> dict:
+    """
+    Server-side equivalent of the dashboard's final-report payload for one organization, or one of
+    its sites, computed from stored data with the emissions engine.
+    """
+    prefs = user_data.get('org_preferences') if isinstance(user_data.get('org_preferences'), dict) else {}
+    sites = user_data.get('sites') if isinstance(user_data.get('sites'), dict) else {}
+    if site_id is not None and site_id not in sites:
+        raise ValueError(f'Site {site_id} not found')
+    if year is None:
+        try:
+            year = int(prefs.get('carbonCalcReportingYear'))
+        except (TypeError, ValueError):
+            year = None
+    scoped = {'sites': {site_id: sites[site_id]} if site_id is not None else sites, 'org_preferences': prefs}
+    result = calculate_site_emissions(scoped, year=year, include_rows=True, registry=registry)
+    summary = result['organization']
+
+    perf: dict[str, dict] = {
+        key: {'usage': '', 'factor': '', 'emissions_kg': 0.0, 'scope_kg': 0.0, '_usage': 0.0}
+        for key in _PERFORMANCE_ROW_KEYS
+    }
+    for sid, site_summary in result['sites'].items():
+        site_data = (scoped['sites'].get(sid) or {}).get('data') or {}
+        for detail in site_summary.get('row_details', []):
+            rows = site_data.get(detail['category']) or []
+            row = rows[detail['index']] if detail['index'] < len(rows) else {}
+            usage = sum(v for v in (row.get('months') or []) if isinstance(v, (int, float)))
+            if detail['total_kg'] <= 0 and usage <= 0:
+                continue
+            unit = detail.get('unit') or ''
+            slot = perf[_performance_row_key(detail['category'], detail.get('emissionType') or '')]
+            if usage > 0:
+                slot['_usage'] += usage
+                slot['usage'] = _format_usage_quantity(slot['_usage'], unit)
+            if detail['kg_per_unit'] > 0 and not slot['factor']:
+                slot['factor'] = _format_factor_display(detail['kg_per_unit'], unit)
+            slot['emissions_kg'] += detail['total_kg']
+            slot['scope_kg'] += detail['total_kg']
+    for slot in perf.values():
+        slot.pop('_usage')
+
+    site_name = (sites.get(site_id) or {}).get('name') if site_id is not None else None
+    payload = {
+        'organization_name': prefs.get('companyName') or organization_name or 'Organization',
+        'site_name': site_name or ('Site' if site_id is not None else 'All sites'),
+        'issue_date': _report_issue_date(prefs.get('issueDate')),
+        'status': prefs.get('reportStatus') or 'Final',
+        'version': (prefs.get('reportVersion') or '').strip() or '1.0',
+        'reporting_period': (prefs.get('reportingPeriod') or '').strip(),
+        'project_number': (prefs.get('projectNumber') or '').strip(),
+        'totals_kg': {cat: summary['totals_kg'].get(cat, 0.0) for cat in (
+            'water', 'energy', 'transmissionDistribution', 'waste', 'transport', 'refrigerants'
+        )},
+        'scope_kg': dict(summary['scope_kg']),
+        'grand_total_kg': summary['total_kg'],
+        'reporting_year': year or '',
+        'performance_rows': perf,
+    }
+    optional = {
+        'organization_profile': 'organizationProfile',
+        'org_registered_address': 'orgRegisteredAddress',
+        'scope_streams_summary': 'scopeStreamsSummary',
+        'assessment_period_detail': 'assessmentPeriodDetail',
+        'assessment_general_notes': 'assessmentGeneralNotes',
+        'assessment_extra_note1': 'assessmentExtraNote1',
+        'assessment_extra_note2': 'assessmentExtraNote2',
+        'buildings_assessed_count': 'buildingsAssessedCount',
+        'assessment_base_year': 'assessmentBaseYear',
+    }
+    for key, pref_key in optional.items():
+        val = str(prefs.get(pref_key) or '').strip()
+        if val:
+            payload[key] = val
+    return payload
 
 
 def _require_platform_admin(users_col):
@@ -2508,7 +3821,12 @@ def _append_consultant_workbench(users_col, user: dict, org_id: str, org_name: s
         'role': 'consultant',
         'username': user.get('username'),
     }
-    users_col.update_one({'_id': user['_id']}, {'$push': {'memberships': entry}})
+    users_col.update_one(
+        {'_id': user['_id']},
+        {'$push': {'memberships': entry}, '$inc': {'membership_version': 1}},
+    )
+    _invalidate_user_cache(user)
+    _note_membership_version(user, changed=True)
     return True
 
 
@@ -2553,6 +3871,7 @@ def ensure_default_platform_admin():
                 'is_consultant': False,
             }},
         )
+        _invalidate_user_cache(existing)
     else:
         doc['created_at'] = utc_now()
         doc['email_verified'] = True
@@ -2612,17 +3931,44 @@ def admin_delete_organization(org_id: str):
     if not oid:
         return jsonify({"msg": "Organization not found"}), 404
 
+    affected = users_col.find(
+        {'$or': [{'organization_id': oid}, {'memberships.organization_id': oid}]},
+        {'email': 1, 'username': 1, 'membership_version': 1},
+    )
+    for affected_user in affected:
+        _note_membership_version(affected_user, changed=True)
     if data_col is not None:
         data_col.delete_many({'organization_id': oid})
+        for derived_col in (get_sites_col(), get_rollups_col()):
+            if derived_col is not None:
+                derived_col.delete_many({'organization_id': oid})
     users_col.delete_many({'organization_id': oid})
     users_col.update_many(
-        {},
-        {'$pull': {'memberships': {'organization_id': oid}}},
+        {'memberships.organization_id': oid},
+        {'$pull': {'memberships': {'organization_id': oid}}, '$inc': {'membership_version': 1}},
     )
+    _invalidate_user_cache()
     orgs_col.delete_one({'_id': org_doc['_id']})
     return jsonify({"msg": "Organization removed"}), 200
 
 
+@app.route('/api/admin/factors/reload', methods=['POST'])
+@jwt_required()
+def admin_reload_factors():
+    """Drop the in-process factor registry cache and reload it from conversion_factor_catalog."""
+    users_col = get_users_col()
+    if users_col is None:
+        return jsonify({"msg": "Database connection error"}), 503
+    _admin, err = _require_platform_admin(users_col)
+    if err:
+        return err
+    invalidate_conversion_factors_cache()
+    registry = get_conversion_factors_registry(force_reload=True)
+    if not registry:
+        return jsonify({"msg": "No conversion factors in catalog."}), 503
+    return jsonify({"msg": "Conversion factors reloaded", "documents": len(registry)}), 200
+
+
 @app.route('/api/admin/consultants', methods=['GET', 'POST'])
 @jwt_required()
 def admin_consultants():
@@ -2685,6 +4031,7 @@ def admin_consultants():
         'created_at': utc_now(),
         'email_verified': True,
     })
+    _invalidate_user_cache()
     return jsonify({
         'msg': 'Consultant created successfully',
         'consultant': {
@@ -2709,6 +4056,8 @@ def admin_delete_consultant(username: str):
     if not target or not target.get('is_consultant'):
         return jsonify({"msg": "Consultant not found"}), 404
     users_col.delete_one({'_id': target['_id']})
+    _invalidate_user_cache(target)
+    _note_membership_version(target, changed=True)
     return jsonify({"msg": "Consultant removed"}), 200
 
 
@@ -2768,8 +4117,10 @@ def consultant_remove_workbench(org_id: str):
     oid = str(org_id).strip()
     users_col.update_one(
         {'_id': consultant['_id']},
-        {'$pull': {'memberships': {'organization_id': oid}}},
+        {'$pull': {'memberships': {'organization_id': oid}}, '$inc': {'membership_version': 1}},
     )
+    _invalidate_user_cache(consultant)
+    _note_membership_version(consultant, changed=True)
     refreshed = users_col.find_one({'_id': consultant['_id']})
     return jsonify({
         'msg': 'Organization removed from workbench',
@@ -2789,17 +4140,176 @@ def generate_final_report_docx():
     - Optional logo: PNG bytes or raster types converted via Pillow to PNG for `word/media/image1.png`.
     """
     payload = request.get_json() or {}
+    logo_ref = None
+    if payload.get('company_logo_ref') and not (
+        payload.get('company_logo_data_url') or payload.get('logo_data_url')
+    ):
+        stored_ref = _request_org_logo_ref()
+        if stored_ref == payload.get('company_logo_ref'):
+            logo_ref = stored_ref
     try:
-        out_bytes, file_name = build_final_report_docx_bytes(payload)
+        chunks, file_name = iter_final_report_docx(payload, logo_ref=logo_ref)
     except FileNotFoundError as e:
         return jsonify({"msg": f"Template not found: {e}"}), 500
     return Response(
-        out_bytes,
+        chunks,
         mimetype='application/vnd.openxmlformats-officedocument.wordprocessingml.document',
         headers={'Content-Disposition': f'attachment; filename=\"{file_name}\"'}
     )
 
 
+REPORT_JOB_MAX_ITEMS = 200
+
+# Rendering is CPU-bound: by default leave at least one core for the web worker.
+_report_jobs = ReportJobManager(
+    max_workers=int(os.environ.get('REPORT_JOB_WORKERS') or max(1, min(2, (os.cpu_count() or 2) - 1))),
+    max_active_jobs=int(os.environ.get('REPORT_JOB_MAX_ACTIVE') or 2),
+    ttl_seconds=float(os.environ.get('REPORT_JOB_TTL_SECONDS') or 3600),
+)
+
+
+def _can_generate_org_report(user: dict | None, org_id: str) -> bool:
+    if not user:
+        return False
+    if user.get('is_platform_admin'):
+        return True
+    return any(m.get('organization_id') == org_id for m in _user_memberships(user))
+
+
+def _plan_bulk_report_items(body: dict, user: dict) -> tuple[list[dict] | None, tuple[str, int] | None]:
+    """Expand {"organizations": [{"organization_id", "site_ids"?}], "organization_ids": [...]} into job items."""
+    requested = []
+    for oid in body.get('organization_ids') or []:
+        requested.append({'organization_id': oid})
+    for entry in body.get('organizations') or []:
+        if not isinstance(entry, dict):
+            return None, ('"organizations" entries must be objects', 400)
+        requested.append(entry)
+    if not requested:
+        return None, ('organization_ids or organizations is required', 400)
+
+    items, seen = [], set()
+    for entry in requested:
+        oid = entry.get('organization_id')
+        if not isinstance(oid, str) or not oid.strip():
+            return None, ('Invalid organization_id', 400)
+        oid = oid.strip()
+        if not _can_generate_org_report(user, oid):
+            return None, (f'No access to organization {oid}', 403)
+        site_ids = entry.get('site_ids')
+        if site_ids is not None and (
+            not isinstance(site_ids, list) or not all(isinstance(sid, str) and sid for sid in site_ids)
+        ):
+            return None, ('"site_ids" must be a list of site ids', 400)
+        for site_id in site_ids or [None]:
+            key = (oid, site_id)
+            if key in seen:
+                continue
+            seen.add(key)
+            items.append({'organization_id': oid, 'site_id': site_id})
+    if len(items) > REPORT_JOB_MAX_ITEMS:
+        return None, (f'Too many reports in one job (max {REPORT_JOB_MAX_ITEMS})', 400)
+    return items, None
+
+
+@app.route('/api/reports/final/bulk', methods=['POST'])
+@jwt_required()
+def start_bulk_final_reports():
+    """
+    Queue final reports for many organizations (one per org, or one per listed site).
+
+    Payloads are computed server-side from stored data; poll the returned status_url and fetch
+    the zip from download_url once status is "done".
+    """
+    users_col = get_users_col()
+    data_col = get_data_col()
+    orgs_col = get_orgs_col()
+    if users_col is None or data_col is None:
+        return jsonify({"msg": "Database connection error"}), 503
+    identity = get_jwt_identity()
+    user = _find_user_by_login(users_col, identity)
+    if not user:
+        return jsonify({"msg": "Invalid auth user"}), 401
+
+    body = request.get_json(silent=True) or {}
+    items, err = _plan_bulk_report_items(body if isinstance(body, dict) else {}, user)
+    if err:
+        return jsonify({"msg": err[0]}), err[1]
+    year = body.get('year')
+    if year not in (None, ''):
+        try:
+            year = int(year)
+        except (TypeError, ValueError):
+            return jsonify({"msg": "Invalid year"}), 400
+    else:
+        year = None
+    try:
+        resolve_final_report_template()
+    except FileNotFoundError as e:
+        return jsonify({"msg": f"Template not found: {e}"}), 500
+    registry = get_conversion_factors_registry()
+    if not registry:
+        return jsonify({"msg": "No conversion factors in catalog."}), 503
+
+    org_docs: dict[str, tuple[dict | None, str]] = {}
+
+    def build_item(item: dict) -> tuple[dict, bytes | None]:
+        oid = item['organization_id']
+        if oid not in org_docs:
+            doc = _load_user_data(data_col, oid, {'_id': 0, 'sites': 1, 'org_preferences': 1})
+            org_doc = _find_org_by_id(orgs_col, oid) if orgs_col is not None else None
+            org_docs.clear()  # items arrive grouped by organization
+            org_docs[oid] = (doc, (org_doc or {}).get('name') or '')
+        doc, org_name = org_docs[oid]
+        if not doc:
+            raise ValueError('No saved data for this organization')
+        payload = build_final_report_payload(
+            doc, organization_name=org_name, site_id=item['site_id'], year=year, registry=registry,
+        )
+        prefs = doc.get('org_preferences') or {}
+        logo_png = _png_bytes_from_logo_ref(prefs.get('companyLogoRef')) or png_bytes_from_logo_data_url(
+            prefs.get('companyLogo')
+        )
+        return payload, logo_png
+
+    job = _report_jobs.submit(identity, items, build_item)
+    if job is None:
+        return jsonify({"msg": "Too many report jobs are running; try again shortly."}), 429
+    return jsonify({
+        **job.to_api(),
+        'status_url': f'/api/reports/final/bulk/{job.id}',
+        'download_url': f'/api/reports/final/bulk/{job.id}/download',
+    }), 202
+
+
+@app.route('/api/reports/final/bulk/<job_id>', methods=['GET'])
+@jwt_required()
+def bulk_final_reports_status(job_id: str):
+    job = _report_jobs.get(job_id, get_jwt_identity())
+    if job is None:
+        return jsonify({"msg": "Report job not found"}), 404
+    return jsonify(job.to_api()), 200
+
+
+@app.route('/api/reports/final/bulk/<job_id>/download', methods=['GET'])
+@jwt_required()
+def bulk_final_reports_download(job_id: str):
+    job = _report_jobs.get(job_id, get_jwt_identity())
+    if job is None:
+        return jsonify({"msg": "Report job not found"}), 404
+    state = job.to_api()
+    if state['status'] != 'done':
+        return jsonify({"msg": "Report job is still running", **state}), 409
+    if not job.zip_path:
+        return jsonify({"msg": "No reports were generated", **state}), 404
+    return send_file(
+        job.zip_path,
+        mimetype='application/zip',
+        as_attachment=True,
+        download_name=f'final_reports_{job.id[:8]}.zip',
+    )
+
+
 print(f'INFO: email config: {_email_config_status()}', file=sys.stderr)
 
 try:
@@ -2808,6 +4318,58 @@ except Exception as _seed_exc:
     print(f'WARN: could not seed platform admin: {_seed_exc}', file=sys.stderr)
 
 
+def ensure_mongo_indexes():
+    """Create any missing indexes from db_indexes.REQUIRED_INDEXES (set MONGO_ENSURE_INDEXES=0 to skip)."""
+    if os.environ.get('MONGO_ENSURE_INDEXES', '1').lower() in ('0', 'false', 'no'):
+        return
+    db = get_db()
+    if db is None:
+        return
+    rows = ensure_indexes(db)
+    created = [f"{r['collection']}.{r['index']}" for r in rows if r['status'] == 'created']
+    if created:
+        print(f'INFO: created MongoDB indexes: {", ".join(created)}', file=sys.stderr)
+    for row in index_problems(rows):
+        print(
+            f"WARN: MongoDB index {row['collection']}.{row['index']} {row['status']}: {row.get('detail', '')}",
+            file=sys.stderr,
+        )
+
+
+_background_services_started = False
+_background_services_lock = threading.Lock()
+
+
+def start_background_services() -> None:
+    """
+    Start the work only the web server should do, once per process: index provisioning, audit
+    spool replay and the email outbox workers. It runs on the first request rather than at import,
+    so scripts and report workers that import this module never claim mail or replay the spool.
+    """
+    global _background_services_started
+    with _background_services_lock:
+        if _background_services_started:
+            return
+        _background_services_started = True
+
+    # Off the request path: building an index on a large collection must not hold up a request.
+    threading.Thread(target=ensure_mongo_indexes, name='mongo-indexes', daemon=True).start()
+
+    # Replay audit entries spooled by a previous process that could not reach MongoDB.
+    if _mongodb_audit_logging_enabled():
+        _audit_writer.start()
+
+    # Deliver queued mail, including messages left pending by a previous process.
+    if _email_outbox_enabled() and _email_delivery_ready():
+        _email_outbox.start()
+
+
+@app.before_request
+def _start_background_services_once():
+    if not _background_services_started:
+        start_background_services()
+
+
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 5000))
     app.run(debug=False, host='0.0.0.0', port=port)
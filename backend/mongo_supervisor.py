@@ -0,0 +1,143 @@
+"""
+MongoDB connection supervisor: one shared database handle behind a circuit breaker, with a
+background reconnect loop and a cached health state.
+
+While the circuit is closed, get_db() hands out the connected database. It opens when the first
+connect fails, when a background ping fails, or when a request hits a connection error
+(report_failure). While it is open, get_db() returns None at once, so routes answer 503 instead
+of each waiting out server selection. Meanwhile the supervisor thread retries with exponential
+backoff and closes the circuit on the first successful ping. A healthy connection is pinged
+every `ping_interval` seconds.
+
+status() reports the last result without any network I/O, so liveness and readiness probes cost
+nothing to poll.
+"""
+from __future__ import annotations
+
+import sys
+import threading
+import time
+from typing import Any, Callable
+
+UNKNOWN = 'unknown'
+CLOSED = 'closed'
+OPEN = 'open'
+
+
+class MongoSupervisor:
+    """
+    `connect()` returns a database handle (raising when it cannot be created) and `ping(db)`
+    raises when the server does not answer; both should bound their own wait.
+    """
+
+    def __init__(
+        self,
+        connect: Callable[[], Any],
+        ping: Callable[[Any], None],
+        *,
+        ping_interval: float = 10.0,
+        backoff_min: float = 1.0,
+        backoff_max: float = 30.0,
+        now: Callable[[], object] = lambda: None,
+    ):
+        self._connect = connect
+        self._ping = ping
+        self._ping_interval = ping_interval
+        self._backoff_min = backoff_min
+        self._backoff_max = backoff_max
+        self._now = now
+        self._db = None
+        self._state = UNKNOWN
+        self._failures = 0
+        self._last_ping_at = None
+        self._latency_ms: float | None = None
+        self._last_error: str | None = None
+        self._changed_at = None
+        self._connect_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._start_lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        return self._state
+
+    def get_db(self):
+        """The database while the circuit is closed; None (immediately, once open) otherwise."""
+        if self._state == CLOSED:
+            return self._db
+        if self._state == UNKNOWN:
+            # First use: connect in the caller, as before; concurrent callers wait for that attempt.
+            with self._connect_lock:
+                if self._state == UNKNOWN:
+                    self._attempt()
+            self.start()
+        return self._db if self._state == CLOSED else None
+
+    def report_failure(self, exc: BaseException) -> None:
+        """A request saw a connection error: fail fast until the supervisor thread reconnects."""
+        if self._state != OPEN:
+            self._open(exc)
+        self.start()
+
+    def status(self) -> dict[str, Any]:
+        """Cached health state; never touches the network."""
+        return {
+            'state': self._state,
+            'connected': self._state == CLOSED,
+            'last_ping_at': self._last_ping_at,
+            'latency_ms': self._latency_ms,
+            'consecutive_failures': self._failures,
+            'last_error': self._last_error,
+            'since': self._changed_at,
+        }
+
+    def start(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._start_lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name='mongo-supervisor', daemon=True)
+            self._thread.start()
+
+    def _attempt(self) -> bool:
+        started = time.monotonic()
+        try:
+            db = self._db if self._db is not None else self._connect()
+            self._db = db
+            self._ping(db)
+        except Exception as e:
+            self._open(e)
+            return False
+        self._latency_ms = round((time.monotonic() - started) * 1000, 1)
+        self._last_ping_at = self._now()
+        self._failures = 0
+        self._last_error = None
+        if self._state != CLOSED:
+            if self._state == OPEN:
+                print('INFO: MongoDB reachable again; circuit closed', file=sys.stderr)
+            self._state = CLOSED
+            self._changed_at = self._now()
+        return True
+
+    def _open(self, exc: BaseException) -> None:
+        self._failures += 1
+        self._last_error = f'{type(exc).__name__}: {exc}'
+        if self._state != OPEN:
+            print(f'ERROR: Could not connect to MongoDB (failing fast until it answers): {exc}', file=sys.stderr)
+            self._state = OPEN
+            self._changed_at = self._now()
+
+    def _run(self) -> None:
+        backoff = self._backoff_min
+        while True:
+            if self._state == CLOSED:
+                backoff = self._backoff_min
+                self._wake.wait(self._ping_interval)
+            else:
+                self._wake.wait(backoff)
+                backoff = min(backoff * 2, self._backoff_max)
+            self._wake.clear()
+            with self._connect_lock:
+                self._attempt()
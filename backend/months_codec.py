@@ -0,0 +1,245 @@
+"""
+Packed storage for the twelve-value `months` arrays of data rows.
+
+Stored as a BSON array, twelve doubles cost about 140 bytes, because each element carries a type
+tag and an index key. With the f64 format a row stores `months` as a 96-byte little-endian float64
+Binary, which is lossless. With f32 it stores 48 bytes of float32 and keeps about 7 significant
+digits; those values are rounded to 7 digits when unpacked.
+
+Packing happens on the way into MongoDB (pack_sites, pack_update). Unpacking happens as user_data
+is loaded (unpack_user_data), so code above the storage boundary only ever sees lists. Stored rows
+may mix formats: unpacking accepts all of them, and repack_org() rewrites one organization in a
+single format. Writers in a lossy format hash what will read back: round_site_months() applies the
+rounding to incoming rows first, so content hashes match the stored values.
+"""
+from __future__ import annotations
+
+import copy
+import struct
+from typing import Any
+
+from bson import BSON, Binary
+
+from audit_log import content_hashes_for_sites
+from site_documents import (
+    LAYOUT_FIELD,
+    load_user_data,
+    rewrite_unchanged_sites,
+    unchanged_header_filter,
+    uses_site_documents,
+)
+
+FORMAT_LIST = 'list'
+FORMAT_F64 = 'f64'
+FORMAT_F32 = 'f32'
+FORMATS = (FORMAT_LIST, FORMAT_F64, FORMAT_F32)
+LOSSY_FORMATS = frozenset({FORMAT_F32})
+
+# BSON user-defined binary subtypes (0x80-0xff).
+_SUBTYPES = {FORMAT_F64: 0x80, FORMAT_F32: 0x81}
+_CODES = {FORMAT_F64: 'd', FORMAT_F32: 'f'}
+_FORMAT_BY_SUBTYPE = {subtype: fmt for fmt, subtype in _SUBTYPES.items()}
+# Attempts repack_org() makes before reporting a conflict with concurrent saves.
+_REPACK_ATTEMPTS = 3
+
+
+def _is_number(value: Any) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def pack_months(months: Any, fmt: str) -> Any:
+    """`months` as a packed Binary in format `fmt`; values that are not a list of numbers are kept."""
+    if fmt not in _SUBTYPES or not isinstance(months, list) or not all(_is_number(v) for v in months):
+        return months
+    try:
+        return Binary(struct.pack(f'<{len(months)}{_CODES[fmt]}', *months), _SUBTYPES[fmt])
+    except (OverflowError, struct.error):
+        # Beyond float32 range: keep the row lossless rather than fail the write.
+        return pack_months(months, FORMAT_F64)
+
+
+def unpack_months(value: Any) -> Any:
+    """List of floats for a packed Binary; any other value is returned as it is."""
+    fmt = _FORMAT_BY_SUBTYPE.get(value.subtype) if isinstance(value, Binary) else None
+    if fmt is None:
+        return value
+    code = _CODES[fmt]
+    values = struct.unpack(f'<{len(value) // struct.calcsize(code)}{code}', value)
+    if fmt == FORMAT_F32:
+        return [float(f'{v:.7g}') for v in values]
+    return list(values)
+
+
+def _pack_row(row: Any, fmt: str) -> Any:
+    if not isinstance(row, dict) or not isinstance(row.get('months'), list):
+        return row
+    return {**row, 'months': pack_months(row['months'], fmt)}
+
+
+def _pack_rows(rows: Any, fmt: str) -> Any:
+    return [_pack_row(row, fmt) for row in rows] if isinstance(rows, list) else rows
+
+
+def _pack_data(data: Any, fmt: str) -> Any:
+    return {category: _pack_rows(rows, fmt) for category, rows in data.items()} if isinstance(data, dict) else data
+
+
+def pack_site(site: Any, fmt: str) -> Any:
+    """Copy of `site` with its rows' months packed (the original is left untouched)."""
+    if fmt == FORMAT_LIST or not isinstance(site, dict) or not isinstance(site.get('data'), dict):
+        return site
+    return {**site, 'data': _pack_data(site['data'], fmt)}
+
+
+def pack_sites(sites: Any, fmt: str) -> Any:
+    if fmt == FORMAT_LIST or not isinstance(sites, dict):
+        return sites
+    return {site_id: pack_site(site, fmt) for site_id, site in sites.items()}
+
+
+# Packers by the number of path parts after 'sites' in a user_data update path.
+_PATH_PACKERS = {
+    1: pack_site,
+    3: _pack_rows,
+    4: _pack_row,
+}
+
+
+def _pack_path_value(path: str, value: Any, fmt: str) -> Any:
+    parts = path.split('.')
+    if parts[0] != 'sites' or len(parts) < 2:
+        return value
+    depth = len(parts) - 1
+    if depth >= 2 and parts[2] != 'data':
+        return value
+    if depth == 2:
+        return _pack_data(value, fmt)
+    if depth == 5 and parts[5] == 'months':
+        return pack_months(value, fmt)
+    packer = _PATH_PACKERS.get(depth)
+    return packer(value, fmt) if packer is not None else value
+
+
+def pack_update(update: dict, fmt: str) -> dict:
+    """Copy of a user_data update ($set / $push on legacy 'sites...' paths) with months packed."""
+    if fmt == FORMAT_LIST:
+        return update
+    packed: dict = {}
+    for operator, fields in update.items():
+        if operator == '$set':
+            fields = {path: _pack_path_value(path, value, fmt) for path, value in fields.items()}
+        elif operator == '$push':
+            fields = {
+                path: {**value, '$each': _pack_rows(value['$each'], fmt)}
+                if isinstance(value, dict) and '$each' in value
+                else _pack_path_value(f'{path}.0', value, fmt)
+                for path, value in fields.items()
+            }
+        packed[operator] = fields
+    return packed
+
+
+def _site_rows(site: Any):
+    data = site.get('data') if isinstance(site, dict) else None
+    for rows in data.values() if isinstance(data, dict) else ():
+        for row in rows if isinstance(rows, list) else ():
+            if isinstance(row, dict):
+                yield row
+
+
+def unpack_user_data(doc: dict | None) -> dict | None:
+    """Unpack every packed months array of a loaded user_data document, in place."""
+    sites = doc.get('sites') if isinstance(doc, dict) else None
+    if not isinstance(sites, dict):
+        return doc
+    for site in sites.values():
+        for row in _site_rows(site):
+            if isinstance(row.get('months'), Binary):
+                row['months'] = unpack_months(row['months'])
+    return doc
+
+
+def round_site_months(site: Any, fmt: str) -> bool:
+    """
+    Round a site's months arrays, in place, to the values they read back as once stored in `fmt`;
+    True when any value changed. Rounding is idempotent, so stored rows are left as they are.
+    """
+    if fmt not in LOSSY_FORMATS:
+        return False
+    changed = False
+    for row in _site_rows(site):
+        months = row.get('months')
+        stored = unpack_months(pack_months(months, fmt))
+        if stored is not months and stored != months:
+            row['months'] = stored
+            changed = True
+    return changed
+
+
+def months_size_report(sites: Any) -> dict[str, Any]:
+    """BSON size of an (unpacked) `sites` map in each months format, with the number of rows."""
+    rows = sum(
+        len(rows)
+        for site in (sites or {}).values() if isinstance(site, dict) and isinstance(site.get('data'), dict)
+        for rows in site['data'].values() if isinstance(rows, list)
+    )
+    report: dict[str, Any] = {'rows': rows}
+    for fmt in FORMATS:
+        report[f'{fmt}_bytes'] = len(BSON.encode({'sites': pack_sites(sites or {}, fmt)}))
+    return report
+
+
+def org_months_report(data_col, sites_col, org_id: str) -> dict[str, Any] | None:
+    """months_size_report() for one organization plus `stored_bytes`, its sites as stored now."""
+    doc = load_user_data(data_col, lambda: sites_col, org_id, {'_id': 0, 'sites': 1})
+    if doc is None:
+        return None
+    stored = doc.get('sites') if isinstance(doc.get('sites'), dict) else {}
+    report = {'organization_id': org_id, 'stored_bytes': len(BSON.encode({'sites': stored}))}
+    report.update(months_size_report(unpack_user_data(doc)['sites'] if stored else {}))
+    return report
+
+
+def repack_org(data_col, sites_col, org_id: str, fmt: str, *, now=None, attempts: int = _REPACK_ATTEMPTS) -> str:
+    """
+    Rewrite one organization's rows with months in format `fmt`; returns 'repacked', 'missing' or
+    'conflict'.
+
+    Content hashes are recomputed from the values as they will read back, since f32 rounds them,
+    and data_version is bumped when that changed any value, so cached GET responses go stale.
+    Writes only apply to data that is still as it was read (see unchanged_header_filter and
+    rewrite_unchanged_sites); after a concurrent save the repack starts over, and reports
+    'conflict' after `attempts` tries.
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f'unknown months format {fmt!r}')
+    for _ in range(max(1, attempts)):
+        status = _repack_once(data_col, sites_col, org_id, fmt, now)
+        if status != 'conflict':
+            return status
+    return 'conflict'
+
+
+def _repack_once(data_col, sites_col, org_id: str, fmt: str, now) -> str:
+    projection = {'sites': 1, 'content_hashes': 1, 'updated_at': 1, 'data_version': 1, LAYOUT_FIELD: 1}
+    doc = unpack_user_data(load_user_data(data_col, lambda: sites_col, org_id, projection))
+    if doc is None:
+        return 'missing'
+    sites = doc.get('sites') if isinstance(doc.get('sites'), dict) else {}
+    read_hashes = doc.get('content_hashes') if isinstance(doc.get('content_hashes'), dict) else {}
+    packed = pack_sites(sites, fmt)
+    hashes = content_hashes_for_sites(unpack_user_data({'sites': copy.deepcopy(packed)})['sites'])
+    values_changed = any(hashes[site_id] != read_hashes.get(site_id) for site_id in sites)
+    header_update: dict = {}
+    if values_changed:
+        header_update['$inc'] = {'data_version': 1}
+        if now is not None:
+            header_update['$set'] = {'updated_at': now}
+    if uses_site_documents(doc):
+        rewritten = rewrite_unchanged_sites(sites_col, org_id, packed, hashes, read_hashes, now=now)
+        if rewritten and header_update:
+            data_col.update_one({'_id': doc['_id']}, header_update)
+        return 'repacked' if rewritten == len(sites) else 'conflict'
+    header_update.setdefault('$set', {}).update({'sites': packed, 'content_hashes': hashes})
+    written = data_col.update_one(unchanged_header_filter(doc), header_update)
+    return 'repacked' if written.matched_count else 'conflict'
@@ -0,0 +1,212 @@
+"""
+Bulk final-report jobs.
+
+A job is a list of (organization, optional site) items. A coordinator thread builds each report
+payload in the web process (it needs MongoDB), hands rendering to a shared, size-capped process
+pool and records per-item status for polling. Finished documents are written to a per-job temp
+directory and bundled into one zip (stored, since .docx members are already compressed).
+
+Jobs live in memory of the process that accepted them (the app runs as a single gunicorn worker)
+and are purged, with their files, `ttl_seconds` after they finish.
+"""
+from __future__ import annotations
+
+import multiprocessing
+import os
+import re
+import secrets
+import shutil
+import tempfile
+import threading
+import time
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, Executor, ProcessPoolExecutor, wait
+from typing import Callable
+
+from final_report import iter_final_report_docx
+
+ITEM_STATUSES = ('queued', 'running', 'done', 'error')
+
+
+def render_final_report(payload: dict, logo_png: bytes | None = None) -> tuple[bytes, str]:
+    """Pool entry point: render one report .docx (final_report never imports the app or MongoDB)."""
+    chunks, file_name = iter_final_report_docx(payload, logo_png=logo_png)
+    return b''.join(chunks), file_name
+
+
+class ReportJob:
+    def __init__(self, owner: str, items: list[dict], work_dir: str):
+        self.id = secrets.token_urlsafe(16)
+        self.owner = owner
+        self.items = [
+            {**item, 'status': 'queued', 'file_name': None, 'error': None}
+            for item in items
+        ]
+        self.work_dir = work_dir
+        self.zip_path: str | None = None
+        self.created_at = time.time()
+        self.finished_at: float | None = None
+        self.lock = threading.Lock()
+
+    @property
+    def status(self) -> str:
+        if self.finished_at is not None:
+            return 'done'
+        if any(item['status'] != 'queued' for item in self.items):
+            return 'running'
+        return 'queued'
+
+    def to_api(self) -> dict:
+        with self.lock:
+            counts = {s: 0 for s in ITEM_STATUSES}
+            for item in self.items:
+                counts[item['status']] += 1
+            return {
+                'job_id': self.id,
+                'status': self.status,
+                'total': len(self.items),
+                'completed': counts['done'] + counts['error'],
+                'succeeded': counts['done'],
+                'failed': counts['error'],
+                'download_ready': self.zip_path is not None,
+                'items': [dict(item) for item in self.items],
+            }
+
+
+class ReportJobManager:
+    """
+    Runs bulk report jobs against one shared pool.
+
+    `max_workers` caps rendering processes across all jobs; `max_active_jobs` caps coordinators so
+    a burst of requests cannot queue unbounded work behind the web workers.
+    """
+
+    def __init__(
+        self,
+        *,
+        max_workers: int,
+        max_active_jobs: int,
+        ttl_seconds: float,
+        executor_factory: Callable[[int], Executor] | None = None,
+    ):
+        self.max_workers = max(1, int(max_workers))
+        self.max_active_jobs = max(1, int(max_active_jobs))
+        self.ttl_seconds = ttl_seconds
+        self._executor_factory = executor_factory or _process_pool
+        self._executor: Executor | None = None
+        self._jobs: dict[str, ReportJob] = {}
+        self._lock = threading.Lock()
+
+    def _pool(self) -> Executor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = self._executor_factory(self.max_workers)
+            return self._executor
+
+    def _purge_expired(self) -> None:
+        cutoff = time.time() - self.ttl_seconds
+        with self._lock:
+            expired = [
+                job for job in self._jobs.values()
+                if job.finished_at is not None and job.finished_at < cutoff
+            ]
+            for job in expired:
+                del self._jobs[job.id]
+        for job in expired:
+            shutil.rmtree(job.work_dir, ignore_errors=True)
+
+    def submit(
+        self,
+        owner: str,
+        items: list[dict],
+        build_item: Callable[[dict], tuple[dict, bytes | None]],
+    ) -> ReportJob | None:
+        """
+        Start a job; returns None when `max_active_jobs` jobs are already running.
+
+        build_item(item) -> (payload, logo_png) runs on the coordinator thread and may raise
+        ValueError to fail just that item.
+        """
+        self._purge_expired()
+        with self._lock:
+            active = sum(1 for job in self._jobs.values() if job.finished_at is None)
+            if active >= self.max_active_jobs:
+                return None
+            job = ReportJob(owner, items, tempfile.mkdtemp(prefix='report-job-'))
+            self._jobs[job.id] = job
+        threading.Thread(
+            target=self._run, args=(job, build_item), name=f'report-job-{job.id[:8]}', daemon=True
+        ).start()
+        return job
+
+    def get(self, job_id: str, owner: str) -> ReportJob | None:
+        self._purge_expired()
+        with self._lock:
+            job = self._jobs.get(job_id)
+        return job if job is not None and job.owner == owner else None
+
+    def _set_item(self, job: ReportJob, index: int, **fields) -> None:
+        with job.lock:
+            job.items[index].update(fields)
+
+    def _run(self, job: ReportJob, build_item) -> None:
+        pending = {}
+        try:
+            pool = self._pool()
+            for index, item in enumerate(job.items):
+                self._set_item(job, index, status='running')
+                try:
+                    payload, logo_png = build_item(item)
+                except ValueError as e:
+                    self._set_item(job, index, status='error', error=str(e))
+                    continue
+                except Exception as e:
+                    self._set_item(job, index, status='error', error=f'Could not load report data: {e}')
+                    continue
+                pending[pool.submit(render_final_report, payload, logo_png)] = index
+                # Keep at most one queued render per pool slot so payloads are not built far ahead.
+                while len(pending) >= self.max_workers:
+                    self._collect(job, pending, wait(pending, return_when=FIRST_COMPLETED).done)
+            while pending:
+                self._collect(job, pending, wait(pending, return_when=FIRST_COMPLETED).done)
+            self._bundle(job)
+        except Exception as e:
+            for index, item in enumerate(job.items):
+                if item['status'] in ('queued', 'running'):
+                    self._set_item(job, index, status='error', error=f'Job failed: {e}')
+        finally:
+            with job.lock:
+                job.finished_at = time.time()
+
+    def _collect(self, job: ReportJob, pending: dict, done) -> None:
+        for future in done:
+            index = pending.pop(future)
+            try:
+                docx, file_name = future.result()
+            except Exception as e:
+                self._set_item(job, index, status='error', error=f'Render failed: {e}')
+                continue
+            file_name = f'{index + 1:03d}_{_safe_file_name(file_name)}'
+            with open(os.path.join(job.work_dir, file_name), 'wb') as fh:
+                fh.write(docx)
+            self._set_item(job, index, status='done', file_name=file_name)
+
+    def _bundle(self, job: ReportJob) -> None:
+        names = [item['file_name'] for item in job.items if item['status'] == 'done']
+        if not names:
+            return
+        zip_path = os.path.join(job.work_dir, 'final_reports.zip')
+        with zipfile.ZipFile(zip_path, 'w', compression=zipfile.ZIP_STORED) as zf:
+            for name in names:
+                zf.write(os.path.join(job.work_dir, name), arcname=name)
+        with job.lock:
+            job.zip_path = zip_path
+
+
+def _safe_file_name(name: str) -> str:
+    return re.sub(r'[^\w\-.]+', '_', name or 'report.docx').strip('_') or 'report.docx'
+
+
+def _process_pool(max_workers: int) -> Executor:
+    # spawn: the web process runs threads (pymongo monitors, job coordinators) that fork would copy mid-state.
+    return ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context('spawn'))
@@ -0,0 +1,350 @@
+"""
+Per-site storage for organization data.
+
+Legacy layout: one `user_data` document per organization holding `sites: {site_id: site}`. Large
+estates approach MongoDB's 16 MB document limit and every read or write moves every site.
+
+Site layout: the `user_data` document becomes an org header (org_preferences, email, updated_at,
+storage_layout='sites') and each site lives in its own `user_data_sites` document
+{organization_id, site_id, position, site, content_hashes, updated_at}. `position` keeps the
+order the sites had in the legacy `sites` map; a site's content hashes are stored with it, so
+they can never disagree with the content they describe.
+
+Callers keep working with the legacy shape: load_user_data() assembles it (honouring a legacy
+projection), write_site_changes() and split_site_update() turn legacy writes into per-site
+writes. migrate_org() converts one organization between layouts.
+"""
+from __future__ import annotations
+
+import time
+from typing import Any, Callable, Iterable
+
+from bson import BSON
+from pymongo import DeleteMany, DeleteOne, ReplaceOne, UpdateOne
+
+from audit_log import content_hashes_for_sites
+
+SITE_DOCUMENTS_COLLECTION = 'user_data_sites'
+LAYOUT_FIELD = 'storage_layout'
+LAYOUT_LEGACY = 'legacy'
+LAYOUT_SITES = 'sites'
+# Site id wildcard in projections: 'sites.*.name' is the name of every site.
+SITE_WILDCARD = '*'
+
+_SITE_SORT = [('position', 1), ('site_id', 1)]
+# Attempts migrate_org() makes before reporting a conflict with concurrent saves.
+_MIGRATE_ATTEMPTS = 3
+
+
+def uses_site_documents(header: dict | None) -> bool:
+    return isinstance(header, dict) and header.get(LAYOUT_FIELD) == LAYOUT_SITES
+
+
+def _site_filter(org_id: str, site_id: str) -> dict:
+    return {'organization_id': org_id, 'site_id': site_id}
+
+
+def _append_position() -> int:
+    # Sites added outside a full save sort after every enumerated position.
+    return int(time.time() * 1000)
+
+
+def split_projection(projection: dict | None) -> tuple[dict | None, dict | None, list[str] | None]:
+    """
+    Translate a legacy user_data projection into (header projection, site projection, site ids).
+
+    'sites...' and 'content_hashes...' paths select site documents: the site projection is None
+    when no site is requested, and site ids is None when every site is (a 'sites' path or the
+    SITE_WILDCARD id). The header projection keeps the legacy paths too, since the layout is only
+    known once the header is read. Projections are inclusive, as everywhere in this app ('_id': 0
+    aside).
+    """
+    if projection is None:
+        return None, {'_id': 0}, None
+    header = {path: value for path, value in projection.items() if not _is_wildcard(path)}
+    header[LAYOUT_FIELD] = 1
+    site_projection: dict = {'_id': 0, 'site_id': 1}
+    site_ids: set[str] | None = set()
+    whole_sites = False
+    site_fields: set[str] = set()
+    for path, value in projection.items():
+        parts = path.split('.', 2)
+        if parts[0] not in ('sites', 'content_hashes') or not value:
+            continue
+        if len(parts) == 1 or parts[1] == SITE_WILDCARD:
+            site_ids = None
+        elif site_ids is not None:
+            site_ids.add(parts[1])
+        if parts[0] == 'content_hashes':
+            site_projection['content_hashes'] = 1
+        elif len(parts) < 3:
+            whole_sites = True
+        else:
+            site_fields.add(parts[2])
+    if site_ids is not None and not site_ids:
+        return header, None, []
+    if whole_sites:
+        site_projection['site'] = 1
+    else:
+        site_projection.update({f'site.{field}': 1 for field in site_fields})
+    return header, site_projection, None if site_ids is None else sorted(site_ids)
+
+
+def _is_wildcard(path: str) -> bool:
+    return path.startswith(f'sites.{SITE_WILDCARD}.')
+
+
+def _site_fields_expression(fields: list[str]) -> dict:
+    expr: dict = {}
+    for field in fields:
+        node = expr
+        *parents, last = field.split('.')
+        for part in parents:
+            node = node.setdefault(part, {})
+        node[last] = f'$$site.v.{field}'
+    return expr
+
+
+def wildcard_header_pipeline(org_id: str, projection: dict) -> list[dict]:
+    """
+    Aggregation reading a single-document organization with 'sites.*.<field>' projections: the
+    `sites` map is cut down to those fields inside MongoDB, so data arrays never leave the server.
+    """
+    fields = sorted(path.split('.', 2)[2] for path, value in projection.items() if value and _is_wildcard(path))
+    if any(path.split('.')[0] in ('sites', 'content_hashes') and not _is_wildcard(path) for path in projection):
+        raise ValueError('wildcard site projections cannot be combined with other site paths')
+    project = {path: value for path, value in projection.items() if not _is_wildcard(path)}
+    project[LAYOUT_FIELD] = 1
+    project['sites'] = {'$arrayToObject': {'$map': {
+        'input': {'$objectToArray': {'$ifNull': ['$sites', {}]}},
+        'as': 'site',
+        'in': {'k': '$$site.k', 'v': _site_fields_expression(fields)},
+    }}}
+    return [{'$match': {'organization_id': org_id}}, {'$limit': 1}, {'$project': project}]
+
+
+def load_user_data(
+    data_col, get_sites_col: Callable[[], object], org_id: str, projection: dict | None = None
+) -> dict | None:
+    """
+    The organization's user_data in the legacy shape, whichever layout it is stored in.
+
+    `projection` uses legacy paths ('sites', 'sites.<id>', 'sites.<id>.data.energy', ...); for the
+    site layout it becomes a projection on the per-site documents, so only requested sites and
+    subtrees are read. 'sites.*.<field>' selects a field of every site (see SITE_WILDCARD).
+    Site-layout documents keep their storage_layout field.
+    """
+    header_projection, site_projection, site_ids = split_projection(projection)
+    if projection is not None and any(_is_wildcard(path) for path in projection):
+        header = next(iter(data_col.aggregate(wildcard_header_pipeline(org_id, projection))), None)
+    else:
+        header = data_col.find_one({'organization_id': org_id}, header_projection)
+    if not uses_site_documents(header) or site_projection is None:
+        return header
+    sites_col = get_sites_col()
+    if sites_col is None:
+        raise RuntimeError('site documents collection unavailable')
+    query: dict = {'organization_id': org_id}
+    if site_ids is not None:
+        query['site_id'] = {'$in': site_ids}
+    sites, hashes = {}, {}
+    for doc in sites_col.find(query, site_projection).sort(_SITE_SORT):
+        sites[doc['site_id']] = doc.get('site') if isinstance(doc.get('site'), dict) else {}
+        if isinstance(doc.get('content_hashes'), dict):
+            hashes[doc['site_id']] = doc['content_hashes']
+    header['sites'] = sites
+    if 'content_hashes' in site_projection or projection is None:
+        header['content_hashes'] = hashes
+    return header
+
+
+def write_site_changes(
+    sites_col,
+    org_id: str,
+    sites: dict,
+    *,
+    hashes: dict | None = None,
+    previous_order: Iterable[str] = (),
+    changed: Iterable[str] | None = None,
+    now=None,
+) -> int:
+    """
+    Make the stored site documents match `sites` (a full legacy `sites` map).
+
+    `hashes` are the sites' content hashes, stored alongside each site. Only `changed` sites (all,
+    when None) are rewritten; unchanged ones get a position update when they moved. Sites missing
+    from `sites` are deleted. Returns the number of bulk operations.
+    """
+    previous_index = {site_id: n for n, site_id in enumerate(previous_order)}
+    hashes = hashes or {}
+    changed = set(sites) if changed is None else set(changed)
+    ops: list = []
+    for position, (site_id, site) in enumerate(sites.items()):
+        if site_id in changed:
+            ops.append(ReplaceOne(
+                _site_filter(org_id, site_id),
+                {
+                    'organization_id': org_id,
+                    'site_id': site_id,
+                    'position': position,
+                    'site': site,
+                    'content_hashes': hashes.get(site_id),
+                    'updated_at': now,
+                },
+                upsert=True,
+            ))
+        elif previous_index.get(site_id) != position:
+            ops.append(UpdateOne(_site_filter(org_id, site_id), {'$set': {'position': position}}))
+    ops.append(DeleteMany({'organization_id': org_id, 'site_id': {'$nin': list(sites)}}))
+    sites_col.bulk_write(ops, ordered=False)
+    return len(ops)
+
+
+def rewrite_unchanged_sites(sites_col, org_id: str, sites: dict, hashes: dict, read_hashes: dict, *, now=None) -> int:
+    """
+    Replace the content of site documents that still hold what was read; returns how many did.
+
+    A site matches while its stored content hash is the one in `read_hashes`, so a site saved,
+    deleted or created since the read is left alone.
+    """
+    ops = []
+    for site_id, site in sites.items():
+        read = read_hashes.get(site_id)
+        query = _site_filter(org_id, site_id)
+        if isinstance(read, dict):
+            query['content_hashes.site'] = read.get('site')
+        else:
+            query['content_hashes'] = None
+        ops.append(UpdateOne(query, {'$set': {'site': site, 'content_hashes': hashes.get(site_id), 'updated_at': now}}))
+    if not ops:
+        return 0
+    return sites_col.bulk_write(ops, ordered=False).matched_count
+
+
+def split_site_update(update: dict) -> tuple[dict, dict[str, dict | None]]:
+    """
+    Split a legacy user_data update ($set / $unset / $push on 'sites.<id>...' paths) into the
+    header update and {site_id: update for its site document, or None to delete it}.
+    'content_hashes.<id>' writes go to that site's document as well.
+    """
+    header: dict = {}
+    per_site: dict[str, dict | None] = {}
+    for operator, fields in update.items():
+        for path, value in fields.items():
+            parts = path.split('.', 2)
+            if parts[0] not in ('sites', 'content_hashes') or len(parts) < 2:
+                header.setdefault(operator, {})[path] = value
+                continue
+            site_id = parts[1]
+            if parts[0] == 'content_hashes':
+                target = 'content_hashes'
+            else:
+                target = f'site.{parts[2]}' if len(parts) == 3 else None
+            if target is None:
+                if operator == '$unset':
+                    per_site[site_id] = None
+                else:
+                    per_site[site_id] = {'$set': {'site': value}}
+                continue
+            site_update = per_site.get(site_id, {})
+            if site_update is None:
+                continue
+            site_update.setdefault(operator, {})[target] = value
+            per_site[site_id] = site_update
+    return header, per_site
+
+
+def apply_site_updates(sites_col, org_id: str, per_site: dict[str, dict | None], *, now=None) -> None:
+    """Write split_site_update() output; a missing site document is created at the end of the order."""
+    ops: list = []
+    for site_id, site_update in per_site.items():
+        if site_update is None:
+            ops.append(DeleteOne(_site_filter(org_id, site_id)))
+            continue
+        site_update = {**site_update, '$setOnInsert': {'position': _append_position()}}
+        site_update.setdefault('$set', {})['updated_at'] = now
+        ops.append(UpdateOne(_site_filter(org_id, site_id), site_update, upsert=True))
+    if ops:
+        sites_col.bulk_write(ops, ordered=False)
+
+
+def site_layout_size(data_col, sites_col, org_id: str) -> dict[str, Any]:
+    """Stored sizes for one organization: header bytes, site document count and largest site."""
+    header = data_col.find_one({'organization_id': org_id}) or {}
+    report: dict[str, Any] = {
+        'organization_id': org_id,
+        'layout': LAYOUT_SITES if uses_site_documents(header) else LAYOUT_LEGACY,
+        'header_bytes': len(BSON.encode(header)) if header else 0,
+        'site_documents': 0,
+        'largest_site_bytes': 0,
+    }
+    if report['layout'] == LAYOUT_SITES and sites_col is not None:
+        for doc in sites_col.find({'organization_id': org_id}):
+            report['site_documents'] += 1
+            report['largest_site_bytes'] = max(report['largest_site_bytes'], len(BSON.encode(doc)))
+    return report
+
+
+def migrate_org(
+    data_col, sites_col, org_id: str, *, to: str = LAYOUT_SITES, now=None, attempts: int = _MIGRATE_ATTEMPTS,
+) -> str:
+    """
+    Convert one organization's stored data to layout `to`; returns 'migrated', 'unchanged',
+    'missing' or 'conflict'.
+
+    Moving to the site layout writes every site document before the header flips (and drops
+    its `sites`), so an interrupted run leaves the legacy document intact and can be re-run.
+    Moving back writes the assembled `sites` map into the header before deleting site documents.
+    The flip only applies while the header still has the updated_at and data_version that were
+    read: after a save that lands mid-migration the migration starts over, and reports 'conflict'
+    (leaving the original layout in charge) after `attempts` tries. A save that read the header
+    before the flip but writes after it finds a different storage_layout than it read and is
+    refused with 409 (see _write_user_data_header in mongo_api), so neither side drops the other.
+    """
+    if to not in (LAYOUT_SITES, LAYOUT_LEGACY):
+        raise ValueError(f'unknown storage layout {to!r}')
+    for _ in range(max(1, attempts)):
+        status = _migrate_once(data_col, sites_col, org_id, to, now)
+        if status != 'conflict':
+            return status
+    return 'conflict'
+
+
+def unchanged_header_filter(header: dict) -> dict:
+    """
+    Filter matching the user_data header only while it is as `header` was read: every save and
+    patch bumps updated_at and data_version (a missing field only matches a still-missing one).
+    """
+    return {'_id': header['_id'], 'updated_at': header.get('updated_at'), 'data_version': header.get('data_version')}
+
+
+def _migrate_once(data_col, sites_col, org_id: str, to: str, now) -> str:
+    header = data_col.find_one({'organization_id': org_id})
+    if header is None:
+        return 'missing'
+    if to == LAYOUT_SITES:
+        if uses_site_documents(header):
+            return 'unchanged'
+        sites = header.get('sites') if isinstance(header.get('sites'), dict) else {}
+        hashes = content_hashes_for_sites(sites, reuse=header.get('content_hashes'))
+        write_site_changes(sites_col, org_id, sites, hashes=hashes, now=now)
+        flipped = data_col.update_one(
+            unchanged_header_filter(header),
+            {'$set': {LAYOUT_FIELD: LAYOUT_SITES}, '$unset': {'sites': '', 'content_hashes': ''}},
+        )
+        # On a conflict the site documents just written stay unused; the next attempt rewrites them.
+        return 'migrated' if flipped.matched_count else 'conflict'
+    if not uses_site_documents(header):
+        return 'unchanged'
+    assembled = load_user_data(data_col, lambda: sites_col, org_id, {'sites': 1, 'content_hashes': 1})
+    flipped = data_col.update_one(
+        unchanged_header_filter(header),
+        {
+            '$set': {'sites': assembled.get('sites') or {}, 'content_hashes': assembled.get('content_hashes') or {}},
+            '$unset': {LAYOUT_FIELD: ''},
+        },
+    )
+    if not flipped.matched_count:
+        return 'conflict'
+    sites_col.delete_many({'organization_id': org_id})
+    return 'migrated'
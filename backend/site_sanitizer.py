@@ -0,0 +1,138 @@
+"""
+Schema-compiled sanitizer for the `sites` map of organization data.
+
+SiteSanitizer is built once from the field rules (a sanitizer per site field, allowed and default
+units per data category) and binds them into plain closures, so sanitizing a site is a single
+pass over its fields and rows: no per-row rule lookups, and every row's months are a preallocated
+twelve-slot array filled in place.
+
+sanitize_sites() also takes the organization's stored content hashes (audit_log.
+site_content_hashes). Stored sites were sanitized when they were saved, so a resent site whose
+raw content hashes to the stored site hash is passed through untouched; for other sites only the
+sections whose hash differs from the stored one are sanitized and re-hashed.
+"""
+from __future__ import annotations
+
+from typing import Callable, Iterable
+
+from audit_log import site_content_hashes, valid_site_hashes
+from emissions_engine import MONTHS
+
+YEAR_MIN = 2020
+YEAR_MAX = 2030
+YEAR_DEFAULT = 2025
+_DESCRIPTION_MAX = 500
+
+RowSanitizer = Callable[[object], list]
+
+
+def compile_row_sanitizer(allowed_units: Iterable[str], default_unit: str) -> RowSanitizer:
+    """Rows sanitizer for one data category: clamp year, default unit, exactly MONTHS floats."""
+    allowed = frozenset(allowed_units)
+
+    def sanitize_rows(rows) -> list:
+        if not isinstance(rows, list):
+            return []
+        clean = []
+        append = clean.append
+        for row in rows:
+            if not isinstance(row, dict):
+                continue
+            try:
+                year = int(row.get('year'))
+            except (TypeError, ValueError):
+                year = YEAR_DEFAULT
+            if year < YEAR_MIN:
+                year = YEAR_MIN
+            elif year > YEAR_MAX:
+                year = YEAR_MAX
+            unit = str(row.get('unit') or '').strip().lower()
+            if unit not in allowed:
+                unit = default_unit
+            months = [0.0] * MONTHS
+            raw = row.get('months')
+            if isinstance(raw, list):
+                for slot, value in enumerate(raw[:MONTHS]):
+                    if isinstance(value, (int, float)):
+                        months[slot] = float(value)
+            append({
+                'description': str(row.get('description') or '')[:_DESCRIPTION_MAX],
+                'year': year,
+                'months': months,
+                'emissionType': row.get('emissionType'),
+                'unit': unit,
+            })
+        return clean
+
+    return sanitize_rows
+
+
+class SiteSanitizer:
+    """
+    `fields` are always written (from the site's value, or None when absent); `optional_fields`
+    only when the site has the key. `row_units` maps each data category to (allowed units,
+    default unit); other categories are kept as sent. `normalize_site(site)` runs last, in place,
+    and may rewrite the hash sections named in `normalize_sections`.
+    """
+
+    def __init__(
+        self,
+        *,
+        fields: dict[str, Callable],
+        optional_fields: dict[str, Callable],
+        row_units: dict[str, tuple[Iterable[str], str]],
+        normalize_site: Callable[[dict], None] | None = None,
+        normalize_sections: Iterable[str] = (),
+    ):
+        self._fields = tuple(fields.items())
+        self._optional_fields = tuple(optional_fields.items())
+        self._rows = {category: compile_row_sanitizer(*units) for category, units in row_units.items()}
+        self._normalize_site = normalize_site
+        self._normalize_sections = frozenset(normalize_sections)
+
+    def rows(self, category: str, rows) -> list:
+        return self._rows[category](rows)
+
+    def sanitize_site(self, site: dict, skip: frozenset[str] | set[str] = frozenset()) -> None:
+        """Sanitize one site in place, leaving the hash sections in `skip` as they are."""
+        for key, sanitize in self._fields:
+            if key not in skip:
+                site[key] = sanitize(site.get(key))
+        for key, sanitize in self._optional_fields:
+            if key in site and key not in skip:
+                site[key] = sanitize(site[key])
+        if self._normalize_site is not None and not self._normalize_sections <= skip:
+            self._normalize_site(site)
+        data = site.get('data')
+        if not isinstance(data, dict):
+            return
+        for category, rows in data.items():
+            sanitize_rows = self._rows.get(category)
+            if sanitize_rows is not None and isinstance(rows, list) and f'data.{category}' not in skip:
+                data[category] = sanitize_rows(rows)
+
+    def sanitize_sites(self, sites: dict, stored_hashes: dict | None = None) -> dict:
+        """Sanitize a `sites` map in place; returns {site_id: content hashes} of the result."""
+        stored_hashes = stored_hashes if isinstance(stored_hashes, dict) else {}
+        hashes = {}
+        for site_id, site in sites.items():
+            if not isinstance(site, dict):
+                hashes[site_id] = site_content_hashes(site)
+                continue
+            stored = stored_hashes.get(site_id)
+            if not valid_site_hashes(stored):
+                self.sanitize_site(site)
+                hashes[site_id] = site_content_hashes(site)
+                continue
+            raw = site_content_hashes(site)
+            if raw['site'] == stored['site']:
+                hashes[site_id] = raw
+                continue
+            unchanged = {section for section, h in raw['sections'].items() if stored['sections'].get(section) == h}
+            unchanged.update(f'data.{c}' for c, h in raw['data'].items() if stored['data'].get(c) == h)
+            touched = {*raw['sections'], *(f'data.{c}' for c in raw['data'])} - unchanged
+            if not self._normalize_sections <= unchanged:
+                touched |= self._normalize_sections
+            self.sanitize_site(site, skip=unchanged)
+            hashes[site_id] = site_content_hashes(site, previous=raw, touched=touched)
+        return hashes
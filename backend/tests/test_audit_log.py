@@ -1,8 +1,12 @@
 from __future__ import annotations
 
+import datetime
+import json
 import sys
 from pathlib import Path
 
+from bson import ObjectId
+
 BACKEND_ROOT = Path(__file__).resolve().parents[1]
 sys.path.insert(0, str(BACKEND_ROOT))
 
@@ -87,3 +91,152 @@ def test_format_audit_log_txt_includes_header():
     assert 'Organization Audit Log' in text
     assert 'org-1' in text
     assert 'Test Org' in text
+
+
+class FakeAuditCursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def sort(self, keys):
+        for field, direction in reversed(keys):
+            self.docs.sort(key=lambda d: d[field], reverse=direction < 0)
+        return self
+
+    def limit(self, n):
+        self.docs = self.docs[:n]
+        return self
+
+    def batch_size(self, n):
+        return self
+
+    def __iter__(self):
+        return iter([dict(d) for d in self.docs])
+
+
+class FakeAuditCollection:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def _matches(self, doc, query):
+        if doc['organization_id'] != query['organization_id']:
+            return False
+        if '$or' not in query:
+            return True
+        older, same_ts = query['$or']
+        return doc['timestamp'] < older['timestamp']['$lt'] or (
+            doc['timestamp'] == same_ts['timestamp'] and doc['_id'] < same_ts['_id']['$lt']
+        )
+
+    def find(self, query, projection=None):
+        docs = [d for d in self.docs if self._matches(d, query)]
+        if projection:
+            docs = [{k: v for k, v in d.items() if k not in projection} for d in docs]
+        return FakeAuditCursor(docs)
+
+    def count_documents(self, query):
+        return sum(1 for d in self.docs if self._matches(d, query))
+
+
+def _audit_client(monkeypatch, docs):
+    admin = {'email': 'admin@example.com', 'is_org_admin': True, 'organization_id': 'org-1'}
+    monkeypatch.setattr(api, '_mongodb_audit_logging_enabled', lambda: True)
+    monkeypatch.setattr(api, 'get_users_col', lambda: object())
+    monkeypatch.setattr(api, 'get_orgs_col', lambda: None)
+    monkeypatch.setattr(api, 'get_audit_log_col', lambda: FakeAuditCollection(docs))
+    monkeypatch.setattr(api, '_find_user_by_login', lambda users_col, ident: admin)
+    with api.app.app_context():
+        token = api.create_access_token(identity='admin@example.com')
+    return api.app.test_client(), {'Authorization': f'Bearer {token}'}
+
+
+def _audit_docs(n):
+    base = datetime.datetime(2025, 1, 1)
+    return [
+        {
+            '_id': ObjectId(),
+            'organization_id': 'org-1',
+            # Pairs of entries share a timestamp, so paging must tie-break on _id.
+            'timestamp': base + datetime.timedelta(minutes=i // 2),
+            'action': 'save',
+            'summary': f'save {i}',
+            'changes': [{'detail': f'field {i}', 'old': '1', 'new': '2'}],
+        }
+        for i in range(n)
+    ]
+
+
+def test_audit_log_cursor_pages_cover_every_entry_once(monkeypatch):
+    docs = _audit_docs(7)
+    client, headers = _audit_client(monkeypatch, docs)
+    seen, cursor = [], None
+    while True:
+        url = '/api/organization/audit-log?limit=2&fields=summary' + (f'&cursor={cursor}' if cursor else '')
+        body = client.get(url, headers=headers).get_json()
+        assert all('changes' not in e for e in body['entries'])
+        seen.extend(e['summary'] for e in body['entries'])
+        cursor = body['next_cursor']
+        if not cursor:
+            break
+    assert len(seen) == 7 and len(set(seen)) == 7
+    r = client.get('/api/organization/audit-log?cursor=not-a-cursor', headers=headers)
+    assert r.status_code == 400
+
+
+def test_audit_log_exports_stream_full_history(monkeypatch):
+    docs = _audit_docs(2500)
+    client, headers = _audit_client(monkeypatch, docs)
+    r = client.get('/api/organization/audit-log?format=ndjson', headers=headers)
+    assert r.is_streamed
+    lines = r.get_data(as_text=True).splitlines()
+    assert len(lines) == 2500
+    first = json.loads(lines[0])
+    assert first['summary'] == 'save 2499' and first['timestamp'].endswith('+00:00')
+
+    r = client.get('/api/organization/audit-log?format=txt', headers=headers)
+    text = r.get_data(as_text=True)
+    assert 'Entries: 2500' in text and text.count('Summary: save') == 2500
+    buffered = audit_log.format_audit_log_txt('org-1', None, sorted(docs, key=lambda d: (d['timestamp'], d['_id']), reverse=True))
+    assert text.split('Entries:')[1] == buffered.split('Entries:')[1]
+
+
+def _hashed(doc):
+    return {**doc, 'content_hashes': audit_log.content_hashes_for_sites(doc['sites'])}
+
+
+def test_hashed_diff_matches_full_diff():
+    row = {'description': 'Main meter', 'year': 2025, 'months': [1] * 12, 'unit': 'm3'}
+    old_doc = {'sites': {
+        'site-1': {'name': 'HQ', 'data': {'water': [row], 'energy': [row]}, 'bills': [{'id': 'b1', 'amount': 3}]},
+        'site-2': {'name': 'Depot', 'data': {'water': [row]}},
+    }}
+    new_doc = json.loads(json.dumps(old_doc))
+    new_doc['sites']['site-1']['data']['water'][0]['months'][0] = 9
+    new_doc['sites']['site-1']['notes'] = 'checked'
+
+    full = audit_log.diff_user_data_payload(old_doc, new_doc)
+    assert [c['path'] for c in full] == ['sites.site-1.notes', 'sites.site-1.data.water']
+    assert audit_log.diff_user_data_payload(_hashed(old_doc), _hashed(new_doc)) == full
+
+
+def test_hashed_diff_skips_subtrees_with_equal_hashes():
+    old_doc = _hashed({'sites': {'site-1': {'name': 'HQ', 'notes': 'a'}, 'site-2': {'name': 'Depot'}}})
+    new_doc = {'sites': {'site-1': {'name': 'HQ', 'notes': 'b'}, 'site-2': {'name': 'Yard'}}}
+    # Hashes claiming nothing changed short-circuit the comparison entirely.
+    new_doc['content_hashes'] = old_doc['content_hashes']
+    assert audit_log.diff_user_data_payload(old_doc, new_doc) == []
+
+    new_doc['content_hashes'] = audit_log.content_hashes_for_sites(new_doc['sites'])
+    new_doc['content_hashes']['site-1'] = old_doc['content_hashes']['site-1']
+    assert [c['path'] for c in audit_log.diff_user_data_payload(old_doc, new_doc)] == ['sites.site-2.name']
+
+
+def test_site_hashes_rebuild_touched_sections_only():
+    site = {'name': 'HQ', 'financials': {'revenue': 1}, 'data': {'energy': [{'months': [1]}]}, 'extra': 1}
+    before = audit_log.site_content_hashes(site)
+    site['data']['energy'][0]['months'] = [2]
+    partial = audit_log.site_content_hashes({'data': site['data']}, before, {'data.energy'})
+    assert partial == audit_log.site_content_hashes(site)
+    assert partial['site'] != before['site']
+    assert partial['sections'] == before['sections']
+    assert audit_log.site_hash_section('data', 'energy') == 'data.energy'
+    assert audit_log.site_hash_section('extra') == 'other'
@@ -0,0 +1,207 @@
+"""Background audit writer: batched inserts, diffs off the request path, bounded flush and spool."""
+from __future__ import annotations
+
+import sys
+import threading
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+from bson import ObjectId, json_util
+from pymongo.errors import BulkWriteError
+
+BACKEND_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(BACKEND_ROOT))
+
+import mongo_api as api  # noqa: E402
+from audit_writer import AuditWriter  # noqa: E402
+
+ACTOR = {"actor_email": "a@example.com", "actor_username": "a", "actor_name": "", "actor_role": "user"}
+OLD = {"sites": {"s1": {"name": "HQ"}}, "org_preferences": {}}
+NEW = {"sites": {"s1": {"name": "Head office"}}, "org_preferences": {}}
+
+
+class FakeAuditCollection:
+    def __init__(self, gate=None, fail=False):
+        self.batches = []
+        self.gate = gate
+        self.fail = fail
+
+    def insert_many(self, docs, ordered=True):
+        if self.gate is not None:
+            self.gate.wait(5)
+        if self.fail:
+            raise RuntimeError("mongo down")
+        self.batches.append(list(docs))
+
+
+def test_diffs_run_in_worker_and_batches_use_insert_many(tmp_path):
+    gate = threading.Event()
+    col = FakeAuditCollection(gate=gate)
+    writer = AuditWriter(lambda: col, spool_path=str(tmp_path / "spool.jsonl"))
+    writer.record("org-1", ACTOR, "user_updated", [{"area": "users", "detail": "x"}], api.utc_now())
+    for _ in range(3):
+        writer.record_diff("org-1", ACTOR, "data_save", OLD, NEW, api.utc_now())
+    writer.record_diff("org-1", ACTOR, "data_save", OLD, OLD, api.utc_now())
+    gate.set()
+    assert writer.flush(5)
+
+    entries = [e for batch in col.batches for e in batch]
+    assert len(entries) == 4  # the no-op save produced no entry
+    assert len(col.batches) < 5
+    saves = [e for e in entries if e["action"] == "data_save"]
+    assert saves[0]["change_count"] == len(saves[0]["changes"]) > 0
+    assert saves[0]["actor_email"] == "a@example.com"
+
+
+def test_failed_writes_are_spooled_and_replayed(tmp_path):
+    spool = tmp_path / "spool.jsonl"
+    down = FakeAuditCollection(fail=True)
+    writer = AuditWriter(lambda: down, spool_path=str(spool))
+    writer.record_diff("org-1", ACTOR, "data_save", OLD, NEW, api.utc_now())
+    assert writer.flush(5)
+    assert spool.exists()
+
+    up = FakeAuditCollection()
+    writer = AuditWriter(lambda: up, spool_path=str(spool))
+    assert writer.replay_spool() == 1
+    assert not spool.exists()
+    assert up.batches[0][0]["organization_id"] == "org-1"
+    assert up.batches[0][0]["timestamp"].year >= 2024
+
+
+def test_replay_treats_duplicate_keys_as_already_written(tmp_path):
+    spool = tmp_path / "spool.jsonl"
+    writer = AuditWriter(lambda: None, spool_path=str(spool))
+    writer._spool(writer._entries([("entry", "org-1", ACTOR, "x", [{"detail": "d"}], api.utc_now(), ObjectId())]))
+
+    class PartlyWritten:
+        def insert_many(self, docs, ordered=True):
+            raise BulkWriteError({"writeErrors": [{"code": 11000, "index": 0}]})
+
+    writer = AuditWriter(lambda: PartlyWritten(), spool_path=str(spool))
+    assert writer.replay_spool() == 1
+    assert not spool.exists()
+
+
+def test_close_is_bounded_and_spools_leftovers(tmp_path):
+    spool = tmp_path / "spool.jsonl"
+    gate = threading.Event()
+    col = FakeAuditCollection(gate=gate)
+    writer = AuditWriter(lambda: col, spool_path=str(spool), max_batch=1)
+    for _ in range(3):
+        writer.record_diff("org-1", ACTOR, "data_save", OLD, NEW, api.utc_now())
+    writer.close(timeout=0.2)  # first event is stuck in insert_many
+    spooled = [json_util.loads(line) for line in spool.read_text().splitlines()]
+    assert len(spooled) == 3  # the stuck batch as well as the two still queued
+    gate.set()
+    assert writer.flush(5)
+    # The stuck write went through after all: it carries the spooled _id, so replay skips it.
+    assert col.batches[0][0]["_id"] == spooled[0]["_id"]
+
+
+def test_entries_appended_during_replay_stay_spooled(tmp_path):
+    spool = tmp_path / "spool.jsonl"
+    other = AuditWriter(lambda: None, spool_path=str(spool))  # e.g. another gunicorn worker
+    other._spool(other._entries([("entry", "org-1", ACTOR, "x", [{"detail": "a"}], api.utc_now(), ObjectId())]))
+
+    class AppendsMeanwhile(FakeAuditCollection):
+        def insert_many(self, docs, ordered=True):
+            other._spool(other._entries([("entry", "org-1", ACTOR, "x", [{"detail": "b"}], api.utc_now(), ObjectId())]))
+            super().insert_many(docs, ordered)
+
+    col = AppendsMeanwhile()
+    assert AuditWriter(lambda: col, spool_path=str(spool)).replay_spool() == 1
+    late = [json_util.loads(line) for line in spool.read_text().splitlines()]
+    assert [e["changes"][0]["detail"] for e in late] == ["b"]
+    assert list(tmp_path.glob("*.replay")) == []
+
+
+def test_failed_replay_is_retried_from_the_claimed_file(tmp_path):
+    spool = tmp_path / "spool.jsonl"
+    writer = AuditWriter(lambda: FakeAuditCollection(fail=True), spool_path=str(spool))
+    writer._spool(writer._entries([("entry", "org-1", ACTOR, "x", [{"detail": "d"}], api.utc_now(), ObjectId())]))
+    assert writer.replay_spool() == 0
+    assert not spool.exists() and len(list(tmp_path.glob("*.replay"))) == 1
+
+    up = FakeAuditCollection()
+    assert AuditWriter(lambda: up, spool_path=str(spool)).replay_spool() == 1
+    assert len(up.batches[0]) == 1
+    assert list(tmp_path.glob("*.replay")) == []
+
+
+def test_save_route_hands_snapshots_to_the_writer(monkeypatch, tmp_path):
+    col = FakeAuditCollection()
+    writer = AuditWriter(lambda: col, spool_path=str(tmp_path / "spool.jsonl"))
+    stored = {"organization_id": "org-1", "sites": {"s1": {"name": "HQ", "data": {}}}}
+
+    class FakeDataCollection:
+        def find_one(self, query, projection=None):
+            return dict(stored)
+
+        def update_one(self, query, update, upsert=False):
+            return SimpleNamespace(matched_count=1)
+
+    monkeypatch.setattr(api, "_audit_writer", writer)
+    monkeypatch.setattr(api, "_mongodb_audit_logging_enabled", lambda: True)
+    monkeypatch.setattr(api, "get_data_col", lambda: FakeDataCollection())
+    monkeypatch.setattr(api, "get_users_col", lambda: object())
+    monkeypatch.setattr(api, "_find_user_by_login", lambda c, i: {"email": "a@example.com", "organization_id": "org-1"})
+    with api.app.app_context():
+        token = api.create_access_token(identity="a@example.com")
+    r = api.app.test_client().post(
+        "/api/data", headers={"Authorization": f"Bearer {token}"},
+        json={"sites": {"s1": {"name": "Head office", "data": {}}}},
+    )
+    assert r.status_code == 200, r.data
+    assert writer.flush(5)
+    entry = col.batches[0][0]
+    assert entry["action"] == "data_save" and entry["organization_id"] == "org-1"
+
+
+def test_torn_spool_line_is_quarantined_and_the_worker_keeps_running(tmp_path):
+    spool = tmp_path / "spool.jsonl"
+    writer = AuditWriter(lambda: None, spool_path=str(spool))
+    writer._spool(writer._entries([("entry", "org-1", ACTOR, "x", [{"detail": "d"}], api.utc_now(), ObjectId())]))
+    with open(spool, "a", encoding="utf-8") as fh:
+        fh.write('{"organization_id": "org-1", "chan')  # crash mid-append
+
+    col = FakeAuditCollection()
+    writer = AuditWriter(lambda: col, spool_path=str(spool))
+    writer.record("org-1", ACTOR, "user_updated", [{"area": "users", "detail": "x"}], api.utc_now())
+    assert writer.flush(5)
+    assert writer._thread.is_alive()
+    assert sorted(len(batch) for batch in col.batches) == [1, 1]  # the good spooled line and the new event
+    assert (tmp_path / "spool.jsonl.bad").read_text().startswith('{"organization_id"')
+    assert not spool.exists() and list(tmp_path.glob("*.replay")) == []
+
+
+def test_spool_is_replayed_once_the_database_answers_again(tmp_path):
+    spool = tmp_path / "spool.jsonl"
+    col = FakeAuditCollection(fail=True)
+    writer = AuditWriter(lambda: col, spool_path=str(spool), replay_interval=0.05)
+    writer.record("org-1", ACTOR, "user_updated", [{"area": "users", "detail": "during outage"}], api.utc_now())
+    assert writer.flush(5)
+    assert spool.exists()
+
+    col.fail = False
+    writer.record("org-1", ACTOR, "user_updated", [{"area": "users", "detail": "after"}], api.utc_now())
+    assert writer.flush(5)
+    deadline = time.monotonic() + 5
+    while sum(map(len, col.batches)) < 2 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    details = sorted(e["changes"][0]["detail"] for batch in col.batches for e in batch)
+    assert details == ["after", "during outage"]
+
+
+def test_idle_worker_replays_the_spool_on_a_timer(tmp_path):
+    spool = tmp_path / "spool.jsonl"
+    col = FakeAuditCollection(fail=True)
+    writer = AuditWriter(lambda: col, spool_path=str(spool), replay_interval=0.05)
+    writer.record("org-1", ACTOR, "user_updated", [{"area": "users", "detail": "d"}], api.utc_now())
+    assert writer.flush(5)
+    col.fail = False
+    deadline = time.monotonic() + 5
+    while not col.batches and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert len(col.batches) == 1
@@ -0,0 +1,133 @@
+"""Bulk final-report jobs: server-side payloads, bounded pool, progress polling and zip download."""
+from __future__ import annotations
+
+import io
+import subprocess
+import sys
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import pytest
+
+BACKEND_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(BACKEND_ROOT))
+
+import final_report  # noqa: E402
+import mongo_api as api  # noqa: E402
+from report_jobs import ReportJobManager  # noqa: E402
+
+REGISTRY = {
+    "UK_2025": {"version": "2025.1", "source": "test", "factors": {"electricity_grid": 0.2, "natural_gas": 0.18}},
+}
+
+ORG_DATA = {
+    "org-1": {
+        "org_preferences": {"companyName": "Acme", "carbonCalcReportingYear": "2025", "projectNumber": "P-7"},
+        "sites": {
+            "s1": {"name": "HQ", "data": {"energy": [
+                {"year": 2025, "unit": "kwh", "emissionType": "electricity", "months": [100] * 12},
+                {"year": 2025, "unit": "kwh", "emissionType": "naturalGas", "months": [10] * 12},
+            ]}},
+            "s2": {"name": "Depot", "data": {"energy": [
+                {"year": 2025, "unit": "kwh", "emissionType": "electricity", "months": [50] * 12},
+            ]}},
+        },
+    },
+}
+
+
+class FakeDataCollection:
+    def find_one(self, query, projection=None):
+        return ORG_DATA.get(query.get("organization_id"))
+
+
+def _client(monkeypatch, user):
+    monkeypatch.setattr(api, "get_data_col", lambda: FakeDataCollection())
+    monkeypatch.setattr(api, "get_users_col", lambda: object())
+    monkeypatch.setattr(api, "get_orgs_col", lambda: None)
+    monkeypatch.setattr(api, "_find_user_by_login", lambda users_col, ident: user)
+    monkeypatch.setattr(api, "get_conversion_factors_registry", lambda *a, **k: REGISTRY)
+    monkeypatch.setattr(api, "_report_jobs", ReportJobManager(
+        max_workers=2, max_active_jobs=1, ttl_seconds=60, executor_factory=ThreadPoolExecutor,
+    ))
+    with api.app.app_context():
+        token = api.create_access_token(identity="consultant@example.com")
+    return api.app.test_client(), {"Authorization": f"Bearer {token}"}
+
+
+def _wait_done(client, headers, url):
+    for _ in range(200):
+        state = client.get(url, headers=headers).get_json()
+        if state["status"] == "done":
+            return state
+        time.sleep(0.05)
+    raise AssertionError("job did not finish")
+
+
+def test_build_final_report_payload_from_stored_data():
+    payload = api.build_final_report_payload(
+        ORG_DATA["org-1"], organization_name="Org One", site_id="s1", registry=REGISTRY,
+    )
+    assert payload["organization_name"] == "Acme"
+    assert payload["site_name"] == "HQ"
+    assert payload["project_number"] == "P-7"
+    assert payload["reporting_year"] == 2025
+    assert payload["grand_total_kg"] == pytest.approx(1200 * 0.2 + 120 * 0.18)
+    assert payload["performance_rows"]["electricity"]["usage"] == "1,200 kWh"
+    assert payload["performance_rows"]["electricity"]["factor"] == "0.2 kg CO2e / kWh"
+    assert payload["performance_rows"]["natural_gas"]["emissions_kg"] == pytest.approx(21.6)
+
+    whole_org = api.build_final_report_payload(ORG_DATA["org-1"], organization_name="", registry=REGISTRY)
+    assert whole_org["site_name"] == "All sites"
+    assert whole_org["grand_total_kg"] == pytest.approx(payload["grand_total_kg"] + 600 * 0.2)
+    with pytest.raises(ValueError):
+        api.build_final_report_payload(ORG_DATA["org-1"], organization_name="", site_id="nope", registry=REGISTRY)
+
+
+def test_bulk_job_reports_per_item_status_and_zip(monkeypatch):
+    if not final_report._SELBY_TEMPLATE.is_file() and not final_report._CARBON_STATEMENT_TEMPLATE.is_file():
+        pytest.skip("Word template not present")
+    user = {"email": "consultant@example.com", "is_consultant": True, "memberships": [
+        {"organization_id": "org-1"}, {"organization_id": "org-empty"},
+    ]}
+    client, headers = _client(monkeypatch, user)
+    r = client.post("/api/reports/final/bulk", headers=headers, json={
+        "organizations": [{"organization_id": "org-1", "site_ids": ["s1", "s2", "missing"]}],
+        "organization_ids": ["org-empty"],
+    })
+    assert r.status_code == 202, r.data
+    started = r.get_json()
+    assert started["total"] == 4
+
+    state = _wait_done(client, headers, started["status_url"])
+    by_target = {(i["organization_id"], i["site_id"]): i for i in state["items"]}
+    assert by_target[("org-1", "s1")]["status"] == "done"
+    assert by_target[("org-1", "s2")]["status"] == "done"
+    assert by_target[("org-1", "missing")]["status"] == "error"
+    assert by_target[("org-empty", None)]["error"] == "No saved data for this organization"
+    assert (state["succeeded"], state["failed"]) == (2, 2)
+
+    r = client.get(started["download_url"], headers=headers)
+    assert r.status_code == 200
+    with zipfile.ZipFile(io.BytesIO(r.data)) as zf:
+        names = zf.namelist()
+        assert len(names) == 2 and all(n.endswith(".docx") for n in names)
+        assert zf.read(names[0])[:2] == b"PK"
+
+
+def test_bulk_job_rejects_orgs_outside_memberships(monkeypatch):
+    user = {"email": "consultant@example.com", "is_consultant": True, "memberships": [{"organization_id": "org-1"}]}
+    client, headers = _client(monkeypatch, user)
+    r = client.post("/api/reports/final/bulk", headers=headers, json={"organization_ids": ["org-2"]})
+    assert r.status_code == 403
+    r = client.get("/api/reports/final/bulk/unknown", headers=headers)
+    assert r.status_code == 404
+
+
+def test_report_worker_does_not_import_the_app():
+    code = "import sys, report_jobs; print('mongo_api' in sys.modules, 'flask' in sys.modules)"
+    out = subprocess.run([sys.executable, "-c", code], cwd=BACKEND_ROOT, capture_output=True, text=True, timeout=60)
+    assert out.returncode == 0, out.stderr
+    assert out.stdout.split() == ["False", "False"]
@@ -65,3 +65,110 @@ def test_unit_conversion_and_factor_application():
     assert err is None
     # 1 MWh = 1000 kWh, UK 2025 electricity factor = 0.177 kg/kWh
     assert abs((kg or 0.0) - 177.0) < 1e-6
+
+
+def test_registry_is_cached_until_version_changes(monkeypatch):
+    calls = {"load": 0}
+    version = {"value": ("catalog", 1, "t1")}
+
+    def fake_load():
+        calls["load"] += 1
+        return {"UK_2025": {"version": "2025.1", "source": "test", "factors": {"electricity_grid": 0.2}}}
+
+    monkeypatch.setattr(api, "load_conversion_factors_from_catalog", fake_load)
+    monkeypatch.setattr(api, "_conversion_factors_version", lambda: version["value"])
+    monkeypatch.setenv("CONVERSION_FACTORS_CACHE_TTL_SECONDS", "0")
+    try:
+        api.invalidate_conversion_factors_cache()
+        api.get_conversion_factors_registry()
+        api.get_conversion_factors_registry()
+        assert calls["load"] == 1
+
+        version["value"] = ("catalog", 1, "t2")
+        api.get_conversion_factors_registry()
+        assert calls["load"] == 2
+
+        api.invalidate_conversion_factors_cache()
+        api.get_conversion_factors_registry()
+        assert calls["load"] == 3
+    finally:
+        monkeypatch.undo()
+        api.invalidate_conversion_factors_cache()
+
+
+def test_registry_keeps_last_good_copy_when_catalog_unavailable(monkeypatch):
+    good = {"UK_2025": {"version": "2025.1", "source": "test", "factors": {"electricity_grid": 0.2}}}
+    monkeypatch.setattr(api, "load_conversion_factors_from_catalog", lambda: good)
+    monkeypatch.setattr(api, "_conversion_factors_version", lambda: None)
+    try:
+        api.get_conversion_factors_registry(force_reload=True)
+        monkeypatch.setattr(api, "load_conversion_factors_from_catalog", lambda: {})
+        assert api.get_conversion_factors_registry(force_reload=True) == good
+    finally:
+        monkeypatch.undo()
+        api.invalidate_conversion_factors_cache()
+
+
+def test_batch_lookup_preserves_order_and_dedupes(monkeypatch):
+    calls = {"count": 0}
+    real_lookup = api.lookup_conversion_factor
+
+    def counting_lookup(*args, **kwargs):
+        calls["count"] += 1
+        return real_lookup(*args, **kwargs)
+
+    monkeypatch.setattr(api, "lookup_conversion_factor", counting_lookup)
+    lookups = [
+        {"country": "UK", "year": 2025, "source_key": "electricity", "unit": "kwh"},
+        {"country": "uk", "year": "2025", "source_key": "electricity", "unit": "kWh"},
+        {"country": "UK", "year": 2025, "source_key": "electricity", "unit": "tonnes"},
+        "not-an-object",
+    ]
+    results = api.lookup_conversion_factors_batch(lookups)
+    assert [r["error"] is None for r in results] == [True, True, False, False]
+    assert results[0]["factor"] == results[1]["factor"] > 0
+    assert "Unsupported unit" in results[2]["error"]
+    assert results[3] == {"country": None, "year": None, "source_key": None, "unit": None,
+                          "factor": None, "error": "Lookup must be an object"}
+    assert {frozenset(r) for r in results} == {frozenset(results[0])}
+    assert calls["count"] == 2
+
+
+def test_api_factor_lookup_batch():
+    client = api.app.test_client()
+    with api.app.app_context():
+        token = api.create_access_token(identity="test@example.com")
+    r = client.post(
+        "/api/factor-lookup/batch",
+        json={"lookups": [
+            {"country": "UK", "year": 2025, "source_key": "naturalGas", "unit": "kwh"},
+            {"country": "UK", "year": 2025, "source_key": "nope"},
+        ]},
+        headers={"Authorization": f"Bearer {token}"},
+    )
+    assert r.status_code == 200, r.data
+    body = r.get_json()
+    assert body["count"] == 2
+    assert body["errors"] == 1
+    assert body["results"][0]["factor"] > 0
+    assert "Unsupported source" in body["results"][1]["error"]
+
+
+def test_compiled_lookup_table_semantics():
+    registry = {
+        "UK_2025": {"factors": {"electricity_grid": 0.2, "waste_recycled": 21.0, "coal": None}},
+        "BRAZIL_2025": {"factors": {"natural_gas": 0.3}},
+    }
+    table = api.get_factor_lookup_table(registry)
+    assert table.lookup("uk ", "2025", "electricity", "MWh") == (0.2, None, 1000.0)
+    # Unknown country document -> UK fallback; existing country document -> no per-key fallback.
+    assert table.lookup("FRANCE", 2025, "waste_to_recycling", "kg")[0] == 21.0
+    assert "Unsupported source" in table.lookup("BRAZIL", 2025, "electricity")[1]
+    assert "Unsupported unit" in table.lookup("UK", 2025, "electricity", "tonnes")[1]
+    assert "Missing factor" in table.lookup("UK", 2025, "coal")[1]
+    assert table.lookup("UK", 2025, "electricity", "kwh") is table.lookup("UK", 2025, "electricity", "kwh")
+
+
+def test_cached_registry_reuses_compiled_table():
+    registry = api.get_conversion_factors_registry()
+    assert api.get_factor_lookup_table() is api.get_factor_lookup_table(registry)
@@ -0,0 +1,208 @@
+from __future__ import annotations
+
+import copy
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+
+BACKEND_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(BACKEND_ROOT))
+
+import mongo_api as api  # noqa: E402
+
+
+def _row(desc, months=None, unit="kwh"):
+    return {
+        "description": desc,
+        "year": 2025,
+        "months": months or [0.0] * 12,
+        "emissionType": "electricity",
+        "unit": unit,
+    }
+
+
+class FakeDataCollection:
+    def __init__(self, doc):
+        self.doc = doc
+        self.find_calls = []
+        self.updates = []
+
+    def find_one(self, query, projection=None):
+        self.find_calls.append((query, projection))
+        return copy.deepcopy(self.doc)
+
+    def update_one(self, query, update, upsert=False):
+        self.updates.append((query, update, upsert))
+        # self.doc is the organization's document; other filter fields must still match it.
+        matched = all(self.doc.get(k) == v for k, v in query.items() if k != "organization_id")
+        return SimpleNamespace(matched_count=int(matched))
+
+
+def _client(monkeypatch, doc):
+    col = FakeDataCollection(doc)
+    monkeypatch.setattr(api, "get_data_col", lambda: col)
+    monkeypatch.setattr(api, "get_users_col", lambda: object())
+    monkeypatch.setattr(
+        api,
+        "_find_user_by_login",
+        lambda users_col, ident: {"email": "a@example.com", "organization_id": "org-1"},
+    )
+    with api.app.app_context():
+        token = api.create_access_token(identity="a@example.com")
+    return api.app.test_client(), col, {"Authorization": f"Bearer {token}"}
+
+
+def test_patch_translates_ops_into_targeted_updates(monkeypatch):
+    stored = {"sites": {"site-1": {"data": {"energy": [_row("a"), _row("b")]}}}}
+    client, col, headers = _client(monkeypatch, stored)
+    r = client.patch("/api/data", headers=headers, json={"ops": [
+        {"op": "set_row", "site_id": "site-1", "category": "energy", "index": 1,
+         "row": {"description": "b2", "year": 2025, "months": [5], "unit": "mwh"}},
+        {"op": "push_row", "site_id": "site-1", "category": "water",
+         "row": {"description": "meter", "months": [1, 2]}},
+        {"op": "set_site_fields", "site_id": "site-1", "fields": {"name": "HQ"}},
+        {"op": "set_preferences", "preferences": {"companyName": "Acme"}},
+    ]})
+    assert r.status_code == 200, r.data
+
+    _query, projection = col.find_calls[0]
+    assert set(projection) == {
+        "_id",
+        "organization_id",
+        "storage_layout",
+        "sites.site-1.data.energy",
+        "sites.site-1.data.water",
+        "sites.site-1.name",
+        "org_preferences",
+        "content_hashes.site-1",
+    }
+    query, update, upsert = col.updates[0]
+    assert query == {"organization_id": "org-1", "storage_layout": None} and upsert is False
+    assert update["$set"]["sites.site-1.data.energy.1"]["months"][0] == 5.0
+    assert update["$set"]["sites.site-1.data.energy.1"]["unit"] == "mwh"
+    assert update["$set"]["sites.site-1.name"] == "HQ"
+    assert update["$set"]["org_preferences.companyName"] == "Acme"
+    pushed = update["$push"]["sites.site-1.data.water"]["$each"]
+    assert pushed[0]["unit"] == "m3" and len(pushed[0]["months"]) == 12
+    assert "sites.site-1" not in update["$set"]
+
+
+def test_patch_collapses_conflicting_paths(monkeypatch):
+    stored = {"sites": {"site-1": {"data": {"energy": [_row("a"), _row("b")]}}, "site-2": {"name": "x"}}}
+    client, col, headers = _client(monkeypatch, stored)
+    r = client.patch("/api/data", headers=headers, json={"ops": [
+        {"op": "push_row", "site_id": "site-1", "category": "energy", "row": _row("c")},
+        {"op": "remove_row", "site_id": "site-1", "category": "energy", "index": 0},
+        {"op": "remove_site", "site_id": "site-2"},
+    ]})
+    assert r.status_code == 200, r.data
+    _query, update, _upsert = col.updates[0]
+    assert "$push" not in update
+    assert [row["description"] for row in update["$set"]["sites.site-1.data.energy"]] == ["b", "c"]
+    assert update["$unset"] == {"sites.site-2": "", "content_hashes.site-1": "", "content_hashes.site-2": ""}
+
+
+def test_patch_rejects_bad_ops(monkeypatch):
+    stored = {"sites": {"site-1": {"data": {"energy": [_row("a")]}}}}
+    client, col, headers = _client(monkeypatch, stored)
+    for ops in (
+        [],
+        [{"op": "drop_database"}],
+        [{"op": "set_site_fields", "site_id": "a.b", "fields": {"name": "x"}}],
+        [{"op": "set_site_fields", "site_id": "site-1", "fields": {"$where": "x"}}],
+        [{"op": "set_row", "site_id": "site-1", "category": "energy", "index": 3, "row": _row("z")}],
+    ):
+        r = client.patch("/api/data", headers=headers, json={"ops": ops})
+        assert r.status_code == 400, ops
+    assert col.updates == []
+
+
+def test_patch_preferences_respect_the_key_cap(monkeypatch):
+    prefs = {f"k{i}": "v" for i in range(api._ORG_PREF_MAX_KEYS - 1)}
+    client, col, headers = _client(monkeypatch, {"org_preferences": prefs})
+    r = client.patch("/api/data", headers=headers, json={"ops": [
+        {"op": "set_preferences", "preferences": {"k0": "w", "extra": "x"}},
+    ]})
+    assert r.status_code == 200, r.data
+    assert col.updates[0][1]["$set"]["org_preferences.extra"] == "x"
+
+    col.doc["org_preferences"]["extra"] = "x"
+    r = client.patch("/api/data", headers=headers, json={"ops": [
+        {"op": "set_preferences", "preferences": {"one_too_many": "y"}},
+    ]})
+    assert r.status_code == 400
+    assert "exceed" in r.get_json()["msg"]
+    assert len(col.updates) == 1
+
+
+def test_patch_rehashes_only_touched_sections(monkeypatch):
+    site = {"name": "HQ", "data": {"energy": [_row("a")], "water": [_row("w", unit="m3")]}}
+    stored = {"sites": {"site-1": site}, "content_hashes": {"site-1": api.site_content_hashes(site)}}
+    client, col, headers = _client(monkeypatch, stored)
+    r = client.patch("/api/data", headers=headers, json={"ops": [
+        {"op": "set_row", "site_id": "site-1", "category": "energy", "index": 0, "row": _row("a2")},
+    ]})
+    assert r.status_code == 200, r.data
+    _query, update, _upsert = col.updates[0]
+    hashes = update["$set"]["content_hashes.site-1"]
+
+    patched = copy.deepcopy(site)
+    patched["data"]["energy"][0] = update["$set"]["sites.site-1.data.energy.0"]
+    assert hashes == api.site_content_hashes(patched)
+    assert hashes["data"]["water"] == stored["content_hashes"]["site-1"]["data"]["water"]
+
+
+def test_patch_drops_hashes_it_cannot_rebuild(monkeypatch):
+    stored = {"sites": {"site-1": {"name": "HQ"}, "site-2": {"name": "Depot"}}}
+    client, col, headers = _client(monkeypatch, stored)
+    r = client.patch("/api/data", headers=headers, json={"ops": [
+        {"op": "set_site_fields", "site_id": "site-1", "fields": {"name": "Head office"}},
+        {"op": "set_site", "site_id": "site-3", "site": {"name": "Annex"}},
+        {"op": "remove_site", "site_id": "site-2"},
+    ]})
+    assert r.status_code == 200, r.data
+    _query, update, _upsert = col.updates[0]
+    assert update["$unset"]["content_hashes.site-1"] == ""
+    assert update["$unset"]["content_hashes.site-2"] == ""
+    assert update["$set"]["content_hashes.site-3"]["site"]
+
+
+def test_patch_refuses_to_write_after_a_layout_migration(monkeypatch):
+    stored = {"sites": {"site-1": {"name": "HQ", "data": {}}}}
+    client, col, headers = _client(monkeypatch, stored)
+    audited = []
+    monkeypatch.setattr(api, "_record_audit_diff", lambda *args: audited.append(args))
+    read = col.find_one
+
+    def read_then_migrate(query, projection=None):
+        doc = read(query, projection)
+        col.doc = {"storage_layout": "sites"}  # migrate_org flipped the header meanwhile
+        return doc
+
+    col.find_one = read_then_migrate
+    r = client.patch("/api/data", headers=headers, json={"ops": [
+        {"op": "set_site_fields", "site_id": "site-1", "fields": {"name": "Head office"}},
+    ]})
+    assert r.status_code == 409
+    assert audited == []
+
+
+def test_ops_on_unknown_sites_create_nothing(monkeypatch):
+    stored = {"sites": {"site-1": {"name": "HQ", "data": {}}}}
+    client, col, headers = _client(monkeypatch, stored)
+    for op in (
+        {"op": "set_site_fields", "site_id": "site-2", "fields": {"name": "Typo"}},
+        {"op": "set_category", "site_id": "site-2", "category": "energy", "rows": []},
+        {"op": "push_row", "site_id": "site-2", "category": "energy", "row": _row("a")},
+        {"op": "set_row", "site_id": "site-2", "category": "energy", "index": 0, "row": _row("a")},
+    ):
+        r = client.patch("/api/data", headers=headers, json={"ops": [op]})
+        assert r.status_code == 400 and b"unknown site_id" in r.data, op
+    assert col.updates == []
+
+    r = client.patch("/api/data", headers=headers, json={"ops": [
+        {"op": "set_site", "site_id": "site-2", "site": {"name": "Depot"}},
+        {"op": "push_row", "site_id": "site-2", "category": "energy", "row": _row("a")},
+    ]})
+    assert r.status_code == 200, r.data
+
@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+import copy
 import sys
 from pathlib import Path
 
@@ -84,3 +85,32 @@ def test_sanitize_site_payload_includes_org_preferences():
     assert out["org_preferences"]["organisationName"] == "Acme Ltd"
     assert out["org_preferences"]["eventCount"] == "2"
 
+
+
+def test_stored_hashes_skip_unchanged_sites_and_sections(monkeypatch):
+    site = {
+        "name": "HQ",
+        "tabQuestions": {"water": "metered"},
+        "data": {
+            "energy": [{"description": "main", "year": 2024, "months": [1, 2], "unit": "kwh"}],
+            "water": [{"description": "supply", "year": 2024, "months": [3], "unit": "m3"}],
+        },
+    }
+    stored = api._sanitize_site_data_payload({"sites": {"s1": copy.deepcopy(site), "s2": copy.deepcopy(site)}})
+    stored_hashes = api.content_hashes_for_sites(stored["sites"])
+
+    resent = copy.deepcopy(stored["sites"])
+    resent["s2"]["data"]["energy"][0]["year"] = 2040
+    resent["s2"]["data"]["energy"][0]["months"] = [5]
+    calls = []
+    sanitize_site = api._site_sanitizer.sanitize_site
+    monkeypatch.setattr(
+        api._site_sanitizer, "sanitize_site", lambda s, skip=frozenset(): calls.append(set(skip)) or sanitize_site(s, skip),
+    )
+    out = api._sanitize_site_data_payload({"sites": resent}, stored_hashes)
+
+    assert len(calls) == 1  # s1 is identical to the stored site
+    assert "data.water" in calls[0] and "name" in calls[0] and "data.energy" not in calls[0]
+    row = out["sites"]["s2"]["data"]["energy"][0]
+    assert row["year"] == 2030 and row["months"] == [5.0] + [0.0] * 11
+    assert out["content_hashes"] == api.content_hashes_for_sites(out["sites"])
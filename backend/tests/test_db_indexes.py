@@ -0,0 +1,81 @@
+"""Index declarations: boot-time provisioning and collection-scan reporting."""
+from __future__ import annotations
+
+import sys
+from pathlib import Path
+
+BACKEND_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(BACKEND_ROOT))
+
+import db_indexes  # noqa: E402
+
+
+class FakeCursor:
+    def __init__(self, plan):
+        self.plan = plan
+
+    def sort(self, keys):
+        return self
+
+    def explain(self):
+        return {"queryPlanner": {"winningPlan": self.plan}}
+
+
+class FakeCollection:
+    def __init__(self, indexes=None, plan=None):
+        self.indexes = {"_id_": {"key": [("_id", 1)]}, **(indexes or {})}
+        self.created = []
+        self.plan = plan or {"stage": "FETCH", "inputStage": {"stage": "IXSCAN"}}
+
+    def index_information(self):
+        return self.indexes
+
+    def create_index(self, keys, name):
+        self.created.append(name)
+        self.indexes[name] = {"key": list(keys)}
+
+    def find(self, query):
+        return FakeCursor(self.plan)
+
+
+class FakeDb(dict):
+    def __missing__(self, name):
+        self[name] = FakeCollection()
+        return self[name]
+
+
+def test_ensure_indexes_creates_missing_and_is_idempotent():
+    db = FakeDb()
+    db["users"] = FakeCollection({"my_email_idx": {"key": [("email", 1.0)]}})
+    db["user_data"] = FakeCollection({"organization_id_1": {"key": [("organization_id", -1)]}})
+
+    rows = {(r["collection"], r["index"]): r for r in db_indexes.ensure_indexes(db)}
+    assert rows[("users", "email_1")]["detail"] == "present under another name"
+    assert rows[("users", "username_1_organization_id_1")]["status"] == "created"
+    assert rows[("user_data", "organization_id_1")]["status"] == "conflict"
+    assert rows[("organization_audit_log", "organization_id_1_timestamp_-1__id_-1")]["status"] == "created"
+
+    again = db_indexes.ensure_indexes(db)
+    assert {r["status"] for r in again} == {"present", "conflict"}
+    assert [r["index"] for r in db_indexes.index_problems(again)] == ["organization_id_1"]
+
+
+def test_check_mode_reports_missing_without_creating():
+    db = FakeDb()
+    rows = db_indexes.ensure_indexes(db, create=False)
+    assert {r["status"] for r in rows} == {"missing"}
+    assert all(not col.created for col in db.values())
+
+
+def test_collection_scans_are_reported_from_explain():
+    db = FakeDb()
+    db["users"] = FakeCollection(plan={"stage": "COLLSCAN"})
+    db["organization_audit_log"] = FakeCollection(
+        plan={"stage": "SORT", "inputStage": {"stage": "FETCH", "inputStage": {"stage": "IXSCAN"}}}
+    )
+    report = db_indexes.find_collection_scans(db)
+    scans = {r["collection"] for r in report if r["collscan"]}
+    assert scans == {"users"}
+    audit = next(r for r in report if r["collection"] == "organization_audit_log")
+    assert audit["in_memory_sort"] and not audit["collscan"]
+    assert len(db_indexes.index_problems([], report)) == 4
@@ -0,0 +1,182 @@
+"""Email outbox: persisted queue with retries, reused SMTP session and cached Gmail token."""
+from __future__ import annotations
+
+import datetime
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+BACKEND_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(BACKEND_ROOT))
+
+import mongo_api as api  # noqa: E402
+from email_outbox import EmailOutbox  # noqa: E402
+from fake_smtp import FakeSmtpServer  # noqa: E402
+
+
+class FakeInsertResult:
+    def __init__(self, inserted_id):
+        self.inserted_id = inserted_id
+
+
+class FakeOutboxCollection:
+    def __init__(self):
+        self.docs = []
+
+    def insert_one(self, doc):
+        doc = {**doc, "_id": len(self.docs) + 1}
+        self.docs.append(doc)
+        return FakeInsertResult(doc["_id"])
+
+    def find_one_and_update(self, query, update, sort=None, return_document=None):
+        due, expired = query["$or"]
+        for doc in sorted(self.docs, key=lambda d: d["next_attempt_at"]):
+            if (doc["status"] == "pending" and doc["next_attempt_at"] <= due["next_attempt_at"]["$lte"]) or (
+                doc["status"] == "sending" and doc.get("lease_until") < expired["lease_until"]["$lt"]
+            ):
+                doc.update(update["$set"])
+                for key, n in update.get("$inc", {}).items():
+                    doc[key] = doc.get(key, 0) + n
+                return dict(doc)
+        return None
+
+    def update_one(self, query, update):
+        doc = next(d for d in self.docs if d["_id"] == query["_id"])
+        doc.update(update.get("$set", {}))
+        for key in update.get("$unset", {}):
+            doc.pop(key, None)
+
+
+def _smtp_env(monkeypatch, smtp):
+    monkeypatch.setenv("MAIL_SERVER", smtp.host)
+    monkeypatch.setenv("MAIL_PORT", str(smtp.port))
+    monkeypatch.setenv("MAIL_USERNAME", "user@example.com")
+    monkeypatch.setenv("MAIL_PASSWORD", "secret")
+    monkeypatch.setenv("MAIL_DEFAULT_SENDER", "Test <user@example.com>")
+    monkeypatch.setenv("MAIL_USE_TLS", "false")
+    monkeypatch.delenv("MAIL_USE_SSL", raising=False)
+
+
+def test_smtp_connection_is_reused_and_reopened_after_disconnect(monkeypatch):
+    with FakeSmtpServer() as smtp:
+        _smtp_env(monkeypatch, smtp)
+        try:
+            api._send_smtp_email("One", "first", "a@example.com")
+            api._send_smtp_email("Two", "second", "b@example.com")
+            assert smtp.connections == 1
+            smtp.disconnect_all()
+            api._send_smtp_email("Three", "third", "c@example.com")
+        finally:
+            api._close_smtp_connection()
+        assert smtp.connections == 2
+        assert [m["Subject"] for m in smtp.messages] == ["One", "Two", "Three"]
+        assert smtp.envelopes[2][1] == ["c@example.com"]
+
+
+def test_outbox_retries_with_backoff_then_marks_sent_or_failed():
+    col = FakeOutboxCollection()
+    failures = {"n": 2}
+
+    def deliver(doc):
+        if failures["n"]:
+            failures["n"] -= 1
+            raise RuntimeError("provider down")
+
+    outbox = EmailOutbox(lambda: col, deliver, max_attempts=3, base_delay_seconds=0.0)
+    outbox.enqueue("Subject", "Body", "ops@example.com")
+    assert outbox.process_once() and col.docs[0]["status"] == "pending"
+    assert col.docs[0]["last_error"] == "provider down"
+    assert outbox.process_once() and outbox.process_once()
+    assert col.docs[0]["status"] == "sent" and col.docs[0]["attempts"] == 3
+    assert outbox.process_once() is False
+
+    failing = EmailOutbox(lambda: col, lambda doc: 1 / 0, max_attempts=1)
+    failing.enqueue("Subject", "Body", "ops@example.com")
+    failing.process_once()
+    assert col.docs[1]["status"] == "failed"
+
+    assert 24 <= EmailOutbox(lambda: col, deliver).retry_delay(1) <= 36
+    assert EmailOutbox(lambda: col, deliver).retry_delay(20) <= 3600 * 1.2
+
+
+def test_expired_lease_is_reclaimed():
+    col = FakeOutboxCollection()
+    outbox = EmailOutbox(lambda: col, lambda doc: None)
+    outbox.enqueue("Subject", "Body", "ops@example.com")
+    col.docs[0].update(status="sending", lease_until=datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(seconds=1))
+    assert outbox.process_once()
+    assert col.docs[0]["status"] == "sent" and col.docs[0]["attempts"] == 1
+
+
+def test_message_that_keeps_crashing_its_sender_fails():
+    col = FakeOutboxCollection()
+    outbox = EmailOutbox(lambda: col, lambda doc: None, max_attempts=2)
+    outbox.enqueue("Subject", "Body", "ops@example.com")
+    expired = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(seconds=1)
+    for attempts in (1, 2):
+        # Claimed, then the sending process died before recording the outcome.
+        assert outbox._claim(col)["attempts"] == attempts
+        col.docs[0]["lease_until"] = expired
+    assert outbox.process_once()
+    assert col.docs[0]["status"] == "failed" and col.docs[0]["last_error"] == "delivery interrupted"
+    assert outbox.process_once() is False
+
+
+def test_registration_notification_is_delivered_by_outbox_worker(monkeypatch):
+    col = FakeOutboxCollection()
+    monkeypatch.setattr(api, "get_email_outbox_col", lambda: col)
+    monkeypatch.setattr(api, "_gmail_api_settings_ready", lambda: False)
+    monkeypatch.setattr(api, "_resend_settings_ready", lambda: False)
+    monkeypatch.delenv("RENDER", raising=False)
+    monkeypatch.setenv("SUSTAIN_QUALITY_NOTIFY_EMAIL", "ops@example.com")
+    with FakeSmtpServer() as smtp:
+        _smtp_env(monkeypatch, smtp)
+        api._email_outbox.start()
+        try:
+            assert api.notify_sustain_quality_new_registration("new@example.com", "OrgX", "User X") is True
+            for _ in range(100):
+                if smtp.messages:
+                    break
+                time.sleep(0.05)
+        finally:
+            api._email_outbox.stop(timeout=5)
+            api._close_smtp_connection()
+        assert "New organization signup" in smtp.messages[0]["Subject"]
+        assert col.docs[0]["status"] == "sent"
+
+
+def test_gmail_access_token_is_cached_until_expiry(monkeypatch):
+    fetches = []
+
+    def fake_fetch(client_id, client_secret, refresh_token):
+        fetches.append(client_id)
+        return f"token-{len(fetches)}", 3600
+
+    monkeypatch.setenv("GMAIL_CLIENT_ID", "id")
+    monkeypatch.setenv("GMAIL_REFRESH_TOKEN", "refresh")
+    monkeypatch.setattr(api, "_fetch_gmail_access_token", fake_fetch)
+    monkeypatch.setattr(api, "_gmail_token_cache", {})
+    assert api._get_gmail_access_token() == "token-1"
+    assert api._get_gmail_access_token() == "token-1"
+    assert api._get_gmail_access_token(force_refresh=True) == "token-2"
+    api._gmail_token_cache["expires_at"] = time.time() - 1
+    assert api._get_gmail_access_token() == "token-3"
+
+
+def test_importing_the_app_starts_no_background_services():
+    env = {
+        **os.environ,
+        "SEED_PLATFORM_ADMIN": "0",
+        "ENABLE_MONGODB_AUDIT_LOGGING": "true",
+        "MAIL_SERVER": "127.0.0.1",
+        "MAIL_USERNAME": "user@example.com",
+        "MAIL_PASSWORD": "secret",
+    }
+    code = "import threading, mongo_api; print(sorted(t.name for t in threading.enumerate()))"
+    out = subprocess.run(
+        [sys.executable, "-c", code], cwd=BACKEND_ROOT, env=env, capture_output=True, text=True, timeout=60,
+    )
+    assert out.returncode == 0, out.stderr
+    assert out.stdout.strip() == "['MainThread']"
@@ -0,0 +1,154 @@
+"""Emission rollups: cell computation, incremental swaps on save and chart series."""
+from __future__ import annotations
+
+import copy
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+from pymongo import DeleteMany, InsertOne
+
+BACKEND_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(BACKEND_ROOT))
+
+import emission_rollups  # noqa: E402
+import mongo_api as api  # noqa: E402
+
+
+def resolve_row(category, row):
+    return 2.0, None, row.get("emissionType") or category
+
+
+def _row(source, months, year=2025):
+    return {"year": year, "unit": "kwh", "emissionType": source, "months": months + [0.0] * (12 - len(months))}
+
+
+SITES = {
+    "s1": {"data": {
+        "energy": [_row("electricity", [1, 2]), _row("naturalGas", [3])],
+        "water": [_row("water_supply", [5], year=2024)],
+    }},
+    "s2": {"data": {"energy": [_row("electricity", [0, 0, 4])]}},
+}
+
+
+def _matches(doc, query):
+    for key, cond in query.items():
+        if isinstance(cond, dict) and "$in" in cond:
+            if doc.get(key) not in cond["$in"]:
+                return False
+        elif isinstance(cond, dict) and "$nin" in cond:
+            if doc.get(key) in cond["$nin"]:
+                return False
+        elif doc.get(key) != cond:
+            return False
+    return True
+
+
+class FakeRollups:
+    def __init__(self):
+        self.docs = []
+        self.deletes = []
+
+    def bulk_write(self, ops, ordered=True):
+        for op in ops:
+            if isinstance(op, DeleteMany):
+                self.deletes.append(op._filter)
+                self.docs = [d for d in self.docs if not _matches(d, op._filter)]
+            elif isinstance(op, InsertOne):
+                self.docs.append(copy.deepcopy(op._doc))
+
+    def aggregate(self, pipeline):
+        match, group = pipeline[0]["$match"], pipeline[1]["$group"]
+        sums = {}
+        for doc in self.docs:
+            if _matches(doc, match):
+                key = tuple(doc[ref[1:]] for ref in group["_id"].values())
+                sums[key] = sums.get(key, 0.0) + doc["kg"]
+        return [{"_id": dict(zip(group["_id"], key)), "kg": kg} for key, kg in sums.items()]
+
+
+def test_rollup_cells_split_by_month_category_and_scope():
+    cells = {(c["site_id"], c["year"], c["month"], c["category"], c["scope"]): c["kg"]
+             for c in emission_rollups.rollup_cells(SITES, resolve_row)}
+    assert cells[("s1", 2025, 1, "energy", "scope2")] == 2.0
+    assert cells[("s1", 2025, 2, "energy", "scope2")] == 4.0
+    assert cells[("s1", 2025, 1, "energy", "scope1")] == 6.0
+    assert cells[("s1", 2024, 1, "water", "scope3")] == 10.0
+    assert cells[("s2", 2025, 3, "energy", "scope2")] == 8.0
+    assert len(cells) == 5  # zero months are not stored
+
+
+def test_incremental_replace_only_touches_selected_cells():
+    col = FakeRollups()
+    emission_rollups.replace_rollups(col, "org-1", SITES, None, resolve_row)
+    before = [d for d in col.docs if d["site_id"] == "s2" or d["category"] == "water"]
+
+    changed = copy.deepcopy(SITES)
+    changed["s1"]["data"]["energy"][0]["months"][0] = 10
+    emission_rollups.replace_rollups(col, "org-1", changed, {"s1": {"energy"}}, resolve_row)
+    assert col.deletes[-1] == {"organization_id": "org-1", "site_id": "s1", "category": {"$in": ["energy"]}}
+    assert [d for d in col.docs if d["site_id"] == "s2" or d["category"] == "water"] == before
+
+    series = emission_rollups.chart_series(col, "org-1", year=2025, group_by="scope")
+    assert series["periods"][0] == "2025-01" and len(series["periods"]) == 12
+    assert series["series"]["scope2"][:3] == [20.0, 4.0, 8.0]
+    assert series["totals_kg"] == {"scope1": 6.0, "scope2": 32.0}
+
+    by_category = emission_rollups.chart_series(col, "org-1", disabled_scopes=["scope1"])
+    assert by_category["periods"][0] == "2024-01" and len(by_category["periods"]) == 24
+    assert list(by_category["series"]) == ["water", "energy"]
+    assert by_category["total_kg"] == 42.0
+    with pytest.raises(ValueError):
+        emission_rollups.chart_series(col, "org-1", group_by="colour")
+
+
+def test_save_queues_only_changed_categories(monkeypatch):
+    stored = {"organization_id": "org-1", "org_preferences": {}}
+    stored["sites"] = api._sanitize_site_data_payload({"sites": copy.deepcopy(SITES)})["sites"]
+    stored["content_hashes"] = api.content_hashes_for_sites(stored["sites"])
+
+    class FakeData:
+        def find_one(self, query, projection=None):
+            return copy.deepcopy(stored)
+
+        def update_one(self, query, update, upsert=False):
+            return SimpleNamespace(matched_count=1)
+
+    submitted = []
+    monkeypatch.setattr(api, "get_data_col", lambda: FakeData())
+    monkeypatch.setattr(api, "get_users_col", lambda: object())
+    monkeypatch.setattr(api, "_mongodb_audit_logging_enabled", lambda: False)
+    monkeypatch.setattr(api, "_find_user_by_login", lambda users_col, ident: {"email": "a@example.com", "organization_id": "org-1"})
+    monkeypatch.setattr(api._emission_rollups, "submit", lambda org_id, sites, touched: submitted.append(touched))
+    monkeypatch.setattr(api._emission_rollups, "rebuild", lambda org_id: submitted.append("rebuild"))
+    with api.app.app_context():
+        token = api.create_access_token(identity="a@example.com")
+    client, headers = api.app.test_client(), {"Authorization": f"Bearer {token}"}
+
+    sites = copy.deepcopy(stored["sites"])
+    sites["s1"]["data"]["water"][0]["months"][1] = 1
+    sites["s1"]["name"] = "HQ"
+    del sites["s2"]
+    r = client.post("/api/data", headers=headers, json={"sites": sites})
+    assert r.status_code == 200, r.data
+    assert submitted == [{"s1": {"water"}, "s2": None}]
+
+    r = client.post("/api/data", headers=headers, json={"org_preferences": {"carbonCalcCountry": "IE"}})
+    assert r.status_code == 200, r.data
+    assert submitted[-1] == "rebuild"
+
+    submitted.clear()
+    r = client.post("/api/data", headers=headers, json={"org_preferences": {"wfhEnabled": "false"}})
+    assert r.status_code == 200, r.data
+    assert submitted == ["rebuild"]
+
+
+def test_maintainer_applies_jobs_in_order():
+    col = FakeRollups()
+    maintainer = emission_rollups.RollupMaintainer(lambda: col, lambda org_id: resolve_row, lambda org_id: SITES)
+    maintainer.rebuild("org-1")
+    maintainer.submit("org-1", {}, {"s2": None})
+    assert maintainer.flush(5)
+    assert {d["site_id"] for d in col.docs} == {"s1"}
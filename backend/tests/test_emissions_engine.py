@@ -0,0 +1,150 @@
+from __future__ import annotations
+
+import json
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+os.environ.setdefault("ALLOW_DATASHEET_FACTOR_JSON", "true")
+
+BACKEND_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(BACKEND_ROOT))
+
+import emissions_engine  # noqa: E402
+import mongo_api as api  # noqa: E402
+
+REGISTRY = {
+    "UK_2025": {
+        "version": "2025.1",
+        "source": "test",
+        "factors": {"electricity_grid": 0.2, "natural_gas": 0.18, "water_supply": 0.15},
+    },
+    "UK_2024": {"version": "2024.1", "source": "test", "factors": {"electricity_grid": 0.2}},
+}
+
+
+def _payload():
+    return {
+        "org_preferences": {"carbonCalcCountry": "UK"},
+        "sites": {
+            "site-1": {
+                "data": {
+                    "energy": [
+                        {"year": 2025, "unit": "mwh", "emissionType": "electricity",
+                         "months": [1] + [0] * 11},
+                        {"year": 2025, "unit": "kwh", "emissionType": "naturalGas",
+                         "months": [0, 100] + [0] * 10},
+                    ],
+                    "water": [
+                        {"year": 2025, "unit": "m3", "emissionType": "water", "months": [10] * 12},
+                        {"year": 2025, "unit": "m3", "emissionType": "unknown_source", "months": [1] * 12},
+                    ],
+                }
+            },
+            "site-2": {
+                "data": {
+                    "energy": [
+                        {"year": 2024, "unit": "kwh", "emissionType": "electricity", "months": [5] * 12},
+                    ]
+                }
+            },
+        },
+    }
+
+
+@pytest.fixture(params=["numpy", "python"])
+def engine_backend(request, monkeypatch):
+    if request.param == "numpy" and emissions_engine.np is None:
+        pytest.skip("numpy not installed")
+    if request.param == "python":
+        monkeypatch.setattr(emissions_engine, "np", None)
+    return request.param
+
+
+def test_site_totals_months_and_scopes(engine_backend):
+    result = api.calculate_site_emissions(_payload(), year=2025, registry=REGISTRY)
+    site = result["sites"]["site-1"]
+    assert site["totals_kg"]["energy"] == pytest.approx(1000 * 0.2 + 100 * 0.18)
+    assert site["totals_kg"]["water"] == pytest.approx(120 * 0.15)
+    assert site["scope_kg"]["scope1"] == pytest.approx(18.0)
+    assert site["scope_kg"]["scope2"] == pytest.approx(200.0)
+    assert site["scope_kg"]["scope3"] == pytest.approx(18.0)
+    months = site["months_kg"]["2025"]
+    assert months[0] == pytest.approx(200.0 + 1.5)
+    assert months[1] == pytest.approx(18.0 + 1.5)
+    assert len(site["errors"]) == 1
+    assert site["errors"][0]["emissionType"] == "unknown_source"
+    assert result["sites"]["site-2"]["rows"] == 0
+    assert result["organization"]["total_kg"] == pytest.approx(site["total_kg"])
+
+
+def test_row_details_and_disabled_scope(engine_backend):
+    payload = _payload()
+    payload["org_preferences"]["scope2Enabled"] = "false"
+    result = api.calculate_site_emissions(payload, include_rows=True, registry=REGISTRY)
+    site1 = result["sites"]["site-1"]
+    assert site1["scope_kg"]["scope2"] == 0.0
+    details = site1["row_details"]
+    assert [(d["category"], d["emissionType"]) for d in details] == [("water", "water"), ("energy", "naturalGas")]
+    assert site1["totals_kg"]["energy"] == pytest.approx(18.0)
+    assert site1["total_kg"] == pytest.approx(18.0 + 18.0)
+    assert site1["months_kg"]["2025"][0] == pytest.approx(1.5)
+    assert result["sites"]["site-2"] == {**result["sites"]["site-2"], "rows": 0, "total_kg": 0.0, "months_kg": {}}
+
+
+def test_engine_matches_calculate_emission_kg():
+    payload = {
+        "sites": {"s": {"data": {"energy": [
+            {"year": 2025, "unit": "mwh", "emissionType": "electricity", "months": [1] + [0] * 11},
+        ]}}},
+    }
+    expected, err = api.calculate_emission_kg("UK", 2025, "electricity", 1.0, "mwh")
+    assert err is None
+    result = api.calculate_site_emissions(payload)
+    assert result["organization"]["total_kg"] == pytest.approx(expected)
+
+
+def test_unknown_unit_is_a_row_error():
+    payload = {"sites": {"s": {"data": {"energy": [
+        {"year": 2025, "unit": "btu", "emissionType": "electricity", "months": [1] * 12},
+        {"year": 2025, "emissionType": "electricity", "months": [1] * 12},
+    ]}}}}
+    site = api.calculate_site_emissions(payload, registry=REGISTRY)["sites"]["s"]
+    assert [e["error"] for e in site["errors"]] == ['Unknown unit "btu" for energy']
+    assert site["total_kg"] == pytest.approx(12 * 0.2)
+
+
+PARITY_FIXTURE = json.loads((Path(__file__).parent / "fixtures" / "emissions_parity.json").read_text())
+
+
+@pytest.mark.parametrize("case", PARITY_FIXTURE["cases"], ids=lambda c: c["name"])
+def test_engine_matches_dashboard_fixture(engine_backend, case):
+    """Rows, scopes and total against js/calculations.js (scripts/emissions_parity_fixture.js)."""
+    factors = {
+        api._SOURCE_TO_BACKEND_FACTOR_KEY.get(src) or api.resolve_catalog_factor_key(src): value
+        for src, value in PARITY_FIXTURE["factors"].items()
+    }
+    registry = {f"{PARITY_FIXTURE['country']}_{PARITY_FIXTURE['year']}": {"factors": factors}}
+    payload = {"org_preferences": case["org_preferences"], "sites": PARITY_FIXTURE["sites"]}
+    result = api.calculate_site_emissions(payload, include_rows=True, registry=registry)
+
+    org = result["organization"]
+    assert org["errors"] == []
+    assert org["scope_kg"] == pytest.approx(case["scope_kg"])
+    assert org["total_kg"] == pytest.approx(sum(case["scope_kg"].values()))
+    rows = {
+        f"{site_id}/{d['category']}/{d['index']}": d["total_kg"]
+        for site_id, site in result["sites"].items()
+        for d in site["row_details"]
+    }
+    enabled = emissions_engine.scopes_enabled_from_prefs(case["org_preferences"])
+
+    def scope_of(key):
+        site_id, category, index = key.split("/")
+        row = PARITY_FIXTURE["sites"][site_id]["data"][category][int(index)]
+        return emissions_engine.scope_for_source(row["emissionType"])
+
+    expected = {key: kg for key, kg in case["rows_kg"].items() if enabled[scope_of(key)]}
+    assert rows == pytest.approx(expected)
@@ -13,11 +13,12 @@ BACKEND_ROOT = Path(__file__).resolve().parents[1]
 REPO_ROOT = BACKEND_ROOT.parent
 sys.path.insert(0, str(BACKEND_ROOT))
 
+import final_report  # noqa: E402
 import mongo_api as api  # noqa: E402
 
 
 def test_load_yellow_map_length_and_keys():
-    m = api._load_yellow_numeric_field_map()
+    m = final_report._load_yellow_numeric_field_map()
     assert len(m) == 21
     assert m[0] == "natural_gas_scope_kg"
     assert m[4] == "electricity_emissions_kg"
@@ -26,7 +27,7 @@ def test_load_yellow_map_length_and_keys():
 
 def test_narrative_overrides_escape_xml():
     xml = "<root>is a community centre located in the London Borough of Haringey.</root>"
-    out = api._apply_docx_narrative_overrides(xml, {"organization_profile": "A & B <test>"})
+    out = final_report._apply_docx_narrative_overrides(xml, {"organization_profile": "A & B <test>"})
     assert "A &amp; B &lt;test&gt;" in out
 
 
@@ -34,7 +35,7 @@ def test_png_from_minimal_data_url():
     b64 = (
         "iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAADUlEQVR42mP8z8BQDwAEhQGAhKmMIQAAAABJRU5ErkJggg=="
     )
-    raw = api._png_bytes_from_logo_data_url("data:image/png;base64," + b64)
+    raw = final_report.png_bytes_from_logo_data_url("data:image/png;base64," + b64)
     assert raw is not None
     assert raw.startswith(b"\x89PNG\r\n\x1a\n")
 
@@ -131,3 +132,79 @@ def test_final_report_yellow_map_json_valid():
     assert len(fields) == 21
     assert fields[0] == "natural_gas_scope_kg"
     assert all(isinstance(f, str) for f in fields)
+
+
+_W = 'xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main"'
+_YELLOW_RUN = '<w:r><w:rPr><w:highlight w:val="yellow"/></w:rPr><w:t>{}</w:t></w:r>'
+
+
+def _cell(*runs):
+    return "<w:tc><w:p>" + "".join(runs) + "</w:p></w:tc>"
+
+
+def _plain(text):
+    return f"<w:r><w:t>{text}</w:t></w:r>"
+
+
+def _write_carbon_statement_template(path: Path) -> Path:
+    detail = "<w:tbl>" + "".join(
+        f"<w:tr>{_cell(_plain(label))}{_cell(_YELLOW_RUN.format('x'))}</w:tr>"
+        for label in ("Project", "Period", "Address")
+    ) + "</w:tbl>"
+    control = f"<w:tbl><w:tr>{_cell(_plain('Version 1.0'))}{_cell(_plain('01/01/2024'))}</w:tr></w:tbl>"
+    perf = (
+        "<w:tbl>"
+        f"<w:tr>{_cell(_plain('Scope'))}{_cell(_plain('Carbon Emission Source'))}{_cell(_plain('Usage Data'))}"
+        f"{_cell(_plain('Factor'))}{_cell(_plain('kg'))}</w:tr>"
+        f"<w:tr>{_cell(_plain('1'))}{_cell(_plain('Natural gas used for company facilities'))}"
+        f"{_cell(_plain('-'))}{_cell(_plain('-'))}{_cell(_plain('-'))}{_cell(_plain('-'))}</w:tr>"
+        "</w:tbl>"
+    )
+    body = (
+        f"<w:p>{_YELLOW_RUN.format('0.00')}</w:p>"
+        f"<w:p>{_plain('Total 22,436.71 kg')}</w:p>"
+    )
+    xml = f'<?xml version="1.0" encoding="UTF-8"?><w:document {_W}><w:body>{detail}{control}{perf}{body}</w:body></w:document>'
+    target = path / "Carbon emissions statement report template.docx"
+    with zipfile.ZipFile(target, "w") as zf:
+        zf.writestr("[Content_Types].xml", "<Types/>")
+        zf.writestr("word/document.xml", xml)
+    return target
+
+
+def _document_text(docx: bytes) -> list[str]:
+    import re
+
+    inner = zipfile.ZipFile(io.BytesIO(docx)).read("word/document.xml").decode("utf-8")
+    return re.findall(r"<w:t[^>]*>([^<]*)</w:t>", inner)
+
+
+def test_report_template_cache_reparses_only_when_mtime_changes(tmp_path):
+    import os
+
+    path = _write_carbon_statement_template(tmp_path)
+    first = final_report._get_report_template(path)
+    assert final_report._get_report_template(path) is first
+    st = path.stat()
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+    assert final_report._get_report_template(path) is not first
+
+
+def test_carbon_statement_fill_uses_pristine_cached_tree(tmp_path, monkeypatch):
+    path = _write_carbon_statement_template(tmp_path)
+    monkeypatch.setattr(final_report, "resolve_final_report_template", lambda: path)
+    monkeypatch.setattr(final_report, "_load_yellow_numeric_field_map", lambda: ["natural_gas_scope_kg"])
+    final_report._report_template_cache.pop(str(path), None)
+
+    base = {"scope_kg": {"scope1": 1}, "org_registered_address": "1 Test Street", "version": "2.0"}
+    docx, _ = api.build_final_report_docx_bytes({**base, "project_number": "P-1", "grand_total_kg": 1234})
+    texts = _document_text(docx)
+    assert "P-1" in texts and "1 Test Street" in texts and "Version 2.0" in texts
+    assert "Total 1,234.00 kg" in texts
+    # Detail cells are rewritten, so the body paragraph is the first yellow-map slot.
+    assert "0.50" in texts and "0.00" not in texts
+
+    docx, _ = api.build_final_report_docx_bytes({**base, "project_number": "P-2", "grand_total_kg": 5})
+    texts = _document_text(docx)
+    assert "P-2" in texts and "P-1" not in texts
+    assert "Total 5.00 kg" in texts
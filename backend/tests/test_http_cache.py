@@ -0,0 +1,80 @@
+"""ETag revalidation and response compression for /api/factors and /api/data."""
+from __future__ import annotations
+
+import copy
+import gzip
+import sys
+from pathlib import Path
+
+BACKEND_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(BACKEND_ROOT))
+
+import http_cache  # noqa: E402
+import mongo_api as api  # noqa: E402
+
+
+def _client(monkeypatch):
+    monkeypatch.setattr(api, "get_users_col", lambda: object())
+    monkeypatch.setattr(api, "_mongodb_audit_logging_enabled", lambda: False)
+    monkeypatch.setattr(
+        api, "_find_user_by_login", lambda users_col, ident: {"email": "a@example.com", "organization_id": "org-1"},
+    )
+    with api.app.app_context():
+        token = api.create_access_token(identity="a@example.com")
+    return api.app.test_client(), {"Authorization": f"Bearer {token}"}
+
+
+def test_factors_revalidate_with_etag(monkeypatch):
+    client, headers = _client(monkeypatch)
+    calls = []
+    monkeypatch.setattr(api, "get_catalog_col", lambda: object())
+    monkeypatch.setattr(api, "_factor_catalog_etag", lambda: http_cache.strong_etag("factors", 3))
+    monkeypatch.setattr(api, "list_catalog_factor_documents", lambda: calls.append(1) or [{"country_key": "UK"}])
+
+    r = client.get("/api/factors", headers=headers)
+    assert r.status_code == 200 and r.headers["Cache-Control"] == "private, no-cache"
+    etag = r.headers["ETag"]
+
+    r = client.get("/api/factors", headers={**headers, "If-None-Match": etag})
+    assert r.status_code == 304 and r.data == b"" and r.headers["ETag"] == etag
+    assert len(calls) == 1
+
+
+def test_data_etag_follows_version_and_query(monkeypatch):
+    stored = {"_id": 1, "organization_id": "org-1", "sites": {"s1": {"name": "HQ"}},
+              "updated_at": "t1", "data_version": 4}
+
+    class FakeData:
+        def find_one(self, query, projection=None):
+            return copy.deepcopy(stored)
+
+    monkeypatch.setattr(api, "get_data_col", lambda: FakeData())
+    client, headers = _client(monkeypatch)
+
+    r = client.get("/api/data", headers=headers)
+    assert r.status_code == 200 and "data_version" not in r.get_json()
+    etag = r.headers["ETag"]
+    assert client.get("/api/data", headers={**headers, "If-None-Match": etag}).status_code == 304
+    assert client.get("/api/data?site_id=s1", headers=headers).headers["ETag"] != etag
+
+    stored["data_version"] = 5
+    assert client.get("/api/data", headers={**headers, "If-None-Match": etag}).status_code == 200
+
+
+def test_large_json_is_gzipped_with_encoded_etag(monkeypatch):
+    client, headers = _client(monkeypatch)
+    monkeypatch.setattr(http_cache, "brotli", None)
+    monkeypatch.setattr(api, "get_catalog_col", lambda: object())
+    monkeypatch.setattr(api, "_factor_catalog_etag", lambda: "abc")
+    factors = [{"country_key": "UK", "row": n} for n in range(200)]
+    monkeypatch.setattr(api, "list_catalog_factor_documents", lambda: factors)
+
+    r = client.get("/api/factors", headers={**headers, "Accept-Encoding": "gzip"})
+    assert r.headers["Content-Encoding"] == "gzip" and "Accept-Encoding" in r.headers["Vary"]
+    assert r.headers["ETag"] == '"abc-gzip"'
+    assert gzip.decompress(r.data).startswith(b"[")
+    r = client.get("/api/factors", headers={**headers, "If-None-Match": '"abc-gzip"'})
+    assert r.status_code == 304
+
+    plain = client.get("/api/factors", headers=headers)
+    assert "Content-Encoding" not in plain.headers and plain.get_json() == factors
@@ -0,0 +1,58 @@
+"""Fast JSON provider: native datetime/ObjectId encoding, fallbacks and streamed responses."""
+from __future__ import annotations
+
+import datetime
+import gzip
+import json
+import sys
+from pathlib import Path
+
+import pytest
+from bson import ObjectId
+
+BACKEND_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(BACKEND_ROOT))
+
+import json_provider  # noqa: E402
+import mongo_api as api  # noqa: E402
+
+
+@pytest.fixture
+def provider():
+    return json_provider.FastJSONProvider(api.app)
+
+
+def test_encodes_datetimes_and_object_ids(provider):
+    oid = ObjectId()
+    doc = {"b": oid, "a": datetime.datetime(2025, 3, 1, 12, 30), "big": 2 ** 70}
+    out = json.loads(provider.dumps(doc))
+    assert out == {"a": "2025-03-01T12:30:00+00:00", "b": str(oid), "big": 2 ** 70}
+    assert provider.dumps({"b": 1, "a": 2}) == '{"a":2,"b":1}'
+    with pytest.raises(TypeError):
+        provider.dumps({"x": object()})
+
+
+def test_stream_chunks_match_the_buffered_body(provider):
+    doc = {"sites": {f"s{n}": {"name": f"Site {n}", "months": [n] * 12} for n in range(300)}, "email": "a@example.com"}
+    chunks = list(provider.iter_chunks(doc, chunk_size=1024))
+    assert len(chunks) > 5
+    assert b"".join(chunks) == provider.dumps_bytes(doc) + b"\n"
+    assert b"".join(provider.iter_chunks([])) == b"[]\n"
+
+
+def test_large_factor_lists_stream_with_gzip(monkeypatch):
+    monkeypatch.setattr(api, "get_users_col", lambda: object())
+    monkeypatch.setattr(api, "_mongodb_audit_logging_enabled", lambda: False)
+    monkeypatch.setattr(api, "_find_user_by_login", lambda users_col, ident: {"email": "a@example.com", "organization_id": "org-1"})
+    monkeypatch.setattr(api, "get_catalog_col", lambda: object())
+    monkeypatch.setattr(api, "_factor_catalog_etag", lambda: "v1")
+    factors = [{"country_key": f"C{n}", "updated_at": datetime.datetime(2025, 1, 1)} for n in range(api.JSON_STREAM_MIN_ITEMS)]
+    monkeypatch.setattr(api, "list_catalog_factor_documents", lambda: factors)
+    with api.app.app_context():
+        token = api.create_access_token(identity="a@example.com")
+    client = api.app.test_client()
+
+    r = client.get("/api/factors", headers={"Authorization": f"Bearer {token}", "Accept-Encoding": "gzip"})
+    assert r.is_streamed and r.headers["Content-Encoding"] == "gzip" and "Content-Length" not in r.headers
+    body = json.loads(gzip.decompress(r.get_data()))
+    assert len(body) == len(factors) and body[0]["updated_at"] == "2025-01-01T00:00:00+00:00"
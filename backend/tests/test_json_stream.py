@@ -0,0 +1,84 @@
+"""Streaming JSON bodies: incremental object parsing and the POST /api/data size budgets."""
+from __future__ import annotations
+
+import io
+import json
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+
+BACKEND_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(BACKEND_ROOT))
+
+import json_stream  # noqa: E402
+import mongo_api as api  # noqa: E402
+
+DOC = {
+    "org_preferences": {"companyName": "Acme", "companyLogo": "x" * 3000},
+    "sites": {f"s{n}": {"name": "Café " * n, "data": {"energy": [{"year": 2024, "months": [1.5] * 12}]}} for n in range(20)},
+    "count": 1234567,
+}
+
+
+def _parse(raw: bytes, **kwargs):
+    out = {}
+    for path, value in json_stream.iter_object_stream(io.BytesIO(raw), stream_keys=["sites"], **kwargs):
+        if len(path) == 1:
+            out[path[0]] = value
+        else:
+            out[path[0]][path[1]] = value
+    return out
+
+
+@pytest.mark.parametrize("chunk_size", [1, 5, 256, 1 << 20])
+def test_parses_any_chunking(chunk_size):
+    raw = json.dumps(DOC, indent=1).encode()
+    assert _parse(raw, max_total=len(raw), max_value=10_000, chunk_size=chunk_size) == DOC
+
+
+def test_budgets_and_malformed_bodies():
+    raw = json.dumps(DOC).encode()
+    with pytest.raises(json_stream.PayloadTooLarge):
+        _parse(raw, max_total=len(raw) - 1, max_value=10_000)
+    with pytest.raises(json_stream.PayloadTooLarge):
+        _parse(raw, max_total=len(raw), max_value=1000, chunk_size=64)
+    for bad in (b"[]", b'{"a": 1', b'{"a": 1} {}', b'{"sites": {"a": tru}}', b""):
+        with pytest.raises(json_stream.PayloadError):
+            _parse(bad, max_total=100, max_value=100, chunk_size=3)
+
+
+def test_save_rejects_oversized_bodies_before_reading(monkeypatch):
+    stored = {"organization_id": "org-1", "sites": {}}
+    writes = []
+
+    class FakeData:
+        def find_one(self, query, projection=None):
+            return dict(stored)
+
+        def update_one(self, query, update, upsert=False):
+            writes.append(update)
+            return SimpleNamespace(matched_count=1)
+
+    monkeypatch.setattr(api, "get_data_col", lambda: FakeData())
+    monkeypatch.setattr(api, "get_users_col", lambda: object())
+    monkeypatch.setattr(api, "_mongodb_audit_logging_enabled", lambda: False)
+    monkeypatch.setattr(api, "_queue_rollup_update", lambda *a, **k: None)
+    monkeypatch.setattr(api, "_find_user_by_login", lambda users_col, ident: {"email": "a@example.com", "organization_id": "org-1"})
+    monkeypatch.setattr(api, "USER_DATA_MAX_BYTES", 4000)
+    monkeypatch.setattr(api, "USER_DATA_SITE_MAX_BYTES", 500)
+    with api.app.app_context():
+        token = api.create_access_token(identity="a@example.com")
+    client, headers = api.app.test_client(), {"Authorization": f"Bearer {token}"}
+
+    assert client.post("/api/data", headers=headers, json={"sites": {"a": {"notes": "x" * 5000}}}).status_code == 413
+    assert client.post("/api/data", headers=headers, json={"sites": {"a": {"notes": "x" * 600}}}).status_code == 413
+    assert client.post("/api/data", headers=headers, data="{\"sites\": ", content_type="application/json").status_code == 400
+    assert writes == []
+
+    r = client.post("/api/data", headers=headers, json={"sites": {"a": {"name": "HQ", "data": {"energy": [{"year": 1990}]}}}})
+    assert r.status_code == 200, r.data
+    saved = writes[-1]["$set"]
+    assert saved["sites"]["a"]["data"]["energy"][0]["year"] == 2020
+    assert saved["content_hashes"] == api.content_hashes_for_sites(saved["sites"])
@@ -0,0 +1,154 @@
+"""Membership and role claims in access tokens: claims-first authorization and version checks."""
+from __future__ import annotations
+
+import sys
+from pathlib import Path
+
+BACKEND_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(BACKEND_ROOT))
+
+import mongo_api as api  # noqa: E402
+
+CONSULTANT = {
+    "_id": "u1",
+    "email": "consultant@example.com",
+    "username": "consult",
+    "is_consultant": True,
+    "membership_version": 3,
+    "memberships": [{"organization_id": "org-1", "organization_name": "Org One", "role": "consultant"}],
+}
+
+
+class CountingUsers:
+    def __init__(self):
+        self.updates = []
+
+    def update_one(self, query, update):
+        self.updates.append(update)
+
+
+def _client(monkeypatch, user):
+    lookups = []
+    monkeypatch.setattr(api, "_membership_versions", api.OrderedDict())
+    monkeypatch.setattr(api, "get_catalog_col", lambda: object())
+    monkeypatch.setattr(api, "list_catalog_factor_documents", lambda: [{"country_key": "UK_2025"}])
+    monkeypatch.setattr(api, "get_users_col", lambda: object())
+    monkeypatch.setattr(api, "_find_user_by_login", lambda users_col, ident: lookups.append(ident) or user)
+    with api.app.app_context():
+        token = api.create_access_token(identity=user["email"], additional_claims=api._membership_claims(user))
+    headers = {"Authorization": f"Bearer {token}", "X-Organization-Id": "org-1"}
+    return api.app.test_client(), headers, lookups
+
+
+def test_factors_authorize_from_claims_without_user_query(monkeypatch):
+    client, headers, lookups = _client(monkeypatch, CONSULTANT)
+    r = client.get("/api/factors", headers=headers)
+    assert r.status_code == 200, r.data
+    assert lookups == ["consultant@example.com"]  # first sight of this identity loads its version
+    r = client.get("/api/factors", headers=headers)
+    assert r.status_code == 200
+    r = client.get("/api/factors", headers={**headers, "X-Organization-Id": "org-2"})
+    assert r.status_code == 400
+    assert lookups == ["consultant@example.com"]
+
+
+def test_stale_token_in_a_fresh_process_goes_to_the_database(monkeypatch):
+    # Membership was revoked in another process: this one has no version for the identity yet.
+    revoked = {**CONSULTANT, "membership_version": 4, "memberships": []}
+    client, headers, lookups = _client(monkeypatch, revoked)
+    with api.app.app_context():
+        stale = api.create_access_token(identity=CONSULTANT["email"], additional_claims=api._membership_claims(CONSULTANT))
+    headers = {**headers, "Authorization": f"Bearer {stale}"}
+
+    r = client.get("/api/factors", headers=headers)
+    assert r.status_code == 400
+    r = client.get("/api/factors", headers=headers)
+    assert r.status_code == 400
+    assert lookups == ["consultant@example.com", "consultant@example.com"]
+
+
+def test_membership_change_sends_older_tokens_to_the_database(monkeypatch):
+    client, headers, lookups = _client(monkeypatch, CONSULTANT)
+    users = CountingUsers()
+    assert api._append_consultant_workbench(users, CONSULTANT, "org-2", "Org Two")
+    assert users.updates[0]["$inc"] == {"membership_version": 1}
+
+    r = client.get("/api/factors", headers=headers)
+    assert r.status_code == 200
+    assert lookups == ["consultant@example.com"]
+
+
+def test_tokens_without_claims_still_resolve_the_user(monkeypatch):
+    client, headers, lookups = _client(monkeypatch, CONSULTANT)
+    with api.app.app_context():
+        bare = api.create_access_token(identity="consultant@example.com")
+    r = client.get("/api/factors", headers={**headers, "Authorization": f"Bearer {bare}"})
+    assert r.status_code == 200
+    assert lookups == ["consultant@example.com"]
+
+
+class FindOneUsers:
+    full_name = "test.users"
+
+    def __init__(self, docs):
+        self.docs = docs
+        self.queries = []
+
+    def find_one(self, query):
+        self.queries.append(query)
+        return next((dict(d) for d in self.docs if all(d.get(k) == v for k, v in query.items())), None)
+
+
+def test_user_lookups_are_cached_until_invalidated(monkeypatch):
+    monkeypatch.setattr(api, "_user_cache", api.OrderedDict())
+    users = FindOneUsers([dict(CONSULTANT)])
+
+    first = api._find_user_by_login(users, "consult")
+    first["is_consultant"] = False  # callers get copies
+    assert api._find_user_by_login(users, "consult")["is_consultant"] is True
+    assert api._find_user_by_email(users, "consultant@example.com")["_id"] == "u1"
+    assert len(users.queries) == 2
+
+    assert api._find_user_by_email(users, "nobody@example.com") is None
+    assert api._find_user_by_email(users, "nobody@example.com") is None
+    assert len(users.queries) == 6  # misses are not cached (normalized + legacy query each)
+
+    users.docs[0]["full_name"] = "Renamed"
+    api._invalidate_user_cache({"_id": "u1"})
+    assert api._find_user_by_login(users, "consult")["full_name"] == "Renamed"
+
+
+def test_change_in_another_worker_is_seen_once_the_version_check_expires(monkeypatch):
+    users = FindOneUsers([dict(CONSULTANT)])
+    monkeypatch.setattr(api, "_membership_versions", api.OrderedDict())
+    monkeypatch.setattr(api, "_user_cache", api.OrderedDict())
+    monkeypatch.setattr(api, "get_catalog_col", lambda: object())
+    monkeypatch.setattr(api, "list_catalog_factor_documents", lambda: [{"country_key": "UK_2025"}])
+    monkeypatch.setattr(api, "get_users_col", lambda: users)
+    with api.app.app_context():
+        token = api.create_access_token(identity=CONSULTANT["email"], additional_claims=api._membership_claims(CONSULTANT))
+    client = api.app.test_client()
+    headers = {"Authorization": f"Bearer {token}", "X-Organization-Id": "org-1"}
+
+    assert client.get("/api/factors", headers=headers).status_code == 200
+    reads = len(users.queries)
+    assert reads > 0
+    # Another worker revokes the membership; this process's user cache does not hear about it.
+    users.docs[0].update(membership_version=4, memberships=[])
+    assert client.get("/api/factors", headers=headers).status_code == 200
+    assert len(users.queries) == reads  # still within the check's TTL
+
+    for key, (_until, version) in list(api._membership_versions.items()):
+        api._membership_versions[key] = (0.0, version)
+    assert client.get("/api/factors", headers=headers).status_code == 400
+    assert len(users.queries) > reads  # re-read from the database, not the user cache
+
+
+def test_membership_versions_are_capped(monkeypatch):
+    monkeypatch.setattr(api, "_membership_versions", api.OrderedDict())
+    monkeypatch.setattr(api, "_MEMBERSHIP_VERSIONS_MAX", 2)
+    for n in range(3):
+        api._note_membership_version({"email": f"u{n}@example.com", "membership_version": n}, checked=True)
+    assert list(api._membership_versions) == ["u1@example.com", "u2@example.com"]
+    assert api._checked_membership_version("u0@example.com") is None
+    assert api._checked_membership_version("u2@example.com") == 2
@@ -0,0 +1,129 @@
+"""Company logo blob store: content-addressed storage, save externalization and PNG caching."""
+from __future__ import annotations
+
+import base64
+import copy
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+
+BACKEND_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(BACKEND_ROOT))
+
+import final_report  # noqa: E402
+import mongo_api as api  # noqa: E402
+from blob_store import LocalBlobStore, blob_ref_for, decode_image_data_url  # noqa: E402
+
+PNG_BYTES = base64.b64decode(
+    "iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAADUlEQVR42mP8z8BQDwAEhQGAhKmMIQAAAABJRU5ErkJggg=="
+)
+PNG_DATA_URL = "data:image/png;base64," + base64.b64encode(PNG_BYTES).decode()
+
+
+class FakeDataCollection:
+    def __init__(self, doc):
+        self.doc = doc
+        self.updates = []
+
+    def find_one(self, query, projection=None):
+        return copy.deepcopy(self.doc)
+
+    def update_one(self, query, update, upsert=False):
+        self.updates.append(update)
+        for path, value in update.get("$set", {}).items():
+            self.doc[path] = value
+        return SimpleNamespace(matched_count=1)
+
+
+def _client(monkeypatch, tmp_path, doc):
+    col = FakeDataCollection(doc)
+    store = LocalBlobStore(tmp_path)
+    monkeypatch.setattr(api, "get_blob_store", lambda: store)
+    monkeypatch.setattr(api, "get_data_col", lambda: col)
+    monkeypatch.setattr(api, "get_users_col", lambda: object())
+    monkeypatch.setattr(
+        api,
+        "_find_user_by_login",
+        lambda users_col, ident: {"email": "a@example.com", "organization_id": "org-1"},
+    )
+    monkeypatch.setattr(api, "_record_audit_event", lambda *a, **k: None)
+    with api.app.app_context():
+        token = api.create_access_token(identity="a@example.com")
+    return api.app.test_client(), col, store, {"Authorization": f"Bearer {token}"}
+
+
+def test_local_store_is_content_addressed(tmp_path):
+    store = LocalBlobStore(tmp_path)
+    ref = store.put(PNG_BYTES, "image/png")
+    assert ref == blob_ref_for(PNG_BYTES)
+    assert store.put(PNG_BYTES, "image/png") == ref
+    assert store.get(ref) == (PNG_BYTES, "image/png")
+    assert store.get("0" * 64) is None
+    assert store.get("../etc/passwd") is None
+    assert decode_image_data_url(PNG_DATA_URL) == (PNG_BYTES, "image/png")
+
+
+def test_save_moves_logo_out_of_org_preferences(monkeypatch, tmp_path):
+    client, col, store, headers = _client(monkeypatch, tmp_path, {"org_preferences": {"companyName": "Acme"}})
+    r = client.post("/api/data", headers=headers, json={"org_preferences": {"companyLogo": PNG_DATA_URL}})
+    assert r.status_code == 200, r.data
+
+    prefs = col.updates[0]["$set"]["org_preferences"]
+    ref = blob_ref_for(PNG_BYTES)
+    assert prefs == {"companyName": "Acme", "companyLogoRef": ref}
+    assert store.get(ref)[0] == PNG_BYTES
+
+    r = client.get("/api/organization/logo", headers=headers)
+    assert r.status_code == 200
+    assert r.data == PNG_BYTES and r.mimetype == "image/png"
+    r = client.get("/api/organization/logo", headers={**headers, "If-None-Match": f'"{ref}"'})
+    assert r.status_code == 304
+
+
+def test_client_cannot_swap_logo_ref(monkeypatch, tmp_path):
+    stored_ref = blob_ref_for(PNG_BYTES)
+    client, col, _store, headers = _client(
+        monkeypatch, tmp_path, {"org_preferences": {"companyLogoRef": stored_ref}}
+    )
+    r = client.post("/api/data", headers=headers, json={"org_preferences": {"companyLogoRef": "a" * 64}})
+    assert r.status_code == 200, r.data
+    assert col.updates[0]["$set"]["org_preferences"]["companyLogoRef"] == stored_ref
+
+
+def test_patch_preferences_externalize_logo(monkeypatch, tmp_path):
+    client, col, _store, headers = _client(
+        monkeypatch, tmp_path, {"org_preferences": {"companyLogo": PNG_DATA_URL}}
+    )
+    r = client.patch("/api/data", headers=headers, json={"ops": [
+        {"op": "set_preferences", "preferences": {"companyLogo": PNG_DATA_URL}},
+    ]})
+    assert r.status_code == 200, r.data
+    update = col.updates[0]
+    assert update["$set"]["org_preferences.companyLogoRef"] == blob_ref_for(PNG_BYTES)
+    assert "org_preferences.companyLogo" in update["$unset"]
+
+
+def test_rejected_patch_stores_no_logo(monkeypatch, tmp_path):
+    client, col, store, headers = _client(monkeypatch, tmp_path, {"org_preferences": {}})
+    r = client.patch("/api/data", headers=headers, json={"ops": [
+        {"op": "set_preferences", "preferences": {"companyLogo": PNG_DATA_URL}},
+        {"op": "set_site_fields", "site_id": "no-such-site", "fields": {"name": "HQ"}},
+    ]})
+    assert r.status_code == 400
+    assert store.get(blob_ref_for(PNG_BYTES)) is None
+    assert col.updates == []
+
+
+def test_logo_png_conversion_is_cached(monkeypatch, tmp_path):
+    store = LocalBlobStore(tmp_path)
+    ref = store.put(PNG_BYTES, "image/png")
+    reads = []
+    real_get = store.get
+    monkeypatch.setattr(store, "get", lambda r: reads.append(r) or real_get(r))
+    monkeypatch.setattr(api, "get_blob_store", lambda: store)
+    final_report._logo_png_cache.clear()
+
+    assert api._png_bytes_from_logo_ref(ref) == PNG_BYTES
+    assert api._png_bytes_from_logo_ref(ref) == PNG_BYTES
+    assert reads == [ref]
+    assert api._png_bytes_from_logo_ref("not-a-ref") is None
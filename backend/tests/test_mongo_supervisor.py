@@ -0,0 +1,93 @@
+"""MongoDB supervisor: circuit breaker, background reconnects and the cached health endpoints."""
+from __future__ import annotations
+
+import sys
+import time
+from pathlib import Path
+
+from pymongo.errors import ServerSelectionTimeoutError
+
+BACKEND_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(BACKEND_ROOT))
+
+import mongo_api as api  # noqa: E402
+import mongo_supervisor  # noqa: E402
+
+
+class FlakyServer:
+    def __init__(self):
+        self.up = False
+        self.pings = 0
+
+    def ping(self, db):
+        self.pings += 1
+        if not self.up:
+            raise ServerSelectionTimeoutError("no servers")
+
+
+def _wait_for(predicate, timeout=3.0):
+    deadline = time.monotonic() + timeout
+    while not predicate() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return predicate()
+
+
+def test_circuit_opens_fails_fast_and_recovers():
+    server = FlakyServer()
+    connects = []
+    supervisor = mongo_supervisor.MongoSupervisor(
+        lambda: connects.append(1) or "db", server.ping, ping_interval=0.05, backoff_min=0.05, backoff_max=0.1,
+    )
+    assert supervisor.get_db() is None
+    assert supervisor.state == mongo_supervisor.OPEN
+    pings = server.pings
+    assert supervisor.get_db() is None and server.pings == pings  # no wait, no I/O on the request path
+    assert supervisor.status()["consecutive_failures"] >= 1
+
+    server.up = True
+    assert _wait_for(lambda: supervisor.get_db() == "db")
+    assert connects == [1]  # the client is reused across reconnects
+    status = supervisor.status()
+    assert status["connected"] and status["last_error"] is None and status["latency_ms"] is not None
+
+    supervisor.report_failure(ServerSelectionTimeoutError("primary gone"))
+    assert supervisor.get_db() is None
+    assert _wait_for(lambda: supervisor.get_db() == "db")
+
+
+def test_health_endpoints_use_the_cached_state(monkeypatch):
+    server = FlakyServer()
+    supervisor = mongo_supervisor.MongoSupervisor(lambda: "db", server.ping, ping_interval=60, backoff_min=60)
+    monkeypatch.setattr(api, "_mongo", supervisor)
+    client = api.app.test_client()
+
+    assert supervisor.get_db() is None
+    pings = server.pings
+    assert client.get("/health/live").get_json() == {"status": "alive"}
+    r = client.get("/health/ready")
+    assert r.status_code == 503 and r.get_json()["db"]["state"] == "open"
+    assert client.get("/").get_json()["db"] == "disconnected"
+    assert server.pings == pings
+
+    server.up = True
+    supervisor._attempt()
+    assert client.get("/health/ready").status_code == 200
+    assert client.get("/").get_json()["db"] == "connected"
+
+
+def test_connection_errors_in_routes_answer_503_and_open_the_circuit(monkeypatch):
+    supervisor = mongo_supervisor.MongoSupervisor(lambda: {"user_data": object()}, lambda db: None, ping_interval=60, backoff_min=60)
+    supervisor.get_db()
+    monkeypatch.setattr(api, "_mongo", supervisor)
+    monkeypatch.setattr(api, "_resolve_request_organization_id", lambda user: "org-1")
+
+    def unreachable(*args, **kwargs):
+        raise ServerSelectionTimeoutError("timed out")
+
+    monkeypatch.setattr(api, "get_users_col", lambda: object())
+    monkeypatch.setattr(api, "_find_user_by_login", unreachable)
+    with api.app.app_context():
+        token = api.create_access_token(identity="a@example.com")
+    r = api.app.test_client().get("/api/data", headers={"Authorization": f"Bearer {token}"})
+    assert r.status_code == 503 and r.get_json() == {"msg": "DB Error"}
+    assert supervisor.state == mongo_supervisor.OPEN
@@ -0,0 +1,239 @@
+"""Packed months storage: codec round trips, update packing and the /api/data storage boundary."""
+from __future__ import annotations
+
+import copy
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+
+from bson import Binary
+
+BACKEND_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(BACKEND_ROOT))
+
+import months_codec  # noqa: E402
+import mongo_api as api  # noqa: E402
+from audit_log import diff_user_data_payload  # noqa: E402
+
+MONTHS = [0.1, 2.0, 1e-9, 123456.789, 0.0, 5.5, 6.0, 7.0, 8.0, 9.0, 10.0, 11.25]
+
+
+def _sites(count=3):
+    return {
+        f"s{n}": {"name": f"Site {n}", "data": {"energy": [
+            {"description": "meter", "year": 2025, "months": list(MONTHS), "unit": "kwh"},
+        ] * 4}}
+        for n in range(count)
+    }
+
+
+def test_round_trips_and_sizes():
+    f64 = months_codec.pack_months(MONTHS, "f64")
+    assert isinstance(f64, Binary) and len(f64) == 96
+    assert months_codec.unpack_months(f64) == MONTHS
+    f32 = months_codec.unpack_months(months_codec.pack_months(MONTHS, "f32"))
+    assert f32[0] == 0.1 and f32[3] == 123456.8
+    assert months_codec.unpack_months(months_codec.pack_months([1e39] * 12, "f32")) == [1e39] * 12
+    assert months_codec.pack_months([1, "x"], "f64") == [1, "x"]
+
+    sites = _sites()
+    report = months_codec.months_size_report(sites)
+    assert report["rows"] == 12
+    assert report["f32_bytes"] < report["f64_bytes"] < report["list_bytes"]
+    packed = months_codec.pack_sites(sites, "f64")
+    assert sites["s0"]["data"]["energy"][0]["months"] == MONTHS  # input untouched
+    assert months_codec.unpack_user_data({"sites": packed})["sites"] == sites
+
+
+def test_pack_update_paths():
+    row = {"year": 2025, "months": list(MONTHS)}
+    update = months_codec.pack_update({
+        "$set": {
+            "sites.a.data.energy.0": row,
+            "sites.a.data.water": [row],
+            "sites.b": {"name": "B", "data": {"waste": [row]}},
+            "sites.a.name": "A",
+            "content_hashes.a": {"site": "x"},
+        },
+        "$push": {"sites.a.data.energy": {"$each": [row]}},
+        "$unset": {"sites.c": ""},
+    }, "f64")
+    assert isinstance(update["$set"]["sites.a.data.energy.0"]["months"], Binary)
+    assert isinstance(update["$set"]["sites.a.data.water"][0]["months"], Binary)
+    assert isinstance(update["$set"]["sites.b"]["data"]["waste"][0]["months"], Binary)
+    assert isinstance(update["$push"]["sites.a.data.energy"]["$each"][0]["months"], Binary)
+    assert update["$set"]["sites.a.name"] == "A" and update["$unset"] == {"sites.c": ""}
+    assert row["months"] == MONTHS
+
+
+def _client(monkeypatch, fmt):
+    stored = {"_id": 1, "organization_id": "org-1"}
+
+    class FakeData:
+        def find_one(self, query, projection=None):
+            return copy.deepcopy(stored)
+
+        def update_one(self, query, update, upsert=False):
+            for path, value in update.get("$set", {}).items():
+                node = stored
+                *parents, last = path.split(".")
+                for part in parents:
+                    node = node[int(part)] if isinstance(node, list) else node.setdefault(part, {})
+                if isinstance(node, list):
+                    node[int(last)] = value
+                else:
+                    node[last] = value
+            return SimpleNamespace(matched_count=1)
+
+    monkeypatch.setattr(api, "MONTHS_STORAGE", fmt)
+    monkeypatch.setattr(api, "get_data_col", lambda: FakeData())
+    monkeypatch.setattr(api, "get_users_col", lambda: object())
+    monkeypatch.setattr(api, "_mongodb_audit_logging_enabled", lambda: False)
+    monkeypatch.setattr(api, "_queue_rollup_update", lambda *a, **k: None)
+    monkeypatch.setattr(api, "_find_user_by_login", lambda users_col, ident: {"email": "a@example.com", "organization_id": "org-1"})
+    with api.app.app_context():
+        token = api.create_access_token(identity="a@example.com")
+    return api.app.test_client(), {"Authorization": f"Bearer {token}"}, stored
+
+
+def test_routes_store_packed_and_serve_lists(monkeypatch):
+    client, headers, stored = _client(monkeypatch, "f64")
+    assert client.post("/api/data", headers=headers, json={"sites": _sites(1)}).status_code == 200
+    assert isinstance(stored["sites"]["s0"]["data"]["energy"][0]["months"], Binary)
+    unpacked = months_codec.unpack_user_data(copy.deepcopy(stored))["sites"]
+    assert stored["content_hashes"] == api.content_hashes_for_sites(unpacked)
+
+    row = {"description": "meter", "year": 2025, "months": [7.0] * 12, "unit": "kwh"}
+    r = client.patch("/api/data", headers=headers, json={"ops": [
+        {"op": "set_row", "site_id": "s0", "category": "energy", "index": 1, "row": row},
+    ]})
+    assert r.status_code == 200, r.data
+    assert isinstance(stored["sites"]["s0"]["data"]["energy"][1]["months"], Binary)
+
+    energy = client.get("/api/data", headers=headers).get_json()["sites"]["s0"]["data"]["energy"]
+    assert energy[0]["months"] == MONTHS and energy[1]["months"] == [7.0] * 12
+
+
+def test_f32_hashes_what_reads_back(monkeypatch):
+    client, headers, stored = _client(monkeypatch, "f32")
+    audited = []
+    monkeypatch.setattr(api, "_record_audit_diff", lambda org_id, user, action, old, new: audited.append((old, new)))
+
+    assert client.post("/api/data", headers=headers, json={"sites": _sites(1)}).status_code == 200
+    unpacked = months_codec.unpack_user_data(copy.deepcopy(stored))["sites"]
+    assert stored["content_hashes"] == api.content_hashes_for_sites(unpacked)
+
+    # GET -> POST of what was stored changes nothing: same hashes, no audited change.
+    hashes = copy.deepcopy(stored["content_hashes"])
+    sites = client.get("/api/data", headers=headers).get_json()["sites"]
+    assert client.post("/api/data", headers=headers, json={"sites": sites}).status_code == 200
+    assert stored["content_hashes"] == hashes
+    assert diff_user_data_payload(*audited[-1]) == []
+
+    row = {"description": "meter", "year": 2025, "months": [0.1 + 0.2] * 12, "unit": "kwh"}
+    r = client.patch("/api/data", headers=headers, json={"ops": [
+        {"op": "set_row", "site_id": "s0", "category": "energy", "index": 1, "row": row},
+    ]})
+    assert r.status_code == 200, r.data
+    unpacked = months_codec.unpack_user_data(copy.deepcopy(stored))["sites"]
+    assert unpacked["s0"]["data"]["energy"][1]["months"] == [0.3] * 12
+    assert stored["content_hashes"]["s0"] == api.content_hashes_for_sites(unpacked)["s0"]
+
+
+def _dotted(doc, path):
+    for part in path.split("."):
+        doc = doc.get(part) if isinstance(doc, dict) else None
+    return doc
+
+
+class RacingData:
+    """user_data collection where `saves` saves land between each read and the next write."""
+
+    def __init__(self, doc, saves=0):
+        self.doc = doc
+        self.saves = saves
+
+    def find_one(self, query, projection=None):
+        return copy.deepcopy(self.doc)
+
+    def update_one(self, query, update, upsert=False):
+        if self.saves:
+            self.saves -= 1
+            self.doc["data_version"] += 1
+        matched = all(_dotted(self.doc, k) == v for k, v in query.items())
+        if matched:
+            self.doc.update(copy.deepcopy(update.get("$set", {})))
+            for field, n in update.get("$inc", {}).items():
+                self.doc[field] = self.doc.get(field, 0) + n
+        return SimpleNamespace(matched_count=int(matched))
+
+
+def _legacy_doc():
+    sites = _sites(1)
+    return {"_id": 1, "organization_id": "org-1", "updated_at": "t0", "data_version": 5,
+            "sites": sites, "content_hashes": api.content_hashes_for_sites(sites)}
+
+
+def test_repack_retries_after_a_concurrent_save_and_bumps_the_version():
+    data_col = RacingData(_legacy_doc(), saves=1)
+    assert months_codec.repack_org(data_col, None, "org-1", "f32", now="t1") == "repacked"
+    assert data_col.doc["data_version"] == 7  # the save's bump, then the repack's
+    assert data_col.doc["updated_at"] == "t1"
+    unpacked = months_codec.unpack_user_data(copy.deepcopy(data_col.doc))["sites"]
+    assert data_col.doc["content_hashes"] == api.content_hashes_for_sites(unpacked)
+
+    data_col = RacingData(_legacy_doc(), saves=3)
+    assert months_codec.repack_org(data_col, None, "org-1", "f32") == "conflict"
+    assert data_col.doc["sites"] == _sites(1)  # untouched
+
+
+def test_lossless_repack_keeps_the_version():
+    data_col = RacingData(_legacy_doc())
+    assert months_codec.repack_org(data_col, None, "org-1", "f64", now="t1") == "repacked"
+    assert isinstance(data_col.doc["sites"]["s0"]["data"]["energy"][0]["months"], Binary)
+    assert data_col.doc["data_version"] == 5 and data_col.doc["updated_at"] == "t0"
+
+
+class RacingSiteDocs:
+    """Site documents where a save rewrites s1 and adds s2 during the first repack write."""
+
+    def __init__(self, sites):
+        self.docs = [
+            {"organization_id": "org-1", "site_id": site_id, "position": n, "site": copy.deepcopy(site),
+             "content_hashes": api.content_hashes_for_sites({site_id: site})[site_id]}
+            for n, (site_id, site) in enumerate(sites.items())
+        ]
+        self.raced = False
+
+    def find(self, query, projection=None):
+        docs = [copy.deepcopy(d) for d in self.docs if d["organization_id"] == query["organization_id"]]
+        return SimpleNamespace(sort=lambda keys: sorted(docs, key=lambda d: d["position"]))
+
+    def bulk_write(self, ops, ordered=True):
+        if not self.raced:
+            self.raced = True
+            saved = dict(_sites(2)["s1"], name="Saved meanwhile")
+            self.docs[1]["site"] = saved
+            self.docs[1]["content_hashes"] = api.content_hashes_for_sites({"s1": saved})["s1"]
+            new = _sites(3)["s2"]
+            self.docs.append({"organization_id": "org-1", "site_id": "s2", "position": 2, "site": new,
+                              "content_hashes": api.content_hashes_for_sites({"s2": new})["s2"]})
+        matched = 0
+        for op in ops:
+            doc = next((d for d in self.docs if all(_dotted(d, k) == v for k, v in op._filter.items())), None)
+            if doc is not None:
+                matched += 1
+                doc.update(copy.deepcopy(op._doc["$set"]))
+        return SimpleNamespace(matched_count=matched)
+
+
+def test_site_layout_repack_leaves_concurrent_saves_alone():
+    header = {"_id": 1, "organization_id": "org-1", "storage_layout": "sites", "data_version": 5}
+    data_col, sites_col = RacingData(header), RacingSiteDocs(_sites(2))
+    assert months_codec.repack_org(data_col, sites_col, "org-1", "f32") == "repacked"
+    by_id = {d["site_id"]: d for d in sites_col.docs}
+    assert sorted(by_id) == ["s0", "s1", "s2"]
+    assert by_id["s1"]["site"]["name"] == "Saved meanwhile"
+    assert all(isinstance(d["site"]["data"]["energy"][0]["months"], Binary) for d in sites_col.docs)
+    assert data_col.doc["data_version"] == 7  # once per attempt that rewrote sites
+
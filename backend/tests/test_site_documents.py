@@ -0,0 +1,355 @@
+"""Per-site storage layout: migration, legacy-shape assembly and the /api/data routes on top of it."""
+from __future__ import annotations
+
+import copy
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+
+from pymongo import DeleteMany, DeleteOne, ReplaceOne, UpdateOne
+
+BACKEND_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(BACKEND_ROOT))
+
+import mongo_api as api  # noqa: E402
+import site_documents  # noqa: E402
+
+
+def _get(doc, path):
+    for part in path.split("."):
+        if not isinstance(doc, dict) or part not in doc:
+            return False, None
+        doc = doc[part]
+    return True, doc
+
+
+def _put(doc, path, value):
+    *parents, last = path.split(".")
+    for part in parents:
+        doc = doc.setdefault(part, {})
+    if isinstance(doc, list):
+        doc[int(last)] = value
+    else:
+        doc[last] = value
+
+
+def _matches(doc, query):
+    for key, cond in query.items():
+        found, value = _get(doc, key)
+        if isinstance(cond, dict) and "$in" in cond:
+            if value not in cond["$in"]:
+                return False
+        elif isinstance(cond, dict) and "$nin" in cond:
+            if value in cond["$nin"]:
+                return False
+        elif not found:
+            if cond is not None:  # like MongoDB, null matches a missing field
+                return False
+        elif value != cond:
+            return False
+    return True
+
+
+def _project(doc, projection):
+    if not projection or set(projection) == {"_id"}:
+        out = copy.deepcopy(doc)
+        if projection:
+            out.pop("_id", None)
+        return out
+    out = {} if projection.get("_id", 1) == 0 else {"_id": doc.get("_id")}
+    for path, flag in projection.items():
+        if path != "_id" and flag:
+            found, value = _get(doc, path)
+            if found:
+                _put(out, path, copy.deepcopy(value))
+    return out
+
+
+class FakeCursor(list):
+    def sort(self, keys):
+        for field, direction in reversed(keys):
+            super().sort(key=lambda d: _get(d, "_sort." + field)[1], reverse=direction < 0)
+        for d in self:
+            d.pop("_sort")
+        return self
+
+
+class FakeCollection:
+    def __init__(self, docs=()):
+        self.docs = [copy.deepcopy(d) for d in docs]
+        self.bulk_calls = []
+
+    def find_one(self, query, projection=None):
+        for doc in self.docs:
+            if _matches(doc, query):
+                return _project(doc, projection)
+        return None
+
+    def find(self, query, projection=None):
+        return FakeCursor({**_project(d, projection), "_sort": d} for d in self.docs if _matches(d, query))
+
+    def update_one(self, query, update, upsert=False):
+        doc = next((d for d in self.docs if _matches(d, query)), None)
+        matched = int(doc is not None)
+        if doc is None:
+            if not upsert:
+                return SimpleNamespace(matched_count=0)
+            doc = {k: v for k, v in query.items() if not isinstance(v, dict)}
+            doc["_id"] = len(self.docs) + 1
+            self.docs.append(doc)
+            for path, value in update.get("$setOnInsert", {}).items():
+                _put(doc, path, value)
+        for path, value in update.get("$set", {}).items():
+            _put(doc, path, copy.deepcopy(value))
+        for path in update.get("$unset", {}):
+            *parents, last = path.split(".")
+            found, parent = _get(doc, ".".join(parents)) if parents else (True, doc)
+            if found and isinstance(parent, dict):
+                parent.pop(last, None)
+        for path, value in update.get("$push", {}).items():
+            _found, rows = _get(doc, path)
+            if not isinstance(rows, list):
+                rows = []
+                _put(doc, path, rows)
+            rows.extend(copy.deepcopy(value["$each"]))
+        return SimpleNamespace(matched_count=matched)
+
+    def delete_many(self, query):
+        self.docs = [d for d in self.docs if not _matches(d, query)]
+
+    def bulk_write(self, ops, ordered=True):
+        self.bulk_calls.append(ops)
+        for op in ops:
+            if isinstance(op, ReplaceOne):
+                self.delete_many(op._filter)
+                self.docs.append(copy.deepcopy(op._doc))
+            elif isinstance(op, UpdateOne):
+                self.update_one(op._filter, op._doc, upsert=bool(op._upsert))
+            elif isinstance(op, DeleteMany):
+                self.delete_many(op._filter)
+            elif isinstance(op, DeleteOne):
+                doc = next((d for d in self.docs if _matches(d, op._filter)), None)
+                if doc is not None:
+                    self.docs.remove(doc)
+
+    def aggregate(self, pipeline):
+        # Just the shape wildcard_header_pipeline() produces: $match, $limit, $project.
+        docs = [d for d in self.docs if _matches(d, pipeline[0]["$match"])][: pipeline[1]["$limit"]]
+        project = dict(pipeline[2]["$project"])
+        site_expr = project.pop("sites")["$arrayToObject"]["$map"]["in"]["v"]
+
+        def evaluate(expr, site):
+            out = {}
+            for key, ref in expr.items():
+                found, value = (True, evaluate(ref, site)) if isinstance(ref, dict) else _get(site, ref[len("$$site.v."):])
+                if found:
+                    out[key] = value
+            return out
+
+        for doc in docs:
+            out = _project(doc, project)
+            out["sites"] = {k: evaluate(site_expr, v) for k, v in (doc.get("sites") or {}).items()}
+            yield out
+
+    def distinct(self, field):
+        return sorted({d.get(field) for d in self.docs})
+
+
+def _row(desc, month=1.0):
+    return {"description": desc, "year": 2025, "months": [month] + [0.0] * 11,
+            "emissionType": "electricity", "unit": "kwh"}
+
+
+LEGACY = {
+    "_id": 1,
+    "organization_id": "org-1",
+    "org_preferences": {"companyName": "Acme"},
+    "sites": {
+        "s2": {"name": "Depot", "data": {"energy": [_row("meter")]}},
+        "s1": {"name": "HQ", "data": {"energy": [_row("main")], "water": []}},
+    },
+}
+
+
+def test_migration_round_trip_keeps_legacy_shape():
+    data_col, sites_col = FakeCollection([LEGACY]), FakeCollection()
+    assert site_documents.migrate_org(data_col, sites_col, "org-1") == "migrated"
+    assert site_documents.migrate_org(data_col, sites_col, "org-1") == "unchanged"
+    header = data_col.docs[0]
+    assert "sites" not in header and header["storage_layout"] == "sites"
+    assert sorted(d["site_id"] for d in sites_col.docs) == ["s1", "s2"]
+
+    loaded = site_documents.load_user_data(data_col, lambda: sites_col, "org-1")
+    assert list(loaded["sites"]) == ["s2", "s1"]
+    assert loaded["sites"] == LEGACY["sites"]
+
+    one = site_documents.load_user_data(
+        data_col, lambda: sites_col, "org-1", {"_id": 0, "sites.s1.data.energy": 1, "org_preferences": 1},
+    )
+    assert one["sites"] == {"s1": {"data": {"energy": LEGACY["sites"]["s1"]["data"]["energy"]}}}
+    assert one["org_preferences"] == {"companyName": "Acme"}
+
+    assert site_documents.migrate_org(data_col, sites_col, "org-1", to="legacy") == "migrated"
+    assert sites_col.docs == []
+    assert data_col.docs[0]["sites"] == LEGACY["sites"]
+    assert "storage_layout" not in data_col.docs[0]
+
+
+class SavesDuringMigration(FakeCollection):
+    """Site documents collection whose writes race `saves` legacy saves into the header."""
+
+    def __init__(self, data_col, saves):
+        super().__init__()
+        self.data_col = data_col
+        self.saves = saves
+
+    def bulk_write(self, ops, ordered=True):
+        super().bulk_write(ops, ordered)
+        if self.saves:
+            self.saves -= 1
+            header = self.data_col.docs[0]
+            header["sites"]["s1"]["name"] = f"HQ v{header.get('data_version', 0) + 1}"
+            header["data_version"] = header.get("data_version", 0) + 1
+
+
+def test_migration_retries_when_a_save_lands_before_the_flip():
+    data_col = FakeCollection([LEGACY])
+    sites_col = SavesDuringMigration(data_col, saves=1)
+    assert site_documents.migrate_org(data_col, sites_col, "org-1") == "migrated"
+    loaded = site_documents.load_user_data(data_col, lambda: sites_col, "org-1")
+    assert loaded["sites"]["s1"]["name"] == "HQ v1"
+
+
+def test_migration_reports_a_conflict_and_keeps_the_legacy_document():
+    data_col = FakeCollection([LEGACY])
+    sites_col = SavesDuringMigration(data_col, saves=3)
+    assert site_documents.migrate_org(data_col, sites_col, "org-1") == "conflict"
+    header = data_col.docs[0]
+    assert "storage_layout" not in header
+    assert header["sites"]["s1"]["name"] == "HQ v3"
+
+
+def _client(monkeypatch, data_col, sites_col):
+    monkeypatch.setattr(api, "get_data_col", lambda: data_col)
+    monkeypatch.setattr(api, "get_sites_col", lambda: sites_col)
+    monkeypatch.setattr(api, "get_users_col", lambda: object())
+    monkeypatch.setattr(api, "_mongodb_audit_logging_enabled", lambda: False)
+    monkeypatch.setattr(
+        api, "_find_user_by_login", lambda users_col, ident: {"email": "a@example.com", "organization_id": "org-1"},
+    )
+    with api.app.app_context():
+        token = api.create_access_token(identity="a@example.com")
+    return api.app.test_client(), {"Authorization": f"Bearer {token}"}
+
+
+def test_save_and_get_in_site_layout(monkeypatch):
+    data_col, sites_col = FakeCollection([LEGACY]), FakeCollection()
+    site_documents.migrate_org(data_col, sites_col, "org-1")
+    client, headers = _client(monkeypatch, data_col, sites_col)
+
+    before = client.get("/api/data", headers=headers).get_json()
+    assert "storage_layout" not in before and "content_hashes" not in before
+    sites = before["sites"]
+    sites["s1"]["name"] = "Head office"
+    del sites["s2"]
+    sites["s3"] = {"name": "Annex"}
+    r = client.post("/api/data", headers=headers, json={"sites": sites})
+    assert r.status_code == 200, r.data
+
+    ops = sites_col.bulk_calls[-1]
+    assert sorted(op._filter["site_id"] for op in ops if isinstance(op, ReplaceOne)) == ["s1", "s3"]
+    assert "sites" not in data_col.docs[0]
+    after = client.get("/api/data", headers=headers).get_json()
+    assert list(after["sites"]) == ["s1", "s3"]
+    assert after["sites"]["s1"]["name"] == "Head office"
+    assert after["org_preferences"]["companyName"] == "Acme"
+
+    # Resending identical sites rewrites nothing but the delete-orphans sweep.
+    client.post("/api/data", headers=headers, json={"sites": after["sites"]})
+    assert [type(op) for op in sites_col.bulk_calls[-1]] == [DeleteMany]
+
+
+def test_save_racing_a_migration_is_refused_not_dropped(monkeypatch):
+    data_col, sites_col = FakeCollection([LEGACY]), FakeCollection()
+    client, headers = _client(monkeypatch, data_col, sites_col)
+    read = data_col.find_one
+
+    def read_then_migrate(query, projection=None):
+        doc = read(query, projection)
+        data_col.find_one = read
+        site_documents.migrate_org(data_col, sites_col, "org-1")
+        return doc
+
+    data_col.find_one = read_then_migrate
+    sites = copy.deepcopy(LEGACY["sites"])
+    sites["s1"]["name"] = "Head office"
+    r = client.post("/api/data", headers=headers, json={"sites": sites})
+    assert r.status_code == 409
+    header = data_col.docs[0]
+    assert header["storage_layout"] == "sites" and "sites" not in header
+
+    r = client.post("/api/data", headers=headers, json={"sites": sites})
+    assert r.status_code == 200, r.data
+    assert client.get("/api/data", headers=headers).get_json()["sites"]["s1"]["name"] == "Head office"
+
+
+def test_patch_in_site_layout_touches_one_site_document(monkeypatch):
+    data_col, sites_col = FakeCollection([LEGACY]), FakeCollection()
+    site_documents.migrate_org(data_col, sites_col, "org-1")
+    client, headers = _client(monkeypatch, data_col, sites_col)
+
+    r = client.patch("/api/data", headers=headers, json={"ops": [
+        {"op": "set_row", "site_id": "s1", "category": "energy", "index": 0, "row": _row("main", 7.0)},
+        {"op": "set_site", "site_id": "s4", "site": {"name": "New"}},
+    ]})
+    assert r.status_code == 200, r.data
+    assert "sites" not in data_col.docs[0]
+    loaded = site_documents.load_user_data(data_col, lambda: sites_col, "org-1")
+    assert list(loaded["sites"]) == ["s2", "s1", "s4"]
+    assert loaded["sites"]["s1"]["data"]["energy"][0]["months"][0] == 7.0
+    assert loaded["content_hashes"]["s1"] == api.site_content_hashes(loaded["sites"]["s1"])
+
+
+def test_get_views_read_only_the_selected_subtrees(monkeypatch):
+    data_col, sites_col = FakeCollection([LEGACY]), FakeCollection()
+    site_documents.migrate_org(data_col, sites_col, "org-1")
+    client, headers = _client(monkeypatch, data_col, sites_col)
+    seen = []
+    find = sites_col.find
+    monkeypatch.setattr(sites_col, "find", lambda q, p=None: seen.append(p) or find(q, p))
+
+    summary = client.get("/api/data?view=summary", headers=headers).get_json()
+    assert summary["sites"] == {"s2": {"name": "Depot"}, "s1": {"name": "HQ"}}
+    assert summary["org_preferences"]["companyName"] == "Acme"
+    assert seen[-1] == {"_id": 0, "site_id": 1, "site.name": 1, "site.companyName": 1}
+
+    one = client.get("/api/data?site_id=s1", headers=headers).get_json()
+    assert list(one["sites"]) == ["s1"] and one["sites"]["s1"]["data"]["energy"][0]["description"] == "main"
+
+    water = client.get("/api/data?categories=water", headers=headers).get_json()
+    assert water["sites"]["s1"] == {"name": "HQ", "data": {"water": []}}
+    assert water["sites"]["s2"] == {"name": "Depot"}
+
+    assert client.get("/api/data?site_id=nope", headers=headers).status_code == 404
+    for bad in ("view=everything", "categories=gold", "view=summary&site_id=s1", "site_id=a.b"):
+        assert client.get(f"/api/data?{bad}", headers=headers).status_code == 400, bad
+
+
+def test_legacy_wildcard_projection_runs_in_the_database():
+    projection = {"org_preferences": 1, "sites.*.name": 1, "sites.*.data.energy": 1}
+    pipeline = site_documents.wildcard_header_pipeline("org-1", projection)
+    assert pipeline[0] == {"$match": {"organization_id": "org-1"}}
+    project = pipeline[-1]["$project"]
+    assert project["org_preferences"] == 1 and "sites.*.name" not in project
+    assert project["sites"]["$arrayToObject"]["$map"]["in"]["v"] == {
+        "name": "$$site.v.name", "data": {"energy": "$$site.v.data.energy"},
+    }
+
+    legacy = FakeCollection([LEGACY])
+    loaded = site_documents.load_user_data(legacy, lambda: None, "org-1", projection)
+    assert loaded["sites"]["s1"] == {"name": "HQ", "data": {"energy": LEGACY["sites"]["s1"]["data"]["energy"]}}
+
+    single = site_documents.load_user_data(
+        FakeCollection([LEGACY]), lambda: None, "org-1", {"_id": 0, "sites.s1": 1},
+    )
+    assert single == {"sites": {"s1": LEGACY["sites"]["s1"]}}
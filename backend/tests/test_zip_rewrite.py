@@ -0,0 +1,66 @@
+"""Streaming zip rewriter used for final-report .docx assembly."""
+from __future__ import annotations
+
+import io
+import sys
+import zipfile
+from pathlib import Path
+
+import pytest
+
+BACKEND_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(BACKEND_ROOT))
+
+from zip_rewrite import RawZipSource, iter_rewritten_zip, rewrite_zip  # noqa: E402
+
+
+def _template() -> bytes:
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w") as zf:
+        zf.writestr("[Content_Types].xml", "<Types/>" * 50, compress_type=zipfile.ZIP_DEFLATED)
+        zf.writestr("word/document.xml", "<doc>old</doc>" * 100, compress_type=zipfile.ZIP_DEFLATED)
+        zf.writestr("word/media/image1.png", b"\x89PNG-old" * 1000, compress_type=zipfile.ZIP_STORED)
+        zf.writestr("word/media/große.png", b"\x00" * 70_000, compress_type=zipfile.ZIP_DEFLATED)
+    return buf.getvalue()
+
+
+def _raw_member(data: bytes, name: str) -> bytes:
+    source = RawZipSource(data)
+    member = next(m for m in source.members if m.info.filename == name)
+    return data[member.data_start:member.data_start + member.info.compress_size]
+
+
+def test_unchanged_members_are_copied_without_recompression():
+    template = _template()
+    out = rewrite_zip(RawZipSource(template), {"word/document.xml": b"<doc>new</doc>"})
+
+    with zipfile.ZipFile(io.BytesIO(out)) as zf:
+        assert zf.testzip() is None
+        assert [i.filename for i in zf.infolist()] == [
+            "[Content_Types].xml", "word/document.xml", "word/media/image1.png", "word/media/große.png",
+        ]
+        assert zf.read("word/document.xml") == b"<doc>new</doc>"
+        assert zf.getinfo("word/document.xml").compress_type == zipfile.ZIP_DEFLATED
+        assert zf.read("word/media/große.png") == b"\x00" * 70_000
+    for name in ("[Content_Types].xml", "word/media/image1.png", "word/media/große.png"):
+        assert _raw_member(out, name) == _raw_member(template, name)
+
+
+def test_replaced_stored_member_stays_stored_and_unknown_names_are_ignored():
+    source = RawZipSource(_template())
+    chunks = list(iter_rewritten_zip(source, {"word/media/image1.png": b"\x89PNG-new", "missing.bin": b"x"}))
+    assert len(chunks) > 4
+    with zipfile.ZipFile(io.BytesIO(b"".join(chunks))) as zf:
+        info = zf.getinfo("word/media/image1.png")
+        assert info.compress_type == zipfile.ZIP_STORED
+        assert zf.read(info) == b"\x89PNG-new"
+        assert "missing.bin" not in zf.namelist()
+
+
+def test_encrypted_members_are_rejected():
+    data = bytearray(_template())
+    # Set the encryption flag on the first central directory entry.
+    cd = data.index(b"PK\x01\x02")
+    data[cd + 8] |= 0x1
+    with pytest.raises(ValueError):
+        RawZipSource(bytes(data))
@@ -0,0 +1,137 @@
+"""
+Rewrite a zip archive (e.g. a .docx template) with a few members replaced, as a stream of chunks.
+
+Unchanged members are copied as their original compressed bytes — no inflate/deflate round trip —
+so only the replaced parts cost CPU. The source is indexed once (RawZipSource) and can be reused
+for every rewrite of the same template.
+"""
+from __future__ import annotations
+
+import io
+import struct
+import time
+import zipfile
+import zlib
+from typing import Iterator
+
+_LOCAL_HEADER = struct.Struct('<4s2B4HL2L2H')
+_CENTRAL_HEADER = struct.Struct('<4s4B4HL2L5H2L')
+_END_RECORD = struct.Struct('<4s4H2LH')
+_LOCAL_SIG = b'PK\x03\x04'
+_CENTRAL_SIG = b'PK\x01\x02'
+_END_SIG = b'PK\x05\x06'
+
+_FLAG_ENCRYPTED = 0x1
+_FLAG_UTF8 = 0x800
+_ZIP32_LIMIT = 0xFFFFFFFF
+_COPY_CHUNK = 1 << 16
+
+
+class _Member:
+    __slots__ = ('info', 'name_bytes', 'data_start')
+
+    def __init__(self, info: zipfile.ZipInfo, name_bytes: bytes, data_start: int):
+        self.info = info
+        self.name_bytes = name_bytes
+        self.data_start = data_start
+
+
+def _dos_datetime(date_time) -> tuple[int, int]:
+    year, month, day, hour, minute, second = date_time
+    dos_date = (max(year, 1980) - 1980) << 9 | month << 5 | day
+    dos_time = hour << 11 | minute << 5 | (second // 2)
+    return dos_time, dos_date
+
+
+class RawZipSource:
+    """Index of an in-memory zip: member metadata plus where each member's compressed bytes start."""
+
+    def __init__(self, data: bytes):
+        self.data = data
+        view = memoryview(data)
+        members = []
+        with zipfile.ZipFile(io.BytesIO(data)) as zf:
+            for info in zf.infolist():
+                if info.flag_bits & _FLAG_ENCRYPTED:
+                    raise ValueError(f'encrypted zip member not supported: {info.filename}')
+                header = _LOCAL_HEADER.unpack_from(view, info.header_offset)
+                if header[0] != _LOCAL_SIG:
+                    raise ValueError(f'bad local header for zip member: {info.filename}')
+                name_len, extra_len = header[10], header[11]
+                name_start = info.header_offset + _LOCAL_HEADER.size
+                name_bytes = bytes(view[name_start:name_start + name_len])
+                members.append(_Member(info, name_bytes, name_start + name_len + extra_len))
+        self.members = tuple(members)
+
+
+def _compress(data: bytes, method: int, level: int) -> bytes:
+    if method == zipfile.ZIP_STORED:
+        return data
+    compressor = zlib.compressobj(level, zlib.DEFLATED, -15)
+    return compressor.compress(data) + compressor.flush()
+
+
+def iter_rewritten_zip(
+    source: RawZipSource,
+    replacements: dict[str, bytes],
+    *,
+    compresslevel: int = 6,
+) -> Iterator[bytes]:
+    """
+    Yield the bytes of `source` with `replacements` ({member name: new content}) swapped in.
+
+    Member order, names and attributes are preserved. A replaced member keeps the template's
+    compression method (stored media stays stored, XML is deflated); names that are not in the
+    source are ignored.
+    """
+    offset = 0
+    central = []
+    now = _dos_datetime(time.localtime()[:6])
+    view = memoryview(source.data)
+
+    for member in source.members:
+        info = member.info
+        flags = info.flag_bits & _FLAG_UTF8
+        replacement = replacements.get(info.filename)
+        if replacement is None:
+            method = info.compress_type
+            crc, compress_size, file_size = info.CRC, info.compress_size, info.file_size
+            dos_time, dos_date = _dos_datetime(info.date_time)
+            body = None
+        else:
+            method = zipfile.ZIP_STORED if info.compress_type == zipfile.ZIP_STORED else zipfile.ZIP_DEFLATED
+            body = _compress(replacement, method, compresslevel)
+            crc, compress_size, file_size = zlib.crc32(replacement), len(body), len(replacement)
+            dos_time, dos_date = now
+        if max(offset, compress_size, file_size) >= _ZIP32_LIMIT:
+            raise ValueError('zip64 archives are not supported')
+        version = 20 if method == zipfile.ZIP_DEFLATED else 10
+
+        header = _LOCAL_HEADER.pack(
+            _LOCAL_SIG, version, 0, flags, method, dos_time, dos_date,
+            crc, compress_size, file_size, len(member.name_bytes), 0,
+        )
+        central.append(_CENTRAL_HEADER.pack(
+            _CENTRAL_SIG, version, info.create_system, version, 0, flags, method, dos_time, dos_date,
+            crc, compress_size, file_size, len(member.name_bytes), 0, 0, 0,
+            info.internal_attr, info.external_attr, offset,
+        ) + member.name_bytes)
+        yield header + member.name_bytes
+        offset += len(header) + len(member.name_bytes)
+
+        if body is not None:
+            yield body
+        else:
+            start = member.data_start
+            for pos in range(start, start + compress_size, _COPY_CHUNK):
+                yield bytes(view[pos:min(pos + _COPY_CHUNK, start + compress_size)])
+        offset += compress_size
+
+    directory = b''.join(central)
+    yield directory + _END_RECORD.pack(
+        _END_SIG, 0, 0, len(central), len(central), len(directory), offset, 0,
+    )
+
+
+def rewrite_zip(source: RawZipSource, replacements: dict[str, bytes], **kwargs) -> bytes:
+    return b''.join(iter_rewritten_zip(source, replacements, **kwargs))
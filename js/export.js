@@ -2326,7 +2326,13 @@ function _buildFinalReportPayload() {
     const org_registered_address =
         document.getElementById('orgRegisteredAddressInput')?.value?.trim() ||
         readPref('orgRegisteredAddress');
-    if (company_logo_data_url) payload.company_logo_data_url = company_logo_data_url;
+    const company_logo_ref = window.OrgPreferences?.getStoredLogoRef?.() || '';
+    if (company_logo_ref) {
+        // Unchanged server-side logo: send the reference instead of re-uploading the image.
+        payload.company_logo_ref = company_logo_ref;
+    } else if (company_logo_data_url) {
+        payload.company_logo_data_url = company_logo_data_url;
+    }
     if (organization_profile) payload.organization_profile = organization_profile;
     if (org_registered_address) payload.org_registered_address = org_registered_address;
 
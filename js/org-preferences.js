@@ -5,6 +5,8 @@
     let cache = {};
     let hydratedFromServer = false;
     let saveTimer = null;
+    // Logo loaded from GET /api/organization/logo: { ref, src } while the <img> still shows it.
+    let storedLogo = null;
 
     const REPORT_META_BINDINGS = [
         { id: 'projectNumberInput', key: 'projectNumber' },
@@ -48,6 +50,7 @@
 
     function clearOrgPreferencesCache() {
         cache = {};
+        storedLogo = null;
         hydratedFromServer = false;
     }
 
@@ -92,6 +95,8 @@
         if (data.companyLogo) {
             const logo = document.getElementById('companyLogoImg');
             if (logo) logo.src = data.companyLogo;
+        } else if (data.companyLogoRef) {
+            loadStoredLogo(String(data.companyLogoRef));
         }
         if (data.currentSiteId && global.appState?.sites?.[data.currentSiteId]) {
             global.appState.currentSite = data.currentSiteId;
@@ -261,7 +266,12 @@
             out.currentSiteId = String(global.appState.currentSite);
         }
         const logo = document.getElementById('companyLogoImg');
-        if (logo?.src && logo.src.startsWith('data:')) {
+        const logoRef = getStoredLogoRef();
+        delete out.companyLogo;
+        delete out.companyLogoRef;
+        if (logoRef) {
+            out.companyLogoRef = logoRef;
+        } else if (logo?.src && logo.src.startsWith('data:')) {
             out.companyLogo = logo.src;
         }
 
@@ -285,6 +295,34 @@
         return out;
     }
 
+    function getStoredLogoRef() {
+        const logo = document.getElementById('companyLogoImg');
+        return storedLogo && logo?.src === storedLogo.src ? storedLogo.ref : '';
+    }
+
+    /** Logo bytes live in the server blob store; org_preferences only carries companyLogoRef. */
+    async function loadStoredLogo(ref) {
+        const logo = document.getElementById('companyLogoImg');
+        if (!logo || storedLogo?.ref === ref || typeof global.getApiBaseUrl !== 'function') return;
+        try {
+            const headers =
+                typeof global.getOrgApiHeaders === 'function' ? global.getOrgApiHeaders() : {};
+            const response = await fetch(`${global.getApiBaseUrl()}/organization/logo`, { headers });
+            if (!response.ok) return;
+            const blob = await response.blob();
+            const src = await new Promise((resolve, reject) => {
+                const reader = new FileReader();
+                reader.onload = () => resolve(reader.result);
+                reader.onerror = () => reject(reader.error);
+                reader.readAsDataURL(blob);
+            });
+            logo.src = src;
+            storedLogo = { ref, src };
+        } catch (err) {
+            console.warn('Could not load company logo:', err);
+        }
+    }
+
     function hydrateFromServer(prefs) {
         cache = prefs && typeof prefs === 'object' ? { ...prefs } : {};
         hydratedFromServer = true;
@@ -314,6 +352,7 @@
         hydrateFromServer,
         applyOrgPreferencesToDOM,
         collectOrgPreferencesFromDOM,
+        getStoredLogoRef,
         refreshForms,
         isHydrated: () => hydratedFromServer,
     };
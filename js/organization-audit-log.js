@@ -48,7 +48,7 @@ async function downloadOrganizationAuditLogTxt() {
     if (statusEl) statusEl.textContent = 'Preparing download…';
     try {
         const response = await fetch(
-            `${getApiBaseUrl()}/organization/audit-log?format=txt&limit=2000`,
+            `${getApiBaseUrl()}/organization/audit-log?format=txt`,
             { headers: getOrgHeaders() }
         );
         if (response.status === 401 || response.status === 422) {
@@ -97,7 +97,7 @@ async function loadAuditLogPreview() {
     previewEl.textContent = 'Loading recent entries…';
     try {
         const response = await fetch(
-            `${getApiBaseUrl()}/organization/audit-log?limit=30`,
+            `${getApiBaseUrl()}/organization/audit-log?limit=30&fields=summary`,
             { headers: getOrgHeaders() }
         );
         if (!response.ok) {
@@ -126,7 +126,9 @@ async function loadAuditLogPreview() {
             const role = entry.actor_role || 'user';
             const action = entry.action || 'change';
             const summary = entry.summary || '';
-            const changeCount = Array.isArray(entry.changes) ? entry.changes.length : 0;
+            const changeCount = Number.isInteger(entry.change_count)
+                ? entry.change_count
+                : Array.isArray(entry.changes) ? entry.changes.length : 0;
             return `[${when}] ${who} (${role}) — ${action}\n  ${summary} (${changeCount} detail line(s))`;
         });
         previewEl.textContent = lines.join('\n\n');
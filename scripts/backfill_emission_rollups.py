@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""
+Rebuild the emission_rollups collection (monthly kg CO2e per site, category and scope) from
+stored organization data — after enabling rollups, or after a conversion factor update.
+
+Usage:
+  py scripts/backfill_emission_rollups.py --all
+  py scripts/backfill_emission_rollups.py --org <id> [--org <id>]
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+from pathlib import Path
+
+os.environ.setdefault('SEED_PLATFORM_ADMIN', '0')
+os.environ.setdefault('MONGO_ENSURE_INDEXES', '0')
+
+BACKEND_ROOT = Path(__file__).resolve().parents[1] / 'backend'
+sys.path.insert(0, str(BACKEND_ROOT))
+
+import mongo_api as api  # noqa: E402
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument('--all', action='store_true', help='every organization with saved data')
+    target.add_argument('--org', action='append', help='organization id (repeatable)')
+    args = parser.parse_args()
+
+    data_col = api.get_data_col()
+    if data_col is None or api.get_rollups_col() is None:
+        print('ERROR: could not connect to MongoDB', file=sys.stderr)
+        return 2
+    if not api.get_conversion_factors_registry(force_reload=True):
+        print('ERROR: no conversion factors in catalog', file=sys.stderr)
+        return 2
+    org_ids = args.org or sorted(str(o) for o in data_col.distinct('organization_id') if o)
+
+    failures = 0
+    for org_id in org_ids:
+        try:
+            cells = api._emission_rollups.apply(org_id, None, None)
+        except Exception as e:
+            failures += 1
+            print(f'  failed  {org_id}: {e}', file=sys.stderr)
+            continue
+        print(f'{cells:>8}  {org_id}')
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark: compiled factor lookup table vs the previous per-call resolution path.
+
+Uses the datasheet JSON mirror (backend/data/datasheet_uk_factors_by_year.json), so no MongoDB
+is needed.
+
+Usage:
+  py scripts/bench_factor_lookup.py
+  py scripts/bench_factor_lookup.py --iterations 200000
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+import timeit
+from pathlib import Path
+
+os.environ.setdefault("ALLOW_DATASHEET_FACTOR_JSON", "true")
+os.environ.setdefault("SEED_PLATFORM_ADMIN", "0")
+
+BACKEND_ROOT = Path(__file__).resolve().parents[1] / "backend"
+sys.path.insert(0, str(BACKEND_ROOT))
+
+import mongo_api as api  # noqa: E402
+from data.catalog_factor_registry import category_for_factor_key, resolve_catalog_factor_key  # noqa: E402
+
+LOOKUPS = [
+    ("UK", 2025, "electricity", "kwh"),
+    ("UK", "2024", "naturalGas", "mwh"),
+    ("BRAZIL", 2023, "water", "m3"),
+    ("uk ", 2022, "car_petrol_average", "miles"),
+    ("FRANCE", 2025, "waste_to_recycling", "tonnes"),
+    ("UK", 2021, "refrigerant_R410A", "kg"),
+]
+
+
+def legacy_lookup(registry: dict, country, year, source_key, unit=""):
+    """Pre-compilation lookup_conversion_factor body (string work + category chain per call)."""
+    c = (country or "UK").strip().upper()
+    y = api._normalize_year(year)
+    src = (source_key or "").strip()
+    doc = registry.get(f"{c}_{y}") or registry.get(f"UK_{y}")
+    factors_bucket = (doc or {}).get("factors") or {}
+    factor_key = resolve_catalog_factor_key(src)
+    if factor_key not in factors_bucket and src in factors_bucket:
+        factor_key = src
+    if factor_key not in factors_bucket:
+        return None, f"Unsupported source: {src}"
+    category = category_for_factor_key(factor_key)
+    unit_clean = (unit or "").strip().lower()
+    if unit_clean:
+        allowed = api._UNIT_TO_BASE.get(category, {})
+        if unit_clean not in allowed:
+            return None, f'Unsupported unit "{unit_clean}" for category "{category}"'
+    factor = factors_bucket.get(factor_key)
+    if factor is None:
+        return None, f'Missing factor for source "{src}" ({factor_key})'
+    return float(factor), None
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--iterations", type=int, default=100_000)
+    args = parser.parse_args()
+
+    registry = api.get_conversion_factors_registry(force_reload=True)
+    if not registry:
+        print("No conversion factors available (datasheet JSON missing?).", file=sys.stderr)
+        return 1
+    table = api.get_factor_lookup_table(registry)
+
+    for args_tuple in LOOKUPS:
+        assert legacy_lookup(registry, *args_tuple) == api.lookup_conversion_factor(*args_tuple), args_tuple
+
+    n = args.iterations
+
+    def run_legacy():
+        for item in LOOKUPS:
+            legacy_lookup(registry, *item)
+
+    def run_compiled():
+        for item in LOOKUPS:
+            table.lookup(*item)
+
+    legacy_s = timeit.timeit(run_legacy, number=n)
+    compiled_s = timeit.timeit(run_compiled, number=n)
+    total = n * len(LOOKUPS)
+    print(f"lookups:  {total:,}")
+    print(f"legacy:   {legacy_s:.3f}s  ({legacy_s / total * 1e9:,.0f} ns/lookup)")
+    print(f"compiled: {compiled_s:.3f}s  ({compiled_s / total * 1e9:,.0f} ns/lookup)")
+    print(f"speedup:  {legacy_s / compiled_s:.1f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
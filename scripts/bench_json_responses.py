@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Benchmark: JSON serialization of large API responses, Flask's default provider vs FastJSONProvider.
+
+Builds a synthetic organization (500 sites by default, every data category filled) plus a factor
+catalog and an audit log page, and times each provider's buffered dumps and, for the fast
+provider, the time to the first streamed chunk. Without MongoDB the factor catalog comes from the
+datasheet JSON mirror.
+
+Usage:
+  py scripts/bench_json_responses.py
+  py scripts/bench_json_responses.py --sites 1000 --repeat 10
+"""
+from __future__ import annotations
+
+import argparse
+import datetime
+import os
+import sys
+import timeit
+from pathlib import Path
+
+os.environ.setdefault("ALLOW_DATASHEET_FACTOR_JSON", "true")
+os.environ.setdefault("SEED_PLATFORM_ADMIN", "0")
+os.environ.setdefault("MONGO_ENSURE_INDEXES", "0")
+
+BACKEND_ROOT = Path(__file__).resolve().parents[1] / "backend"
+sys.path.insert(0, str(BACKEND_ROOT))
+
+from bson import ObjectId  # noqa: E402
+from flask.json.provider import DefaultJSONProvider  # noqa: E402
+
+import mongo_api as api  # noqa: E402
+from json_provider import FastJSONProvider, orjson  # noqa: E402
+
+
+def synthetic_org(site_count: int) -> dict:
+    now = datetime.datetime(2025, 6, 1, 12, 0)
+    sites = {}
+    for n in range(site_count):
+        data = {
+            category: [
+                {
+                    "description": f"{category} meter {r}",
+                    "year": 2020 + r % 6,
+                    "months": [float((n + r + m) % 97) * 1.25 for m in range(12)],
+                    "emissionType": category,
+                    "unit": api._DEFAULT_ROW_UNIT[category],
+                }
+                for r in range(3)
+            ]
+            for category in api._ALLOWED_ROW_UNITS
+        }
+        sites[f"site-{n:04d}"] = {
+            "name": f"Site {n}",
+            "companyName": "Synthetic Ltd",
+            "notes": "Lorem ipsum " * 8,
+            "financials": {"bankBalance": 1000.0 + n, "cashIn": 10.0, "cashOut": 5.0},
+            "invoices": [{"id": f"inv-{i}", "amount": 120.5, "client": "Client"} for i in range(5)],
+            "tabQuestions": {"water": "Metered monthly", "energy": "Half-hourly data"},
+            "data": data,
+        }
+    return {"_id": str(ObjectId()), "organization_id": "org-bench", "updated_at": now, "sites": sites}
+
+
+def synthetic_audit_page(entries: int) -> dict:
+    ts = datetime.datetime(2025, 6, 1, 12, 0)
+    return {
+        "organization_id": "org-bench",
+        "entries": [
+            {
+                "_id": ObjectId(),
+                "timestamp": ts - datetime.timedelta(minutes=n),
+                "action": "data_save",
+                "user_email": "user@example.com",
+                "changes": [{"path": f"sites.site-{n % 500:04d}.data.energy.0.months", "summary": "12 month(s)"}] * 6,
+            }
+            for n in range(entries)
+        ],
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sites", type=int, default=500)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    default, fast = DefaultJSONProvider(api.app), FastJSONProvider(api.app)
+    audit = synthetic_audit_page(500)
+    # The stdlib encoder cannot write ObjectId; the routes convert it before jsonify.
+    audit_for_default = {**audit, "entries": [{**e, "_id": str(e["_id"])} for e in audit["entries"]]}
+    cases = {
+        f"user data ({args.sites} sites)": (synthetic_org(args.sites),) * 2,
+        "factor catalog": (api.list_catalog_factor_documents(),) * 2,
+        "audit log page (500 entries)": (audit_for_default, audit),
+    }
+    if orjson is None:
+        print("orjson is not installed: the fast provider falls back to the stdlib encoder.")
+    print(f"{'response':32} {'bytes':>10} {'default ms':>11} {'fast ms':>9} {'speedup':>8} {'1st chunk ms':>13}")
+    for name, (default_obj, fast_obj) in cases.items():
+        size = len(fast.dumps_bytes(fast_obj))
+        slow = min(timeit.repeat(lambda: default.dumps(default_obj, separators=(",", ":")), number=1, repeat=args.repeat))
+        quick = min(timeit.repeat(lambda: fast.dumps_bytes(fast_obj), number=1, repeat=args.repeat))
+        first = min(timeit.repeat(lambda: next(fast.iter_chunks(fast_obj)), number=1, repeat=args.repeat))
+        print(
+            f"{name:32} {size:>10} {slow * 1000:>11.1f} {quick * 1000:>9.1f} "
+            f"{slow / quick if quick else 0:>7.1f}x {first * 1000:>13.2f}"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,169 @@
+#!/usr/bin/env node
+/**
+ * Regenerate backend/tests/fixtures/emissions_parity.json: per-row kg CO2e and the scope
+ * breakdown computed by the dashboard's own js/calculations.js, for the server engine's parity
+ * test. Loads the browser scripts into a VM with just enough of a DOM to run them.
+ *
+ * Usage: node scripts/emissions_parity_fixture.js
+ */
+'use strict';
+
+const fs = require('fs');
+const path = require('path');
+const vm = require('vm');
+
+const ROOT = path.resolve(__dirname, '..');
+const OUT = path.join(ROOT, 'backend', 'tests', 'fixtures', 'emissions_parity.json');
+
+// Factors per UI source key (kg CO2e per base unit), used for the reporting year in both engines.
+const FACTORS = {
+    electricity: 0.2,
+    naturalGas: 0.18,
+    diesel: 2.5,
+    electricity_transmission_distribution: 0.018,
+    td_district_heat_steam: 0.011,
+    water: 0.15,
+    waste: 21.3,
+    transport_petrol: 0.17,
+    flights_short: 0.15,
+    business_travel_hotel_night: 10.4,
+    wfh_day: 0.33,
+    materials_paper_kg: 0.92,
+    refrigerant_R410A: 2088,
+};
+
+const row = (emissionType, unit, months) => ({ year: 2025, unit, emissionType, months });
+const spread = (first, rest = 0) => [first, ...Array(11).fill(rest)];
+
+const SITES = {
+    hq: {
+        data: {
+            energy: [row('electricity', 'mwh', spread(2, 1)), row('naturalGas', 'therms', spread(10))],
+            transmissionDistribution: [
+                row('electricity_transmission_distribution', 'kwh', Array(12).fill(500)),
+                row('td_district_heat_steam', 'gj', spread(3)),
+            ],
+            water: [row('water', 'litres', Array(12).fill(2500))],
+            waste: [row('waste', 'kg', spread(800, 50))],
+            refrigerants: [row('refrigerant_R410A', 'g', spread(0, 120))],
+        },
+    },
+    depot: {
+        data: {
+            energy: [row('diesel', 'kwh', Array(12).fill(40))],
+            transport: [row('transport_petrol', 'miles', Array(12).fill(300))],
+            businessTravel: [
+                row('flights_short', 'km', spread(1200)),
+                row('business_travel_hotel_night', 'night', spread(4, 2)),
+            ],
+            wfh: [row('wfh_day', 'day', Array(12).fill(20))],
+            materials: [row('materials_paper_kg', 'kg', Array(12).fill(15))],
+        },
+    },
+};
+
+const CASES = [
+    { name: 'defaults', org_preferences: {} },
+    {
+        name: 'sources_and_scope_disabled',
+        org_preferences: {
+            elecDistLossIncluded: 'false',
+            hotelStayEnabled: 'false',
+            wfhEnabled: 'false',
+            materialsEnabled: 'false',
+            scope1Enabled: 'false',
+        },
+    },
+];
+
+function element(props = {}) {
+    return {
+        value: '',
+        textContent: '',
+        title: '',
+        dataset: {},
+        classList: { contains: () => false, toggle() {}, add() {}, remove() {} },
+        setAttribute() {},
+        querySelector: () => null,
+        querySelectorAll: () => [],
+        ...props,
+    };
+}
+
+function buildTable(category, rows) {
+    const table = element({ id: `${category}Table` });
+    const rowEls = rows.map((r) => {
+        const parts = {
+            '.emission-select': element({ value: r.emissionType }),
+            '.row-unit-select': element({ value: r.unit }),
+            '.row-display-year': element({ value: String(r.year) }),
+            '.co2-cell': element(),
+            '.total-cell': element(),
+        };
+        const months = r.months.map((v) => element({ value: String(v) }));
+        return element({
+            classList: { contains: (c) => c === 'data-row', toggle() {}, add() {}, remove() {} },
+            querySelector: (sel) => parts[sel] || null,
+            querySelectorAll: (sel) => (sel === '.month-input' ? months : []),
+            closest: () => table,
+        });
+    });
+    table.querySelectorAll = (sel) => (sel === '.data-row' || sel === 'tr.data-row .row-unit-select' ? rowEls : []);
+    return { table, rowEls };
+}
+
+function runCase(prefs) {
+    const storage = new Map(Object.entries({ carbonCalcReportingYear: '2025', ...prefs }));
+    const tables = {};
+    const window = { addEventListener() {} };
+    const context = vm.createContext({
+        window,
+        console,
+        localStorage: { getItem: (k) => (storage.has(k) ? storage.get(k) : null), setItem() {} },
+        document: {
+            getElementById: (id) => (tables[id] ? tables[id].table : null),
+            querySelector: () => null,
+            querySelectorAll: () => [],
+            addEventListener() {},
+            createElement: () => element(),
+        },
+    });
+    window.document = context.document;
+    for (const file of ['js/data-input-categories.js', 'js/calculations.js']) {
+        vm.runInContext(fs.readFileSync(path.join(ROOT, file), 'utf8'), context, { filename: file });
+    }
+    vm.runInContext(
+        `CONVERSION_FACTORS = { UK: { '2025': ${JSON.stringify(FACTORS)} } }; currentCountry = 'UK';`,
+        context,
+    );
+
+    const rows = {};
+    const scopes = { scope1: 0, scope2: 0, scope3: 0 };
+    for (const [siteId, site] of Object.entries(SITES)) {
+        for (const key of Object.keys(tables)) delete tables[key];
+        for (const [category, categoryRows] of Object.entries(site.data)) {
+            tables[`${category}Table`] = buildTable(category, categoryRows);
+        }
+        vm.runInContext('resetReportingFactorContext(); calculateAllTotals();', context);
+        for (const [category, categoryRows] of Object.entries(site.data)) {
+            tables[`${category}Table`].rowEls.forEach((el, index) => {
+                rows[`${siteId}/${category}/${index}`] = Number(el.dataset.co2Tonnes || 0) * 1000;
+            });
+        }
+        const breakdown = vm.runInContext('getScopeBreakdown()', context);
+        for (const scope of Object.keys(scopes)) scopes[scope] += breakdown[scope] * 1000;
+    }
+    return { rows_kg: rows, scope_kg: scopes };
+}
+
+const fixture = {
+    generated_by: 'scripts/emissions_parity_fixture.js',
+    country: 'UK',
+    year: 2025,
+    factors: FACTORS,
+    sites: SITES,
+    cases: CASES.map((c) => ({ ...c, ...runCase(c.org_preferences) })),
+};
+fs.mkdirSync(path.dirname(OUT), { recursive: true });
+fs.writeFileSync(OUT, `${JSON.stringify(fixture, null, 2)}\n`);
+console.log(`wrote ${path.relative(ROOT, OUT)}`);
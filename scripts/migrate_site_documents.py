@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Move organization data between the single-document and per-site storage layouts
+(see backend/site_documents.py).
+
+Usage:
+  py scripts/migrate_site_documents.py --all                  # every organization -> per-site documents
+  py scripts/migrate_site_documents.py --org <id> [--org <id>]
+  py scripts/migrate_site_documents.py --all --to legacy      # back to one user_data document per org
+  py scripts/migrate_site_documents.py --all --dry-run        # report layouts and sizes only
+
+Re-running is safe: organizations already in the target layout are left alone, and an
+interrupted migration to per-site documents leaves the original document in place. An
+organization that kept being saved while it was migrated is reported as a conflict and keeps
+its current layout; re-run it later.
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+from pathlib import Path
+
+os.environ.setdefault('SEED_PLATFORM_ADMIN', '0')
+os.environ.setdefault('MONGO_ENSURE_INDEXES', '0')
+
+BACKEND_ROOT = Path(__file__).resolve().parents[1] / 'backend'
+sys.path.insert(0, str(BACKEND_ROOT))
+
+import mongo_api as api  # noqa: E402
+from site_documents import LAYOUT_LEGACY, LAYOUT_SITES, migrate_org, site_layout_size  # noqa: E402
+
+
+def _print_size(row: dict) -> None:
+    print(
+        f"  {row['organization_id']}: {row['layout']}, header {row['header_bytes']:,} bytes, "
+        f"{row['site_documents']} site document(s), largest {row['largest_site_bytes']:,} bytes"
+    )
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument('--all', action='store_true', help='every organization with saved data')
+    target.add_argument('--org', action='append', help='organization id (repeatable)')
+    parser.add_argument('--to', choices=(LAYOUT_SITES, LAYOUT_LEGACY), default=LAYOUT_SITES)
+    parser.add_argument('--dry-run', action='store_true', help='report current layout and sizes only')
+    args = parser.parse_args()
+
+    data_col, sites_col = api.get_data_col(), api.get_sites_col()
+    if data_col is None or sites_col is None:
+        print('ERROR: could not connect to MongoDB', file=sys.stderr)
+        return 2
+    org_ids = args.org or sorted(str(o) for o in data_col.distinct('organization_id') if o)
+
+    failures = 0
+    for org_id in org_ids:
+        if args.dry_run:
+            _print_size(site_layout_size(data_col, sites_col, org_id))
+            continue
+        try:
+            status = migrate_org(data_col, sites_col, org_id, to=args.to, now=api.utc_now())
+        except Exception as e:
+            failures += 1
+            print(f'   failed  {org_id}: {e}', file=sys.stderr)
+            continue
+        if status == 'conflict':
+            failures += 1
+            print(f' conflict  {org_id}: data changed during the migration; re-run later', file=sys.stderr)
+            continue
+        print(f'{status:>9}  {org_id}')
+        if status == 'migrated':
+            _print_size(site_layout_size(data_col, sites_col, org_id))
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
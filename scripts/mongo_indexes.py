@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""
+Create or verify the MongoDB indexes the API relies on (declared in backend/db_indexes.py).
+
+Usage:
+  py scripts/mongo_indexes.py             # create missing indexes, then report
+  py scripts/mongo_indexes.py --explain   # also explain hot queries and list collection scans
+  py scripts/mongo_indexes.py --check     # create nothing; exit 1 on a missing index or a scan
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+from pathlib import Path
+
+os.environ.setdefault('SEED_PLATFORM_ADMIN', '0')
+os.environ.setdefault('MONGO_ENSURE_INDEXES', '0')
+
+BACKEND_ROOT = Path(__file__).resolve().parents[1] / 'backend'
+sys.path.insert(0, str(BACKEND_ROOT))
+
+import mongo_api as api  # noqa: E402
+from db_indexes import ensure_indexes, find_collection_scans, index_problems  # noqa: E402
+
+
+def _print_report(index_rows: list[dict], scan_rows: list[dict]) -> None:
+    for row in index_rows:
+        detail = f" ({row['detail']})" if row.get('detail') else ''
+        print(f"{row['status']:>9}  {row['collection']}.{row['index']}{detail}")
+    for row in scan_rows:
+        shape = f"{row['collection']} {row['filter']}" + (f" sort {row['sort']}" if row['sort'] else '')
+        if row.get('error'):
+            print(f"    ERROR  {shape}: {row['error']}")
+        elif row['collscan']:
+            print(f" COLLSCAN  {shape}")
+        elif row['in_memory_sort']:
+            print(f"     SORT  {shape} (sorted in memory)")
+        else:
+            print(f"       ok  {shape}")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--check', action='store_true', help='do not create anything; exit 1 on problems')
+    parser.add_argument('--explain', action='store_true', help='explain hot queries and report collection scans')
+    args = parser.parse_args()
+
+    db = api.get_db()
+    if db is None:
+        print('ERROR: could not connect to MongoDB', file=sys.stderr)
+        return 2
+    index_rows = ensure_indexes(db, create=not args.check)
+    scan_rows = find_collection_scans(db) if (args.explain or args.check) else []
+    _print_report(index_rows, scan_rows)
+    return 1 if index_problems(index_rows, scan_rows) else 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
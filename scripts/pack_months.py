@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Rewrite stored data rows with `months` as lists or packed float64/float32 binaries
+(see backend/months_codec.py), or report what each format would take.
+
+Usage:
+  py scripts/pack_months.py --all --report             # stored size vs list / f64 / f32, per org
+  py scripts/pack_months.py --all --to f64             # lossless packing
+  py scripts/pack_months.py --org <id> --to f32        # smallest; keeps ~7 significant digits
+  py scripts/pack_months.py --all --to list            # back to plain BSON arrays
+
+Set MONTHS_STORAGE to the same format so later saves keep writing it; rows in any format are
+read back transparently, so re-running or mixing formats is safe. An organization that kept being
+saved while it was rewritten is reported as a conflict; re-run it later.
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+from pathlib import Path
+
+os.environ.setdefault('SEED_PLATFORM_ADMIN', '0')
+os.environ.setdefault('MONGO_ENSURE_INDEXES', '0')
+
+BACKEND_ROOT = Path(__file__).resolve().parents[1] / 'backend'
+sys.path.insert(0, str(BACKEND_ROOT))
+
+import mongo_api as api  # noqa: E402
+from months_codec import FORMATS, org_months_report, repack_org  # noqa: E402
+
+
+def _print_report(row: dict) -> None:
+    sizes = ', '.join(f"{fmt} {row[f'{fmt}_bytes']:,}" for fmt in FORMATS)
+    print(f"  {row['organization_id']}: {row['rows']} row(s), stored {row['stored_bytes']:,} bytes ({sizes})")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument('--all', action='store_true', help='every organization with saved data')
+    target.add_argument('--org', action='append', help='organization id (repeatable)')
+    action = parser.add_mutually_exclusive_group(required=True)
+    action.add_argument('--to', choices=FORMATS, help='months format to rewrite rows in')
+    action.add_argument('--report', action='store_true', help='report sizes per format only')
+    args = parser.parse_args()
+
+    data_col, sites_col = api.get_data_col(), api.get_sites_col()
+    if data_col is None or sites_col is None:
+        print('ERROR: could not connect to MongoDB', file=sys.stderr)
+        return 2
+    org_ids = args.org or sorted(str(o) for o in data_col.distinct('organization_id') if o)
+
+    failures = 0
+    for org_id in org_ids:
+        if args.report:
+            row = org_months_report(data_col, sites_col, org_id)
+            if row is not None:
+                _print_report(row)
+            continue
+        try:
+            status = repack_org(data_col, sites_col, org_id, args.to, now=api.utc_now())
+        except Exception as e:
+            failures += 1
+            print(f'   failed  {org_id}: {e}', file=sys.stderr)
+            continue
+        if status == 'conflict':
+            failures += 1
+            print(f' conflict  {org_id}: data changed during the rewrite; re-run later', file=sys.stderr)
+            continue
+        print(f'{status:>9}  {org_id}')
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
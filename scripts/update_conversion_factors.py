@@ -19,7 +19,9 @@ Usage:
   py scripts/update_conversion_factors.py --dry-run
   py scripts/update_conversion_factors.py --no-prune-legacy-org-factors
 
-After updating production MongoDB, restart the Render web service.
+Running API workers cache the catalog in-process and notice the new `updated_at` stamps
+within CONVERSION_FACTORS_CACHE_TTL_SECONDS (default 300s); no Render restart is needed.
+To apply immediately, a platform admin can POST /api/admin/factors/reload.
 """
 from __future__ import annotations
 